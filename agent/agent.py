@@ -1,4 +1,6 @@
 import requests
+import gzip
+import json
 import time
 import socket
 import platform
@@ -6,6 +8,15 @@ import psutil
 import os
 import logging
 
+import backoff
+import cache
+import compression
+import engine
+import peers
+import probes
+import spool
+import wire
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -14,19 +25,32 @@ logger = logging.getLogger(__name__)
 
 CONTROL_PLANE = os.environ.get("CONTROL_PLANE_URL", "http://localhost:8080")
 HEARTBEAT_INTERVAL = int(os.environ.get("HEARTBEAT_INTERVAL", "30"))
+CAPABILITY_REFRESH_INTERVAL = int(os.environ.get("CAPABILITY_REFRESH_INTERVAL", "300"))
+
+# Request body coding advertised by the control plane, learned at registration
+request_encoding = None
+
+# Heartbeat wire format; falls back to "json" if the control plane rejects binary
+heartbeat_format = wire.HEARTBEAT_FORMAT
 
 def get_capabilities():
-    """Detect and return node capabilities"""
+    """Detect and return node capabilities
+    
+    Basic CPU/memory information comes from psutil; GPUs, Docker, kubelet
+    and disks are detected by the concurrent probes in ``probes.py``. The
+    result carries a content fingerprint so changes can be detected cheaply.
+    """
     try:
         mem_info = psutil.virtual_memory()
-        disk_info = psutil.disk_usage('/')
         
         capabilities = {
             "os": platform.system().lower(),
             "cpu_count": psutil.cpu_count(logical=True),
             "mem_mb": mem_info.total // (1024 * 1024),
-            "gpus": []  # GPU detection can be added later
+            "gpus": []
         }
+        capabilities.update(probes.run_probes())
+        capabilities["fingerprint"] = probes.fingerprint(capabilities)
         
         logger.info(f"Detected capabilities: {capabilities}")
         return capabilities
@@ -52,56 +76,119 @@ def get_host_ip():
     except Exception:
         return "127.0.0.1"
 
-def register():
-    """Register this agent with the control plane"""
+def post_json(url, payload, headers=None, timeout=10):
+    """POST a JSON body, compressed once the control plane has advertised support
+    
+    A 415 response means the control plane stopped accepting the coding (for
+    example after a downgrade), so compression is turned off and the request
+    is sent again uncompressed.
+    """
+    global request_encoding
+    headers = dict(headers or {})
+    if request_encoding is None:
+        return requests.post(url, json=payload, headers=headers, timeout=timeout)
+    
+    body, body_headers = compression.encode_json(payload, request_encoding)
+    response = requests.post(
+        url, data=body, headers={**headers, **body_headers}, timeout=timeout
+    )
+    if response.status_code == 415 and "Content-Encoding" in body_headers:
+        logger.warning(f"Control plane rejected {request_encoding} request bodies, disabling compression")
+        request_encoding = None
+        return requests.post(url, json=payload, headers=headers, timeout=timeout)
+    return response
+
+class RegistrationThrottled(requests.exceptions.HTTPError):
+    """Registration was rejected with 429 by the control plane's admission control"""
+    
+    def __init__(self, retry_after, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.retry_after = retry_after
+
+def register(capabilities=None, name=None):
+    """Register this agent with the control plane
+    
+    Re-registering an existing node name updates its capabilities, which is
+    how changed capabilities are pushed to the control plane. The node is
+    named after the host unless ``name`` is given.
+    """
+    global request_encoding
     try:
         payload = {
-            "name": socket.gethostname(),
+            "name": name or socket.gethostname(),
             "ip": get_host_ip(),
-            "capabilities": get_capabilities()
+            "capabilities": capabilities or get_capabilities()
         }
         
         logger.info(f"Registering with control plane at {CONTROL_PLANE}")
-        response = requests.post(
-            f"{CONTROL_PLANE}/api/v1/nodes/register",
-            json=payload,
-            timeout=10
-        )
+        response = post_json(f"{CONTROL_PLANE}/api/v1/nodes/register", payload)
+        if response.status_code == 429:
+            retry_after = backoff.parse_retry_after(response.headers.get("Retry-After"))
+            raise RegistrationThrottled(
+                retry_after,
+                f"Registration throttled, retry after {retry_after}s",
+                response=response,
+            )
         response.raise_for_status()
         
+        # Compress later requests if the control plane accepts it
+        request_encoding = compression.negotiate(response.headers.get("Accept-Encoding"))
+        
         data = response.json()
+        data["capabilities"] = payload["capabilities"]
         logger.info(f"Registration successful. Node ID: {data['node_id']}")
         return data
     except requests.exceptions.RequestException as e:
         logger.error(f"Failed to register with control plane: {e}")
         raise
 
-def send_heartbeat(node_id, node_token):
-    """Send heartbeat with current metrics to control plane"""
+def collect_metrics():
+    """Collect a heartbeat sample of current resource usage"""
+    cpu_percent = psutil.cpu_percent(interval=1)
+    mem_info = psutil.virtual_memory()
+    disk_info = psutil.disk_usage('/')
+    
+    return {
+        "timestamp": time.time(),
+        "cpu_usage": cpu_percent,
+        "mem_usage": mem_info.percent,
+        "disk_free_mb": disk_info.free // (1024 * 1024),
+        "running_containers": []  # Can be enhanced to detect Docker containers
+    }
+
+def send_heartbeat(node_id, node_token, payload=None):
+    """Send heartbeat with current metrics to control plane
+    
+    ``payload`` is a sample from ``collect_metrics()``; a fresh one is
+    collected if it is not given. It is sent in the binary wire format
+    (``wire.py``) unless ``HEARTBEAT_FORMAT=json``.
+    """
+    global heartbeat_format
     try:
-        # Collect current metrics
-        cpu_percent = psutil.cpu_percent(interval=1)
-        mem_info = psutil.virtual_memory()
-        disk_info = psutil.disk_usage('/')
-        
-        payload = {
-            "cpu_usage": cpu_percent,
-            "mem_usage": mem_info.percent,
-            "disk_free_mb": disk_info.free // (1024 * 1024),
-            "running_containers": []  # Can be enhanced to detect Docker containers
-        }
+        if payload is None:
+            payload = collect_metrics()
         
         # Include JWT token in Authorization header
         headers = {
             "Authorization": f"Bearer {node_token}"
         }
+        url = f"{CONTROL_PLANE}/api/v1/nodes/{node_id}/heartbeat"
         
-        response = requests.post(
-            f"{CONTROL_PLANE}/api/v1/nodes/{node_id}/heartbeat",
-            json=payload,
-            headers=headers,
-            timeout=10
-        )
+        response = None
+        if heartbeat_format == "binary":
+            response = requests.post(
+                url,
+                data=wire.encode_heartbeat(payload),
+                headers={**headers, "Content-Type": wire.HEARTBEAT_MEDIA_TYPE},
+                timeout=10
+            )
+            # Older control planes only accept JSON heartbeats
+            if response.status_code in (415, 422):
+                logger.warning("Control plane does not accept binary heartbeats, falling back to JSON")
+                heartbeat_format = "json"
+                response = None
+        if response is None:
+            response = post_json(url, payload, headers=headers)
         response.raise_for_status()
         
         logger.debug(f"Heartbeat sent successfully")
@@ -110,46 +197,246 @@ def send_heartbeat(node_id, node_token):
         logger.error(f"Failed to send heartbeat: {e}")
         return False
 
+def send_metric_batch(node_id, node_token, samples):
+    """Replay a batch of spooled samples as gzip-compressed NDJSON
+    
+    Batches the control plane rejects as malformed are reported as sent, so
+    a bad sample cannot block the rest of the spool.
+    """
+    body = gzip.compress(
+        "\n".join(json.dumps(sample) for sample in samples).encode()
+    )
+    try:
+        response = requests.post(
+            f"{CONTROL_PLANE}/api/v1/nodes/{node_id}/metrics",
+            data=body,
+            headers={
+                "Authorization": f"Bearer {node_token}",
+                "Content-Type": "application/x-ndjson",
+                "Content-Encoding": "gzip",
+            },
+            timeout=30
+        )
+        if response.status_code in (400, 422):
+            logger.warning(f"Discarding {len(samples)} spooled samples rejected by control plane")
+            return True
+        response.raise_for_status()
+        return True
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Failed to replay spooled metrics: {e}")
+        return False
+
+def open_spool():
+    """Open the metric spool, or return None if spooling is unavailable"""
+    try:
+        metric_spool = spool.MetricSpool()
+    except OSError as e:
+        logger.warning(f"Metric spooling disabled, cannot open {spool.SPOOL_PATH}: {e}")
+        return None
+    if len(metric_spool):
+        logger.info(f"Found {len(metric_spool)} spooled samples from a previous run")
+    return metric_spool
+
+def start_peer_server(store):
+    """Serve chunks of held artifacts to peers, or return None if disabled"""
+    if not peers.PEER_PORT:
+        return None
+    try:
+        server = peers.PeerServer(store)
+    except OSError as e:
+        logger.warning(f"Peer chunk serving disabled, cannot listen on port {peers.PEER_PORT}: {e}")
+        return None
+    server.start()
+    logger.info(f"Serving artifact chunks to peers on port {server.port}")
+    return server
+
+def start_engine(node_token, artifact_cache):
+    """Run inference batches on a warm worker pool, or return None if disabled"""
+    if not engine.ENGINE_WORKERS:
+        return None
+    inference_engine = engine.InferenceEngine(
+        CONTROL_PLANE, node_token, artifact_cache, engine.WorkerPool(),
+        models=engine.ENGINE_MODELS or None,
+    )
+    inference_engine.start()
+    logger.info(f"Running inference on {inference_engine.pool.size} worker processes")
+    return inference_engine
+
+def report_cache(node_id, node_token, artifact_cache):
+    """Send the artifacts held in the cache to the control plane
+    
+    Placement and request routing use the report to prefer nodes that
+    already hold a model. Returns True if the control plane took it.
+    """
+    try:
+        response = requests.put(
+            f"{CONTROL_PLANE}/api/v1/nodes/{node_id}/artifacts",
+            json={
+                "artifacts": [
+                    {
+                        "digest": item["digest"],
+                        "size": item["size"],
+                        "pinned": item["pinned"],
+                        "last_used": item["last_used"],
+                    }
+                    for item in artifact_cache.contents()
+                    if item["complete"]
+                ],
+            },
+            headers={"Authorization": f"Bearer {node_token}"},
+            timeout=10
+        )
+        response.raise_for_status()
+        return True
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Failed to report cached artifacts: {e}")
+        return False
+
+def retry_delay(error, reconnect_backoff):
+    """Delay before retrying a failed registration
+    
+    A delay chosen by the control plane's admission control is honoured;
+    otherwise the delay comes from the decorrelated-jitter backoff.
+    """
+    retry_after = getattr(error, "retry_after", None)
+    return reconnect_backoff.next(retry_after)
+
 def main():
     """Main agent loop"""
     logger.info("Agent starting...")
+    reconnect_backoff = backoff.Backoff()
     
-    # Register with control plane
-    try:
-        registration_info = register()
-        node_id = registration_info["node_id"]
-        node_token = registration_info["node_token"]
-        logger.info(f"Agent registered successfully with node_id: {node_id}")
-    except Exception as e:
-        logger.error(f"Failed to register agent: {e}")
-        logger.error("Exiting...")
-        return
+    # Register with control plane, backing off until it is reachable
+    while True:
+        try:
+            registration_info = register()
+            break
+        except KeyboardInterrupt:
+            logger.info("Agent shutting down...")
+            return
+        except Exception as e:
+            delay = retry_delay(e, reconnect_backoff)
+            logger.error(f"Failed to register agent: {e}. Retrying in {delay:.1f}s")
+            try:
+                time.sleep(delay)
+            except KeyboardInterrupt:
+                logger.info("Agent shutting down...")
+                return
+    node_id = registration_info["node_id"]
+    node_token = registration_info["node_token"]
+    capabilities_fingerprint = registration_info["capabilities"].get("fingerprint")
+    reconnect_backoff.reset()
+    logger.info(f"Agent registered successfully with node_id: {node_id}")
+    
+    # Samples that could not be sent are spooled and replayed later
+    metric_spool = open_spool()
+    
+    # Artifacts are fetched from peers where possible and served back to them
+    artifact_store = peers.ArtifactStore()
+    peer_server = start_peer_server(artifact_store)
+    artifact_fetcher = peers.ArtifactFetcher(
+        artifact_store, CONTROL_PLANE, node_token,
+        peers.advertise_url(peer_server.port if peer_server else peers.PEER_PORT, get_host_ip()),
+    )
+    last_announce = time.monotonic()
+    
+    # Fetched artifacts are kept within the cache's disk budget and reported
+    # to the control plane whenever the cached set changes
+    artifact_cache = cache.ArtifactCache(artifact_store, artifact_fetcher)
+    reported_cache_version = None
+    last_cache_flush = time.monotonic()
+    
+    # Inference batches are pulled from the control plane and run on worker
+    # processes keeping their models loaded
+    inference_engine = start_engine(node_token, artifact_cache)
     
     # Main heartbeat loop
     logger.info(f"Starting heartbeat loop (interval: {HEARTBEAT_INTERVAL}s)")
     consecutive_failures = 0
     max_failures = 5
+    next_registration_attempt = 0.0
+    last_capability_check = time.monotonic()
     
     while True:
         try:
             time.sleep(HEARTBEAT_INTERVAL)
             
-            if send_heartbeat(node_id, node_token):
+            # Re-probe periodically and push capabilities only if they changed
+            if time.monotonic() - last_capability_check >= CAPABILITY_REFRESH_INTERVAL:
+                last_capability_check = time.monotonic()
+                capabilities = get_capabilities()
+                if capabilities.get("fingerprint") != capabilities_fingerprint:
+                    logger.info("Capabilities changed, re-registering...")
+                    try:
+                        registration_info = register(capabilities)
+                        node_id = registration_info["node_id"]
+                        node_token = registration_info["node_token"]
+                        capabilities_fingerprint = capabilities.get("fingerprint")
+                        reported_cache_version = None
+                        if inference_engine:
+                            inference_engine.node_token = node_token
+                    except Exception as e:
+                        logger.error(f"Re-registration failed: {e}")
+            
+            # Artifact usage only reaches the cache index periodically
+            if time.monotonic() - last_cache_flush >= cache.CACHE_SAVE_INTERVAL:
+                last_cache_flush = time.monotonic()
+                artifact_cache.flush()
+            
+            sample = collect_metrics()
+            if inference_engine:
+                # Lets the control plane route batches to engines with their model loaded
+                sample["inference"] = inference_engine.summary()
+            if send_heartbeat(node_id, node_token, sample):
                 consecutive_failures = 0
+                reconnect_backoff.reset()
+                if metric_spool and len(metric_spool):
+                    # Spend at most half an interval replaying per heartbeat
+                    replayed = spool.replay(
+                        metric_spool,
+                        lambda batch: send_metric_batch(node_id, node_token, batch),
+                        budget=HEARTBEAT_INTERVAL / 2,
+                    )
+                    logger.info(f"Replayed {replayed} spooled samples, {len(metric_spool)} remaining")
+                # Keep held artifacts in the swarm before their announcements expire
+                if time.monotonic() - last_announce >= peers.PEER_ANNOUNCE_INTERVAL:
+                    last_announce = time.monotonic()
+                    artifact_fetcher.node_token = node_token
+                    artifact_fetcher.announce_all()
+                cache_version = artifact_cache.version
+                if cache_version != reported_cache_version and report_cache(node_id, node_token, artifact_cache):
+                    reported_cache_version = cache_version
             else:
                 consecutive_failures += 1
-                if consecutive_failures >= max_failures:
-                    logger.error(f"Failed to send heartbeat {max_failures} times. Attempting re-registration...")
+                if metric_spool:
+                    # Engine state is only of use to routing while it is current
+                    sample.pop("inference", None)
+                    metric_spool.append(sample)
+                # Re-register with backoff so a restarted control plane is
+                # not hit by the whole fleet at once; heartbeats keep being
+                # attempted (and spooled) in between
+                if consecutive_failures >= max_failures and time.monotonic() >= next_registration_attempt:
+                    logger.error(f"Failed to send heartbeat {consecutive_failures} times. Attempting re-registration...")
                     try:
                         registration_info = register()
                         node_id = registration_info["node_id"]
                         node_token = registration_info["node_token"]
+                        capabilities_fingerprint = registration_info["capabilities"].get("fingerprint")
+                        reported_cache_version = None
+                        if inference_engine:
+                            inference_engine.node_token = node_token
                         consecutive_failures = 0
+                        reconnect_backoff.reset()
                     except Exception as e:
-                        logger.error(f"Re-registration failed: {e}")
+                        delay = retry_delay(e, reconnect_backoff)
+                        next_registration_attempt = time.monotonic() + delay
+                        logger.error(f"Re-registration failed: {e}. Next attempt in {delay:.1f}s")
                         
         except KeyboardInterrupt:
             logger.info("Agent shutting down...")
+            if inference_engine:
+                inference_engine.stop()
+            artifact_cache.flush()
             break
         except Exception as e:
             logger.error(f"Unexpected error in main loop: {e}")
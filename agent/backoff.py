@@ -0,0 +1,83 @@
+"""Decorrelated-jitter exponential backoff for reconnecting to the control plane.
+
+When the control plane restarts, every agent loses it at the same moment.
+Retrying on a fixed schedule keeps the fleet in lockstep, so each retry wave
+hits the control plane at once. Decorrelated jitter draws every delay at
+random between the base delay and three times the previous delay (capped),
+which grows the delay exponentially while spreading agents apart on every
+attempt.
+
+See "Exponential Backoff And Jitter" (AWS Architecture Blog, 2015).
+"""
+import os
+import random
+from typing import Optional
+
+# First retry delay in seconds
+BACKOFF_BASE = float(os.environ.get("BACKOFF_BASE", "1"))
+
+# Maximum retry delay in seconds
+BACKOFF_CAP = float(os.environ.get("BACKOFF_CAP", "300"))
+
+
+class Backoff:
+    """Decorrelated-jitter backoff delays.
+
+    Example:
+        >>> backoff = Backoff(base=1, cap=60)
+        >>> delay = backoff.next()   # after a failure
+        >>> backoff.reset()          # after a success
+    """
+
+    def __init__(
+        self,
+        base: float = BACKOFF_BASE,
+        cap: float = BACKOFF_CAP,
+        rng: Optional[random.Random] = None,
+    ):
+        """Initialize the backoff.
+
+        Args:
+            base: Minimum and first delay in seconds
+            cap: Maximum delay in seconds
+            rng: Random number generator, for reproducible delays
+        """
+        self.base = base
+        self.cap = cap
+        self.rng = rng or random.Random()
+        self._delay = base
+
+    def next(self, retry_after: Optional[float] = None) -> float:
+        """Return the delay before the next attempt.
+
+        Args:
+            retry_after: Delay requested by the server (e.g. ``Retry-After``).
+                It is honoured as a minimum with up to a second of jitter
+                added, and does not grow the backoff.
+
+        Returns:
+            Seconds to wait
+        """
+        if retry_after is not None:
+            return retry_after + self.rng.uniform(0, 1)
+        self._delay = min(self.cap, self.rng.uniform(self.base, self._delay * 3))
+        return self._delay
+
+    def reset(self):
+        """Start over from the base delay after a success."""
+        self._delay = self.base
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a ``Retry-After`` header given in seconds.
+
+    Args:
+        value: Header value, or None if absent
+
+    Returns:
+        Delay in seconds, or None if absent or not a number of seconds
+    """
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,357 @@
+"""Size-bounded cache of model artifacts on the node.
+
+Artifacts fetched with ``peers.py`` stay on disk, so that redeploying a
+model or starting another replica of it on the same node does not fetch it
+again. ``ArtifactCache`` keeps them within a disk budget of
+``CACHE_MAX_BYTES``: before an artifact is fetched, enough space is made for
+it by evicting other artifacts, least recently used first (``lru``) or least
+often used first (``lfu``), as chosen by ``CACHE_POLICY``.
+
+Artifacts in use are pinned and never evicted. ``use`` fetches an artifact
+if needed and pins it while the caller holds it::
+
+    with cache.use("sha256:4f3c...") as path:
+        ...  # load the model from path
+
+An artifact that does not fit without evicting pinned artifacts raises
+``CacheFull``. Evicted artifacts are withdrawn from the swarm, so other
+agents stop asking for their chunks.
+
+The cache's index, ``cache.json`` in the artifact directory, records each
+artifact's manifest and how recently and how often it was used, so the
+cache survives agent restarts: held artifacts are served to peers again and
+interrupted fetches resume. Files the index does not know about are removed.
+The index is rewritten when artifacts are added or removed; usage alone only
+marks it stale, and ``flush`` writes it, which the agent does every
+``CACHE_SAVE_INTERVAL`` seconds and on shutdown.
+
+The agent reports the cache's contents to the control plane after each
+change (``PUT /api/v1/nodes/{node_id}/artifacts``), so that placement and
+request routing can prefer nodes already holding a model.
+"""
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import peers
+
+logger = logging.getLogger(__name__)
+
+# Disk space artifacts may take up, including those being fetched
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", str(20 * 1024 ** 3)))
+
+# Eviction order: "lru" (least recently used) or "lfu" (least often used)
+CACHE_POLICY = os.environ.get("CACHE_POLICY", "lru")
+
+# Seconds between writes of artifact usage to the cache index
+CACHE_SAVE_INTERVAL = float(os.environ.get("CACHE_SAVE_INTERVAL", "60"))
+
+POLICIES = ("lru", "lfu")
+
+INDEX_FILE = "cache.json"
+
+
+class CacheFull(Exception):
+    """Raised when an artifact does not fit even after evicting every unpinned artifact."""
+
+
+class _Entry:
+    __slots__ = ("manifest", "last_used", "uses", "pins")
+
+    def __init__(self, manifest, last_used, uses=0):
+        self.manifest = manifest
+        self.last_used = last_used
+        self.uses = uses
+        self.pins = 0
+
+    @property
+    def size(self):
+        return self.manifest["size"]
+
+
+class ArtifactCache:
+    """Artifacts kept on disk within a size budget, evicting unpinned ones.
+
+    Example:
+        >>> cache = ArtifactCache(store, fetcher, max_bytes=50 * 1024 ** 3)
+        >>> with cache.use("sha256:4f3c...") as path:
+        ...     model = load(path)
+        >>> cache.contents()
+        [{'digest': 'sha256:4f3c...', 'size': 524288000, 'complete': True, ...}]
+    """
+
+    def __init__(self, store: peers.ArtifactStore, fetcher: Optional[peers.ArtifactFetcher] = None,
+                 max_bytes=CACHE_MAX_BYTES, policy=CACHE_POLICY, clock=time.time):
+        """Initialize the cache, loading its index from the store's directory.
+
+        Args:
+            store: Where artifacts are kept
+            fetcher: Fetches missing artifacts and withdraws evicted ones
+                from the swarm; None for a cache that only holds what is
+                already on disk
+            max_bytes: Disk budget in bytes
+            policy: Eviction order, ``"lru"`` or ``"lfu"``
+            clock: Wall clock, replaceable in tests
+
+        Raises:
+            ValueError: If ``policy`` is unknown
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown cache policy {policy!r}, expected one of {POLICIES}")
+        self.store = store
+        self.fetcher = fetcher
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.clock = clock
+        # Incremented whenever the reported contents change
+        self.version = 0
+        self._entries: Dict[str, _Entry] = {}
+        self._fetch_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        # Whether usage has changed since the index was last written
+        self._dirty = False
+        self._load()
+
+    @property
+    def used_bytes(self):
+        """Bytes taken by cached artifacts and artifacts being fetched."""
+        with self._lock:
+            return sum(entry.size for entry in self._entries.values())
+
+    def get(self, digest) -> Optional[str]:
+        """Path of a cached artifact, counting it as used, or None if not cached."""
+        return self._cached(digest, pin=False)
+
+    def fetch(self, digest) -> str:
+        """Path of an artifact, fetching it into the cache if needed.
+
+        Raises:
+            CacheFull: If the artifact does not fit
+            requests.exceptions.RequestException: If the registry is unreachable
+            peers.ChunkUnavailable: If a chunk could not be fetched at all
+            ValueError: If the fetched artifact does not match its digest
+        """
+        return self._fetch(digest, pin=False)
+
+    @contextlib.contextmanager
+    def use(self, digest):
+        """Fetch an artifact if needed and pin it while the block runs.
+
+        Yields:
+            Path of the artifact
+        """
+        path = self._fetch(digest, pin=True)
+        try:
+            yield path
+        finally:
+            self.unpin(digest)
+
+    def pin(self, digest):
+        """Keep a cached artifact from being evicted until ``unpin``.
+
+        Pins are counted: an artifact pinned twice stays pinned until it
+        has been unpinned twice.
+
+        Raises:
+            KeyError: If the artifact is not cached
+        """
+        with self._lock:
+            entry = self._entries[digest]
+            entry.pins += 1
+            if entry.pins == 1:
+                self.version += 1
+
+    def unpin(self, digest):
+        """Release a pin taken with ``pin`` or ``use``."""
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None or not entry.pins:
+                return
+            entry.pins -= 1
+            if not entry.pins:
+                self.version += 1
+
+    def evict(self, digest) -> bool:
+        """Remove an unpinned artifact from the cache.
+
+        Returns:
+            True if the artifact was removed, False if it was not cached or
+            is pinned
+        """
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None or entry.pins:
+                return False
+            self._remove(digest)
+            self._save()
+        self._withdraw([digest])
+        return True
+
+    def flush(self) -> bool:
+        """Write the index if usage has changed since it was last written.
+
+        Returns:
+            True if the index was written
+        """
+        with self._lock:
+            if not self._dirty:
+                return False
+            self._save()
+            return True
+
+    def contents(self) -> List[Dict]:
+        """Cached artifacts, most recently used first, as reported to the control plane."""
+        with self._lock:
+            found = []
+            for digest, entry in self._entries.items():
+                artifact = self.store.get(digest)
+                found.append({
+                    "digest": digest,
+                    "size": entry.size,
+                    "complete": bool(artifact and artifact.complete),
+                    "pinned": entry.pins > 0,
+                    "uses": entry.uses,
+                    "last_used": entry.last_used,
+                })
+        found.sort(key=lambda item: item["last_used"], reverse=True)
+        return found
+
+    def _fetch(self, digest, pin):
+        with self._lock:
+            lock = self._fetch_locks.setdefault(digest, threading.Lock())
+        # One fetch per artifact; later callers find it cached
+        with lock:
+            path = self._cached(digest, pin)
+            if path is not None:
+                return path
+            if self.fetcher is None:
+                raise KeyError(f"{digest} is not cached")
+            manifest = self.fetcher.manifest(digest)
+            with self._lock:
+                entry = self._entries.get(digest)
+                evicted = []
+                if entry is None:
+                    evicted = self._make_room(manifest["size"])
+                    entry = self._entries[digest] = _Entry(manifest, self.clock())
+                # Pinned while fetching, so that it is not evicted half-written
+                entry.pins += 1
+                self._save()
+            self._withdraw(evicted)
+            try:
+                path = self.fetcher.fetch(digest, manifest=manifest).path
+            except BaseException:
+                with self._lock:
+                    entry.pins -= 1
+                    # A corrupt artifact is discarded; an interrupted one resumes later
+                    if self.store.get(digest) is None:
+                        del self._entries[digest]
+                        self._save()
+                raise
+            with self._lock:
+                entry.pins -= 1
+                self.version += 1
+            return self._cached(digest, pin) or path
+
+    def _cached(self, digest, pin):
+        """Path of a complete cached artifact, counting it as used and pinning it if asked."""
+        with self._lock:
+            entry = self._entries.get(digest)
+            artifact = self.store.get(digest)
+            if entry is None or artifact is None or not artifact.complete:
+                return None
+            self._touch(entry)
+            if pin:
+                entry.pins += 1
+                if entry.pins == 1:
+                    self.version += 1
+            return artifact.path
+
+    def _make_room(self, size) -> List[str]:
+        """Evict unpinned artifacts until ``size`` more bytes fit; returns their digests."""
+        used = sum(entry.size for entry in self._entries.values())
+        if used + size <= self.max_bytes:
+            return []
+        if self.policy == "lru":
+            key = lambda item: item[1].last_used
+        else:
+            key = lambda item: (item[1].uses, item[1].last_used)
+        candidates = sorted(
+            ((digest, entry) for digest, entry in self._entries.items() if not entry.pins),
+            key=key,
+        )
+        evictable = sum(entry.size for _, entry in candidates)
+        if used - evictable + size > self.max_bytes:
+            raise CacheFull(
+                f"Artifact of {size} bytes does not fit in the cache: {used} of "
+                f"{self.max_bytes} bytes used, {used - evictable} by pinned artifacts"
+            )
+        evicted = []
+        for digest, entry in candidates:
+            if used + size <= self.max_bytes:
+                break
+            self._remove(digest)
+            used -= entry.size
+            evicted.append(digest)
+        logger.info(f"Evicted {len(evicted)} artifacts to make room for {size} bytes")
+        return evicted
+
+    def _touch(self, entry):
+        entry.last_used = self.clock()
+        entry.uses += 1
+        self._dirty = True
+
+    def _remove(self, digest):
+        del self._entries[digest]
+        self.store.discard(digest)
+        self.version += 1
+
+    def _withdraw(self, digests):
+        if self.fetcher is not None:
+            for digest in digests:
+                self.fetcher.withdraw(digest)
+
+    def _index_path(self):
+        return os.path.join(self.store.directory, INDEX_FILE)
+
+    def _save(self):
+        """Write the index atomically; called with the lock held."""
+        index = {
+            digest: {"manifest": entry.manifest, "last_used": entry.last_used, "uses": entry.uses}
+            for digest, entry in self._entries.items()
+        }
+        os.makedirs(self.store.directory, exist_ok=True)
+        temp = f"{self._index_path()}.tmp"
+        with open(temp, "w") as f:
+            json.dump(index, f)
+        os.replace(temp, self._index_path())
+        self._dirty = False
+
+    def _load(self):
+        """Read the index, re-open held artifacts and remove unknown files."""
+        try:
+            with open(self._index_path()) as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            index = {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding unreadable cache index {self._index_path()}: {e}")
+            index = {}
+        for digest, item in index.items():
+            manifest = item["manifest"]
+            path = self.store.path(digest)
+            if not (os.path.exists(path) or os.path.exists(f"{path}.part")):
+                continue
+            # Complete artifacts are served to peers again, partial ones resume
+            self.store.open(digest, manifest["size"], manifest["chunk_size"], manifest["chunks"])
+            self._entries[digest] = _Entry(manifest, item["last_used"], item["uses"])
+        directory = os.path.join(self.store.directory, "sha256")
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if f"sha256:{name.split('.', 1)[0]}" not in self._entries:
+                    logger.info(f"Removing {name}, not in the cache index")
+                    os.remove(os.path.join(directory, name))
+        self._save()
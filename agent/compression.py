@@ -0,0 +1,65 @@
+"""Compression of agent request bodies.
+
+Heartbeats and registrations are JSON documents that grow with running
+containers and GPU telemetry. The control plane advertises the request
+codings it accepts in an ``Accept-Encoding`` response header; once the agent
+has seen it, bodies of at least ``COMPRESS_MIN_BYTES`` are sent compressed
+with ``Content-Encoding``. Nothing is compressed before the server has
+advertised support, so new agents keep working against older control planes.
+
+zstd is used when both sides support it (the agent needs the optional
+``zstandard`` package), otherwise gzip.
+"""
+import gzip
+import json
+import os
+from typing import Dict, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - exercised when zstandard is absent
+    zstandard = None
+
+# "auto" to compress once the control plane advertises support, "off" to never
+COMPRESS_REQUESTS = os.environ.get("COMPRESS_REQUESTS", "auto").lower()
+
+# Smallest request body in bytes worth compressing
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+
+# Codings the agent can produce, in order of preference
+SUPPORTED_ENCODINGS = ("zstd", "gzip") if zstandard is not None else ("gzip",)
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """Choose a request coding from the server's ``Accept-Encoding`` header
+
+    Returns None if the header is absent, no common coding exists, or
+    compression is turned off.
+    """
+    if COMPRESS_REQUESTS == "off" or not isinstance(accept_encoding, str):
+        return None
+    offered = {
+        item.split(";")[0].strip().lower() for item in accept_encoding.split(",")
+    }
+    for encoding in SUPPORTED_ENCODINGS:
+        if encoding in offered:
+            return encoding
+    return None
+
+
+def encode_json(payload, encoding: Optional[str]) -> Tuple[bytes, Dict[str, str]]:
+    """Encode a JSON request body, compressing it if worthwhile
+
+    Returns:
+        The body and the headers describing it
+    """
+    body = json.dumps(payload).encode()
+    headers = {"Content-Type": "application/json"}
+    if encoding is None or len(body) < COMPRESS_MIN_BYTES:
+        return body, headers
+    if encoding == "zstd":
+        body = zstandard.ZstdCompressor(level=3).compress(body)
+    else:
+        body = gzip.compress(body, 6)
+    headers["Content-Encoding"] = encoding
+    return body, headers
@@ -0,0 +1,588 @@
+"""Inference engine: a pool of worker processes keeping CPU models warm.
+
+The engine pulls batches of inference requests from the control plane
+(``POST /api/v1/inference/batches``), runs them and returns their results.
+Models run in ``WorkerPool`` processes rather than threads of the agent, so
+CPU-bound inference is not serialized by the GIL, and a crashing model does
+not take the agent down.
+
+Each worker keeps up to ``ENGINE_MODELS_PER_WORKER`` models loaded, least
+recently used going first, so a model is loaded once per worker rather than
+once per request. A batch goes to a free worker that already has its model
+loaded; only if there is none does a free worker load it, which also
+spreads a busy model over more workers. There are never more workers than
+cores, and each worker's numeric libraries use a single thread, so workers
+do not compete for cores.
+
+Workers serving the same model share one copy of its weights: the model is
+exported once to a memory-mapped file that every worker maps read-only
+(``weights.py``). Workers are started from a fork server that has already
+imported the engine, so a replacement worker is up in milliseconds, and
+attaching an exported model takes about as long.
+
+Models are loaded from the artifact cache by framework (see ``LOADERS``):
+scikit-learn pickles and ONNX models are supported out of the box, and other
+frameworks can be added with the ``loader`` decorator::
+
+    @loader("xgboost")
+    def load_xgboost(path):
+        booster = ...
+        return lambda inputs: booster.predict(...).tolist()
+
+A loader returns a function from a list of inputs to a list of outputs, one
+per input. Inputs are a request's ``input_data``: a feature row, or a dict
+with the row under ``"features"``.
+"""
+import collections
+import logging
+import multiprocessing
+import os
+import pickle
+import queue
+import shutil
+import tempfile
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+
+import backoff
+import cache
+import weights
+
+logger = logging.getLogger(__name__)
+
+# Inference worker processes; 0 disables the engine. Capped at the core count
+ENGINE_WORKERS = int(os.environ.get("ENGINE_WORKERS", "0"))
+
+# Models each worker keeps loaded
+ENGINE_MODELS_PER_WORKER = int(os.environ.get("ENGINE_MODELS_PER_WORKER", "2"))
+
+# Comma-separated IDs of the models to serve; empty for any model
+ENGINE_MODELS = [m.strip() for m in os.environ.get("ENGINE_MODELS", "").split(",") if m.strip()]
+
+# Seconds to wait for a batch in each request to the control plane
+ENGINE_POLL_WAIT = float(os.environ.get("ENGINE_POLL_WAIT", "20"))
+
+# How worker processes are started: "forkserver" (where available), "spawn" or "fork"
+ENGINE_START_METHOD = os.environ.get(
+    "ENGINE_START_METHOD",
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn",
+)
+
+# Share model weights between workers through memory-mapped files; 0 gives each worker its own copy
+ENGINE_SHARE_WEIGHTS = os.environ.get("ENGINE_SHARE_WEIGHTS", "1") != "0"
+
+# Directory for shared weights files; empty for /dev/shm where available, else the temp directory
+ENGINE_SHARED_DIR = os.environ.get("ENGINE_SHARED_DIR", "")
+
+# Thread pools of numeric libraries, limited to one thread in each worker
+THREAD_VARIABLES = (
+    "OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMEXPR_NUM_THREADS",
+)
+
+LOADERS: Dict[str, Callable[[str], Callable[[List[Any]], List[Any]]]] = {}
+
+# The pool's shared weights directory, in worker processes that share weights
+_shared_dir: Optional[str] = None
+
+
+class ModelError(Exception):
+    """Raised when a model fails to load or to run a batch."""
+
+
+class WorkerCrashed(Exception):
+    """Raised when a worker process died running a batch; it is restarted."""
+
+
+def loader(*frameworks: str):
+    """Register a function loading models of the given frameworks.
+
+    Args:
+        frameworks: Framework names, as registered with the model
+
+    Returns:
+        Decorator registering the function and returning it unchanged
+    """
+    def decorator(func):
+        for framework in frameworks:
+            LOADERS[framework] = func
+        return func
+    return decorator
+
+
+def _features(item):
+    """The feature row of one input."""
+    if isinstance(item, dict) and "features" in item:
+        return item["features"]
+    return item
+
+
+def _rows(outputs) -> List[Any]:
+    """Model outputs as plain Python values, one per input."""
+    return outputs.tolist() if hasattr(outputs, "tolist") else list(outputs)
+
+
+def shared_model(path: str, read: Callable[[str], Any]) -> Any:
+    """Load a picklable model with ``read(path)``, sharing its weights with other workers.
+
+    For use in loaders: in a pool sharing weights, the model is read and
+    exported by the first worker loading it and mapped by the others (see
+    ``weights.py``); otherwise it is just read.
+    """
+    if _shared_dir is None:
+        return read(path)
+    return weights.load_shared(path, read, _shared_dir)
+
+
+def _read_pickle(path):
+    try:
+        import joblib
+        return joblib.load(path)
+    except ImportError:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+@loader("sklearn", "scikit-learn")
+def load_sklearn(path):
+    """Load a pickled scikit-learn estimator (joblib or plain pickle), sharing its weights."""
+    model = shared_model(path, _read_pickle)
+    return lambda inputs: _rows(model.predict([_features(item) for item in inputs]))
+
+
+@loader("onnx")
+def load_onnx(path):
+    """Load an ONNX model, feeding the batch to its first input."""
+    import numpy as np
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = 1
+    options.inter_op_num_threads = 1
+    session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+    first = session.get_inputs()[0]
+    dtype = {"tensor(double)": np.float64, "tensor(int64)": np.int64}.get(first.type, np.float32)
+
+    def predict(inputs):
+        batch = np.asarray([_features(item) for item in inputs], dtype=dtype)
+        return _rows(session.run(None, {first.name: batch})[0])
+    return predict
+
+
+def bounded_workers(workers: int) -> int:
+    """Number of workers to start: ``workers``, at least one and at most one per core."""
+    return max(1, min(workers, os.cpu_count() or 1))
+
+
+def _worker_main(conn, models_per_worker):
+    """Run batches sent over ``conn`` until it is closed, keeping models loaded."""
+    models = collections.OrderedDict()
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        key, path, framework, inputs = message
+        try:
+            predict = models.get(key)
+            if predict is None:
+                load = LOADERS.get(framework)
+                if load is None:
+                    raise ModelError(f"No loader for framework {framework!r}")
+                predict = models[key] = load(path)
+                while len(models) > models_per_worker:
+                    models.popitem(last=False)
+            models.move_to_end(key)
+            outputs = predict(inputs)
+            if len(outputs) != len(inputs):
+                raise ModelError(f"Model returned {len(outputs)} outputs for {len(inputs)} inputs")
+            reply = (True, outputs)
+        except Exception as e:
+            reply = (False, f"{type(e).__name__}: {e}")
+        try:
+            conn.send((reply, list(models)))
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            conn.send(((False, f"Model outputs cannot be returned: {e}"), list(models)))
+
+
+def _start_worker(conn, models_per_worker, shared_dir):
+    """Entry point of worker processes."""
+    global _shared_dir
+    for variable in THREAD_VARIABLES:
+        os.environ[variable] = "1"
+    _shared_dir = shared_dir
+    _worker_main(conn, models_per_worker)
+
+
+class _Worker:
+    __slots__ = ("process", "conn", "models", "running", "last_used")
+
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.models: List[str] = []
+        # Model of the batch being run, None when free
+        self.running: Optional[str] = None
+        self.last_used = 0
+
+
+class WorkerPool:
+    """Worker processes running batches, each keeping recently used models loaded.
+
+    Example:
+        >>> pool = WorkerPool(workers=4, models_per_worker=2)
+        >>> pool.run("sha256:4f3c...", "/artifacts/iris.pkl", "sklearn", [[5.1, 3.5, 1.4, 0.2]])
+        [0]
+        >>> pool.loaded()
+        ['sha256:4f3c...']
+        >>> pool.close()
+    """
+
+    def __init__(self, workers: int = ENGINE_WORKERS,
+                 models_per_worker: int = ENGINE_MODELS_PER_WORKER,
+                 start_method: str = ENGINE_START_METHOD,
+                 share_weights: bool = ENGINE_SHARE_WEIGHTS,
+                 shared_dir: str = ENGINE_SHARED_DIR):
+        """Start the workers.
+
+        Args:
+            workers: Worker processes; at least one, capped at the core count
+            models_per_worker: Models each worker keeps loaded
+            start_method: ``multiprocessing`` start method of the workers
+            share_weights: Share model weights between workers through
+                memory-mapped files
+            shared_dir: Where the pool's weights files are kept; empty for
+                ``/dev/shm`` where available
+        """
+        self.size = bounded_workers(workers)
+        self.models_per_worker = max(1, models_per_worker)
+        self._context = multiprocessing.get_context(start_method)
+        if start_method == "forkserver":
+            # Forked workers start with the engine imported
+            self._context.set_forkserver_preload([__name__])
+        self.shared_dir = None
+        if share_weights:
+            parent = shared_dir or ("/dev/shm" if os.path.isdir("/dev/shm") else None)
+            self.shared_dir = tempfile.mkdtemp(prefix="miaas-weights-", dir=parent)
+        # Artifact each model was loaded from, for finding its weights file
+        self._paths: Dict[str, str] = {}
+        self._cond = threading.Condition()
+        self._runs = 0
+        self._closed = False
+        self._workers = [self._start() for _ in range(self.size)]
+
+    def run(self, key: str, path: str, framework: str, inputs: List[Any]) -> List[Any]:
+        """Run a batch on a worker, loading the model there if needed.
+
+        Waits for a free worker; one that has the model loaded is preferred.
+
+        Args:
+            key: Identifies the model, e.g. its artifact digest
+            path: Model file, loaded if no chosen worker has ``key`` loaded
+            framework: Model framework, choosing the loader
+            inputs: Model inputs
+
+        Returns:
+            Model outputs, one per input
+
+        Raises:
+            ModelError: If the model failed to load or to run
+            WorkerCrashed: If the worker died running the batch
+        """
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Worker pool is closed")
+                worker = self._pick(key)
+                if worker is not None:
+                    break
+                self._cond.wait()
+            worker.running = key
+            self._runs += 1
+            worker.last_used = self._runs
+            self._paths[key] = path
+
+        try:
+            worker.conn.send((key, path, framework, inputs))
+            (ok, value), models = worker.conn.recv()
+        except (EOFError, OSError) as e:
+            with self._cond:
+                self._replace(worker)
+                self._prune()
+                self._cond.notify_all()
+            raise WorkerCrashed(f"Inference worker died running {key}: {e}")
+
+        with self._cond:
+            dropped = set(worker.models) - set(models)
+            worker.models = models
+            worker.running = None
+            if dropped:
+                self._prune()
+            self._cond.notify_all()
+        if not ok:
+            raise ModelError(value)
+        return value
+
+    def loaded(self) -> List[str]:
+        """Models loaded in any worker."""
+        with self._cond:
+            return sorted({key for worker in self._workers for key in worker.models})
+
+    def close(self):
+        """Stop the workers."""
+        with self._cond:
+            self._closed = True
+            workers = list(self._workers)
+            self._cond.notify_all()
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+        for worker in workers:
+            worker.process.join(5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.conn.close()
+        if self.shared_dir:
+            shutil.rmtree(self.shared_dir, ignore_errors=True)
+
+    def _start(self) -> _Worker:
+        conn, child = self._context.Pipe()
+        process = self._context.Process(
+            target=_start_worker, args=(child, self.models_per_worker, self.shared_dir),
+            name="inference-worker", daemon=True,
+        )
+        process.start()
+        child.close()
+        return _Worker(process, conn)
+
+    def _pick(self, key) -> Optional[_Worker]:
+        """A free worker with the model loaded, else the free worker with the fewest, stalest models."""
+        free = [worker for worker in self._workers if worker.running is None]
+        for worker in free:
+            if key in worker.models:
+                return worker
+        if not free:
+            return None
+        return min(free, key=lambda worker: (len(worker.models), worker.last_used))
+
+    def _replace(self, worker):
+        """Start a new worker in place of a dead one; called with the lock held."""
+        worker.conn.close()
+        worker.process.join(1)
+        index = self._workers.index(worker)
+        self._workers[index] = self._start()
+        logger.warning(f"Inference worker {worker.process.pid} died (exit code {worker.process.exitcode}), restarted")
+
+    def _prune(self):
+        """Remove weights files of models no worker has loaded or is loading; called with the lock held."""
+        wanted = {key for worker in self._workers for key in worker.models}
+        wanted.update(worker.running for worker in self._workers if worker.running)
+        self._paths = {key: path for key, path in self._paths.items() if key in wanted}
+        if not self.shared_dir:
+            return
+        keep = {weights.shared_name(path) for path in self._paths.values()}
+        for name in os.listdir(self.shared_dir):
+            if name.endswith(".weights") and name not in keep:
+                # Workers still mapping the file keep their pages until they drop the model
+                try:
+                    os.remove(os.path.join(self.shared_dir, name))
+                except FileNotFoundError:
+                    pass
+
+
+class InferenceEngine:
+    """Pulls batches from the control plane and runs them on a worker pool.
+
+    A single thread polls for batches, one at a time while a worker is
+    free, and hands them to one runner thread per worker, so every worker
+    can be busy while the engine holds one waiting request on the control
+    plane.
+
+    Example:
+        >>> engine = InferenceEngine(CONTROL_PLANE, node_token, artifact_cache, WorkerPool(4))
+        >>> engine.start()
+        >>> ...
+        >>> engine.stop()
+    """
+
+    def __init__(self, control_plane, node_token, artifact_cache: cache.ArtifactCache,
+                 pool: WorkerPool, models: Optional[List[str]] = None,
+                 wait: float = ENGINE_POLL_WAIT):
+        """Initialize the engine.
+
+        Args:
+            control_plane: Control plane base URL
+            node_token: This node's token; replace it after re-registering
+            artifact_cache: Where model artifacts are fetched to
+            pool: Workers running the batches
+            models: Model IDs to serve; None for any model
+            wait: Seconds each poll waits for a batch
+        """
+        self.control_plane = control_plane
+        self.node_token = node_token
+        self.artifact_cache = artifact_cache
+        self.pool = pool
+        self.models = models
+        self.wait = wait
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        # Workers without a batch, and leased batches waiting for one
+        self._free = threading.Semaphore(pool.size)
+        self._batches: "queue.Queue[Dict]" = queue.Queue()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._running = 0
+        self._requests = 0
+
+    def start(self):
+        """Start polling for batches and running them in background threads."""
+        targets = [(self._poll, "inference-poll")]
+        targets += [(self._serve, f"inference-{i}") for i in range(self.pool.size)]
+        for target, name in targets:
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Stop polling once the batches being run are returned, and stop the workers."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(self.wait + 15)
+        self.pool.close()
+
+    def summary(self) -> Dict:
+        """State reported with every heartbeat, for the control plane to route batches by.
+
+        Returns:
+            Digests of the models loaded in the workers, the number of
+            workers, the batches being run and their requests
+        """
+        with self._lock:
+            busy, queued = self._running, self._requests
+        return {"loaded": self.pool.loaded(), "workers": self.pool.size, "busy": busy, "queued": queued}
+
+    def take_batch(self) -> Optional[Dict]:
+        """Lease the next batch, waiting up to ``wait`` seconds; None if there was none."""
+        response = self._session().post(
+            f"{self.control_plane}/api/v1/inference/batches",
+            json={"models": self.models, "wait": self.wait},
+            headers=self._headers(),
+            timeout=self.wait + 10,
+        )
+        if response.status_code == 204:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def run_batch(self, batch: Dict) -> List[Dict]:
+        """Run a batch, returning the outcome of each of its requests.
+
+        If the model fails on the batch as a whole, its requests are run one
+        at a time, so that one bad input fails only its own request.
+        """
+        items = batch["requests"]
+        try:
+            if not batch["digest"]:
+                raise ModelError("Model has no artifact")
+            with self.artifact_cache.use(batch["digest"]) as path:
+                return self._run(batch, path, items)
+        except (ModelError, WorkerCrashed, cache.CacheFull) as e:
+            error = str(e)
+        except Exception as e:
+            logger.error(f"Failed to run batch {batch['batch_id']} of model {batch['model_id']}: {e}")
+            error = f"{type(e).__name__}: {e}"
+        return [{"request_id": item["request_id"], "error": error} for item in items]
+
+    def return_results(self, batch: Dict, results: List[Dict]) -> bool:
+        """Send a batch's results; False if the lease had expired or the request failed."""
+        try:
+            response = self._session().post(
+                f"{self.control_plane}/api/v1/inference/batches/{batch['batch_id']}/results",
+                json={"results": results},
+                headers=self._headers(),
+                timeout=30,
+            )
+            if response.status_code == 409:
+                logger.warning(f"Lease of batch {batch['batch_id']} expired before its results were returned")
+                return False
+            response.raise_for_status()
+            return True
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Failed to return results of batch {batch['batch_id']}: {e}")
+            return False
+
+    def _run(self, batch, path, items) -> List[Dict]:
+        digest, framework = batch["digest"], batch.get("framework", "")
+        try:
+            outputs = self.pool.run(digest, path, framework, [item["input_data"] for item in items])
+            return [
+                {"request_id": item["request_id"], "result": output}
+                for item, output in zip(items, outputs)
+            ]
+        except ModelError:
+            if len(items) == 1:
+                raise
+        results = []
+        for item in items:
+            try:
+                output = self.pool.run(digest, path, framework, [item["input_data"]])[0]
+                results.append({"request_id": item["request_id"], "result": output})
+            except ModelError as e:
+                results.append({"request_id": item["request_id"], "error": str(e)})
+        return results
+
+    def _poll(self):
+        """Take batches while a worker is free, until stopped."""
+        retry = backoff.Backoff(cap=60)
+        while not self._stop.is_set():
+            if not self._free.acquire(timeout=0.5):
+                continue
+            try:
+                batch = self.take_batch()
+            except requests.exceptions.RequestException as e:
+                self._free.release()
+                delay = retry.next()
+                logger.error(f"Failed to take an inference batch: {e}. Retrying in {delay:.1f}s")
+                self._stop.wait(delay)
+                continue
+            retry.reset()
+            if batch is None:
+                self._free.release()
+                continue
+            with self._lock:
+                self._requests += len(batch["requests"])
+            self._batches.put(batch)
+
+    def _serve(self):
+        """Run and return taken batches until stopped and none are left."""
+        while True:
+            try:
+                batch = self._batches.get(timeout=0.5)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            with self._lock:
+                self._running += 1
+            try:
+                self.return_results(batch, self.run_batch(batch))
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._requests -= len(batch["requests"])
+                self._free.release()
+
+    def _session(self):
+        """HTTP session of the calling thread, reusing connections."""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _headers(self):
+        return {"Authorization": f"Bearer {self.node_token}"}
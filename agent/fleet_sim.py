@@ -0,0 +1,477 @@
+"""Simulated agent fleet for load-testing the control plane.
+
+Runs thousands of virtual agents in a single asyncio event loop. Each one
+speaks the same protocol as ``agent.py``: it registers, then sends
+authenticated heartbeats on an interval and re-registers after repeated
+failures, backing off with jitter and honouring ``Retry-After``. Intervals
+can be jittered and failures injected, and the run ends with a
+machine-readable JSON report of throughput, latency percentiles and error
+rates.
+
+Example:
+    python fleet_sim.py --agents 5000 --duration 120 --interval 10 \\
+        --jitter 0.2 --ramp-up 30 --output fleet_report.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+import httpx
+
+from backoff import BACKOFF_BASE, BACKOFF_CAP, Backoff, parse_retry_after
+from wire import HEARTBEAT_FORMAT, HEARTBEAT_MEDIA_TYPE, encode_heartbeat
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+# httpx logs every request at INFO, which is far too noisy for a fleet
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+CONTROL_PLANE = os.environ.get("CONTROL_PLANE_URL", "http://localhost:8080")
+
+REGISTER_PATH = "/api/v1/nodes/register"
+HEARTBEAT_PATH = "/api/v1/nodes/{node_id}/heartbeat"
+
+# Same threshold as agent.main() before re-registering
+MAX_CONSECUTIVE_FAILURES = 5
+
+
+class LatencyRecorder:
+    """Collects per-operation latencies and outcomes."""
+
+    def __init__(self):
+        """Initialize empty recorders."""
+        self.latencies: Dict[str, List[float]] = {}
+        self.outcomes: Dict[str, Counter] = {}
+
+    def record(self, op: str, latency: float, outcome: str) -> None:
+        """Record one request.
+
+        Args:
+            op: Operation name, e.g. "register" or "heartbeat"
+            latency: Seconds the request took
+            outcome: "ok", an HTTP status code, or an exception name
+        """
+        self.latencies.setdefault(op, []).append(latency)
+        self.outcomes.setdefault(op, Counter())[outcome] += 1
+
+    def count(self, op: str, outcome: str) -> None:
+        """Count an event that did not produce a request (e.g. a drop)."""
+        self.outcomes.setdefault(op, Counter())[outcome] += 1
+
+
+def percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list.
+
+    Args:
+        sorted_values: Values sorted ascending
+        fraction: Percentile as a fraction, e.g. 0.99
+
+    Returns:
+        The percentile value, or None for an empty list
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class VirtualAgent:
+    """One simulated node running the register/heartbeat protocol."""
+
+    def __init__(self, index: int, simulator: "FleetSimulator"):
+        """Initialize the virtual agent.
+
+        Args:
+            index: Agent number, used to derive a stable name and IP
+            simulator: Owning simulator with config, client and recorder
+        """
+        self.sim = simulator
+        self.name = f"{simulator.name_prefix}-{index:05d}"
+        self.ip = f"10.{(index >> 16) & 255}.{(index >> 8) & 255}.{index & 255}"
+        self.rng = random.Random(simulator.seed + index)
+        self.capabilities = {
+            "os": "linux",
+            "cpu_count": self.rng.choice([2, 4, 8, 16, 32]),
+            "mem_mb": self.rng.choice([4096, 8192, 16384, 32768, 65536]),
+            "gpus": [],
+        }
+        self.node_id: Optional[str] = None
+        self.node_token: Optional[str] = None
+        self.backoff = Backoff(
+            simulator.backoff_base, simulator.backoff_cap, rng=self.rng
+        )
+        self.retry_after: Optional[float] = None
+
+    async def _request(self, op: str, url: str, payload: Dict, headers=None, binary=False):
+        """Send one POST, recording latency and outcome.
+
+        Args:
+            binary: Send ``payload`` as a binary heartbeat instead of JSON
+
+        Returns:
+            Decoded JSON body on success, None otherwise
+        """
+        start = time.perf_counter()
+        try:
+            if binary:
+                response = await self.sim.client.post(
+                    url,
+                    content=encode_heartbeat(payload),
+                    headers={**headers, "Content-Type": HEARTBEAT_MEDIA_TYPE},
+                )
+            else:
+                response = await self.sim.client.post(url, json=payload, headers=headers)
+        except httpx.HTTPError as e:
+            self.sim.recorder.record(op, time.perf_counter() - start, type(e).__name__)
+            return None
+        latency = time.perf_counter() - start
+        if response.status_code == 429:
+            self.retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if response.status_code >= 400:
+            self.sim.recorder.record(op, latency, str(response.status_code))
+            return None
+        self.sim.recorder.record(op, latency, "ok")
+        return response.json()
+
+    async def register(self) -> bool:
+        """Register with the control plane, as ``agent.register()`` does."""
+        data = await self._request("register", REGISTER_PATH, {
+            "name": self.name,
+            "ip": self.ip,
+            "capabilities": self.capabilities,
+        })
+        if data is None:
+            return False
+        self.node_id = data["node_id"]
+        self.node_token = data["node_token"]
+        return True
+
+    async def heartbeat(self) -> bool:
+        """Send a heartbeat, as ``agent.send_heartbeat()`` does."""
+        sim = self.sim
+        if self.rng.random() < sim.drop_rate:
+            sim.recorder.count("heartbeat", "dropped")
+            return False
+
+        token = self.node_token
+        if self.rng.random() < sim.bad_token_rate:
+            token = "invalid-token"
+
+        data = await self._request(
+            "heartbeat",
+            HEARTBEAT_PATH.format(node_id=self.node_id),
+            {
+                "cpu_usage": round(self.rng.uniform(0, 100), 1),
+                "mem_usage": round(self.rng.uniform(0, 100), 1),
+                "disk_free_mb": self.rng.randint(1000, 500000),
+                "running_containers": [],
+            },
+            headers={"Authorization": f"Bearer {token}"},
+            binary=sim.heartbeat_format == "binary",
+        )
+        return data is not None
+
+    async def run(self, start_delay: float, stop_at: float) -> None:
+        """Run the agent's main loop until ``stop_at`` (monotonic time).
+
+        Args:
+            start_delay: Seconds to wait before registering (ramp-up)
+            stop_at: Monotonic time at which to stop
+        """
+        sim = self.sim
+        await asyncio.sleep(start_delay)
+        while not await self.register():
+            await asyncio.sleep(self._retry_delay())
+            if time.monotonic() >= stop_at:
+                return
+        self.backoff.reset()
+
+        failures = 0
+        next_registration_attempt = 0.0
+        while True:
+            await asyncio.sleep(self._next_interval())
+            if time.monotonic() >= stop_at:
+                return
+
+            if self.rng.random() < sim.restart_rate:
+                sim.recorder.count("agent", "restarted")
+                await self.register()
+                failures = 0
+                continue
+
+            if await self.heartbeat():
+                failures = 0
+                self.backoff.reset()
+                continue
+
+            failures += 1
+            if (
+                failures >= MAX_CONSECUTIVE_FAILURES
+                and time.monotonic() >= next_registration_attempt
+            ):
+                sim.recorder.count("agent", "reregistered")
+                if await self.register():
+                    failures = 0
+                    self.backoff.reset()
+                else:
+                    next_registration_attempt = time.monotonic() + self._retry_delay()
+
+    def _retry_delay(self) -> float:
+        """Delay before retrying registration, as ``agent.retry_delay()``."""
+        retry_after, self.retry_after = self.retry_after, None
+        return self.backoff.next(retry_after)
+
+    def _next_interval(self) -> float:
+        """Heartbeat interval with uniform +/- jitter applied."""
+        jitter = self.sim.jitter
+        return self.sim.interval * (1 + self.rng.uniform(-jitter, jitter))
+
+
+class FleetSimulator:
+    """Runs a fleet of virtual agents and produces a load report.
+
+    Example:
+        >>> sim = FleetSimulator(agents=1000, duration=60, interval=5)
+        >>> report = asyncio.run(sim.run())
+    """
+
+    def __init__(
+        self,
+        control_plane_url: str = CONTROL_PLANE,
+        agents: int = 1000,
+        duration: float = 60.0,
+        interval: float = 30.0,
+        jitter: float = 0.1,
+        ramp_up: float = 0.0,
+        drop_rate: float = 0.0,
+        bad_token_rate: float = 0.0,
+        restart_rate: float = 0.0,
+        max_connections: int = 512,
+        timeout: float = 10.0,
+        name_prefix: str = "sim-agent",
+        seed: int = 0,
+        backoff_base: float = BACKOFF_BASE,
+        backoff_cap: float = BACKOFF_CAP,
+        heartbeat_format: str = HEARTBEAT_FORMAT,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        """Initialize the simulator.
+
+        Args:
+            control_plane_url: Base URL of the control plane
+            agents: Number of virtual agents
+            duration: Seconds to run after the first agent starts
+            interval: Mean seconds between heartbeats per agent
+            jitter: Fractional +/- jitter applied to each interval
+            ramp_up: Seconds over which agent start times are spread
+            drop_rate: Probability a heartbeat is silently skipped
+            bad_token_rate: Probability a heartbeat uses an invalid token
+            restart_rate: Probability per interval that an agent restarts
+                and re-registers
+            max_connections: HTTP connection pool size
+            timeout: Per-request timeout in seconds
+            name_prefix: Prefix for virtual node names
+            seed: Random seed for reproducible runs
+            backoff_base: First registration retry delay in seconds
+            backoff_cap: Maximum registration retry delay in seconds
+            heartbeat_format: "binary" or "json" heartbeat bodies
+            transport: Optional httpx transport, used for testing
+        """
+        self.control_plane_url = control_plane_url
+        self.agents = agents
+        self.duration = duration
+        self.interval = interval
+        self.jitter = jitter
+        self.ramp_up = ramp_up
+        self.drop_rate = drop_rate
+        self.bad_token_rate = bad_token_rate
+        self.restart_rate = restart_rate
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.name_prefix = name_prefix
+        self.seed = seed
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.heartbeat_format = heartbeat_format
+        self.transport = transport
+        self.recorder = LatencyRecorder()
+        self.client: Optional[httpx.AsyncClient] = None
+
+    async def run(self) -> Dict:
+        """Run the fleet for the configured duration.
+
+        Returns:
+            Report dictionary, see ``build_report``
+        """
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+        )
+        started = time.monotonic()
+        stop_at = started + self.duration
+        async with httpx.AsyncClient(
+            base_url=self.control_plane_url,
+            limits=limits,
+            timeout=self.timeout,
+            transport=self.transport,
+        ) as client:
+            self.client = client
+            fleet = [VirtualAgent(i, self) for i in range(self.agents)]
+            ramp = self.ramp_up / self.agents if self.agents else 0
+            await asyncio.gather(*(
+                agent.run(i * ramp, stop_at) for i, agent in enumerate(fleet)
+            ))
+        return self.build_report(time.monotonic() - started)
+
+    def build_report(self, elapsed: float) -> Dict:
+        """Summarize recorded requests.
+
+        Args:
+            elapsed: Wall-clock seconds the run took
+
+        Returns:
+            Dictionary with the run configuration and, per operation,
+            request counts, throughput, error rate, outcome breakdown and
+            p50/p90/p99/p999/max latency in milliseconds
+        """
+        operations = {}
+        for op, outcomes in sorted(self.recorder.outcomes.items()):
+            values = sorted(self.recorder.latencies.get(op, []))
+            requests_sent = len(values)
+            ok = outcomes.get("ok", 0)
+            summary = {
+                "requests": requests_sent,
+                "ok": ok,
+                "errors": requests_sent - ok,
+                "error_rate": (
+                    (requests_sent - ok) / requests_sent if requests_sent else 0.0
+                ),
+                "throughput_rps": ok / elapsed if elapsed > 0 else 0.0,
+                "outcomes": dict(outcomes),
+            }
+            if values:
+                summary["latency_ms"] = {
+                    name: round(percentile(values, fraction) * 1000, 3)
+                    for name, fraction in (
+                        ("p50", 0.5),
+                        ("p90", 0.9),
+                        ("p99", 0.99),
+                        ("p999", 0.999),
+                    )
+                }
+                summary["latency_ms"]["max"] = round(values[-1] * 1000, 3)
+                summary["latency_ms"]["mean"] = round(
+                    sum(values) / len(values) * 1000, 3
+                )
+            operations[op] = summary
+
+        return {
+            "config": {
+                "control_plane_url": self.control_plane_url,
+                "agents": self.agents,
+                "duration_s": self.duration,
+                "interval_s": self.interval,
+                "jitter": self.jitter,
+                "ramp_up_s": self.ramp_up,
+                "drop_rate": self.drop_rate,
+                "bad_token_rate": self.bad_token_rate,
+                "restart_rate": self.restart_rate,
+                "max_connections": self.max_connections,
+                "seed": self.seed,
+                "backoff_base_s": self.backoff_base,
+                "backoff_cap_s": self.backoff_cap,
+            },
+            "elapsed_s": round(elapsed, 3),
+            "operations": operations,
+        }
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Simulated MIaaS agent fleet")
+    parser.add_argument("--control-plane-url", default=CONTROL_PLANE)
+    parser.add_argument("--agents", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=60.0,
+                        help="Seconds to run")
+    parser.add_argument("--interval", type=float, default=30.0,
+                        help="Mean seconds between heartbeats per agent")
+    parser.add_argument("--jitter", type=float, default=0.1,
+                        help="Fractional +/- jitter on each interval")
+    parser.add_argument("--ramp-up", type=float, default=0.0,
+                        help="Seconds over which agents start")
+    parser.add_argument("--drop-rate", type=float, default=0.0,
+                        help="Probability a heartbeat is skipped")
+    parser.add_argument("--bad-token-rate", type=float, default=0.0,
+                        help="Probability a heartbeat uses an invalid token")
+    parser.add_argument("--restart-rate", type=float, default=0.0,
+                        help="Probability per interval an agent restarts")
+    parser.add_argument("--max-connections", type=int, default=512)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--name-prefix", default="sim-agent")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backoff-base", type=float, default=BACKOFF_BASE,
+                        help="First registration retry delay in seconds")
+    parser.add_argument("--backoff-cap", type=float, default=BACKOFF_CAP,
+                        help="Maximum registration retry delay in seconds")
+    parser.add_argument("--heartbeat-format", choices=("binary", "json"),
+                        default=HEARTBEAT_FORMAT,
+                        help="Heartbeat body encoding")
+    parser.add_argument("--output", default="fleet_report.json",
+                        help="Path of the JSON report")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the simulator from the command line and write the report."""
+    args = parse_args(argv)
+    simulator = FleetSimulator(
+        control_plane_url=args.control_plane_url,
+        agents=args.agents,
+        duration=args.duration,
+        interval=args.interval,
+        jitter=args.jitter,
+        ramp_up=args.ramp_up,
+        drop_rate=args.drop_rate,
+        bad_token_rate=args.bad_token_rate,
+        restart_rate=args.restart_rate,
+        max_connections=args.max_connections,
+        timeout=args.timeout,
+        name_prefix=args.name_prefix,
+        seed=args.seed,
+        backoff_base=args.backoff_base,
+        backoff_cap=args.backoff_cap,
+        heartbeat_format=args.heartbeat_format,
+    )
+    logger.info(
+        f"Starting {args.agents} virtual agents against {args.control_plane_url} "
+        f"for {args.duration}s"
+    )
+    report = asyncio.run(simulator.run())
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for op, summary in report["operations"].items():
+        latency = summary.get("latency_ms", {})
+        logger.info(
+            f"{op}: {summary['requests']} requests, "
+            f"{summary['throughput_rps']:.1f} ok/s, "
+            f"error rate {summary['error_rate']:.2%}, "
+            f"p50 {latency.get('p50')}ms p99 {latency.get('p99')}ms "
+            f"p999 {latency.get('p999')}ms"
+        )
+    logger.info(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,755 @@
+"""Peer-assisted artifact downloads.
+
+When a model is deployed to many nodes at once, every agent pulling the whole
+artifact from the registry makes the registry's disk and network the
+bottleneck. Agents therefore fetch artifacts from each other, in chunks:
+
+1. The registry (``GET /api/v1/blobs/{digest}/chunks``) gives the chunk
+   size and the SHA-256 of every chunk.
+2. The agent announces the chunks it holds to the control plane's tracker
+   (``PUT /api/v1/blobs/{digest}/swarm``), which answers with the other
+   agents holding or fetching the artifact and bitfields of their chunks.
+   It announces again every ``PEER_REFRESH_INTERVAL`` seconds while
+   fetching, so agents fetching the same artifact serve each other at once.
+3. Chunks are fetched rarest-first from peers holding them, several at a
+   time, and checked against their digests. Chunks no peer holds are split
+   between the agents: each announces the chunk it is about to fetch from
+   the registry with a ranged ``GET``, and the others wait for it to appear
+   at that peer (see ``_Fetch``).
+4. The complete artifact is checked against its digest and kept in
+   ``ARTIFACT_DIR``, from where it keeps being served to peers.
+
+Chunks are served by ``PeerServer`` on ``PEER_PORT`` as
+``GET /chunks/<digest>/<index>``, sent with ``sendfile``. A peer serving
+``PEER_MAX_UPLOADS`` chunks already answers ``503`` and the requester moves
+on to another peer. Served chunks are content-addressed and checked by the
+receiver, so a faulty or malicious peer cannot corrupt an artifact.
+
+Run ``python peers.py fetch <digest>`` to fetch (and then seed) an artifact
+from the command line, e.g. to try several agents on one host.
+"""
+import argparse
+import base64
+import collections
+import hashlib
+import http.server
+import logging
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Port chunks are served to peers on; 0 disables serving
+PEER_PORT = int(os.environ.get("PEER_PORT", "7070"))
+
+# URL peers reach this agent's chunk server at; defaults to http://<host ip>:<port>
+PEER_ADVERTISE_URL = os.environ.get("PEER_ADVERTISE_URL", "")
+
+# Directory fetched artifacts are kept in
+ARTIFACT_DIR = os.path.expanduser(
+    os.environ.get("ARTIFACT_DIR", "~/.miaas-agent/artifacts")
+)
+
+# Chunks fetched concurrently per artifact
+PEER_FETCH_WORKERS = int(os.environ.get("PEER_FETCH_WORKERS", "4"))
+
+# Chunks served to peers concurrently before answering 503
+PEER_MAX_UPLOADS = int(os.environ.get("PEER_MAX_UPLOADS", "8"))
+
+# Seconds between announcing progress and refreshing peers during a fetch
+PEER_REFRESH_INTERVAL = float(os.environ.get("PEER_REFRESH_INTERVAL", "1"))
+
+# Seconds between re-announcing complete artifacts; below the tracker's PEER_TTL
+PEER_ANNOUNCE_INTERVAL = float(os.environ.get("PEER_ANNOUNCE_INTERVAL", "30"))
+
+# Concurrent registry requests per fetch while peers hold chunks of the artifact
+PEER_REGISTRY_SLOTS = int(os.environ.get("PEER_REGISTRY_SLOTS", "1"))
+
+# Seconds to wait for a chunk another agent fetches from the registry
+PEER_CLAIM_TIMEOUT = float(os.environ.get("PEER_CLAIM_TIMEOUT", "10"))
+
+# Peers tried for a chunk before falling back to the registry
+PEER_ATTEMPTS = 3
+
+_CHUNK_PATH = re.compile(r"^/chunks/(sha256:[0-9a-f]{64})/(\d+)$")
+_HASH_BLOCK = 1024 * 1024
+
+FetchResult = collections.namedtuple(
+    "FetchResult", ["path", "peer_bytes", "registry_bytes", "seconds"]
+)
+
+
+class ChunkUnavailable(Exception):
+    """A chunk could not be fetched from any peer or the registry."""
+
+
+class SourceFailed(Exception):
+    """A peer or the registry could not be reached or sent a corrupt chunk."""
+
+
+def encode_bitfield(chunks, count):
+    """Base64 bitfield of the chunks held, out of ``count`` chunks.
+
+    Bit ``i`` (most significant bit of byte ``i // 8`` first) is set if
+    chunk ``i`` is held, as the control plane's tracker expects.
+    """
+    bits = bytearray((count + 7) // 8)
+    for index in chunks:
+        bits[index // 8] |= 0x80 >> (index % 8)
+    return base64.b64encode(bytes(bits)).decode()
+
+
+def decode_bitfield(text, count):
+    """Indices of the chunks set in a base64 bitfield."""
+    bits = base64.b64decode(text)
+    return [i for i in range(min(count, len(bits) * 8)) if bits[i // 8] & (0x80 >> (i % 8))]
+
+
+class Artifact:
+    """An artifact being fetched or held, and which of its chunks are present."""
+
+    def __init__(self, digest, path, size, chunk_size, chunks):
+        """Initialize the artifact.
+
+        Args:
+            digest: Artifact digest, ``sha256:<hex>``
+            path: File holding the chunks present so far
+            size: Artifact size in bytes
+            chunk_size: Chunk size in bytes
+            chunks: Hex SHA-256 of every chunk
+        """
+        self.digest = digest
+        self.path = path
+        self.size = size
+        self.chunk_size = chunk_size
+        self.chunks = chunks
+        self.have = set()
+        self.complete = False
+
+    def extent(self, index):
+        """Offset and length of chunk ``index``."""
+        offset = index * self.chunk_size
+        return offset, min(self.chunk_size, self.size - offset)
+
+    def bitfield(self):
+        """Base64 bitfield of the chunks present."""
+        return encode_bitfield(list(self.have), len(self.chunks))
+
+
+class ArtifactStore:
+    """Artifacts on local disk, complete or being fetched.
+
+    Layout under the directory::
+
+        sha256/<hex>        complete artifacts
+        sha256/<hex>.part   artifacts being fetched, chunks written in place
+    """
+
+    def __init__(self, directory=ARTIFACT_DIR):
+        """Initialize the store.
+
+        Args:
+            directory: Directory artifacts are kept in
+        """
+        self.directory = directory
+        self._artifacts: Dict[str, Artifact] = {}
+        self._lock = threading.Lock()
+
+    def path(self, digest):
+        """Path of the complete artifact ``digest``."""
+        return os.path.join(self.directory, "sha256", digest.split(":", 1)[1])
+
+    def get(self, digest) -> Optional[Artifact]:
+        """The artifact if any of its chunks are held, else None."""
+        with self._lock:
+            return self._artifacts.get(digest)
+
+    def artifacts(self) -> List[Artifact]:
+        """All artifacts held or being fetched."""
+        with self._lock:
+            return list(self._artifacts.values())
+
+    def open(self, digest, size, chunk_size, chunks) -> Artifact:
+        """Start or resume holding an artifact.
+
+        A complete artifact already on disk is taken as is. Chunks of an
+        interrupted fetch are checked against their digests and kept.
+
+        Args:
+            digest: Artifact digest
+            size: Artifact size in bytes
+            chunk_size: Chunk size in bytes
+            chunks: Hex SHA-256 of every chunk
+
+        Returns:
+            The artifact, registered for serving to peers
+        """
+        with self._lock:
+            artifact = self._artifacts.get(digest)
+            if artifact is not None:
+                return artifact
+        final = self.path(digest)
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        if os.path.exists(final) and os.path.getsize(final) == size:
+            artifact = Artifact(digest, final, size, chunk_size, chunks)
+            artifact.have = set(range(len(chunks)))
+            artifact.complete = True
+        else:
+            artifact = Artifact(digest, f"{final}.part", size, chunk_size, chunks)
+            with open(artifact.path, "a+b") as f:
+                if os.path.getsize(artifact.path) == size:
+                    for index, expected in enumerate(chunks):
+                        f.seek(index * chunk_size)
+                        if hashlib.sha256(f.read(chunk_size)).hexdigest() == expected:
+                            artifact.have.add(index)
+                else:
+                    f.truncate(size)
+        with self._lock:
+            return self._artifacts.setdefault(digest, artifact)
+
+    def finish(self, artifact: Artifact) -> str:
+        """Verify a fully fetched artifact and move it into place.
+
+        Returns:
+            Path of the complete artifact
+
+        Raises:
+            ValueError: If the content does not match the digest; the
+                partial file is discarded
+        """
+        hasher = hashlib.sha256()
+        with open(artifact.path, "rb") as f:
+            for block in iter(lambda: f.read(_HASH_BLOCK), b""):
+                hasher.update(block)
+            os.fsync(f.fileno())
+        if f"sha256:{hasher.hexdigest()}" != artifact.digest:
+            self.discard(artifact.digest)
+            raise ValueError(f"Fetched artifact does not match {artifact.digest}")
+        final = self.path(artifact.digest)
+        os.replace(artifact.path, final)
+        artifact.path = final
+        artifact.complete = True
+        return final
+
+    def discard(self, digest):
+        """Forget an artifact and delete its files."""
+        with self._lock:
+            self._artifacts.pop(digest, None)
+        for path in (self.path(digest), f"{self.path(digest)}.part"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class _ChunkHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        match = _CHUNK_PATH.match(self.path)
+        artifact = match and self.server.store.get(match.group(1))
+        index = int(match.group(2)) if match else -1
+        if not artifact or index not in artifact.have:
+            self._empty(404)
+            return
+        if not self.server.uploads.acquire(blocking=False):
+            self._empty(503)
+            return
+        try:
+            offset, length = artifact.extent(index)
+            with open(artifact.path, "rb") as f:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(length))
+                self.end_headers()
+                self.connection.sendfile(f, offset, length)
+        except FileNotFoundError:
+            # Renamed into place or discarded since the lookup
+            self._empty(404)
+        finally:
+            self.server.uploads.release()
+
+    def _empty(self, status):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        logger.debug(f"Peer {self.client_address[0]}: {format % args}")
+
+
+class PeerServer:
+    """Serves chunks of held artifacts to other agents.
+
+    Example:
+        >>> server = PeerServer(store, port=7070)
+        >>> server.start()
+        >>> ...
+        >>> server.stop()
+    """
+
+    def __init__(self, store: ArtifactStore, port=PEER_PORT, host="0.0.0.0",
+                 max_uploads=PEER_MAX_UPLOADS):
+        """Initialize the server.
+
+        Args:
+            store: Artifacts to serve
+            port: Port to listen on; 0 picks a free one
+            host: Address to listen on
+            max_uploads: Chunks served concurrently before answering 503
+        """
+        self.httpd = http.server.ThreadingHTTPServer((host, port), _ChunkHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.store = store
+        self.httpd.uploads = threading.Semaphore(max_uploads)
+        self._thread = None
+
+    @property
+    def port(self):
+        """Port the server listens on."""
+        return self.httpd.server_address[1]
+
+    def start(self):
+        """Start serving in a background thread."""
+        self._thread = threading.Thread(
+            target=self.httpd.serve_forever, args=(0.1,), name="peer-server",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class ArtifactFetcher:
+    """Fetches artifacts from peers and the registry, and announces them.
+
+    Example:
+        >>> fetcher = ArtifactFetcher(store, CONTROL_PLANE, node_token, server_url)
+        >>> result = fetcher.fetch("sha256:4f3c...")
+        >>> result.path, result.peer_bytes, result.registry_bytes
+    """
+
+    def __init__(self, store: ArtifactStore, control_plane, node_token, advertise_url,
+                 workers=PEER_FETCH_WORKERS, refresh_interval=PEER_REFRESH_INTERVAL,
+                 registry_slots=PEER_REGISTRY_SLOTS, claim_timeout=PEER_CLAIM_TIMEOUT):
+        """Initialize the fetcher.
+
+        Args:
+            store: Where artifacts are kept
+            control_plane: Control plane base URL
+            node_token: This node's token, for the tracker
+            advertise_url: URL peers reach this agent's chunk server at
+            workers: Chunks fetched concurrently
+            refresh_interval: Seconds between announcements and peer refreshes
+            registry_slots: Concurrent registry requests while other agents
+                fetch the artifact; all workers use the registry otherwise
+            claim_timeout: Seconds to wait for a chunk another agent is
+                fetching from the registry before fetching it as well
+        """
+        self.store = store
+        self.control_plane = control_plane
+        self.node_token = node_token
+        self.advertise_url = advertise_url
+        self.workers = workers
+        self.refresh_interval = refresh_interval
+        self.registry_slots = registry_slots
+        self.claim_timeout = claim_timeout
+        self._local = threading.local()
+
+    def _session(self):
+        """HTTP session of the calling thread, reusing connections."""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _blob_url(self, digest):
+        return f"{self.control_plane}/api/v1/blobs/{digest}"
+
+    def _headers(self):
+        return {"Authorization": f"Bearer {self.node_token}"}
+
+    def manifest(self, digest):
+        """The artifact's size, chunk size and chunk digests, from the registry."""
+        response = self._session().get(f"{self._blob_url(digest)}/chunks", timeout=60)
+        response.raise_for_status()
+        return response.json()
+
+    def announce(self, artifact: Artifact, fetching=()):
+        """Tell the tracker which chunks of an artifact this agent holds.
+
+        Args:
+            artifact: The artifact
+            fetching: Chunks being fetched from the registry right now
+
+        Returns:
+            The other peers holding or fetching the artifact
+
+        Raises:
+            requests.exceptions.RequestException: If the tracker is unreachable
+        """
+        count = len(artifact.chunks)
+        response = self._session().put(
+            f"{self._blob_url(artifact.digest)}/swarm",
+            json={
+                "url": self.advertise_url,
+                "have": artifact.bitfield(),
+                "fetching": encode_bitfield(fetching, count) if fetching else "",
+            },
+            headers=self._headers(),
+            timeout=10,
+        )
+        response.raise_for_status()
+        return response.json()["peers"]
+
+    def withdraw(self, digest):
+        """Stop offering an artifact to peers."""
+        try:
+            self._session().delete(
+                f"{self._blob_url(digest)}/swarm", headers=self._headers(), timeout=10
+            )
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Failed to withdraw {digest}: {e}")
+
+    def announce_all(self):
+        """Re-announce every complete artifact, keeping it in the swarm."""
+        for artifact in self.store.artifacts():
+            if artifact.complete:
+                try:
+                    self.announce(artifact)
+                except requests.exceptions.RequestException as e:
+                    logger.warning(f"Failed to announce {artifact.digest}: {e}")
+
+    def fetch(self, digest, manifest=None) -> FetchResult:
+        """Fetch an artifact, from peers where possible.
+
+        Args:
+            digest: Artifact digest, ``sha256:<hex>``
+            manifest: The artifact's manifest, if already fetched with
+                ``manifest``
+
+        Returns:
+            FetchResult with the artifact's path and where its bytes came from
+
+        Raises:
+            requests.exceptions.RequestException: If the registry is unreachable
+            ChunkUnavailable: If a chunk could not be fetched at all
+            ValueError: If the fetched artifact does not match its digest
+        """
+        started = time.monotonic()
+        manifest = manifest or self.manifest(digest)
+        artifact = self.store.open(
+            digest, manifest["size"], manifest["chunk_size"], manifest["chunks"]
+        )
+        fetch = _Fetch(self, artifact)
+        if not artifact.complete:
+            # Join the swarm first, so agents starting together see each other
+            fetch.refresh(force=True)
+            with ThreadPoolExecutor(self.workers, thread_name_prefix="fetch") as pool:
+                for future in [pool.submit(fetch.work) for _ in range(self.workers)]:
+                    future.result()
+            self.store.finish(artifact)
+        try:
+            self.announce(artifact)
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Failed to announce {digest}: {e}")
+        return FetchResult(
+            artifact.path, fetch.peer_bytes, fetch.registry_bytes,
+            time.monotonic() - started,
+        )
+
+    def _get_chunk(self, url, artifact, index, headers=None):
+        """Fetch and verify one chunk.
+
+        Returns:
+            The chunk, or None if the source does not have it or is busy
+
+        Raises:
+            SourceFailed: If the source is unreachable or sent corrupt data
+        """
+        try:
+            response = self._session().get(url, headers=headers, timeout=30)
+        except requests.exceptions.RequestException as e:
+            raise SourceFailed(f"Chunk {index} from {url} failed: {e}")
+        if response.status_code not in (200, 206):
+            return None
+        data = response.content
+        if hashlib.sha256(data).hexdigest() != artifact.chunks[index]:
+            raise SourceFailed(f"Chunk {index} of {artifact.digest} from {url} is corrupt")
+        return data
+
+    def from_peer(self, peer_url, artifact, index):
+        """Fetch and verify chunk ``index`` from a peer, see ``_get_chunk``."""
+        return self._get_chunk(
+            f"{peer_url}/chunks/{artifact.digest}/{index}", artifact, index
+        )
+
+    def from_registry(self, artifact, index):
+        """Fetch and verify chunk ``index`` from the registry, see ``_get_chunk``."""
+        offset, length = artifact.extent(index)
+        return self._get_chunk(
+            self._blob_url(artifact.digest), artifact, index,
+            headers={"Range": f"bytes={offset}-{offset + length - 1}"},
+        )
+
+
+class _Fetch:
+    """State of one artifact fetch, shared by its worker threads.
+
+    Chunks held by peers are fetched from them, rarest first. Of the chunks
+    no peer holds, each agent fetches from the registry those no other agent
+    is fetching, announcing each one (as ``fetching``) before it starts, and
+    waits for the others to appear at their peers. While other agents are in
+    the swarm, only ``registry_slots`` chunks at a time come from the
+    registry, so agents fetching together split the registry's work between
+    them instead of each pulling the whole artifact. All workers use the
+    registry once an announcement has shown no other agent in the swarm.
+    """
+
+    def __init__(self, fetcher: ArtifactFetcher, artifact: Artifact):
+        self.fetcher = fetcher
+        self.artifact = artifact
+        self.pending = set(range(len(artifact.chunks))) - artifact.have
+        self.in_flight = set()
+        self.from_registry = set()
+        self.failed_peers = set()
+        self.holders = {}
+        self.claims = {}
+        self.claimed_since = {}
+        self.order = collections.deque()
+        self.peer_count = 0
+        self.refreshes = 0
+        self.refreshed = 0.0
+        self.refreshing = False
+        self.peer_bytes = 0
+        self.registry_bytes = 0
+        self.lock = threading.Lock()
+
+    def _plan(self, peers):
+        """Order pending chunks from a fresh peer list.
+
+        Chunks peers hold come first, rarest first; then chunks no agent is
+        fetching; chunks other agents are fetching from the registry come
+        last. Ties are broken at random so agents fetching the same artifact
+        start on different chunks.
+        """
+        count = len(self.artifact.chunks)
+        usable = [p for p in peers if p["url"] not in self.failed_peers]
+        holders = collections.defaultdict(list)
+        claims = collections.defaultdict(list)
+        for peer in usable:
+            for index in decode_bitfield(peer["have"], count):
+                holders[index].append(peer["url"])
+            if peer.get("fetching"):
+                for index in decode_bitfield(peer["fetching"], count):
+                    claims[index].append(peer["url"])
+        now = time.monotonic()
+        with self.lock:
+            order = list(self.pending - self.in_flight)
+            random.shuffle(order)
+            order.sort(key=lambda i: len(holders[i]) or (count + 2 if claims[i] else count + 1))
+            self.holders = holders
+            self.claims = claims
+            self.claimed_since = {
+                i: self.claimed_since.get(i, now) for i in claims if i not in holders
+            }
+            self.peer_count = len(usable)
+            self.order = collections.deque(order)
+            self.refreshed = now
+
+    def refresh(self, force=False):
+        """Announce progress and refresh peers, by one worker at a time.
+
+        Unless ``force`` is set, nothing is done if the last refresh is
+        more recent than the fetcher's ``refresh_interval``.
+        """
+        with self.lock:
+            if self.refreshing:
+                return
+            if not force and time.monotonic() - self.refreshed < self.fetcher.refresh_interval:
+                return
+            self.refreshing = True
+            fetching = list(self.from_registry)
+        try:
+            self._plan(self.fetcher.announce(self.artifact, fetching))
+            self.refreshes += 1
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Failed to refresh peers of {self.artifact.digest}: {e}")
+            with self.lock:
+                self.refreshed = time.monotonic()
+        finally:
+            self.refreshing = False
+
+    def _drop_peer(self, url):
+        with self.lock:
+            self.failed_peers.add(url)
+            for urls in list(self.holders.values()) + list(self.claims.values()):
+                if url in urls:
+                    urls.remove(url)
+
+    def _next(self):
+        """Next chunk to fetch and the peers holding it, or None when done."""
+        self.refresh()
+        with self.lock:
+            while self.order:
+                index = self.order.popleft()
+                if index in self.pending and index not in self.in_flight:
+                    self.in_flight.add(index)
+                    return index, list(self.holders.get(index, ()))
+            # Everything left is in flight, or was queued after the last plan
+            rest = self.pending - self.in_flight
+            if rest:
+                index = rest.pop()
+                self.in_flight.add(index)
+                return index, list(self.holders.get(index, ()))
+            return None
+
+    def _requeue(self, index):
+        """Give a chunk back to be fetched later."""
+        with self.lock:
+            self.in_flight.discard(index)
+            self.from_registry.discard(index)
+            self.order.append(index)
+
+    def _claim(self, index):
+        """Take a registry slot for chunk ``index`` and announce it.
+
+        Returns:
+            False if the chunk should rather be waited for: no slot is free,
+            another agent fetches it from the registry, or a peer got it
+        """
+        with self.lock:
+            claimants = self.claims.get(index, [])
+            waited = time.monotonic() - self.claimed_since.get(index, time.monotonic())
+            if claimants and waited < self.fetcher.claim_timeout:
+                return False
+            alone = self.refreshes and not self.peer_count
+            limit = self.fetcher.workers if alone else self.fetcher.registry_slots
+            if len(self.from_registry) >= limit:
+                return False
+            self.from_registry.add(index)
+        # Agents claiming the same chunk at once: the lowest URL fetches it
+        self.refresh(force=True)
+        with self.lock:
+            rivals = [u for u in self.claims.get(index, []) if u < self.fetcher.advertise_url]
+            if self.holders.get(index) or (rivals and waited < self.fetcher.claim_timeout):
+                self.from_registry.discard(index)
+                return False
+        return True
+
+    def _from_peers(self, index, holders):
+        """Chunk ``index`` from one of the peers holding it, or None."""
+        random.shuffle(holders)
+        for url in holders[:PEER_ATTEMPTS]:
+            try:
+                data = self.fetcher.from_peer(url, self.artifact, index)
+            except SourceFailed as e:
+                # Not asked again during this fetch
+                logger.warning(f"{e}, dropping peer")
+                self._drop_peer(url)
+                continue
+            if data is not None:
+                return data
+        return None
+
+    def _from_registry(self, index):
+        """Chunk ``index`` from the registry, or None."""
+        try:
+            return self.fetcher.from_registry(self.artifact, index)
+        except SourceFailed as e:
+            logger.warning(str(e))
+            return None
+        finally:
+            with self.lock:
+                self.from_registry.discard(index)
+
+    def work(self):
+        """Fetch chunks until none are left."""
+        artifact = self.artifact
+        fd = os.open(artifact.path, os.O_WRONLY)
+        try:
+            while True:
+                nxt = self._next()
+                if nxt is None:
+                    return
+                index, holders = nxt
+                data = self._from_peers(index, holders)
+                from_peer = data is not None
+                if data is None:
+                    if not self._claim(index):
+                        # Wait for a peer to get it, or for a free slot
+                        self._requeue(index)
+                        time.sleep(self.fetcher.refresh_interval / 4)
+                        continue
+                    data = self._from_registry(index)
+                if data is None:
+                    with self.lock:
+                        self.in_flight.discard(index)
+                    raise ChunkUnavailable(f"Chunk {index} of {artifact.digest}")
+                os.pwrite(fd, data, artifact.extent(index)[0])
+                with self.lock:
+                    artifact.have.add(index)
+                    self.pending.discard(index)
+                    self.in_flight.discard(index)
+                    if from_peer:
+                        self.peer_bytes += len(data)
+                    else:
+                        self.registry_bytes += len(data)
+        finally:
+            os.close(fd)
+
+
+def advertise_url(port, host_ip):
+    """URL peers reach this agent's chunk server at."""
+    return PEER_ADVERTISE_URL or f"http://{host_ip}:{port}"
+
+
+def main(argv=None):
+    """Fetch an artifact as a registered agent, then seed it."""
+    import agent
+
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    sub = parser.add_subparsers(dest="command", required=True)
+    fetch = sub.add_parser("fetch", help="fetch an artifact and seed it")
+    fetch.add_argument("digest")
+    fetch.add_argument("--name", help="node name to register as (default: hostname)")
+    fetch.add_argument("--port", type=int, default=PEER_PORT)
+    fetch.add_argument("--advertise-host", help="host peers reach this agent at (default: host IP)")
+    fetch.add_argument("--dir", default=ARTIFACT_DIR)
+    fetch.add_argument("--seed", type=float, default=0,
+                       help="seconds to keep serving chunks after the fetch")
+    args = parser.parse_args(argv)
+
+    registration = agent.register(name=args.name)
+    store = ArtifactStore(args.dir)
+    server = PeerServer(store, args.port)
+    server.start()
+    fetcher = ArtifactFetcher(
+        store, agent.CONTROL_PLANE, registration["node_token"],
+        advertise_url(server.port, args.advertise_host or agent.get_host_ip()),
+    )
+    result = fetcher.fetch(args.digest)
+    print(
+        f"{result.path} {result.peer_bytes} {result.registry_bytes} {result.seconds:.3f}",
+        flush=True,
+    )
+    deadline = time.monotonic() + args.seed
+    while time.monotonic() < deadline:
+        time.sleep(min(PEER_ANNOUNCE_INTERVAL, max(0, deadline - time.monotonic())))
+        fetcher.announce_all()
+    fetcher.withdraw(args.digest)
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""Capability probes for the MIaaS agent.
+
+Each probe inspects one aspect of the host (GPUs, Docker, kubelet, disks)
+and returns a dict of capability fields to merge into the registration
+payload. Probes run concurrently in a thread pool with a per-probe timeout,
+so one slow or hanging probe cannot delay registration. All filesystem and
+socket paths are resolved under a configurable root, so probes can be tested
+against a fake sysfs/procfs tree.
+
+New probes are added with the ``probe`` decorator:
+
+    @probe("tpus", timeout=1.0)
+    def probe_tpus(root):
+        return {"tpus": [...]}
+"""
+import hashlib
+import json
+import logging
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeout
+from typing import Any, Callable, Dict, List, Optional
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+# Root under which /sys, /proc and /var paths are resolved
+PROBE_ROOT = os.environ.get("PROBE_ROOT", "/")
+
+# Default per-probe timeout in seconds
+PROBE_TIMEOUT = float(os.environ.get("PROBE_TIMEOUT", "2.0"))
+
+# PCI vendor IDs of GPU vendors, as found in sysfs
+PCI_GPU_VENDORS = {
+    "0x10de": "nvidia",
+    "0x1002": "amd",
+    "0x8086": "intel",
+}
+
+# PCI display controller class prefix (0x03xxxx)
+PCI_DISPLAY_CLASS = "0x03"
+
+
+class Probe:
+    """A named capability probe with its own timeout."""
+
+    def __init__(self, name: str, func: Callable[[str], Dict], timeout: float):
+        """Initialize the probe.
+
+        Args:
+            name: Probe name, used in logs
+            func: Callable taking the probe root and returning capability fields
+            timeout: Seconds to wait for the probe before giving up
+        """
+        self.name = name
+        self.func = func
+        self.timeout = timeout
+
+
+# Registered probes, in registration order
+PROBES: List[Probe] = []
+
+
+def probe(name: str, timeout: float = PROBE_TIMEOUT):
+    """Register a function as a capability probe.
+
+    Args:
+        name: Probe name
+        timeout: Seconds to wait for the probe before giving up
+
+    Returns:
+        Decorator registering the function and returning it unchanged
+    """
+    def decorator(func):
+        PROBES.append(Probe(name, func, timeout))
+        return func
+    return decorator
+
+
+def _path(root: str, *parts: str) -> str:
+    """Join absolute host paths under the probe root."""
+    return os.path.join(root, *(p.lstrip("/") for p in parts))
+
+
+def _read(path: str) -> Optional[str]:
+    """Read and strip a small text file, or None if it cannot be read."""
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def run_probes(
+    probes: Optional[List[Probe]] = None,
+    root: str = PROBE_ROOT,
+) -> Dict[str, Any]:
+    """Run capability probes concurrently and merge their results.
+
+    Probes that raise or exceed their timeout are logged and skipped.
+
+    Args:
+        probes: Probes to run, defaults to all registered probes
+        root: Root under which host paths are resolved
+
+    Returns:
+        Merged capability fields from all successful probes
+    """
+    probes = PROBES if probes is None else probes
+    if not probes:
+        return {}
+
+    executor = ThreadPoolExecutor(
+        max_workers=len(probes), thread_name_prefix="probe"
+    )
+    try:
+        started = time.monotonic()
+        futures = [(p, executor.submit(p.func, root)) for p in probes]
+
+        capabilities: Dict[str, Any] = {}
+        for p, future in futures:
+            remaining = started + p.timeout - time.monotonic()
+            try:
+                result = future.result(timeout=max(0.0, remaining))
+            except FuturesTimeout:
+                logger.warning(
+                    f"Capability probe '{p.name}' timed out after {p.timeout}s"
+                )
+                continue
+            except Exception as e:
+                logger.warning(f"Capability probe '{p.name}' failed: {e!r}")
+                continue
+            if result:
+                capabilities.update(result)
+        return capabilities
+    finally:
+        # Do not wait for hung probes; their threads are abandoned
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def fingerprint(capabilities: Dict[str, Any]) -> str:
+    """Content fingerprint of a capability report.
+
+    Args:
+        capabilities: Capability dict, without a "fingerprint" key
+
+    Returns:
+        Hex digest that changes whenever any capability value changes
+    """
+    canonical = json.dumps(
+        {k: v for k, v in capabilities.items() if k != "fingerprint"},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+@probe("gpus")
+def probe_gpus(root: str) -> Dict[str, Any]:
+    """Detect GPUs from PCI devices in sysfs and the NVIDIA procfs driver.
+
+    Returns:
+        {"gpus": [{"id", "vendor", "pci", "model", "mem_mb"}, ...]}
+    """
+    nvidia_models = {}
+    nvidia_dir = _path(root, "/proc/driver/nvidia/gpus")
+    if os.path.isdir(nvidia_dir):
+        for bus_id in sorted(os.listdir(nvidia_dir)):
+            info = _read(os.path.join(nvidia_dir, bus_id, "information")) or ""
+            for line in info.splitlines():
+                key, _, value = line.partition(":")
+                if key.strip() == "Model":
+                    nvidia_models[bus_id.lower()] = value.strip()
+
+    gpus = []
+    pci_dir = _path(root, "/sys/bus/pci/devices")
+    if os.path.isdir(pci_dir):
+        for address in sorted(os.listdir(pci_dir)):
+            device_dir = os.path.join(pci_dir, address)
+            device_class = _read(os.path.join(device_dir, "class")) or ""
+            vendor = PCI_GPU_VENDORS.get(_read(os.path.join(device_dir, "vendor")))
+            if not vendor or not device_class.startswith(PCI_DISPLAY_CLASS):
+                continue
+            gpu = {"id": len(gpus), "vendor": vendor, "pci": address}
+            model = nvidia_models.get(address.lower())
+            if model:
+                gpu["model"] = model
+            vram = _read(os.path.join(device_dir, "mem_info_vram_total"))
+            if vram and vram.isdigit():
+                gpu["mem_mb"] = int(vram) // (1024 * 1024)
+            gpus.append(gpu)
+
+    return {"gpus": gpus}
+
+
+def _docker_socket(root: str) -> str:
+    """Path of the Docker daemon's unix socket."""
+    docker_host = os.environ.get("DOCKER_HOST", "")
+    if docker_host.startswith("unix://"):
+        return _path(root, docker_host[len("unix://"):])
+    return _path(root, "/var/run/docker.sock")
+
+
+@probe("docker")
+def probe_docker(root: str) -> Dict[str, Any]:
+    """Query the Docker daemon version over its unix socket.
+
+    Returns:
+        {"docker": {"available", "version", "api_version"}} or {} if absent
+    """
+    path = _docker_socket(root)
+    if not os.path.exists(path):
+        return {}
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(PROBE_TIMEOUT)
+        sock.connect(path)
+        sock.sendall(b"GET /version HTTP/1.0\r\nHost: docker\r\n\r\n")
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+
+    header, _, body = b"".join(chunks).partition(b"\r\n\r\n")
+    status_line = header.split(b"\r\n", 1)[0]
+    if b" 200 " not in status_line + b" ":
+        return {"docker": {"available": False}}
+    version = json.loads(body)
+    return {
+        "docker": {
+            "available": True,
+            "version": version.get("Version"),
+            "api_version": version.get("ApiVersion"),
+        }
+    }
+
+
+@probe("k8s")
+def probe_kubelet(root: str) -> Dict[str, Any]:
+    """Detect a kubelet from its configuration on disk.
+
+    Returns:
+        {"k8s": {"available", "kubelet_config"}} or {} if absent
+    """
+    for config in (
+        "/var/lib/kubelet/config.yaml",
+        "/etc/kubernetes/kubelet.conf",
+    ):
+        if os.path.exists(_path(root, config)):
+            return {"k8s": {"available": True, "kubelet_config": config}}
+    return {}
+
+
+@probe("disks")
+def probe_disks(root: str) -> Dict[str, Any]:
+    """Report mounted physical filesystems and total root disk size.
+
+    Free space is reported in heartbeats instead, so it is deliberately left
+    out here to keep the capability fingerprint stable.
+
+    Returns:
+        {"disk_mb": int, "disks": [{"mountpoint", "fstype", "total_mb", "ssd"}]}
+    """
+    disks = []
+    for partition in psutil.disk_partitions(all=False):
+        try:
+            usage = psutil.disk_usage(partition.mountpoint)
+        except OSError:
+            continue
+        disk = {
+            "mountpoint": partition.mountpoint,
+            "fstype": partition.fstype,
+            "total_mb": int(usage.total) // (1024 * 1024),
+        }
+        block = _path(root, "/sys/class/block", os.path.basename(partition.device))
+        # Partitions have no queue of their own; fall back to the parent disk
+        rotational = _read(os.path.join(block, "queue", "rotational")) or _read(
+            os.path.join(block, "..", "queue", "rotational")
+        )
+        if rotational in ("0", "1"):
+            disk["ssd"] = rotational == "0"
+        disks.append(disk)
+
+    result: Dict[str, Any] = {"disks": disks}
+    root_disk = next((d for d in disks if d["mountpoint"] == "/"), None)
+    if root_disk:
+        result["disk_mb"] = root_disk["total_mb"]
+    return result
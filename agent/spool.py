@@ -0,0 +1,248 @@
+"""On-disk spool for heartbeat samples the control plane could not receive.
+
+While the control plane is unreachable, each heartbeat sample is appended to
+a fixed-size ring file instead of being dropped. Once heartbeats succeed
+again, spooled samples are replayed oldest-first in compressed batches at a
+bounded rate, so the control plane's metric history has no gaps and the
+replay cannot flood it. When the ring is full the oldest samples are
+overwritten, so the spool never grows past its configured size.
+
+File layout:
+
+    header  magic "MSPL", version, capacity, head, tail, count, dropped
+    data    ring of records: length (u32) + crc32 (u32) + JSON payload
+
+A record that would not fit before the end of the ring is written at the
+start instead, after a wrap marker. The header is rewritten after every
+record, so a crash loses at most the sample being written; a record that
+fails its checksum resets the spool rather than replaying garbage.
+"""
+import json
+import logging
+import os
+import struct
+import time
+import zlib
+from typing import Callable, Dict, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+# Location of the spool file
+SPOOL_PATH = os.path.expanduser(
+    os.environ.get("SPOOL_PATH", "~/.miaas-agent/metrics.spool")
+)
+
+# Size of the ring in bytes; older samples are overwritten beyond this
+SPOOL_MAX_BYTES = int(os.environ.get("SPOOL_MAX_BYTES", str(4 * 1024 * 1024)))
+
+# Samples per replay request
+SPOOL_REPLAY_BATCH = int(os.environ.get("SPOOL_REPLAY_BATCH", "500"))
+
+# Maximum replayed samples per second
+SPOOL_REPLAY_RATE = float(os.environ.get("SPOOL_REPLAY_RATE", "500"))
+
+MAGIC = b"MSPL"
+VERSION = 1
+
+_HEADER = struct.Struct(">4sB3xQQQQQ")
+_RECORD = struct.Struct(">II")
+_WRAP = 0xFFFFFFFF
+
+
+class SpoolCorrupted(Exception):
+    """Raised when a spooled record fails its checksum."""
+
+
+class MetricSpool:
+    """Bounded, append-only ring file of JSON samples."""
+
+    def __init__(
+        self,
+        path: str = SPOOL_PATH,
+        max_bytes: int = SPOOL_MAX_BYTES,
+        fsync: bool = True,
+    ):
+        """Open or create the spool file.
+
+        A file with a different capacity or an unreadable header is reset.
+
+        Args:
+            path: Spool file path; parent directories are created
+            max_bytes: Capacity of the ring in bytes
+            fsync: Flush every append to disk
+        """
+        self.path = path
+        self.capacity = max_bytes
+        self.fsync = fsync
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+
+        header = os.pread(self._fd, _HEADER.size, 0)
+        if len(header) == _HEADER.size:
+            magic, version, capacity, head, tail, count, dropped = _HEADER.unpack(header)
+            if (magic, version, capacity) == (MAGIC, VERSION, max_bytes):
+                self.head, self.tail = head, tail
+                self.count, self.dropped = count, dropped
+                return
+            logger.warning(f"Resetting incompatible metric spool {path}")
+        os.ftruncate(self._fd, _HEADER.size + max_bytes)
+        self._reset()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self):
+        """Close the spool file."""
+        os.close(self._fd)
+
+    def append(self, sample: Dict):
+        """Spool a sample, overwriting the oldest samples if the ring is full.
+
+        Args:
+            sample: JSON-serializable sample
+
+        Raises:
+            ValueError: If the sample is larger than the whole ring
+        """
+        payload = json.dumps(sample, separators=(",", ":")).encode()
+        need = _RECORD.size + len(payload)
+        if need > self.capacity:
+            raise ValueError(f"Sample of {need} bytes exceeds spool capacity")
+
+        while True:
+            if self.count == 0:
+                self.head = self.tail = 0
+                break
+            if self.tail > self.head:
+                if self.capacity - self.tail >= need:
+                    break
+                # Not enough room before the end: continue at the start
+                if self.capacity - self.tail >= _RECORD.size:
+                    self._write(self.tail, _RECORD.pack(_WRAP, 0))
+                self.tail = 0
+            elif self.head - self.tail >= need:
+                break
+            else:
+                self._drop_oldest()
+
+        self._write(
+            self.tail, _RECORD.pack(len(payload), zlib.crc32(payload)) + payload
+        )
+        self.tail += need
+        self.count += 1
+        self._write_header()
+
+    def peek(self, limit: int) -> List[Dict]:
+        """Return up to ``limit`` of the oldest samples without removing them.
+
+        Args:
+            limit: Maximum number of samples
+
+        Returns:
+            Samples, oldest first
+        """
+        try:
+            return [
+                json.loads(payload)
+                for _, payload in zip(range(limit), self._records())
+            ]
+        except SpoolCorrupted as e:
+            logger.error(f"Discarding corrupted metric spool: {e}")
+            self._reset()
+            return []
+
+    def consume(self, n: int):
+        """Remove the ``n`` oldest samples, e.g. after replaying them.
+
+        Args:
+            n: Number of samples to remove
+        """
+        for _ in range(min(n, self.count)):
+            self.head = self._normalize(self._next(self.head))
+            self.count -= 1
+        self._write_header()
+
+    def _records(self) -> Iterator[bytes]:
+        """Iterate over spooled payloads, oldest first."""
+        pos = self.head
+        for _ in range(self.count):
+            pos = self._normalize(pos)
+            length, crc = _RECORD.unpack(os.pread(self._fd, _RECORD.size, _HEADER.size + pos))
+            if length > self.capacity - pos - _RECORD.size:
+                raise SpoolCorrupted(f"bad record length {length} at {pos}")
+            payload = os.pread(self._fd, length, _HEADER.size + pos + _RECORD.size)
+            if zlib.crc32(payload) != crc:
+                raise SpoolCorrupted(f"checksum mismatch at {pos}")
+            yield payload
+            pos += _RECORD.size + length
+
+    def _normalize(self, pos: int) -> int:
+        """Follow an explicit or implicit wrap at ``pos``."""
+        if self.capacity - pos < _RECORD.size:
+            return 0
+        length, _ = _RECORD.unpack(os.pread(self._fd, _RECORD.size, _HEADER.size + pos))
+        return 0 if length == _WRAP else pos
+
+    def _next(self, pos: int) -> int:
+        """Offset of the record after the one at ``pos``."""
+        pos = self._normalize(pos)
+        length, _ = _RECORD.unpack(os.pread(self._fd, _RECORD.size, _HEADER.size + pos))
+        return pos + _RECORD.size + length
+
+    def _drop_oldest(self):
+        """Overwrite the oldest sample to make room."""
+        self.head = self._normalize(self._next(self.head))
+        self.count -= 1
+        self.dropped += 1
+
+    def _reset(self):
+        self.head = self.tail = self.count = self.dropped = 0
+        self._write_header()
+
+    def _write(self, pos: int, data: bytes):
+        os.pwrite(self._fd, data, _HEADER.size + pos)
+
+    def _write_header(self):
+        os.pwrite(self._fd, _HEADER.pack(
+            MAGIC, VERSION, self.capacity,
+            self.head, self.tail, self.count, self.dropped,
+        ), 0)
+        if self.fsync:
+            os.fsync(self._fd)
+
+
+def replay(
+    spool: MetricSpool,
+    send_batch: Callable[[List[Dict]], bool],
+    budget: float,
+    batch_size: int = SPOOL_REPLAY_BATCH,
+    rate: float = SPOOL_REPLAY_RATE,
+    sleep: Callable[[float], None] = time.sleep,
+) -> int:
+    """Replay spooled samples in batches, oldest first, at a bounded rate.
+
+    Samples are only removed from the spool once ``send_batch`` reports
+    success, so a failed batch is retried on the next call.
+
+    Args:
+        spool: Spool to drain
+        send_batch: Callable sending a batch, returning True on success
+        budget: Seconds to spend replaying before returning
+        batch_size: Samples per batch
+        rate: Maximum samples per second
+        sleep: Sleep function, replaceable in tests
+
+    Returns:
+        Number of samples replayed
+    """
+    deadline = time.monotonic() + budget
+    replayed = 0
+    while len(spool) and time.monotonic() < deadline:
+        batch = spool.peek(batch_size)
+        if not batch or not send_batch(batch):
+            break
+        spool.consume(len(batch))
+        replayed += len(batch)
+        if len(spool):
+            sleep(len(batch) / rate)
+    return replayed
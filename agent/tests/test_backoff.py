@@ -0,0 +1,60 @@
+"""Unit tests for reconnect backoff and registration throttling."""
+import random
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# Import backoff module
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import agent
+import backoff
+
+
+def test_backoff_delays_grow_within_bounds():
+    """Test delays stay within [base, cap] and grow towards the cap."""
+    b = backoff.Backoff(base=1, cap=60, rng=random.Random(1))
+
+    delays = [b.next() for _ in range(50)]
+
+    assert all(1 <= d <= 60 for d in delays)
+    assert max(delays[-10:]) > 10
+
+
+def test_backoff_is_decorrelated_between_agents():
+    """Test agents with different seeds do not retry in lockstep."""
+    fleet = [backoff.Backoff(base=1, cap=60, rng=random.Random(i)) for i in range(100)]
+
+    third_delays = [[b.next() for _ in range(3)][-1] for b in fleet]
+
+    assert len({round(d, 3) for d in third_delays}) == 100
+
+
+def test_backoff_reset_and_retry_after():
+    """Test reset returns to the base delay and Retry-After is honoured."""
+    b = backoff.Backoff(base=1, cap=60, rng=random.Random(2))
+    for _ in range(10):
+        b.next()
+
+    assert 30 <= b.next(retry_after=30) <= 31
+    b.reset()
+    assert b.next() <= 3
+
+
+def test_parse_retry_after():
+    """Test Retry-After parsing of seconds and invalid values."""
+    assert backoff.parse_retry_after("12") == 12.0
+    assert backoff.parse_retry_after(None) is None
+    assert backoff.parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") is None
+
+
+def test_register_raises_throttled_with_retry_after():
+    """Test a 429 registration response carries the server's delay."""
+    response = MagicMock(status_code=429, headers={"Retry-After": "7"})
+    with patch('agent.requests.post', return_value=response):
+        with pytest.raises(agent.RegistrationThrottled) as exc_info:
+            agent.register(capabilities={"os": "linux"})
+
+    assert exc_info.value.retry_after == 7.0
+    assert agent.retry_delay(exc_info.value, backoff.Backoff()) >= 7.0
@@ -0,0 +1,175 @@
+"""Unit tests for the size-bounded artifact cache."""
+import hashlib
+import json
+import os
+
+import pytest
+
+# Import cache module
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import cache
+import peers
+
+CHUNK = 1024
+
+
+class FakeFetcher:
+    """Fetches artifacts from a dict instead of peers and the registry."""
+
+    def __init__(self, store, blobs):
+        self.store = store
+        self.blobs = {f"sha256:{hashlib.sha256(b).hexdigest()}": b for b in blobs}
+        self.fetched = []
+        self.withdrawn = []
+
+    def manifest(self, digest):
+        blob = self.blobs[digest]
+        return {
+            "digest": digest, "size": len(blob), "chunk_size": CHUNK,
+            "chunks": [hashlib.sha256(blob[i:i + CHUNK]).hexdigest()
+                       for i in range(0, len(blob), CHUNK)],
+        }
+
+    def fetch(self, digest, manifest=None):
+        manifest = manifest or self.manifest(digest)
+        artifact = self.store.open(
+            digest, manifest["size"], manifest["chunk_size"], manifest["chunks"]
+        )
+        with open(artifact.path, "r+b") as f:
+            f.write(self.blobs[digest])
+        self.fetched.append(digest)
+        return peers.FetchResult(self.store.finish(artifact), 0, manifest["size"], 0.0)
+
+    def withdraw(self, digest):
+        self.withdrawn.append(digest)
+
+
+@pytest.fixture
+def make_cache(tmp_path):
+    now = [1000.0]
+
+    def make(blobs, **kwargs):
+        store = peers.ArtifactStore(str(tmp_path / "artifacts"))
+        fetcher = FakeFetcher(store, blobs)
+
+        def clock():
+            now[0] += 1
+            return now[0]
+
+        return cache.ArtifactCache(store, fetcher, clock=clock, **kwargs), list(fetcher.blobs)
+
+    return make
+
+
+def _blobs(count, size=4 * CHUNK):
+    return [os.urandom(size) for _ in range(count)]
+
+
+def test_fetches_once_then_serves_from_disk(make_cache):
+    """Test a cached artifact is not fetched again."""
+    artifacts, (digest,) = make_cache(_blobs(1))
+
+    path = artifacts.fetch(digest)
+
+    assert artifacts.fetch(digest) == path
+    assert artifacts.get(digest) == path
+    assert artifacts.fetcher.fetched == [digest]
+    assert artifacts.used_bytes == 4 * CHUNK
+
+
+def test_lru_evicts_least_recently_used(make_cache):
+    """Test the least recently used artifact makes room for a new one."""
+    artifacts, (a, b, c) = make_cache(_blobs(3), max_bytes=8 * CHUNK, policy="lru")
+    artifacts.fetch(a)
+    artifacts.fetch(b)
+    artifacts.get(a)
+
+    artifacts.fetch(c)
+
+    assert {item["digest"] for item in artifacts.contents()} == {a, c}
+    assert artifacts.fetcher.withdrawn == [b]
+    assert not os.path.exists(artifacts.store.path(b))
+
+
+def test_lfu_evicts_least_often_used(make_cache):
+    """Test the least often used artifact makes room under the LFU policy."""
+    artifacts, (a, b, c) = make_cache(_blobs(3), max_bytes=8 * CHUNK, policy="lfu")
+    artifacts.fetch(a)
+    artifacts.get(a)
+    artifacts.fetch(b)
+
+    artifacts.fetch(c)
+
+    assert {item["digest"] for item in artifacts.contents()} == {a, c}
+
+
+def test_pinned_artifacts_are_not_evicted(make_cache):
+    """Test artifacts in use survive eviction, and a full cache is refused."""
+    artifacts, (a, b, c) = make_cache(_blobs(3), max_bytes=8 * CHUNK)
+    with artifacts.use(a):
+        artifacts.fetch(b)
+        with artifacts.use(c):
+            assert {item["digest"]: item["pinned"] for item in artifacts.contents()} == {
+                a: True, c: True,
+            }
+            assert not artifacts.evict(a)
+            with pytest.raises(cache.CacheFull):
+                artifacts.fetch(b)
+
+    assert not any(item["pinned"] for item in artifacts.contents())
+    assert artifacts.evict(a)
+
+
+def test_version_changes_with_reported_contents(make_cache):
+    """Test the version only moves when what is reported changes."""
+    artifacts, (a,) = make_cache(_blobs(1))
+    artifacts.fetch(a)
+    version = artifacts.version
+
+    artifacts.get(a)
+    assert artifacts.version == version
+
+    artifacts.pin(a)
+    assert artifacts.version > version
+
+
+def test_index_survives_restart(make_cache, tmp_path):
+    """Test a new cache picks up held artifacts and removes unknown files."""
+    artifacts, (a, b) = make_cache(_blobs(2))
+    artifacts.fetch(a)
+    artifacts.get(a)
+    artifacts.flush()
+    stray = tmp_path / "artifacts" / "sha256" / ("0" * 64)
+    stray.write_bytes(b"left over")
+
+    restarted, _ = make_cache([artifacts.fetcher.blobs[a]])
+
+    (item,) = restarted.contents()
+    assert item["digest"] == a and item["uses"] == 2 and item["complete"]
+    # Registered with the store again, so it is served to peers
+    assert restarted.store.get(a).complete
+    assert not stray.exists()
+    assert restarted.fetcher.fetched == []
+
+
+def test_usage_written_only_on_flush(make_cache, tmp_path):
+    """Test cache hits leave the index alone until it is flushed."""
+    artifacts, (a,) = make_cache(_blobs(1))
+    artifacts.fetch(a)
+    index = tmp_path / "artifacts" / cache.INDEX_FILE
+    written = index.read_text()
+
+    for _ in range(3):
+        artifacts.get(a)
+    assert index.read_text() == written
+
+    assert artifacts.flush()
+    assert json.loads(index.read_text())[a]["uses"] == 4
+    assert not artifacts.flush()
+
+
+def test_unknown_policy_rejected(tmp_path):
+    """Test a misspelt eviction policy fails at startup."""
+    with pytest.raises(ValueError):
+        cache.ArtifactCache(peers.ArtifactStore(str(tmp_path)), policy="fifo")
@@ -0,0 +1,79 @@
+"""Unit tests for compressed agent request bodies."""
+import gzip
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# Import compression module
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import agent
+import compression
+
+
+@pytest.fixture(autouse=True)
+def reset_encoding(monkeypatch):
+    """Start every test with JSON heartbeats and no negotiated coding."""
+    monkeypatch.setattr(agent, "request_encoding", None)
+    monkeypatch.setattr(agent, "heartbeat_format", "json")
+    monkeypatch.setattr(compression, "COMPRESS_MIN_BYTES", 0)
+
+
+def _response(status_code, accept_encoding=None, json_body=None):
+    response = MagicMock(status_code=status_code)
+    response.headers = {"Accept-Encoding": accept_encoding} if accept_encoding else {}
+    response.json.return_value = json_body or {}
+    return response
+
+
+def test_negotiate_uses_common_coding(monkeypatch):
+    """Test the agent picks a coding the control plane advertised."""
+    assert compression.negotiate(None) is None
+    assert compression.negotiate("br") is None
+    assert compression.negotiate("zstd, gzip") == compression.SUPPORTED_ENCODINGS[0]
+    assert compression.negotiate("gzip") == "gzip"
+
+    monkeypatch.setattr(compression, "COMPRESS_REQUESTS", "off")
+    assert compression.negotiate("gzip") is None
+
+
+def test_small_bodies_are_not_compressed(monkeypatch):
+    """Test bodies below the threshold are sent as plain JSON."""
+    monkeypatch.setattr(compression, "COMPRESS_MIN_BYTES", 1024)
+
+    body, headers = compression.encode_json({"cpu_usage": 1.0}, "gzip")
+
+    assert json.loads(body) == {"cpu_usage": 1.0}
+    assert "Content-Encoding" not in headers
+
+
+def test_heartbeats_compressed_after_registration_advertises_support():
+    """Test registration is plain JSON and later heartbeats are gzip-compressed."""
+    with patch('agent.requests.post') as mock_post:
+        mock_post.return_value = _response(
+            201, "gzip", {"node_id": "n1", "node_token": "tok"}
+        )
+        agent.register({"os": "linux"})
+        assert "json" in mock_post.call_args.kwargs
+
+        mock_post.return_value = _response(200, "gzip")
+        assert agent.send_heartbeat("n1", "tok", {"cpu_usage": 5.0})
+
+    kwargs = mock_post.call_args.kwargs
+    assert kwargs["headers"]["Content-Encoding"] == "gzip"
+    assert kwargs["headers"]["Authorization"] == "Bearer tok"
+    assert json.loads(gzip.decompress(kwargs["data"])) == {"cpu_usage": 5.0}
+
+
+def test_unsupported_coding_falls_back_to_plain_json(monkeypatch):
+    """Test a 415 disables compression and resends the body uncompressed."""
+    monkeypatch.setattr(agent, "request_encoding", "gzip")
+    with patch('agent.requests.post') as mock_post:
+        mock_post.side_effect = [_response(415), _response(200)]
+
+        assert agent.send_heartbeat("n1", "tok", {"cpu_usage": 5.0})
+
+    assert mock_post.call_args.kwargs["json"] == {"cpu_usage": 5.0}
+    assert agent.request_encoding is None
@@ -0,0 +1,335 @@
+"""Unit tests for the inference worker pool and engine."""
+import contextlib
+import http.server
+import itertools
+import json
+import os
+import pickle
+import threading
+import time
+
+import pytest
+
+# Import engine module
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import engine
+
+# Models are unpickled in the workers, so loads are counted per worker
+_loads = itertools.count(1)
+
+
+class LoadCounter:
+    """Answers every input with how many models its worker had loaded before it."""
+
+    def __init__(self):
+        self.load = 0
+
+    def __setstate__(self, state):
+        self.load = next(_loads)
+
+    def predict(self, rows):
+        return [self.load for _ in rows]
+
+
+class WhoAmI:
+    def predict(self, rows):
+        return [os.getpid() for _ in rows]
+
+
+class SlowWhoAmI:
+    def predict(self, rows):
+        time.sleep(0.3)
+        return [os.getpid() for _ in rows]
+
+
+class Picky:
+    def predict(self, rows):
+        if any(row < 0 for row in rows):
+            raise ValueError("negative input")
+        return [row * 2 for row in rows]
+
+
+class Weights:
+    """A buffer pickled out-of-band, as NumPy arrays are."""
+
+    def __init__(self, data):
+        self.data = memoryview(data)
+
+    def __reduce_ex__(self, protocol):
+        if protocol >= 5:
+            return Weights, (pickle.PickleBuffer(self.data),)
+        return Weights, (bytes(self.data),)
+
+
+class MappedModel:
+    """Answers with its worker and whether its weights are mapped from a shared file."""
+
+    def __init__(self, size, delay=0.0):
+        self.weights = Weights(bytearray(size))
+        self.delay = delay
+
+    def predict(self, rows):
+        time.sleep(self.delay)
+        mapped = type(self.weights.data.obj).__name__ == "mmap"
+        return [(os.getpid(), mapped) for _ in rows]
+
+
+class Crasher:
+    def predict(self, rows):
+        os._exit(1)
+
+
+@pytest.fixture
+def model_file(tmp_path):
+    def make(model):
+        path = tmp_path / f"{type(model).__name__}-{len(os.listdir(tmp_path))}.pkl"
+        path.write_bytes(pickle.dumps(model))
+        return str(path)
+    return make
+
+
+@pytest.fixture
+def make_pool(monkeypatch):
+    pools = []
+
+    def make(workers=1, cores=1, **kwargs):
+        monkeypatch.setattr(os, "cpu_count", lambda: cores)
+        pool = engine.WorkerPool(workers, **kwargs)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+def test_workers_bounded_by_cores(monkeypatch):
+    """Test there is at least one worker and never more than cores."""
+    monkeypatch.setattr(os, "cpu_count", lambda: 4)
+
+    assert engine.bounded_workers(64) == 4
+    assert engine.bounded_workers(2) == 2
+    assert engine.bounded_workers(0) == 1
+
+
+def test_models_stay_loaded(make_pool, model_file):
+    """Test a model is loaded once per worker, and least recently used models go first."""
+    a, b = model_file(LoadCounter()), model_file(LoadCounter())
+    # Attaching shared weights unpickles the model again, so count artifact reads only
+    warm = make_pool(models_per_worker=2, share_weights=False)
+    cold = make_pool(models_per_worker=1, share_weights=False)
+
+    def loads(pool):
+        return [pool.run(key, path, "sklearn", [None])[0]
+                for key, path in (("a", a), ("a", a), ("b", b), ("a", a))]
+
+    assert loads(warm) == [1, 1, 2, 1]
+    assert loads(cold) == [1, 1, 2, 3]
+    assert warm.loaded() == ["a", "b"] and cold.loaded() == ["a"]
+
+
+def test_batches_go_to_worker_with_model_loaded(make_pool, model_file):
+    """Test a free worker with the model loaded is preferred over loading it again."""
+    pool = make_pool(workers=3, cores=3)
+    path = model_file(WhoAmI())
+
+    pids = {pool.run("m", path, "sklearn", [1, 2])[0] for _ in range(5)}
+
+    assert len(pids) == 1
+
+
+def test_busy_model_spreads_over_workers(make_pool, model_file):
+    """Test concurrent batches of one model run on several workers at once."""
+    pool = make_pool(workers=2, cores=2)
+    path = model_file(SlowWhoAmI())
+    pool.run("m", path, "sklearn", [0])
+    pids = set()
+
+    def run():
+        pids.update(pool.run("m", path, "sklearn", [0]))
+
+    threads = [threading.Thread(target=run) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+
+    assert len(pids) == 2
+
+
+def test_model_errors_and_crashes(make_pool, model_file):
+    """Test model errors are raised, and a crashed worker is replaced."""
+    pool = make_pool()
+
+    with pytest.raises(engine.ModelError, match="negative input"):
+        pool.run("picky", model_file(Picky()), "sklearn", [1, -1])
+    with pytest.raises(engine.ModelError, match="No loader"):
+        pool.run("other", model_file(Picky()), "tensorflow", [1])
+    with pytest.raises(engine.WorkerCrashed):
+        pool.run("crash", model_file(Crasher()), "sklearn", [1])
+
+    assert pool.run("picky", model_file(Picky()), "sklearn", [3]) == [6]
+
+
+def test_workers_share_weights(make_pool, model_file):
+    """Test workers map one exported copy of a model, without reading its artifact again."""
+    pool = make_pool(workers=2, cores=2)
+    path = model_file(MappedModel(1024 * 1024, delay=0.3))
+    [(_, mapped)] = pool.run("m", path, "sklearn", [0])
+    assert mapped
+    os.remove(path)
+
+    outcomes = []
+    threads = [threading.Thread(target=lambda: outcomes.extend(pool.run("m", path, "sklearn", [0])))
+               for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+
+    assert len({pid for pid, _ in outcomes}) == 2
+    assert all(mapped for _, mapped in outcomes)
+    assert len(os.listdir(pool.shared_dir)) == 1
+
+
+def test_weights_files_follow_loaded_models(make_pool, model_file):
+    """Test a model's weights file goes once no worker has it loaded, and with the pool."""
+    pool = make_pool(models_per_worker=1)
+    a, b = model_file(MappedModel(16)), model_file(MappedModel(16))
+
+    pool.run("a", a, "sklearn", [0])
+    pool.run("b", b, "sklearn", [0])
+
+    assert os.listdir(pool.shared_dir) == [engine.weights.shared_name(b)]
+    pool.close()
+    assert not os.path.exists(pool.shared_dir)
+
+
+def test_unshared_weights_are_copies(make_pool, model_file):
+    """Test weights are read by each worker when sharing is off."""
+    pool = make_pool(share_weights=False)
+
+    assert pool.run("m", model_file(MappedModel(16)), "sklearn", [0])[0][1] is False
+    assert pool.shared_dir is None
+
+
+class FakeControlPlane(http.server.ThreadingHTTPServer):
+    """Inference batch endpoints of the control plane, handing out one batch."""
+
+    def __init__(self, batch):
+        super().__init__(("127.0.0.1", 0), _FakeHandler)
+        self.daemon_threads = True
+        self.batches = [batch]
+        self.results = {}
+        self.tokens = set()
+        self.returned = threading.Event()
+        self.polling = 0
+        self.most_polling = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _FakeHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        cp = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        cp.tokens.add(self.headers["Authorization"])
+        if self.path.endswith("/results"):
+            cp.results[self.path.split("/")[-2]] = body["results"]
+            cp.returned.set()
+            self._send(204)
+        elif cp.batches:
+            self._send(200, json.dumps(cp.batches.pop()).encode())
+        else:
+            with cp.lock:
+                cp.polling += 1
+                cp.most_polling = max(cp.most_polling, cp.polling)
+            time.sleep(body["wait"])
+            with cp.lock:
+                cp.polling -= 1
+            self._send(204)
+
+    def _send(self, status, body=b""):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeCache:
+    def __init__(self, paths):
+        self.paths = paths
+
+    @contextlib.contextmanager
+    def use(self, digest):
+        yield self.paths[digest]
+
+
+def test_engine_runs_batches_from_control_plane(make_pool, model_file):
+    """Test batches are taken, run and returned, a bad input failing only its own request."""
+    server = FakeControlPlane({
+        "batch_id": "b1", "model_id": "m1", "digest": "sha256:aa", "framework": "sklearn",
+        "lease_seconds": 60,
+        "requests": [{"request_id": f"r{i}", "input_data": x, "parameters": {}}
+                     for i, x in enumerate([1, -1, 2])],
+    })
+    threading.Thread(target=server.serve_forever, args=(0.1,), daemon=True).start()
+    inference_engine = engine.InferenceEngine(
+        server.url, "token-1", FakeCache({"sha256:aa": model_file(Picky())}),
+        make_pool(), wait=0.05,
+    )
+    try:
+        inference_engine.start()
+        assert server.returned.wait(30)
+    finally:
+        inference_engine.stop()
+        server.shutdown()
+        server.server_close()
+
+    assert server.results["b1"] == [
+        {"request_id": "r0", "result": 2},
+        {"request_id": "r1", "error": "ValueError: negative input"},
+        {"request_id": "r2", "result": 4},
+    ]
+    assert server.tokens == {"Bearer token-1"}
+    assert inference_engine.summary() == {"loaded": ["sha256:aa"], "workers": 1, "busy": 0, "queued": 0}
+
+
+def test_engine_holds_one_poll(make_pool):
+    """Test an engine with several free workers waits for batches with a single request."""
+    server = FakeControlPlane(None)
+    server.batches = []
+    threading.Thread(target=server.serve_forever, args=(0.1,), daemon=True).start()
+    inference_engine = engine.InferenceEngine(
+        server.url, "token-1", FakeCache({}), make_pool(workers=3, cores=3), wait=0.1,
+    )
+    try:
+        inference_engine.start()
+        time.sleep(0.5)
+    finally:
+        inference_engine.stop()
+        server.shutdown()
+        server.server_close()
+
+    assert server.most_polling == 1
+
+
+def test_engine_fails_batch_without_artifact(make_pool):
+    """Test a model without an artifact fails its requests instead of leaving them leased."""
+    inference_engine = engine.InferenceEngine("http://unused", "t", FakeCache({}), make_pool())
+
+    results = inference_engine.run_batch({
+        "batch_id": "b", "model_id": "m", "digest": "", "framework": "sklearn",
+        "requests": [{"request_id": "r", "input_data": 1}],
+    })
+
+    assert results == [{"request_id": "r", "error": "Model has no artifact"}]
@@ -0,0 +1,136 @@
+"""Unit tests for the simulated agent fleet."""
+import asyncio
+import json
+
+import httpx
+
+# Import fleet simulator module
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import fleet_sim
+
+
+class FakeControlPlane:
+    """Minimal in-process control plane speaking the agent protocol."""
+
+    def __init__(self, fail_registrations=0):
+        self.nodes = {}
+        self.heartbeats = 0
+        self.registrations = 0
+        self.fail_registrations = fail_registrations
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path == fleet_sim.REGISTER_PATH:
+            self.registrations += 1
+            if self.fail_registrations > 0:
+                self.fail_registrations -= 1
+                return httpx.Response(503)
+            body = json.loads(request.content)
+            node_id = f"id-{body['name']}"
+            self.nodes[node_id] = f"token-{node_id}"
+            return httpx.Response(201, json={
+                "node_id": node_id,
+                "node_token": self.nodes[node_id],
+                "control_plane_url": "http://test",
+            })
+
+        node_id = request.url.path.split("/")[-2]
+        if request.headers.get("Authorization") != f"Bearer {self.nodes.get(node_id)}":
+            return httpx.Response(401)
+        self.heartbeats += 1
+        return httpx.Response(200, json={"status": "ok", "timestamp": 0})
+
+    def transport(self):
+        return httpx.MockTransport(self.handler)
+
+
+def _run(fake, **kwargs):
+    """Run a short simulation against a fake control plane."""
+    options = dict(
+        agents=20, duration=0.3, interval=0.05, jitter=0.2,
+        backoff_base=0.01, backoff_cap=0.05,
+    )
+    options.update(kwargs)
+    sim = fleet_sim.FleetSimulator(
+        control_plane_url="http://test", transport=fake.transport(), **options
+    )
+    return asyncio.run(sim.run())
+
+
+def test_percentile_nearest_rank():
+    """Test percentile uses the nearest-rank method."""
+    values = [float(i) for i in range(1, 101)]
+
+    assert fleet_sim.percentile(values, 0.5) == 50.0
+    assert fleet_sim.percentile(values, 0.99) == 99.0
+    assert fleet_sim.percentile(values, 0.999) == 100.0
+    assert fleet_sim.percentile([], 0.5) is None
+
+
+def test_fleet_registers_and_heartbeats():
+    """Test every agent registers and heartbeats are reported."""
+    fake = FakeControlPlane()
+
+    report = _run(fake)
+
+    assert len(fake.nodes) == 20
+    register = report["operations"]["register"]
+    heartbeat = report["operations"]["heartbeat"]
+    assert register["ok"] == 20
+    assert heartbeat["ok"] == fake.heartbeats > 0
+    assert heartbeat["error_rate"] == 0.0
+    assert set(heartbeat["latency_ms"]) >= {"p50", "p99", "p999", "max"}
+
+
+def test_failure_injection_is_reported():
+    """Test dropped and rejected heartbeats show up in the report."""
+    fake = FakeControlPlane()
+
+    report = _run(fake, drop_rate=0.3, bad_token_rate=0.3, seed=7)
+
+    outcomes = report["operations"]["heartbeat"]["outcomes"]
+    assert outcomes["dropped"] > 0
+    assert outcomes["401"] > 0
+    assert report["operations"]["heartbeat"]["error_rate"] > 0
+
+
+def test_registration_retried_after_failure():
+    """Test agents keep retrying registration until it succeeds."""
+    fake = FakeControlPlane(fail_registrations=5)
+
+    report = _run(fake, agents=2)
+
+    assert report["operations"]["register"]["outcomes"]["503"] == 5
+    assert len(fake.nodes) == 2
+
+
+def test_repeated_failures_trigger_reregistration():
+    """Test agents re-register after consecutive heartbeat failures."""
+    fake = FakeControlPlane()
+
+    report = _run(fake, agents=2, bad_token_rate=1.0, duration=0.5, jitter=0)
+
+    assert report["operations"]["agent"]["outcomes"]["reregistered"] >= 1
+    assert fake.registrations > 2
+
+
+def test_main_writes_report(tmp_path, monkeypatch):
+    """Test the CLI writes a JSON report with run configuration."""
+    fake = FakeControlPlane()
+    original = fleet_sim.FleetSimulator.__init__
+
+    def init_with_transport(self, *args, **kwargs):
+        original(self, *args, transport=fake.transport(), **kwargs)
+
+    monkeypatch.setattr(fleet_sim.FleetSimulator, "__init__", init_with_transport)
+    output = tmp_path / "report.json"
+
+    fleet_sim.main([
+        "--agents", "3", "--duration", "0.2", "--interval", "0.05",
+        "--output", str(output),
+    ])
+
+    report = json.loads(output.read_text())
+    assert report["config"]["agents"] == 3
+    assert "heartbeat" in report["operations"]
@@ -0,0 +1,237 @@
+"""Unit tests for peer-assisted artifact downloads."""
+import hashlib
+import http.server
+import json
+import os
+import re
+import threading
+import time
+
+import pytest
+import requests
+
+# Import peers module
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import peers
+
+CHUNK = 16 * 1024
+
+
+class FakeControlPlane(http.server.ThreadingHTTPServer):
+    """Tracker and registry endpoints of the control plane, for one blob."""
+
+    def __init__(self, blob, registry_delay=0.0):
+        super().__init__(("127.0.0.1", 0), _FakeHandler)
+        self.daemon_threads = True
+        self.blob = blob
+        self.digest = f"sha256:{hashlib.sha256(blob).hexdigest()}"
+        self.chunks = [
+            hashlib.sha256(blob[i:i + CHUNK]).hexdigest()
+            for i in range(0, len(blob), CHUNK)
+        ]
+        self.announcements = {}
+        self.registry_bytes = 0
+        self.registry_delay = registry_delay
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _FakeHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _node(self):
+        return self.headers.get("Authorization", "").replace("Bearer ", "")
+
+    def _send(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _peers(self):
+        return [
+            {"node_id": node, "url": url, "have": have, "fetching": fetching}
+            for node, (url, have, fetching) in self.server.announcements.items()
+            if node != self._node()
+        ]
+
+    def do_GET(self):
+        cp = self.server
+        if self.path.endswith("/chunks"):
+            self._send(200, json.dumps({
+                "digest": cp.digest, "size": len(cp.blob), "chunk_size": CHUNK,
+                "chunks": cp.chunks,
+            }).encode())
+            return
+        first, last = map(int, re.match(r"bytes=(\d+)-(\d+)", self.headers["Range"]).groups())
+        time.sleep(cp.registry_delay)
+        with cp.lock:
+            cp.registry_bytes += last - first + 1
+        self._send(206, cp.blob[first:last + 1])
+
+    def do_PUT(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.announcements[self._node()] = (body["url"], body["have"], body["fetching"])
+        self._send(200, json.dumps({"digest": self.server.digest, "peers": self._peers()}).encode())
+
+    def do_DELETE(self):
+        self.server.announcements.pop(self._node(), None)
+        self._send(204)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def control_plane():
+    servers = []
+
+    def start(blob, **kwargs):
+        server = FakeControlPlane(blob, **kwargs)
+        threading.Thread(target=server.serve_forever, args=(0.1,), daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def make_agent(tmp_path):
+    servers = []
+
+    def make(cp, name, refresh_interval=0.02, store=None):
+        store = store or peers.ArtifactStore(str(tmp_path / name))
+        server = peers.PeerServer(store, port=0, host="127.0.0.1")
+        server.start()
+        servers.append(server)
+        return peers.ArtifactFetcher(
+            store, cp.url, name, f"http://127.0.0.1:{server.port}",
+            refresh_interval=refresh_interval,
+        )
+
+    yield make
+    for server in servers:
+        server.stop()
+
+
+def _blob(size):
+    return os.urandom(size)
+
+
+def test_bitfield_roundtrip():
+    """Test chunk bitfields encode and decode the same chunks."""
+    text = peers.encode_bitfield([0, 3, 9], 10)
+
+    assert peers.decode_bitfield(text, 10) == [0, 3, 9]
+
+
+def test_first_agent_fetches_from_registry(control_plane, make_agent):
+    """Test an artifact no peer holds is fetched from the registry and announced."""
+    blob = _blob(5 * CHUNK + 100)
+    cp = control_plane(blob)
+    agent = make_agent(cp, "a")
+
+    result = agent.fetch(cp.digest)
+
+    with open(result.path, "rb") as f:
+        assert f.read() == blob
+    assert result.registry_bytes == len(blob) and result.peer_bytes == 0
+    assert peers.decode_bitfield(cp.announcements["a"][1], 6) == list(range(6))
+
+
+def test_second_agent_fetches_from_peer(control_plane, make_agent):
+    """Test an artifact a peer holds does not touch the registry."""
+    blob = _blob(8 * CHUNK)
+    cp = control_plane(blob)
+    make_agent(cp, "a").fetch(cp.digest)
+    cp.registry_bytes = 0
+
+    result = make_agent(cp, "b").fetch(cp.digest)
+
+    with open(result.path, "rb") as f:
+        assert f.read() == blob
+    assert result.peer_bytes == len(blob)
+    assert cp.registry_bytes == 0
+
+
+def test_corrupt_peer_falls_back_to_registry(control_plane, make_agent):
+    """Test chunks failing their digest are fetched again from the registry."""
+    blob = _blob(4 * CHUNK)
+    cp = control_plane(blob)
+    seeder = make_agent(cp, "a")
+    path = seeder.fetch(cp.digest).path
+    with open(path, "r+b") as f:
+        f.write(b"corrupt")
+
+    result = make_agent(cp, "b").fetch(cp.digest)
+
+    with open(result.path, "rb") as f:
+        assert f.read() == blob
+    assert result.registry_bytes >= CHUNK
+
+
+def test_interrupted_fetch_resumes(control_plane, make_agent, tmp_path):
+    """Test chunks of an interrupted fetch are kept and not fetched again."""
+    blob = _blob(4 * CHUNK)
+    cp = control_plane(blob)
+    store = peers.ArtifactStore(str(tmp_path / "a"))
+    part = store.path(cp.digest) + ".part"
+    os.makedirs(os.path.dirname(part))
+    with open(part, "wb") as f:
+        f.write(blob[:2 * CHUNK] + bytes(2 * CHUNK))
+
+    result = make_agent(cp, "a", store=store).fetch(cp.digest)
+
+    with open(result.path, "rb") as f:
+        assert f.read() == blob
+    assert result.registry_bytes == 2 * CHUNK
+    assert not os.path.exists(part)
+
+
+def test_busy_peer_answers_503(control_plane, make_agent, tmp_path):
+    """Test a peer at its upload limit turns requests away."""
+    blob = _blob(CHUNK)
+    cp = control_plane(blob)
+    store = peers.ArtifactStore(str(tmp_path / "a"))
+    make_agent(cp, "a", store=store).fetch(cp.digest)
+    server = peers.PeerServer(store, port=0, host="127.0.0.1", max_uploads=0)
+    server.start()
+    try:
+        url = f"http://127.0.0.1:{server.port}/chunks/{cp.digest}/0"
+        assert requests.get(url).status_code == 503
+        assert requests.get(f"http://127.0.0.1:{server.port}/chunks/{cp.digest}/1").status_code == 404
+    finally:
+        server.stop()
+
+
+def test_concurrent_agents_share_chunks(control_plane, make_agent):
+    """Test agents fetching together take most chunks from each other."""
+    blob = _blob(64 * CHUNK)
+    cp = control_plane(blob, registry_delay=0.01)
+    agents = [make_agent(cp, f"agent-{i}") for i in range(4)]
+    results = [None] * len(agents)
+
+    def fetch(i):
+        results[i] = agents[i].fetch(cp.digest)
+
+    threads = [threading.Thread(target=fetch, args=(i,)) for i in range(len(agents))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for result in results:
+        with open(result.path, "rb") as f:
+            assert f.read() == blob
+    assert sum(r.peer_bytes for r in results) > 0
+    # Without peers this would be four full copies
+    assert cp.registry_bytes < 2 * len(blob)
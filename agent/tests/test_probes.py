@@ -0,0 +1,208 @@
+"""Unit tests for agent capability probes."""
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from unittest.mock import patch
+
+import pytest
+
+# Import probes module
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import probes
+
+
+def _write(root, path, content):
+    """Create a file in the fake host tree."""
+    full = os.path.join(root, path.lstrip("/"))
+    os.makedirs(os.path.dirname(full), exist_ok=True)
+    with open(full, "w") as f:
+        f.write(content)
+
+
+@pytest.fixture
+def fake_root(tmp_path):
+    """Fake sysfs/procfs tree with an NVIDIA GPU, an AMD GPU and a NIC."""
+    root = str(tmp_path)
+    nvidia = "/sys/bus/pci/devices/0000:01:00.0"
+    _write(root, f"{nvidia}/vendor", "0x10de\n")
+    _write(root, f"{nvidia}/class", "0x030000\n")
+    _write(
+        root,
+        "/proc/driver/nvidia/gpus/0000:01:00.0/information",
+        "Model: \t\t NVIDIA A100-SXM4-80GB\nIRQ:   \t\t 35\n",
+    )
+    amd = "/sys/bus/pci/devices/0000:02:00.0"
+    _write(root, f"{amd}/vendor", "0x1002\n")
+    _write(root, f"{amd}/class", "0x038000\n")
+    _write(root, f"{amd}/mem_info_vram_total", str(16 * 1024 ** 3))
+    nic = "/sys/bus/pci/devices/0000:03:00.0"
+    _write(root, f"{nic}/vendor", "0x8086\n")
+    _write(root, f"{nic}/class", "0x020000\n")
+    return root
+
+
+def test_probe_gpus_from_fake_sysfs(fake_root):
+    """Test GPUs are detected from PCI sysfs and NVIDIA procfs."""
+    gpus = probes.probe_gpus(fake_root)["gpus"]
+
+    assert gpus == [
+        {
+            "id": 0,
+            "vendor": "nvidia",
+            "pci": "0000:01:00.0",
+            "model": "NVIDIA A100-SXM4-80GB",
+        },
+        {"id": 1, "vendor": "amd", "pci": "0000:02:00.0", "mem_mb": 16384},
+    ]
+
+
+def test_probe_gpus_none(tmp_path):
+    """Test hosts without GPUs report an empty list."""
+    assert probes.probe_gpus(str(tmp_path)) == {"gpus": []}
+
+
+def test_probe_kubelet(fake_root):
+    """Test kubelet is detected from its config file."""
+    assert probes.probe_kubelet(fake_root) == {}
+
+    _write(fake_root, "/var/lib/kubelet/config.yaml", "kind: KubeletConfiguration\n")
+
+    assert probes.probe_kubelet(fake_root)["k8s"]["available"] is True
+
+
+def test_probe_docker_over_unix_socket():
+    """Test the Docker version is read from the daemon socket."""
+    # AF_UNIX paths are length-limited, so keep the tree short
+    root = tempfile.mkdtemp(prefix="pr")
+    path = os.path.join(root, "var/run/docker.sock")
+    os.makedirs(os.path.dirname(path))
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(1)
+
+    def serve():
+        conn, _ = server.accept()
+        conn.recv(4096)
+        body = json.dumps({"Version": "24.0.7", "ApiVersion": "1.43"}).encode()
+        conn.sendall(b"HTTP/1.0 200 OK\r\nContent-Type: application/json\r\n\r\n" + body)
+        conn.close()
+
+    thread = threading.Thread(target=serve)
+    thread.start()
+    try:
+        result = probes.probe_docker(root)
+    finally:
+        thread.join()
+        server.close()
+
+    assert result == {
+        "docker": {"available": True, "version": "24.0.7", "api_version": "1.43"}
+    }
+
+
+def test_probe_docker_absent(tmp_path):
+    """Test no Docker field is reported without a daemon socket."""
+    assert probes.probe_docker(str(tmp_path)) == {}
+
+
+def test_probe_disks_reports_ssd_from_parent_disk(tmp_path):
+    """Test disks are reported with total size and SSD detection."""
+    root = str(tmp_path)
+    _write(root, "/sys/class/block/sda/queue/rotational", "0\n")
+    os.makedirs(os.path.join(root, "sys/class/block/sda/sda1"))
+    Partition = namedtuple("Partition", "device mountpoint fstype")
+    Usage = namedtuple("Usage", "total")
+
+    with patch("probes.psutil.disk_partitions",
+               return_value=[Partition("/dev/sda1", "/", "ext4")]), \
+         patch("probes.psutil.disk_usage", return_value=Usage(2 * 1024 ** 3)):
+        # Partition dirs live under the parent disk, as in real sysfs
+        os.symlink(
+            os.path.join(root, "sys/class/block/sda/sda1"),
+            os.path.join(root, "sys/class/block/sda1"),
+        )
+        result = probes.probe_disks(root)
+
+    assert result["disk_mb"] == 2048
+    assert result["disks"] == [
+        {"mountpoint": "/", "fstype": "ext4", "total_mb": 2048, "ssd": True}
+    ]
+
+
+def test_run_probes_merges_and_skips_failures():
+    """Test probe results are merged and failing probes are skipped."""
+    def failing(root):
+        raise RuntimeError("boom")
+
+    selected = [
+        probes.Probe("a", lambda root: {"a": 1}, timeout=1.0),
+        probes.Probe("fail", failing, timeout=1.0),
+        probes.Probe("b", lambda root: {"b": root}, timeout=1.0),
+    ]
+
+    assert probes.run_probes(selected, root="/fake") == {"a": 1, "b": "/fake"}
+
+
+def test_run_probes_runs_concurrently_with_timeouts():
+    """Test probes run in parallel and slow probes are abandoned."""
+    release = threading.Event()
+
+    def slow(root):
+        time.sleep(0.2)
+        return {"slow": True}
+
+    def hung(root):
+        release.wait(5)
+        return {"hung": True}
+
+    selected = [
+        probes.Probe(f"slow{i}", slow, timeout=1.0) for i in range(3)
+    ] + [probes.Probe("hung", hung, timeout=0.3)]
+
+    start = time.monotonic()
+    try:
+        result = probes.run_probes(selected)
+    finally:
+        release.set()
+
+    assert result == {"slow": True}
+    assert time.monotonic() - start < 0.6
+
+
+def test_fingerprint_is_stable_and_content_sensitive():
+    """Test the fingerprint ignores key order and its own field."""
+    caps = {"os": "linux", "gpus": [{"id": 0}], "cpu_count": 8}
+    reordered = {"cpu_count": 8, "gpus": [{"id": 0}], "os": "linux"}
+
+    assert probes.fingerprint(caps) == probes.fingerprint(reordered)
+    assert probes.fingerprint(caps) == probes.fingerprint(
+        dict(caps, fingerprint="old")
+    )
+    assert probes.fingerprint(caps) != probes.fingerprint(dict(caps, cpu_count=16))
+
+
+def test_probe_decorator_registers_probe():
+    """Test the probe decorator adds a probe to the registry."""
+    with patch.object(probes, "PROBES", []):
+        @probes.probe("custom", timeout=0.5)
+        def probe_custom(root):
+            return {"custom": True}
+
+        assert [(p.name, p.timeout) for p in probes.PROBES] == [("custom", 0.5)]
+        assert probes.run_probes() == {"custom": True}
+
+
+def test_get_capabilities_merges_probes_and_fingerprint():
+    """Test agent capabilities include probe results and a fingerprint."""
+    import agent
+
+    with patch("agent.probes.run_probes", return_value={"gpus": [{"id": 0}]}):
+        capabilities = agent.get_capabilities()
+
+    assert capabilities["gpus"] == [{"id": 0}]
+    assert capabilities["fingerprint"] == probes.fingerprint(capabilities)
@@ -0,0 +1,117 @@
+"""Unit tests for the on-disk metric spool and replay."""
+import gzip
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# Import spool module
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import agent
+import spool
+
+
+def _open(tmp_path, max_bytes=4096):
+    return spool.MetricSpool(
+        str(tmp_path / "metrics.spool"), max_bytes=max_bytes, fsync=False
+    )
+
+
+def test_samples_are_returned_oldest_first(tmp_path):
+    """Test peek and consume work in append order."""
+    s = _open(tmp_path)
+    for i in range(5):
+        s.append({"i": i})
+
+    assert [x["i"] for x in s.peek(3)] == [0, 1, 2]
+    s.consume(2)
+    assert len(s) == 3
+    assert [x["i"] for x in s.peek(10)] == [2, 3, 4]
+
+
+def test_spool_survives_reopen(tmp_path):
+    """Test spooled samples persist across agent restarts."""
+    s = _open(tmp_path)
+    for i in range(3):
+        s.append({"i": i})
+    s.consume(1)
+    s.close()
+
+    reopened = _open(tmp_path)
+
+    assert [x["i"] for x in reopened.peek(10)] == [1, 2]
+
+
+def test_full_ring_overwrites_oldest_samples(tmp_path):
+    """Test the spool stays bounded by dropping the oldest samples."""
+    s = _open(tmp_path, max_bytes=256)
+    for i in range(100):
+        s.append({"i": i, "pad": "x" * 20})
+
+    samples = s.peek(100)
+    assert os.path.getsize(s.path) == spool._HEADER.size + 256
+    assert samples[-1]["i"] == 99
+    assert [x["i"] for x in samples] == list(range(100 - len(samples), 100))
+    assert s.dropped == 100 - len(samples)
+
+
+def test_oversized_sample_rejected(tmp_path):
+    """Test a sample larger than the ring is rejected."""
+    with pytest.raises(ValueError):
+        _open(tmp_path, max_bytes=64).append({"pad": "x" * 100})
+
+
+def test_corrupted_spool_is_reset(tmp_path):
+    """Test a record failing its checksum discards the spool."""
+    s = _open(tmp_path)
+    s.append({"i": 0})
+    with open(s.path, "r+b") as f:
+        f.seek(spool._HEADER.size + spool._RECORD.size)
+        f.write(b"X")
+
+    assert s.peek(10) == []
+    assert len(s) == 0
+
+
+def test_replay_is_batched_and_rate_limited(tmp_path):
+    """Test replay sends batches and sleeps to respect the rate."""
+    s = _open(tmp_path)
+    for i in range(10):
+        s.append({"i": i})
+    batches, sleeps = [], []
+
+    replayed = spool.replay(
+        s, lambda b: batches.append(b) or True, budget=10,
+        batch_size=4, rate=8, sleep=sleeps.append,
+    )
+
+    assert replayed == 10
+    assert [len(b) for b in batches] == [4, 4, 2]
+    assert sleeps == [0.5, 0.5]
+    assert len(s) == 0
+
+
+def test_failed_batch_stays_spooled(tmp_path):
+    """Test samples are only removed once their batch is sent."""
+    s = _open(tmp_path)
+    for i in range(3):
+        s.append({"i": i})
+
+    assert spool.replay(s, lambda b: False, budget=10) == 0
+    assert len(s) == 3
+
+
+def test_send_metric_batch_posts_gzip_ndjson():
+    """Test replayed batches are sent as gzip-compressed NDJSON."""
+    with patch('agent.requests.post') as mock_post:
+        mock_post.return_value = MagicMock(status_code=200)
+
+        assert agent.send_metric_batch("n1", "tok", [{"i": 0}, {"i": 1}])
+
+    kwargs = mock_post.call_args.kwargs
+    assert mock_post.call_args.args[0].endswith("/api/v1/nodes/n1/metrics")
+    assert kwargs["headers"]["Content-Encoding"] == "gzip"
+    lines = gzip.decompress(kwargs["data"]).decode().splitlines()
+    assert [json.loads(line) for line in lines] == [{"i": 0}, {"i": 1}]
@@ -0,0 +1,76 @@
+"""Unit tests for model weights shared through memory-mapped files."""
+import mmap
+import os
+import pickle
+
+import pytest
+
+# Import weights module
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import weights
+
+
+class Weights:
+    """A buffer pickled out-of-band, as NumPy arrays are."""
+
+    def __init__(self, data):
+        self.data = memoryview(data)
+
+    def __reduce_ex__(self, protocol):
+        if protocol >= 5:
+            return Weights, (pickle.PickleBuffer(self.data),)
+        return Weights, (bytes(self.data),)
+
+
+class Model:
+    def __init__(self, *layers):
+        self.name = "net"
+        self.layers = [Weights(bytearray(layer)) for layer in layers]
+
+
+def test_attached_weights_are_mapped_not_copied(tmp_path):
+    """Test buffers come back as aligned read-only views of the mapped file."""
+    path = str(tmp_path / "model.weights")
+    weights.export(Model(b"a" * 1000, b"b" * 3), path)
+
+    model = weights.attach(path)
+
+    assert model.name == "net"
+    assert [bytes(layer.data) for layer in model.layers] == [b"a" * 1000, b"b" * 3]
+    for layer in model.layers:
+        assert isinstance(layer.data.obj, mmap.mmap) and layer.data.readonly
+    with open(path, "rb") as f:
+        content = f.read()
+    assert content.index(b"a" * 1000) % weights.ALIGNMENT == 0
+    assert content.index(b"bbb") % weights.ALIGNMENT == 0
+
+
+def test_load_shared_reads_artifact_once(tmp_path):
+    """Test the artifact is read and exported by the first load only."""
+    artifact = tmp_path / "artifact.pkl"
+    artifact.write_bytes(pickle.dumps(Model(b"x" * 100)))
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    reads = []
+
+    def read(path):
+        reads.append(path)
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    first = weights.load_shared(str(artifact), read, str(shared))
+    second = weights.load_shared(str(artifact), read, str(shared))
+
+    assert reads == [str(artifact)]
+    assert os.listdir(shared) == [weights.shared_name(str(artifact))]
+    assert bytes(first.layers[0].data) == bytes(second.layers[0].data) == b"x" * 100
+
+
+def test_attach_rejects_other_files(tmp_path):
+    """Test a file that is not a weights file is refused."""
+    path = tmp_path / "model.pkl"
+    path.write_bytes(pickle.dumps(Model(b"x")))
+
+    with pytest.raises(ValueError):
+        weights.attach(str(path))
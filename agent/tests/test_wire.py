@@ -0,0 +1,72 @@
+"""Unit tests for binary heartbeats."""
+import struct
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# Import wire module
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import agent
+import wire
+
+SAMPLE = {
+    "timestamp": 1700000000.5,
+    "cpu_usage": 25.5,
+    "mem_usage": 60.25,
+    "disk_free_mb": 450000,
+    "running_containers": ["web", "db"],
+}
+
+
+@pytest.fixture(autouse=True)
+def binary_heartbeats(monkeypatch):
+    """Start every test sending binary heartbeats."""
+    monkeypatch.setattr(agent, "heartbeat_format", "binary")
+    monkeypatch.setattr(agent, "request_encoding", None)
+
+
+def test_encode_heartbeat_layout():
+    """Test the fixed header and NUL-separated container names."""
+    data = wire.encode_heartbeat(SAMPLE)
+
+    assert struct.unpack_from(">BBdffQH", data) == (1, 1, 1700000000.5, 25.5, 60.25, 450000, 6)
+    assert data[28:] == b"web\x00db"
+    assert len(wire.encode_heartbeat({})) == 28
+
+
+def test_encode_inference_section():
+    """Test engine state is appended as version 2, digests as raw bytes."""
+    digest = "sha256:" + "ab" * 32
+    data = wire.encode_heartbeat({**SAMPLE, "inference": {
+        "loaded": [digest, "md5:ignored"], "workers": 4, "busy": 1, "queued": 12,
+    }})
+
+    assert struct.unpack_from(">BB", data) == (2, 3)
+    assert struct.unpack_from(">HHIB", data, 34) == (4, 1, 12, 1)
+    assert data[43:] == bytes.fromhex("ab" * 32)
+
+
+def test_heartbeat_sent_as_binary():
+    """Test heartbeats use the binary media type by default."""
+    with patch('agent.requests.post') as mock_post:
+        mock_post.return_value = MagicMock(status_code=200)
+
+        assert agent.send_heartbeat("n1", "tok", SAMPLE)
+
+    kwargs = mock_post.call_args.kwargs
+    assert kwargs["headers"]["Content-Type"] == wire.HEARTBEAT_MEDIA_TYPE
+    assert kwargs["headers"]["Authorization"] == "Bearer tok"
+    assert kwargs["data"] == wire.encode_heartbeat(SAMPLE)
+
+
+def test_falls_back_to_json_when_binary_rejected():
+    """Test a control plane without binary support gets JSON from then on."""
+    with patch('agent.requests.post') as mock_post:
+        mock_post.side_effect = [MagicMock(status_code=422), MagicMock(status_code=200)]
+
+        assert agent.send_heartbeat("n1", "tok", SAMPLE)
+
+    assert mock_post.call_args.kwargs["json"] == SAMPLE
+    assert agent.heartbeat_format == "json"
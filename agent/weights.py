@@ -0,0 +1,120 @@
+"""Model weights shared between inference workers through memory-mapped files.
+
+Every inference worker (``engine.py``) that loads a model would otherwise
+hold its own copy of the model's weights, so memory grows with the number
+of workers. Instead, the first worker to load a model exports it to a
+weights file in a directory shared by the pool (in ``/dev/shm`` where
+available), and every worker, the first included, maps that file read-only.
+The operating system keeps one copy of the file's pages however many
+workers map it, and a worker loading a model that has already been exported
+only maps the file instead of reading and deserializing the artifact, which
+takes milliseconds.
+
+A weights file is the model pickled with protocol 5, its large buffers
+written out-of-band after the pickle stream, aligned to 64 bytes. NumPy
+arrays (and so scikit-learn estimators and most models built on NumPy) are
+pickled out-of-band, so once attached they are read-only views into the
+mapped file rather than copies. Models that write to their weights while
+predicting cannot be shared; set ``ENGINE_SHARE_WEIGHTS=0`` for them.
+
+Layout::
+
+    MAGIC | buffer | pad | buffer | pad | ... | trailer | trailer offset (u64)
+
+where the trailer is a pickle of the stream and the (offset, length) of
+each buffer.
+"""
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import tempfile
+from typing import Any, Callable
+
+MAGIC = b"MIAASWT1"
+
+ALIGNMENT = 64
+
+_OFFSET = struct.Struct("<Q")
+
+
+def shared_name(path: str) -> str:
+    """Name of the weights file of the model in the artifact at ``path``."""
+    return hashlib.sha256(os.path.realpath(path).encode()).hexdigest()[:32] + ".weights"
+
+
+def export(model: Any, path: str) -> int:
+    """Write a model to a weights file, atomically.
+
+    Args:
+        model: Any picklable model
+        path: Weights file to write
+
+    Returns:
+        Bytes written
+    """
+    buffers = []
+    stream = pickle.dumps(model, protocol=5, buffer_callback=buffers.append)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC)
+            table = []
+            for buffer in buffers:
+                offset = -f.tell() % ALIGNMENT
+                f.write(b"\0" * offset)
+                raw = buffer.raw()
+                table.append((f.tell(), raw.nbytes))
+                f.write(raw)
+            trailer = f.tell()
+            f.write(pickle.dumps((stream, table), protocol=5))
+            f.write(_OFFSET.pack(trailer))
+            size = f.tell()
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return size
+
+
+def attach(path: str) -> Any:
+    """Load a model from a weights file, its buffers mapped rather than read.
+
+    Raises:
+        ValueError: If ``path`` is not a weights file
+    """
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapped[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a weights file")
+    view = memoryview(mapped)
+    (trailer,) = _OFFSET.unpack_from(mapped, len(mapped) - _OFFSET.size)
+    stream, table = pickle.loads(view[trailer:len(mapped) - _OFFSET.size])
+    # The buffers keep the mapping alive for as long as the model uses them
+    return pickle.loads(stream, buffers=[view[offset:offset + length] for offset, length in table])
+
+
+def load_shared(path: str, read: Callable[[str], Any], directory: str) -> Any:
+    """Load the model in the artifact at ``path`` through a shared weights file.
+
+    The weights file in ``directory`` is attached if another worker already
+    exported it. Otherwise the model is read with ``read(path)`` and
+    exported first; workers exporting the same model at once each write a
+    whole file and the last one wins.
+
+    Args:
+        path: Model artifact
+        read: Loads the model from the artifact
+        directory: Directory shared by the workers
+
+    Returns:
+        The model, its weights mapped from the shared file
+    """
+    shared = os.path.join(directory, shared_name(path))
+    try:
+        return attach(shared)
+    except FileNotFoundError:
+        pass
+    export(read(path), shared)
+    return attach(shared)
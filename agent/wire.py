@@ -0,0 +1,59 @@
+"""Binary heartbeat encoding, mirroring the control plane's ``app/wire.py``
+
+Heartbeats are sent as a 28-byte fixed struct plus container names under
+the ``application/vnd.miaas.heartbeat`` media type instead of JSON. Samples
+carrying inference engine state are sent as version 2, with the engine's
+loaded model digests appended; others as version 1. See the control plane
+module for the layout.
+"""
+import os
+import struct
+
+# "binary" to send heartbeats in the binary wire format, "json" for JSON
+HEARTBEAT_FORMAT = os.environ.get("HEARTBEAT_FORMAT", "binary").lower()
+
+HEARTBEAT_MEDIA_TYPE = "application/vnd.miaas.heartbeat"
+
+HEARTBEAT_VERSION = 2
+
+_HEADER = struct.Struct(">BBdffQH")
+_INFERENCE = struct.Struct(">HHIB")
+_HAS_TIMESTAMP = 0x01
+_HAS_INFERENCE = 0x02
+_DIGEST_PREFIX = "sha256:"
+_MAX_LOADED = 255
+
+
+def encode_heartbeat(sample):
+    """Encode a ``collect_metrics()`` sample in the binary wire format
+
+    Loaded models whose digests are not SHA-256 are left out, and only the
+    first 255 are sent.
+    """
+    names = "\0".join(sample.get("running_containers", [])).encode()
+    timestamp = sample.get("timestamp")
+    flags = _HAS_TIMESTAMP if timestamp is not None else 0
+    inference = b""
+    state = sample.get("inference")
+    if state:
+        flags |= _HAS_INFERENCE
+        digests = [
+            bytes.fromhex(digest[len(_DIGEST_PREFIX):])
+            for digest in state.get("loaded", [])
+            if digest.startswith(_DIGEST_PREFIX) and len(digest) == len(_DIGEST_PREFIX) + 64
+        ][:_MAX_LOADED]
+        inference = _INFERENCE.pack(
+            state.get("workers", 0),
+            state.get("busy", 0),
+            state.get("queued", 0),
+            len(digests),
+        ) + b"".join(digests)
+    return _HEADER.pack(
+        2 if inference else 1,
+        flags,
+        timestamp or 0.0,
+        sample.get("cpu_usage", 0.0),
+        sample.get("mem_usage", 0.0),
+        sample.get("disk_free_mb", 0),
+        len(names),
+    ) + names + inference
@@ -0,0 +1,8 @@
+"""Admission control package for protecting the control plane from load spikes."""
+from .bucket import TokenBucket, admit_registration, registration_bucket
+
+__all__ = [
+    "TokenBucket",
+    "admit_registration",
+    "registration_bucket",
+]
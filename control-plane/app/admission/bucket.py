@@ -0,0 +1,115 @@
+"""Token-bucket admission control for node registration.
+
+After a control plane restart every agent re-registers within a few
+heartbeat intervals. Registrations are admitted at a steady rate from a token
+bucket; excess requests are answered with ``429 Too Many Requests`` and a
+``Retry-After`` delay chosen by the server.
+
+The delays are handed out as consecutive slots: each rejected client is told
+to come back one token interval after the previous one, so a burst of 10k
+registrations is spread evenly over ``10000 / rate`` seconds instead of
+every client retrying at the same moment.
+"""
+import math
+import os
+import threading
+import time
+from typing import Callable
+
+from fastapi import HTTPException
+
+from app.metrics.instruments import NODE_REGISTRATIONS, REGISTRATION_RETRY_AFTER
+
+# Sustained registrations per second; 0 disables admission control
+REGISTRATION_RATE = float(os.environ.get("REGISTRATION_RATE", "50"))
+
+# Registrations admitted back to back before throttling starts
+REGISTRATION_BURST = float(os.environ.get("REGISTRATION_BURST", "100"))
+
+# Upper bound on the Retry-After delay handed to a client, in seconds
+REGISTRATION_MAX_RETRY_AFTER = float(
+    os.environ.get("REGISTRATION_MAX_RETRY_AFTER", "300")
+)
+
+
+class TokenBucket:
+    """Thread-safe token bucket that schedules rejected requests.
+
+    Example:
+        >>> bucket = TokenBucket(rate=50, burst=100)
+        >>> delay = bucket.reserve()
+        >>> if delay: ...  # reject, ask the client to retry after ``delay``
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        max_delay: float = REGISTRATION_MAX_RETRY_AFTER,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Initialize a full bucket.
+
+        Args:
+            rate: Tokens added per second
+            burst: Bucket capacity
+            max_delay: Upper bound on returned delays in seconds
+            clock: Monotonic clock, replaceable in tests
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_delay = max_delay
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Refill the bucket and forget scheduled retries."""
+        with self._lock:
+            self._tokens = self.burst
+            self._updated = self._clock()
+            self._horizon = self._updated
+
+    def reserve(self) -> float:
+        """Take a token if one is available.
+
+        Returns:
+            0.0 if the request is admitted, otherwise the number of seconds
+            after which the client should retry
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+
+            # Hand out the next free slot after the ones already promised
+            slot = max(self._horizon, now + (1 - self._tokens) / self.rate)
+            self._horizon = slot + 1 / self.rate
+            return min(slot - now, self.max_delay)
+
+
+registration_bucket = TokenBucket(REGISTRATION_RATE, REGISTRATION_BURST)
+
+
+def admit_registration() -> None:
+    """Admit a node registration or reject it with 429 and Retry-After.
+
+    Raises:
+        HTTPException: 429 with a ``Retry-After`` header when throttled
+    """
+    if registration_bucket.rate <= 0:
+        return
+    delay = registration_bucket.reserve()
+    if delay > 0:
+        NODE_REGISTRATIONS.labels("throttled").inc()
+        REGISTRATION_RETRY_AFTER.observe(delay)
+        raise HTTPException(
+            status_code=429,
+            detail="Too many registrations, retry later",
+            headers={"Retry-After": str(math.ceil(delay))},
+        )
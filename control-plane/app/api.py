@@ -1,12 +1,40 @@
 """API endpoints for the Control Plane."""
+import time
+
 from flask import Flask, request, jsonify
-from .models import Node
 from .storage import storage
 
 
 app = Flask(__name__)
 
 
+def _node_from_request(data: dict) -> dict:
+    """Build a node record from a legacy registration payload."""
+    capabilities = data.get("capabilities") or {}
+    if isinstance(capabilities, list):
+        # Legacy agents send a list of feature names
+        capabilities = {name: True for name in capabilities}
+    return {
+        "id": data["id"],
+        "name": data["hostname"],
+        "ip": data.get("ip", ""),
+        "capabilities": capabilities,
+        "last_seen": time.time(),
+        "status": data.get("status", "active"),
+    }
+
+
+def _node_to_dict(node: dict) -> dict:
+    """Legacy JSON view of a node record."""
+    return {
+        "id": node["id"],
+        "hostname": node["name"],
+        "capabilities": node["capabilities"],
+        "status": node["status"],
+        "last_seen": node["last_seen"],
+    }
+
+
 @app.route('/api/v1/nodes/register', methods=['POST'])
 def register_node():
     """Register a new node or update an existing one.
@@ -36,12 +64,12 @@ def register_node():
             return jsonify({"error": "Missing required field: hostname"}), 400
         
         # Create or update node
-        node = Node.from_dict(data)
+        node = _node_from_request(data)
         storage.add_node(node)
         
         return jsonify({
             "message": "Node registered successfully",
-            "node": node.to_dict()
+            "node": _node_to_dict(node)
         }), 201
         
     except Exception as e:
@@ -58,7 +86,7 @@ def list_nodes():
     try:
         nodes = storage.get_all_nodes()
         return jsonify({
-            "nodes": [node.to_dict() for node in nodes],
+            "nodes": [_node_to_dict(node) for node in nodes],
             "count": len(nodes)
         }), 200
         
@@ -82,7 +110,7 @@ def get_node(node_id):
         if not node:
             return jsonify({"error": "Node not found"}), 404
         
-        return jsonify(node.to_dict()), 200
+        return jsonify(_node_to_dict(node)), 200
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
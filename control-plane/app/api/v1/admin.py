@@ -0,0 +1,129 @@
+"""Admin diagnostics API endpoints.
+
+This module provides admin-only endpoints for on-demand CPU profiling of the
+control plane, for inspecting recently captured slow requests and for
+checking which replica holds the leader lease.
+"""
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy.orm import Session
+from typing import Dict, List
+
+from app.auth import require_admin_auth
+from app.db import get_db, LeaseDB
+from app.leader import leader_elector
+from app.metrics import TimedRoute
+from app.profiling import ProfilerBusy, profile_for, slow_request_log
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    route_class=TimedRoute,
+    dependencies=[Depends(require_admin_auth)],
+)
+
+# Upper bound on a single profiling run in seconds
+MAX_PROFILE_SECONDS = 60
+
+
+@router.post("/profile")
+def profile(
+    seconds: float = Query(5.0, gt=0, le=MAX_PROFILE_SECONDS),
+    format: str = Query("speedscope", pattern="^(speedscope|collapsed)$"),
+    interval_ms: float = Query(10.0, ge=1, le=1000),
+    include_idle: bool = False,
+):
+    """Run the sampling profiler for a number of seconds.
+    
+    Samples the stacks of every thread in the control plane process while
+    the request is open, then returns the aggregated profile. Only one
+    profile can run at a time.
+    
+    Args:
+        seconds: How long to sample for
+        format: "speedscope" for a speedscope JSON file, or "collapsed"
+            for flamegraph-compatible collapsed stacks
+        interval_ms: Milliseconds between samples
+        include_idle: Keep samples of threads parked waiting for work
+        
+    Returns:
+        Speedscope JSON document or collapsed-stack text
+        
+    Raises:
+        HTTPException: 409 if another profile is already running
+        
+    Example:
+        POST /api/v1/admin/profile?seconds=10&format=collapsed
+    """
+    try:
+        result = profile_for(seconds, interval_ms / 1000, include_idle)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    if format == "collapsed":
+        return PlainTextResponse(result.to_collapsed())
+    return JSONResponse(
+        result.to_speedscope(),
+        headers={
+            "Content-Disposition": 'attachment; filename="profile.speedscope.json"'
+        },
+    )
+
+
+@router.get("/slow-requests", response_model=List[Dict])
+def list_slow_requests(
+    limit: int = Query(50, ge=1, le=1000),
+) -> List[Dict]:
+    """List recently captured slow requests, newest first.
+    
+    Each entry has the request's route, status, total duration and the time
+    spent in each phase (auth, handler, db, serialization) in milliseconds.
+    The db phase overlaps with handler and auth.
+    
+    Args:
+        limit: Maximum number of entries to return
+        
+    Returns:
+        List of slow request entries
+        
+    Example:
+        GET /api/v1/admin/slow-requests?limit=10
+    """
+    return slow_request_log.entries(limit)
+
+
+@router.delete("/slow-requests", status_code=204)
+def clear_slow_requests() -> None:
+    """Clear the slow request log.
+    
+    Example:
+        DELETE /api/v1/admin/slow-requests
+    """
+    slow_request_log.clear()
+
+
+@router.get("/leader", response_model=Dict)
+def get_leader(db: Session = Depends(get_db)) -> Dict:
+    """Show this replica's leadership and the current lease holder.
+    
+    Args:
+        db: Database session
+        
+    Returns:
+        This replica's identity and leadership, and the stored lease
+        
+    Example:
+        GET /api/v1/admin/leader
+    """
+    lease = db.get(LeaseDB, leader_elector.name)
+    return {
+        "identity": leader_elector.identity,
+        "is_leader": leader_elector.is_leader,
+        "lease": lease and {
+            "name": lease.name,
+            "holder": lease.holder,
+            "epoch": lease.epoch,
+            "expires_at": lease.expires_at,
+            "renewed_at": lease.renewed_at,
+        },
+    }
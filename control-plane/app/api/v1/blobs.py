@@ -0,0 +1,390 @@
+"""Artifact blob API endpoints.
+
+This module provides resumable, chunked uploads of model artifacts into the
+content-addressed blob store, ranged downloads of stored blobs, and the
+chunk availability tracker agents use to fetch artifacts from each other.
+"""
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from typing import Optional
+import base64
+import re
+
+from app.auth import require_node_auth
+from app.metrics import TimedRoute
+from app.metrics.instruments import REGISTRY_BLOB_BYTES_SENT, SWARM_ANNOUNCEMENTS
+from app.models import (
+    BlobUploadResponse,
+    ChunkManifestResponse,
+    PeerAnnounceRequest,
+    SwarmPeer,
+    SwarmResponse,
+)
+from app.registry import (
+    ARTIFACT_CHUNK_BYTES,
+    BlobNotFound,
+    BlobResponse,
+    DigestMismatch,
+    UploadOffsetMismatch,
+    blob_store,
+    chunk_count,
+    chunk_digests,
+    chunk_tracker,
+    decode_bitfield,
+)
+
+router = APIRouter(
+    prefix="/blobs", tags=["blobs"], route_class=TimedRoute
+)
+
+_CONTENT_RANGE = re.compile(r"^(?:bytes )?(\d+)-(\d+)(?:/(?:\d+|\*))?$")
+
+# Bytes buffered from the request before each write to the upload file
+UPLOAD_WRITE_CHUNK = 1024 * 1024
+
+
+def _upload_headers(upload_id: str, offset: int) -> dict:
+    """Location and received range of an upload, as resumable clients expect."""
+    headers = {"Location": f"/api/v1/blobs/uploads/{upload_id}"}
+    if offset:
+        headers["Range"] = f"0-{offset - 1}"
+    return headers
+
+
+async def _append_body(request: Request, upload_id: str, offset: int) -> int:
+    """Stream the request body into an upload, a buffer at a time."""
+    buffer = bytearray()
+    async for chunk in request.stream():
+        buffer += chunk
+        if len(buffer) >= UPLOAD_WRITE_CHUNK:
+            offset = await run_in_threadpool(
+                blob_store.append, upload_id, offset, [bytes(buffer)]
+            )
+            buffer.clear()
+    if buffer:
+        offset = await run_in_threadpool(
+            blob_store.append, upload_id, offset, [bytes(buffer)]
+        )
+    return offset
+
+
+@router.post("/uploads", response_model=BlobUploadResponse, status_code=202)
+def start_upload(response: Response) -> BlobUploadResponse:
+    """Start a resumable blob upload.
+    
+    Returns:
+        BlobUploadResponse with the upload ID; the ``Location`` header is the
+        URL to send chunks to
+        
+    Example:
+        POST /api/v1/blobs/uploads
+    """
+    upload_id = blob_store.start_upload()
+    response.headers.update(_upload_headers(upload_id, 0))
+    return BlobUploadResponse(upload_id=upload_id, offset=0)
+
+
+@router.get("/uploads/{upload_id}", response_model=BlobUploadResponse)
+def get_upload(upload_id: str, response: Response) -> BlobUploadResponse:
+    """Get the progress of an upload, to resume it.
+    
+    Args:
+        upload_id: ID of the upload
+        
+    Returns:
+        BlobUploadResponse with the offset the next chunk must start at
+        
+    Raises:
+        HTTPException: 404 if the upload does not exist
+    """
+    try:
+        offset = blob_store.offset(upload_id)
+    except BlobNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    response.headers.update(_upload_headers(upload_id, offset))
+    return BlobUploadResponse(upload_id=upload_id, offset=offset)
+
+
+@router.patch("/uploads/{upload_id}", response_model=BlobUploadResponse, status_code=202)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    response: Response,
+    content_range: Optional[str] = Header(None),
+) -> BlobUploadResponse:
+    """Append a chunk to an upload.
+    
+    The chunk is the request body. ``Content-Range: <first>-<last>`` states
+    where it starts; without it the chunk is appended at the current offset.
+    The content is hashed as it is written.
+    
+    Args:
+        upload_id: ID of the upload
+        request: Incoming request, streamed into the upload
+        response: Outgoing response, used to set the progress headers
+        content_range: Position of the chunk in the blob
+        
+    Returns:
+        BlobUploadResponse with the new offset
+        
+    Raises:
+        HTTPException: 400 for a malformed Content-Range, 404 if the upload
+            does not exist, 416 if the chunk does not start at the current
+            offset (the ``Range`` header gives the bytes received)
+        
+    Example:
+        PATCH /api/v1/blobs/uploads/{upload_id}
+        Content-Range: 0-1048575
+        
+        <1 MiB of artifact bytes>
+    """
+    try:
+        offset = await run_in_threadpool(blob_store.offset, upload_id)
+        if content_range:
+            match = _CONTENT_RANGE.match(content_range.strip())
+            if not match:
+                raise HTTPException(status_code=400, detail="Invalid Content-Range")
+            if int(match.group(1)) != offset:
+                raise UploadOffsetMismatch(offset)
+        offset = await _append_body(request, upload_id, offset)
+    except BlobNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except UploadOffsetMismatch as e:
+        raise HTTPException(
+            status_code=416,
+            detail=f"Chunk must start at offset {e.offset}",
+            headers=_upload_headers(upload_id, e.offset),
+        )
+    response.headers.update(_upload_headers(upload_id, offset))
+    return BlobUploadResponse(upload_id=upload_id, offset=offset)
+
+
+@router.put("/uploads/{upload_id}", status_code=201)
+async def finish_upload(
+    upload_id: str,
+    digest: str,
+    request: Request,
+    response: Response,
+) -> dict:
+    """Finish an upload, verifying its digest.
+    
+    A last chunk may be sent as the request body. The upload becomes the
+    blob ``digest`` if its content hashes to it, and is discarded otherwise.
+    
+    Args:
+        upload_id: ID of the upload
+        digest: Expected digest, ``sha256:<hex>``
+        request: Incoming request carrying an optional last chunk
+        response: Outgoing response, used to set the blob's location
+        
+    Returns:
+        The stored blob's digest and size
+        
+    Raises:
+        HTTPException: 400 if the content does not match the digest,
+            404 if the upload does not exist
+        
+    Example:
+        PUT /api/v1/blobs/uploads/{upload_id}?digest=sha256:4f3c...
+    """
+    try:
+        offset = await run_in_threadpool(blob_store.offset, upload_id)
+        await _append_body(request, upload_id, offset)
+        await run_in_threadpool(blob_store.finish, upload_id, digest)
+        _, size = blob_store.stat(digest)
+    except BlobNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except DigestMismatch as e:
+        raise HTTPException(status_code=400, detail=f"Digest mismatch: {e}")
+    response.headers["Location"] = f"/api/v1/blobs/{digest}"
+    return {"digest": digest, "size": size}
+
+
+@router.delete("/uploads/{upload_id}", status_code=204)
+def cancel_upload(upload_id: str) -> Response:
+    """Discard an upload.
+    
+    Args:
+        upload_id: ID of the upload
+    """
+    try:
+        blob_store.cancel(upload_id)
+    except BlobNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return Response(status_code=204)
+
+
+def blob_response(
+    digest: str, range_header: Optional[str], method: str = "GET"
+) -> BlobResponse:
+    """Ranged response for a stored blob.
+    
+    Raises:
+        HTTPException: 404 if the blob does not exist
+    """
+    try:
+        path, size = blob_store.stat(digest)
+    except BlobNotFound:
+        raise HTTPException(status_code=404, detail="Blob not found")
+    response = BlobResponse(
+        path, size, digest, range_header, headers={"Digest": digest}
+    )
+    if method != "HEAD":
+        REGISTRY_BLOB_BYTES_SENT.inc(response.length)
+    return response
+
+
+def _blob_size(digest: str) -> int:
+    try:
+        return blob_store.stat(digest)[1]
+    except BlobNotFound:
+        raise HTTPException(status_code=404, detail="Blob not found")
+
+
+def _swarm(digest: str, node_id: str) -> SwarmResponse:
+    """Peers of an artifact other than ``node_id``."""
+    return SwarmResponse(
+        digest=digest,
+        peers=[
+            SwarmPeer(
+                node_id=peer_id,
+                url=url,
+                have=base64.b64encode(have).decode(),
+                fetching=base64.b64encode(fetching).decode(),
+            )
+            for peer_id, url, have, fetching in chunk_tracker.peers(
+                digest, exclude=node_id
+            )
+        ],
+    )
+
+
+@router.get("/{digest}/chunks", response_model=ChunkManifestResponse)
+def get_chunks(digest: str) -> ChunkManifestResponse:
+    """Get the chunks an artifact is distributed in between agents.
+    
+    Every chunk fetched from a peer is checked against its digest here.
+    
+    Args:
+        digest: Artifact digest, ``sha256:<hex>``
+        
+    Returns:
+        ChunkManifestResponse with the chunk size and chunk digests
+        
+    Raises:
+        HTTPException: 404 if the blob does not exist
+        
+    Example:
+        GET /api/v1/blobs/sha256:4f3c.../chunks
+    """
+    size = _blob_size(digest)
+    return ChunkManifestResponse(
+        digest=digest,
+        size=size,
+        chunk_size=ARTIFACT_CHUNK_BYTES,
+        chunks=chunk_digests(blob_store, digest, ARTIFACT_CHUNK_BYTES),
+    )
+
+
+@router.get("/{digest}/swarm", response_model=SwarmResponse)
+def get_swarm(
+    digest: str,
+    node_id: str = Depends(require_node_auth),
+) -> SwarmResponse:
+    """Get the peers holding or fetching an artifact.
+    
+    Args:
+        digest: Artifact digest, ``sha256:<hex>``
+        node_id: Authenticated node, left out of the peer list
+        
+    Returns:
+        SwarmResponse with each peer's URL and chunk bitfields
+        
+    Raises:
+        HTTPException: 401 without a valid node token
+    """
+    return _swarm(digest, node_id)
+
+
+@router.put("/{digest}/swarm", response_model=SwarmResponse)
+def announce_chunks(
+    digest: str,
+    request: PeerAnnounceRequest,
+    node_id: str = Depends(require_node_auth),
+) -> SwarmResponse:
+    """Announce the chunks of an artifact this node holds and fetches.
+    
+    Agents announce when they start fetching an artifact, before each chunk
+    they fetch from the registry, periodically while fetching, and
+    periodically while they keep serving the complete artifact. Each
+    announcement replaces the node's previous one and expires after
+    ``PEER_TTL`` seconds unless renewed.
+    
+    Args:
+        digest: Artifact digest, ``sha256:<hex>``
+        request: URL the node serves chunks from, bitfield of the chunks it
+            holds and of those it is fetching from the registry
+        node_id: Authenticated node
+        
+    Returns:
+        SwarmResponse with the other peers, saving a separate request
+        
+    Raises:
+        HTTPException: 400 for a malformed bitfield, 401 without a valid
+            node token, 404 if the blob does not exist
+        
+    Example:
+        PUT /api/v1/blobs/sha256:4f3c.../swarm
+        Authorization: Bearer <node token>
+        {"url": "http://10.0.0.5:7070", "have": "/8A=", "fetching": "AEA="}
+    """
+    count = chunk_count(_blob_size(digest), ARTIFACT_CHUNK_BYTES)
+    try:
+        have = decode_bitfield(request.have, count)
+        fetching = decode_bitfield(request.fetching, count) if request.fetching else b""
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    chunk_tracker.announce(digest, node_id, request.url, have, fetching)
+    SWARM_ANNOUNCEMENTS.inc()
+    return _swarm(digest, node_id)
+
+
+@router.delete("/{digest}/swarm", status_code=204)
+def withdraw_chunks(
+    digest: str,
+    node_id: str = Depends(require_node_auth),
+) -> Response:
+    """Stop offering an artifact's chunks to peers.
+    
+    Args:
+        digest: Artifact digest
+        node_id: Authenticated node
+    """
+    chunk_tracker.withdraw(digest, node_id)
+    return Response(status_code=204)
+
+
+@router.api_route("/{digest}", methods=["GET", "HEAD"])
+def get_blob(request: Request, digest: str, range: Optional[str] = Header(None)):
+    """Download a blob, or a byte range of it.
+    
+    Supports ``Range: bytes=<first>-<last>``, ``bytes=<first>-`` and
+    ``bytes=-<suffix>``, answered with ``206 Partial Content``; ``HEAD``
+    returns only the headers, including the size.
+    
+    Args:
+        request: Incoming request
+        digest: Blob digest, ``sha256:<hex>``
+        range: Range header
+        
+    Returns:
+        The blob content
+        
+    Raises:
+        HTTPException: 404 if the blob does not exist
+        
+    Example:
+        GET /api/v1/blobs/sha256:4f3c...
+        Range: bytes=0-67108863
+    """
+    return blob_response(digest, range, request.method)
@@ -3,21 +3,29 @@
 This module provides REST API endpoints for managing deployments,
 including creating, listing, and deleting deployments.
 """
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import uuid
 
-from app.models import DeploymentRequest, DeploymentResponse
-from app.db import get_db, DeploymentDB, NodeDB
+from app.models import DeploymentEventResponse, DeploymentRequest, DeploymentResponse
+from app.db import get_db
+from app.eventlog import deployment_log
+from app.storage import Storage, get_storage
+from app.metrics import TimedRoute
+from app import serialization
+from app.serialization import FastJSONResponse
+from app.watch import change_log, watch_response
 
-router = APIRouter(prefix="/deployments", tags=["deployments"])
+router = APIRouter(
+    prefix="/deployments", tags=["deployments"], route_class=TimedRoute
+)
 
 
 @router.post("", response_model=DeploymentResponse, status_code=202)
 def create_deployment(
     request: DeploymentRequest,
-    db: Session = Depends(get_db),
+    storage: Storage = Depends(get_storage),
 ) -> DeploymentResponse:
     """Create a new deployment.
     
@@ -27,7 +35,7 @@ def create_deployment(
     
     Args:
         request: Deployment request with template and configuration
-        db: Database session
+        storage: Deployment storage
         
     Returns:
         DeploymentResponse with deployment status
@@ -46,9 +54,7 @@ def create_deployment(
         }
     """
     # Validate deployment_id is unique
-    existing = db.query(DeploymentDB).filter(
-        DeploymentDB.id == request.deployment_id
-    ).first()
+    existing = storage.deployments.get(request.deployment_id)
     
     if existing:
         raise HTTPException(
@@ -58,62 +64,92 @@ def create_deployment(
     
     # For MVP, we'll accept any deployment without node assignment
     # In production, this would use the orchestrator to select a node
-    deployment = DeploymentDB(
-        id=request.deployment_id,
-        node_id="unassigned",  # Stub: would use orchestrator
-        template_id=request.template_id,
-        rendered_compose=request.rendered_compose,
-        env=request.env,
-        status="pending",
-        action=request.action,
-    )
-    
-    db.add(deployment)
-    db.commit()
+    storage.deployments.put({
+        "id": request.deployment_id,
+        "node_id": "unassigned",  # Stub: would use orchestrator
+        "template_id": request.template_id,
+        "rendered_compose": request.rendered_compose,
+        "env": request.env,
+        "status": "pending",
+        "action": request.action,
+    })
+    storage.commit()
     
     return DeploymentResponse(
-        deployment_id=deployment.id,
+        deployment_id=request.deployment_id,
         status="accepted",
         message="Deployment request accepted and queued for processing",
     )
 
 
 @router.get("", response_model=List[DeploymentResponse])
-def list_deployments(db: Session = Depends(get_db)) -> List[DeploymentResponse]:
-    """List all deployments.
+def list_deployments(
+    response: Response,
+    watch: bool = False,
+    resource_version: Optional[int] = Query(None, alias="resourceVersion"),
+    timeout_seconds: Optional[int] = Query(None, alias="timeoutSeconds"),
+    accept: Optional[str] = Header(None),
+    last_event_id: Optional[int] = Header(None),
+    storage: Storage = Depends(get_storage),
+    db: Session = Depends(get_db),
+) -> List[DeploymentResponse]:
+    """List all deployments, or watch them for changes.
     
-    Returns a list of all deployments with their current status.
+    Returns a list of all deployments with their current status. The
+    list's resource version is returned in the ``X-Resource-Version``
+    header; see ``list_nodes`` for the watch parameters and the
+    ``FAST_SERIALIZATION`` path.
     
     Args:
-        db: Database session
+        response: Outgoing response, used to set the resource version header
+        watch: Stream changes instead of returning a list
+        resource_version: Resource version to start watching after
+        timeout_seconds: Lifetime of the watch stream
+        accept: Accept header, used to negotiate the stream format
+        last_event_id: SSE reconnect position, used if resourceVersion is unset
+        storage: Deployment storage
+        db: Database session, used by the fast path
         
     Returns:
-        List of DeploymentResponse objects
+        List of DeploymentResponse objects, or a streaming watch response
         
     Example:
         GET /api/v1/deployments
+        GET /api/v1/deployments?watch=1&resourceVersion=42
     """
-    deployments = db.query(DeploymentDB).all()
+    if watch:
+        if resource_version is None:
+            resource_version = last_event_id
+        return watch_response(
+            "deployments", resource_version, timeout_seconds, accept
+        )
+    
+    response.headers["X-Resource-Version"] = str(change_log.resource_version)
+    if serialization.FAST_SERIALIZATION and storage.name == "sql":
+        return FastJSONResponse(
+            serialization.encode_deployment_list(db),
+            headers=dict(response.headers),
+        )
     return [
         DeploymentResponse(
-            deployment_id=d.id,
-            status=d.status,
-            message=f"Deployment on node {d.node_id}",
+            deployment_id=d["id"],
+            status=d["status"],
+            message=f"Deployment on node {d['node_id']}",
         )
-        for d in deployments
+        for d in storage.deployments.list()
     ]
 
 
 @router.get("/{deployment_id}", response_model=DeploymentResponse)
 def get_deployment(
     deployment_id: str,
-    db: Session = Depends(get_db),
+    storage: Storage = Depends(get_storage),
 ) -> DeploymentResponse:
     """Get a specific deployment by ID.
     
     Args:
         deployment_id: ID of the deployment to retrieve
-        db: Database session
+        storage: Deployment storage
         
     Returns:
         DeploymentResponse with deployment details
@@ -124,24 +160,58 @@ def get_deployment(
     Example:
         GET /api/v1/deployments/{deployment_id}
     """
-    deployment = db.query(DeploymentDB).filter(
-        DeploymentDB.id == deployment_id
-    ).first()
+    deployment = storage.deployments.get(deployment_id)
     
     if not deployment:
         raise HTTPException(status_code=404, detail="Deployment not found")
     
     return DeploymentResponse(
-        deployment_id=deployment.id,
-        status=deployment.status,
-        message=f"Deployment '{deployment.template_id}' on node {deployment.node_id}",
+        deployment_id=deployment["id"],
+        status=deployment["status"],
+        message=(
+            f"Deployment '{deployment['template_id']}' on node {deployment['node_id']}"
+        ),
     )
 
 
+@router.get(
+    "/{deployment_id}/history", response_model=List[DeploymentEventResponse]
+)
+def get_deployment_history(deployment_id: str) -> List[DeploymentEventResponse]:
+    """Get the recorded state transitions of a deployment, oldest first.
+    
+    Transitions are read from the deployment event log, enabled by
+    ``DEPLOYMENT_LOG_DIR``. History from before the log's last compaction
+    is summarized by the compaction and not returned.
+    
+    Args:
+        deployment_id: ID of the deployment
+        
+    Returns:
+        List of DeploymentEventResponse objects
+        
+    Raises:
+        HTTPException: 404 if the event log is disabled or has no events
+            for the deployment
+        
+    Example:
+        GET /api/v1/deployments/{deployment_id}/history
+    """
+    if not deployment_log.is_open:
+        raise HTTPException(
+            status_code=404, detail="Deployment event log is not enabled"
+        )
+    events = deployment_log.history(deployment_id)
+    if not events and deployment_id not in deployment_log.state:
+        raise HTTPException(status_code=404, detail="Deployment not found")
+    
+    return [DeploymentEventResponse(**event) for event in events]
+
+
 @router.delete("/{deployment_id}", response_model=DeploymentResponse)
 def delete_deployment(
     deployment_id: str,
-    db: Session = Depends(get_db),
+    storage: Storage = Depends(get_storage),
 ) -> DeploymentResponse:
     """Delete a deployment.
     
@@ -150,7 +220,7 @@ def delete_deployment(
     
     Args:
         deployment_id: ID of the deployment to delete
-        db: Database session
+        storage: Deployment storage
         
     Returns:
         DeploymentResponse with deletion status
@@ -161,20 +231,17 @@ def delete_deployment(
     Example:
         DELETE /api/v1/deployments/{deployment_id}
     """
-    deployment = db.query(DeploymentDB).filter(
-        DeploymentDB.id == deployment_id
-    ).first()
+    deployment = storage.deployments.get(deployment_id)
     
     if not deployment:
         raise HTTPException(status_code=404, detail="Deployment not found")
     
     # Mark for deletion instead of removing immediately
-    deployment.status = "deleting"
-    deployment.action = "remove"
-    db.commit()
+    storage.deployments.update(deployment_id, status="deleting", action="remove")
+    storage.commit()
     
     return DeploymentResponse(
-        deployment_id=deployment.id,
+        deployment_id=deployment_id,
         status="deleting",
         message="Deployment marked for deletion",
     )
@@ -0,0 +1,324 @@
+"""Inference API endpoints.
+
+This module provides REST API endpoints for submitting inference requests
+and fetching their results, and for inference engines to take batches of
+queued requests and return their results.
+"""
+from fastapi import APIRouter, HTTPException, Depends, Response
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+import math
+import os
+import uuid
+
+from app.api.v1.models import batch_policy
+from app.auth import require_node_auth
+from app.db import get_db, ModelDB
+from app.inference import (
+    COMPLETED,
+    FAILED,
+    DeadlineInfeasible,
+    InferenceRequest,
+    QueueFull,
+    inference_cache,
+    inference_queue,
+    inference_router,
+    result_store,
+)
+from app.metrics import TimedRoute
+from app.metrics.instruments import INFERENCE_REJECTED, INFERENCE_REQUESTS
+from app.serialization import FastJSONResponse, dumps
+from app.models import (
+    BatchItem,
+    BatchLeaseRequest,
+    BatchResponse,
+    BatchResultsRequest,
+    InferenceResultResponse,
+    InferenceSubmitRequest,
+    InferenceSubmitResponse,
+)
+
+# Longest a client may wait for a result in one request
+INFERENCE_MAX_WAIT_SECONDS = float(os.environ.get("INFERENCE_MAX_WAIT_SECONDS", "30"))
+
+router = APIRouter(
+    prefix="/inference", tags=["inference"], route_class=TimedRoute
+)
+
+
+@router.post("", response_model=InferenceSubmitResponse, status_code=202)
+def submit_inference(
+    request: InferenceSubmitRequest,
+    db: Session = Depends(get_db),
+) -> InferenceSubmitResponse:
+    """Queue an inference request for a model.
+
+    Requests are batched per model according to the model's batching
+    policy and run by an inference engine; fetch the result with
+    ``GET /api/v1/inference/{request_id}``.
+
+    Requests are handed out earliest deadline first. ``priority``
+    (``interactive``, ``standard`` or ``batch``) sets the default deadline
+    and how much of the model's bounded queue the request may fill;
+    ``deadline_ms`` overrides the deadline. Requests that would not finish
+    in time are refused at once, and queued requests that no longer can
+    are failed without being run.
+
+    Unless ``cache`` is false, a request whose input and parameters match
+    an earlier completed request to the same model version is answered
+    from the result cache with status ``completed``, and one matching a
+    request still queued or running is given that request's ID, so both
+    share its execution; that request is then due by the earlier of their
+    deadlines.
+
+    Args:
+        request: Model ID, input data and parameters
+        db: Database session
+
+    Returns:
+        InferenceSubmitResponse with the request ID and its status
+
+    Raises:
+        HTTPException: 400 if the input is not JSON-serializable, 404 if
+            the model does not exist, 409 if it is archived, 429 if the
+            request's class has filled its share of the model's queue, 503
+            if the request is not expected to finish by its deadline; both
+            with ``Retry-After``
+
+    Example:
+        POST /api/v1/inference
+        {
+            "model_id": "3f6c...",
+            "input_data": {"features": [5.1, 3.5, 1.4, 0.2]},
+            "priority": "interactive",
+            "deadline_ms": 250
+        }
+    """
+    model = db.query(ModelDB).filter(ModelDB.id == request.model_id).first()
+    if not model:
+        raise HTTPException(status_code=404, detail="Model not found")
+    if model.status == "archived":
+        raise HTTPException(status_code=409, detail="Model is archived")
+
+    inference_router.track(model.id, model.digest)
+    policy = batch_policy(model)
+    deadline = request.deadline_ms / 1000 if request.deadline_ms is not None else None
+
+    def start() -> str:
+        try:
+            queued = inference_queue.submit(
+                model.id, request.input_data, request.parameters, policy,
+                priority=request.priority, deadline=deadline,
+            )
+        except QueueFull as exc:
+            INFERENCE_REJECTED.labels("queue_full", request.priority).inc()
+            raise _refused(429, exc)
+        except DeadlineInfeasible as exc:
+            INFERENCE_REJECTED.labels("deadline", request.priority).inc()
+            raise _refused(503, exc)
+        INFERENCE_REQUESTS.labels("queued").inc()
+        return queued.request_id
+
+    if not (request.cache and inference_cache.enabled):
+        return InferenceSubmitResponse(request_id=start(), status="queued")
+
+    try:
+        key = inference_cache.key(model.id, model.digest, request.input_data, request.parameters)
+    except TypeError:
+        raise HTTPException(status_code=400, detail="Input data is not JSON-serializable")
+    request_id, encoded = inference_cache.resolve(key, start)
+    if encoded is not None:
+        request_id = str(uuid.uuid4())
+        result_store.put(request_id, COMPLETED, encoded=encoded)
+        INFERENCE_REQUESTS.labels("cached").inc()
+        return InferenceSubmitResponse(request_id=request_id, status=COMPLETED)
+    inference_queue.expedite(request_id, request.priority, deadline)
+    return InferenceSubmitResponse(
+        request_id=request_id, status=inference_queue.status(request_id) or "queued"
+    )
+
+
+def _refused(status_code: int, exc: Exception) -> HTTPException:
+    """An admission refusal, telling the client when to try again."""
+    return HTTPException(
+        status_code=status_code,
+        detail=str(exc),
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
+
+
+def fail_missed(queued: InferenceRequest) -> None:
+    """Fail a request taken out of its queue because it could no longer finish by its deadline."""
+    result_store.put(queued.request_id, FAILED, error="Deadline exceeded before the request ran")
+    inference_cache.finish(queued.request_id, None)
+    INFERENCE_REQUESTS.labels("missed").inc()
+
+
+def parse_wait(text: Optional[str]) -> float:
+    """Seconds from a ``wait`` parameter such as ``10s``, ``500ms`` or ``10``.
+
+    Raises:
+        ValueError: If ``text`` is not a duration
+    """
+    if not text:
+        return 0.0
+    if text.endswith("ms"):
+        seconds = float(text[:-2]) / 1000
+    else:
+        seconds = float(text[:-1] if text.endswith("s") else text)
+    if not seconds >= 0:
+        raise ValueError(f"Invalid wait {text!r}")
+    return min(seconds, INFERENCE_MAX_WAIT_SECONDS)
+
+
+@router.get("/{request_id}", response_model=InferenceResultResponse)
+async def get_inference(request_id: str, wait: Optional[str] = None):
+    """Get the status of an inference request, and its result once finished.
+
+    With ``wait``, an unfinished request is waited for up to that long
+    (at most ``INFERENCE_MAX_WAIT_SECONDS``) and the response sent as soon
+    as it finishes, so clients need not poll in a tight loop. Waiting
+    requests hold no server thread.
+
+    Args:
+        request_id: ID of the request
+        wait: Longest time to wait for the result, e.g. ``10s`` or ``500ms``
+
+    Returns:
+        InferenceResultResponse with the status, and the result or error
+
+    Raises:
+        HTTPException: 400 for an invalid ``wait``, 404 if the request is
+            unknown or its result has expired
+
+    Example:
+        GET /api/v1/inference/{request_id}?wait=10s
+    """
+    try:
+        timeout = parse_wait(wait)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid wait {wait!r}, expected e.g. 10s or 500ms")
+
+    # Outstanding requests first: results are stored before they stop being outstanding
+    status = inference_queue.status(request_id)
+    finished = result_store.get(request_id)
+    if finished is None:
+        if status is None:
+            raise HTTPException(status_code=404, detail="Inference request not found")
+        finished = await result_store.wait(request_id, timeout)
+    if finished is None:
+        return InferenceResultResponse(
+            request_id=request_id, status=inference_queue.status(request_id) or status
+        )
+
+    try:
+        body = await run_in_threadpool(finished.encode) if finished.spilled else finished.encode()
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Inference request not found")
+    return FastJSONResponse(body)
+
+
+@router.post("/batches", response_model=BatchResponse)
+async def lease_batch(
+    request: BatchLeaseRequest,
+    db: Session = Depends(get_db),
+    node_id: str = Depends(require_node_auth),
+):
+    """Take the next batch of queued requests, waiting for one if asked.
+
+    Inference engines call this in a loop. The batch is leased to the
+    calling node; its results must come back within ``lease_seconds``, or
+    its requests are handed out again. Waiting engines are parked on the
+    event loop, so they hold no server threads.
+
+    Args:
+        request: Models the engine runs and how long to wait
+        db: Database session
+        node_id: Authenticated node
+
+    Returns:
+        BatchResponse, or 204 if no batch was ready in time
+
+    Example:
+        POST /api/v1/inference/batches
+        {"models": ["3f6c..."], "wait": 20}
+    """
+    batch = await inference_queue.wait_batch(request.models, request.wait, holder=node_id)
+    if batch is None:
+        return Response(status_code=204)
+
+    model = await run_in_threadpool(
+        lambda: db.query(ModelDB).filter(ModelDB.id == batch.model_id).first()
+    )
+    return BatchResponse(
+        batch_id=batch.batch_id,
+        model_id=batch.model_id,
+        digest=model.digest if model else "",
+        framework=model.framework if model else "",
+        lease_seconds=inference_queue.lease,
+        requests=[
+            BatchItem(
+                request_id=queued.request_id,
+                input_data=queued.input_data,
+                parameters=queued.parameters,
+            )
+            for queued in batch.requests
+        ],
+    )
+
+
+@router.post("/batches/{batch_id}/results", status_code=204)
+def return_batch_results(
+    batch_id: str,
+    request: BatchResultsRequest,
+    node_id: str = Depends(require_node_auth),
+) -> Response:
+    """Store the results of a leased batch.
+
+    A result with an ``error`` marks its request failed. Requests of the
+    batch without a result are failed as well. Completed results are added
+    to the result cache.
+
+    Args:
+        batch_id: ID of the batch
+        request: Outcome of each request
+        node_id: Authenticated node
+
+    Returns:
+        204 No Content
+
+    Raises:
+        HTTPException: 403 if another node holds the batch, 409 if the
+            lease is unknown or expired (the requests were handed out again)
+
+    Example:
+        POST /api/v1/inference/batches/{batch_id}/results
+        {"results": [{"request_id": "9b1e...", "result": {"label": "setosa"}}]}
+    """
+    batch = inference_queue.leased(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=409, detail="Batch lease unknown or expired")
+    if batch.holder != node_id:
+        raise HTTPException(status_code=403, detail="Batch is leased to another node")
+
+    # Results are stored before the lease ends, so a request is never found
+    # neither outstanding nor finished
+    outcomes = {item.request_id: item for item in request.results}
+    for queued in batch.requests:
+        outcome = outcomes.get(queued.request_id)
+        if outcome is None:
+            result_store.put(queued.request_id, FAILED, error="No result returned by the engine")
+        elif outcome.error is not None:
+            result_store.put(queued.request_id, FAILED, error=outcome.error)
+        else:
+            encoded = dumps(outcome.result)
+            result_store.put(queued.request_id, COMPLETED, encoded=encoded)
+            inference_cache.finish(queued.request_id, encoded)
+            INFERENCE_REQUESTS.labels("completed").inc()
+            continue
+        inference_cache.finish(queued.request_id, None)
+        INFERENCE_REQUESTS.labels("failed").inc()
+    inference_queue.complete(batch_id)
+
+    return Response(status_code=204)
@@ -0,0 +1,315 @@
+"""Model registry API endpoints.
+
+This module provides REST API endpoints for registering ML models, listing
+and updating their metadata, and downloading their artifacts.
+"""
+from fastapi import APIRouter, HTTPException, Depends, Header, Request
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from typing import Optional
+import uuid
+
+from app.api.v1.blobs import blob_response
+from app.db import get_db, ModelDB, NodeArtifactDB
+from app.inference import DEFAULT_POLICY, BatchPolicy, inference_cache
+from app.metrics import TimedRoute
+from app.models import (
+    ModelListResponse,
+    ModelLocationsResponse,
+    ModelRegisterRequest,
+    ModelResponse,
+    ModelUpdateRequest,
+    NodeResponse,
+)
+from app.registry import BlobNotFound, blob_store
+from app.storage import Storage, get_storage
+
+router = APIRouter(
+    prefix="/models", tags=["models"], route_class=TimedRoute
+)
+
+
+def _model_response(model: ModelDB) -> ModelResponse:
+    """Response model for a model row."""
+    policy = batch_policy(model)
+    return ModelResponse(
+        id=model.id,
+        name=model.name,
+        version=model.version,
+        framework=model.framework,
+        status=model.status,
+        digest=model.digest,
+        size=model.size,
+        input_schema=model.input_schema or {},
+        output_schema=model.output_schema or {},
+        max_batch_size=policy.max_batch_size,
+        max_batch_wait_ms=policy.max_wait * 1000,
+        min_replicas=model.min_replicas or 0,
+        max_replicas=model.max_replicas,
+    )
+
+
+def batch_policy(model: ModelDB) -> BatchPolicy:
+    """A model's inference batching policy, with defaults for unset limits."""
+    return BatchPolicy(
+        model.max_batch_size or DEFAULT_POLICY.max_batch_size,
+        model.max_batch_wait_ms / 1000
+        if model.max_batch_wait_ms is not None else DEFAULT_POLICY.max_wait,
+    )
+
+
+def _check_replicas(model: ModelDB) -> None:
+    """Reject replica bounds the autoscaler cannot satisfy."""
+    if model.max_replicas is not None and (model.min_replicas or 0) > model.max_replicas:
+        raise HTTPException(
+            status_code=400, detail="min_replicas must not exceed max_replicas"
+        )
+
+
+def _get_model(db: Session, model_id: str) -> ModelDB:
+    model = db.query(ModelDB).filter(ModelDB.id == model_id).first()
+    if not model:
+        raise HTTPException(status_code=404, detail="Model not found")
+    return model
+
+
+@router.get("", response_model=ModelListResponse)
+def list_models(
+    name: Optional[str] = None,
+    status: Optional[str] = None,
+    db: Session = Depends(get_db),
+) -> ModelListResponse:
+    """List registered models.
+    
+    Args:
+        name: Only return versions of this model
+        status: Only return models with this lifecycle status
+        db: Database session
+        
+    Returns:
+        ModelListResponse with the matching models
+        
+    Example:
+        GET /api/v1/models?status=active
+    """
+    query = db.query(ModelDB)
+    if name is not None:
+        query = query.filter(ModelDB.name == name)
+    if status is not None:
+        query = query.filter(ModelDB.status == status)
+    return ModelListResponse(models=[_model_response(m) for m in query])
+
+
+@router.post("", response_model=ModelResponse, status_code=201)
+def register_model(
+    request: ModelRegisterRequest,
+    db: Session = Depends(get_db),
+) -> ModelResponse:
+    """Register a model version whose artifact has been uploaded.
+    
+    Upload the artifact first through ``/api/v1/blobs/uploads``, then
+    register it here by digest.
+    
+    Args:
+        request: Model name, version, framework, artifact digest and schemas
+        db: Database session
+        
+    Returns:
+        ModelResponse for the new model
+        
+    Raises:
+        HTTPException: 400 if the artifact blob does not exist or
+            ``min_replicas`` exceeds ``max_replicas``, 409 if the name and
+            version are already registered
+        
+    Example:
+        POST /api/v1/models
+        {
+            "name": "resnet50",
+            "version": "1.0",
+            "framework": "onnx",
+            "digest": "sha256:4f3c..."
+        }
+    """
+    try:
+        _, size = blob_store.stat(request.digest)
+    except BlobNotFound:
+        raise HTTPException(
+            status_code=400, detail=f"Artifact {request.digest} has not been uploaded"
+        )
+    model = ModelDB(
+        id=str(uuid.uuid4()),
+        name=request.name,
+        version=request.version,
+        framework=request.framework,
+        status="active",
+        digest=request.digest,
+        size=size,
+        input_schema=request.input_schema,
+        output_schema=request.output_schema,
+        max_batch_size=request.max_batch_size,
+        max_batch_wait_ms=request.max_batch_wait_ms,
+        min_replicas=request.min_replicas,
+        max_replicas=request.max_replicas,
+    )
+    _check_replicas(model)
+    db.add(model)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=409,
+            detail=f"Model {request.name} version {request.version} already exists",
+        )
+    return _model_response(model)
+
+
+@router.get("/{model_id}", response_model=ModelResponse)
+def get_model(model_id: str, db: Session = Depends(get_db)) -> ModelResponse:
+    """Get a model's details.
+    
+    Args:
+        model_id: ID of the model
+        db: Database session
+        
+    Returns:
+        ModelResponse with the model's metadata
+        
+    Raises:
+        HTTPException: 404 if model not found
+    """
+    return _model_response(_get_model(db, model_id))
+
+
+@router.put("/{model_id}", response_model=ModelResponse)
+def update_model(
+    model_id: str,
+    request: ModelUpdateRequest,
+    db: Session = Depends(get_db),
+) -> ModelResponse:
+    """Update a model's status, schemas, batching policy or replica bounds.
+    
+    Args:
+        model_id: ID of the model
+        request: Fields to change; omitted fields are kept
+        db: Database session
+        
+    Returns:
+        ModelResponse with the updated metadata
+        
+    Raises:
+        HTTPException: 400 if ``min_replicas`` would exceed ``max_replicas``,
+            404 if model not found
+    """
+    model = _get_model(db, model_id)
+    for field, value in request.model_dump(exclude_none=True).items():
+        setattr(model, field, value)
+    _check_replicas(model)
+    db.commit()
+    inference_cache.invalidate(model_id)
+    return _model_response(model)
+
+
+@router.delete("/{model_id}", response_model=ModelResponse)
+def archive_model(model_id: str, db: Session = Depends(get_db)) -> ModelResponse:
+    """Archive a model.
+    
+    The model is marked ``archived`` rather than removed, and its artifact
+    stays downloadable for nodes still serving it.
+    
+    Args:
+        model_id: ID of the model
+        db: Database session
+        
+    Returns:
+        ModelResponse with the archived model
+        
+    Raises:
+        HTTPException: 404 if model not found
+    """
+    model = _get_model(db, model_id)
+    model.status = "archived"
+    db.commit()
+    inference_cache.invalidate(model_id)
+    return _model_response(model)
+
+
+@router.get("/{model_id}/nodes", response_model=ModelLocationsResponse)
+def get_model_locations(
+    model_id: str,
+    storage: Storage = Depends(get_storage),
+    db: Session = Depends(get_db),
+) -> ModelLocationsResponse:
+    """List the online nodes holding a model's artifact in their cache.
+    
+    Nodes with the artifact pinned (loaded and in use) come first, then
+    the others by how recently they used it. Requests for the model are
+    best routed, and new replicas best placed, on these nodes, which do not
+    need to fetch the artifact first.
+    
+    Args:
+        model_id: ID of the model
+        storage: Node storage
+        db: Database session
+        
+    Returns:
+        ModelLocationsResponse with the nodes holding the artifact
+        
+    Raises:
+        HTTPException: 404 if model not found
+        
+    Example:
+        GET /api/v1/models/{model_id}/nodes
+    """
+    model = _get_model(db, model_id)
+    rows = (
+        db.query(NodeArtifactDB)
+        .filter(NodeArtifactDB.digest == model.digest)
+        .order_by(NodeArtifactDB.pinned.desc(), NodeArtifactDB.last_used.desc())
+        .all()
+    )
+    nodes = []
+    for row in rows:
+        node = storage.nodes.get(row.node_id)
+        if node and node["status"] == "online":
+            nodes.append(NodeResponse(
+                id=node["id"],
+                name=node["name"],
+                ip=node["ip"],
+                capabilities=node["capabilities"],
+                last_seen=node["last_seen"],
+                status=node["status"],
+            ))
+    return ModelLocationsResponse(model_id=model.id, digest=model.digest, nodes=nodes)
+
+
+@router.api_route("/{model_id}/artifact", methods=["GET", "HEAD"])
+def get_model_artifact(
+    request: Request,
+    model_id: str,
+    range: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    """Download a model's artifact, or a byte range of it.
+    
+    Ranges work as for ``GET /api/v1/blobs/{digest}``; the ``Digest`` header
+    names the blob so clients can verify or cache the download.
+    
+    Args:
+        request: Incoming request
+        model_id: ID of the model
+        range: Range header
+        db: Database session
+        
+    Returns:
+        The artifact content
+        
+    Raises:
+        HTTPException: 404 if the model or its artifact does not exist
+        
+    Example:
+        GET /api/v1/models/{model_id}/artifact
+        Range: bytes=0-67108863
+    """
+    return blob_response(_get_model(db, model_id).digest, range, request.method)
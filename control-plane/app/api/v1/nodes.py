@@ -3,9 +3,12 @@
 This module provides REST API endpoints for node registration, listing,
 status updates, and heartbeat management.
 """
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional, Tuple
+import json
 import uuid
 import time
 
@@ -15,17 +18,43 @@ from app.models import (
     NodeResponse,
     HeartbeatRequest,
     HeartbeatResponse,
+    MetricSampleResponse,
+    MetricsReplayResponse,
+    CachedArtifact,
+    NodeArtifactsRequest,
+    NodeArtifactsResponse,
 )
-from app.db import get_db, NodeDB
+from app.admission import admit_registration
+from app.db import get_db, NodeArtifactDB, NodeMetricDB
+from app.inference import inference_router
+from app.storage import Record, Storage, get_storage
 from app.auth import create_node_token, require_node_auth
+from app.metrics import TimedRoute
+from app.metrics.instruments import NODE_HEARTBEATS, NODE_REGISTRATIONS
+from app.orchestrator.reaper import METRICS_RETENTION_SECONDS
+from app import serialization
+from app.serialization import FastJSONResponse
+from app.watch import change_log, watch_response
+from app.wire import HEARTBEAT_MEDIA_TYPE, UnsupportedVersion, decode_heartbeat
 
-router = APIRouter(prefix="/nodes", tags=["nodes"])
+# Limits on a single replayed batch, after decompression
+MAX_REPLAY_BYTES = 8 * 1024 * 1024
+MAX_REPLAY_SAMPLES = 5000
+
+router = APIRouter(
+    prefix="/nodes", tags=["nodes"], route_class=TimedRoute
+)
 
 
-@router.post("/register", response_model=NodeRegisterResponse, status_code=201)
+@router.post(
+    "/register",
+    response_model=NodeRegisterResponse,
+    status_code=201,
+    dependencies=[Depends(admit_registration)],
+)
 def register_node(
     request: NodeRegisterRequest,
-    db: Session = Depends(get_db),
+    storage: Storage = Depends(get_storage),
 ) -> NodeRegisterResponse:
     """Register a new node or update an existing node.
     
@@ -33,13 +62,19 @@ def register_node(
     providing their capabilities and connection information. If a node with
     the same name already exists, it will be updated.
     
+    Registrations are rate limited; when throttled the response is 429 with
+    a ``Retry-After`` header giving the delay before retrying.
+    
     Args:
         request: Node registration request with name, ip, and capabilities
-        db: Database session
+        storage: Node storage
         
     Returns:
         NodeRegisterResponse with assigned node_id, token, and control plane URL
         
+    Raises:
+        HTTPException: 429 if the registration rate limit is exceeded
+        
     Example:
         POST /api/v1/nodes/register
         {
@@ -54,29 +89,33 @@ def register_node(
         }
     """
     # Check if node with same name exists
-    existing_node = db.query(NodeDB).filter(NodeDB.name == request.name).first()
+    existing_node = storage.nodes.get_by_name(request.name)
     
     if existing_node:
         # Update existing node
-        existing_node.ip = request.ip
-        existing_node.capabilities = request.capabilities.model_dump()
-        existing_node.last_seen = time.time()
-        existing_node.status = "online"
-        db.commit()
-        node_id = existing_node.id
-    else:
-        # Create new node
-        node_id = str(uuid.uuid4())
-        node = NodeDB(
-            id=node_id,
-            name=request.name,
+        node_id = existing_node["id"]
+        storage.nodes.update(
+            node_id,
             ip=request.ip,
             capabilities=request.capabilities.model_dump(),
             last_seen=time.time(),
             status="online",
         )
-        db.add(node)
-        db.commit()
+        storage.commit()
+        NODE_REGISTRATIONS.labels("updated").inc()
+    else:
+        # Create new node
+        node_id = str(uuid.uuid4())
+        storage.nodes.put({
+            "id": node_id,
+            "name": request.name,
+            "ip": request.ip,
+            "capabilities": request.capabilities.model_dump(),
+            "last_seen": time.time(),
+            "status": "online",
+        })
+        storage.commit()
+        NODE_REGISTRATIONS.labels("created").inc()
     
     # Generate JWT token for the node
     jwt_token = create_node_token(node_id, request.name)
@@ -89,42 +128,86 @@ def register_node(
 
 
 @router.get("", response_model=List[NodeResponse])
-def list_nodes(db: Session = Depends(get_db)) -> List[NodeResponse]:
-    """List all registered nodes.
+def list_nodes(
+    response: Response,
+    watch: bool = False,
+    resource_version: Optional[int] = Query(None, alias="resourceVersion"),
+    timeout_seconds: Optional[int] = Query(None, alias="timeoutSeconds"),
+    accept: Optional[str] = Header(None),
+    last_event_id: Optional[int] = Header(None),
+    storage: Storage = Depends(get_storage),
+    db: Session = Depends(get_db),
+) -> List[NodeResponse]:
+    """List all registered nodes, or watch them for changes.
     
     Returns a list of all nodes registered with the control plane,
-    including their current status and capabilities.
+    including their current status and capabilities. The list's resource
+    version is returned in the ``X-Resource-Version`` header. With
+    ``FAST_SERIALIZATION`` enabled the list is encoded straight from the
+    rows, skipping response model validation; the fast path applies to the
+    SQL storage backend only.
+    
+    With ``watch=1`` the response is instead a stream of node change
+    events newer than ``resourceVersion`` (NDJSON, or Server-Sent Events
+    when requested via the Accept header).
     
     Args:
-        db: Database session
+        response: Outgoing response, used to set the resource version header
+        watch: Stream changes instead of returning a list
+        resource_version: Resource version to start watching after
+        timeout_seconds: Lifetime of the watch stream
+        accept: Accept header, used to negotiate the stream format
+        last_event_id: SSE reconnect position, used if resourceVersion is unset
+        storage: Node storage
+        db: Database session, used by the fast path
         
     Returns:
-        List of NodeResponse objects
+        List of NodeResponse objects, or a streaming watch response
         
     Example:
         GET /api/v1/nodes
+        GET /api/v1/nodes?watch=1&resourceVersion=42
     """
-    nodes = db.query(NodeDB).all()
-    return [
-        NodeResponse(
-            id=node.id,
-            name=node.name,
-            ip=node.ip,
-            capabilities=node.capabilities,
-            last_seen=node.last_seen,
-            status=node.status,
+    if watch:
+        if resource_version is None:
+            resource_version = last_event_id
+        return watch_response(
+            "nodes", resource_version, timeout_seconds, accept
         )
-        for node in nodes
-    ]
+    
+    # Read the version before the query so no later change can be missed
+    response.headers["X-Resource-Version"] = str(change_log.resource_version)
+    if serialization.FAST_SERIALIZATION and storage.name == "sql":
+        return FastJSONResponse(
+            serialization.encode_node_list(db), headers=dict(response.headers)
+        )
+    return [_node_response(node) for node in storage.nodes.list()]
+
+
+def _node_response(node: Record) -> NodeResponse:
+    """Response model for a stored node record."""
+    return NodeResponse(
+        id=node["id"],
+        name=node["name"],
+        ip=node["ip"],
+        capabilities=node["capabilities"],
+        last_seen=node["last_seen"],
+        status=node["status"],
+    )
 
 
 @router.get("/{node_id}", response_model=NodeResponse)
-def get_node(node_id: str, db: Session = Depends(get_db)) -> NodeResponse:
+def get_node(
+    node_id: str,
+    storage: Storage = Depends(get_storage),
+    db: Session = Depends(get_db),
+) -> NodeResponse:
     """Get a specific node by ID.
     
     Args:
         node_id: ID of the node to retrieve
-        db: Database session
+        storage: Node storage
+        db: Database session, used by the fast path
         
     Returns:
         NodeResponse with node details
@@ -135,37 +218,92 @@ def get_node(node_id: str, db: Session = Depends(get_db)) -> NodeResponse:
     Example:
         GET /api/v1/nodes/{node_id}
     """
-    node = db.query(NodeDB).filter(NodeDB.id == node_id).first()
+    if serialization.FAST_SERIALIZATION and storage.name == "sql":
+        body = serialization.encode_node(db, node_id)
+        if not body:
+            raise HTTPException(status_code=404, detail="Node not found")
+        return FastJSONResponse(body)
+    
+    node = storage.nodes.get(node_id)
     
     if not node:
         raise HTTPException(status_code=404, detail="Node not found")
     
-    return NodeResponse(
-        id=node.id,
-        name=node.name,
-        ip=node.ip,
-        capabilities=node.capabilities,
-        last_seen=node.last_seen,
-        status=node.status,
-    )
+    return _node_response(node)
+
+
+async def read_heartbeat(request: Request) -> HeartbeatRequest:
+    """Parse a heartbeat body as JSON or the binary wire format.
+    
+    The format is chosen by ``Content-Type``: ``application/vnd.miaas.heartbeat``
+    bodies are decoded with ``app.wire``; anything else is parsed as JSON.
+    
+    Args:
+        request: Incoming request
+        
+    Returns:
+        Parsed heartbeat
+        
+    Raises:
+        HTTPException: 400 for malformed binary bodies, 415 for unknown
+            binary format versions
+        RequestValidationError: For invalid JSON bodies (422)
+    """
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+    if content_type.split(";")[0].strip().lower() == HEARTBEAT_MEDIA_TYPE:
+        try:
+            return decode_heartbeat(body)
+        except UnsupportedVersion as e:
+            raise HTTPException(status_code=415, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid heartbeat: {e}")
+    try:
+        return HeartbeatRequest.model_validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+
+
+_HEARTBEAT_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": HeartbeatRequest.model_json_schema()},
+            HEARTBEAT_MEDIA_TYPE: {
+                "schema": {"type": "string", "format": "binary"},
+            },
+        },
+    },
+}
 
 
-@router.post("/{node_id}/heartbeat", response_model=HeartbeatResponse)
+@router.post(
+    "/{node_id}/heartbeat",
+    response_model=HeartbeatResponse,
+    openapi_extra=_HEARTBEAT_BODY,
+)
 def heartbeat(
     node_id: str,
-    request: HeartbeatRequest,
+    storage: Storage = Depends(get_storage),
     db: Session = Depends(get_db),
     authenticated_node_id: str = Depends(require_node_auth),
+    # Authenticate before spending time on the body
+    request: HeartbeatRequest = Depends(read_heartbeat),
 ) -> HeartbeatResponse:
     """Update node heartbeat and metrics.
     
     This endpoint receives periodic heartbeat updates from agent nodes,
-    updating their status and resource metrics.
+    updating their status and resource metrics. Nodes running an inference
+    engine also report its state (``inference``), which routes inference
+    batches to nodes that have their models loaded. The body is JSON or, with
+    ``Content-Type: application/vnd.miaas.heartbeat``, the binary format
+    described in ``app.wire``.
     
     Args:
         node_id: ID of the node sending heartbeat
         request: Heartbeat data with resource metrics
-        db: Database session
+        storage: Node storage
+        db: Database session, used for the metric history
         
     Returns:
         HeartbeatResponse with status confirmation
@@ -184,28 +322,337 @@ def heartbeat(
     """
     # Verify the authenticated node matches the request
     if authenticated_node_id != node_id:
+        NODE_HEARTBEATS.labels("forbidden").inc()
         raise HTTPException(
             status_code=403,
             detail="Cannot send heartbeat for a different node"
         )
     
-    node = db.query(NodeDB).filter(NodeDB.id == node_id).first()
+    node = storage.nodes.get(node_id)
     
     if not node:
+        NODE_HEARTBEATS.labels("not_found").inc()
         raise HTTPException(status_code=404, detail="Node not found")
     
-    # Update node status
-    node.last_seen = time.time()
-    node.status = "online"
-    
     # Store metrics in capabilities (for MVP)
-    if not isinstance(node.capabilities, dict):
-        node.capabilities = {}
-    node.capabilities["metrics"] = request.model_dump()
+    capabilities = node["capabilities"]
+    capabilities = dict(capabilities) if isinstance(capabilities, dict) else {}
+    capabilities["metrics"] = request.model_dump()
     
+    # Update node status
+    storage.nodes.update(
+        node_id,
+        last_seen=time.time(),
+        status="online",
+        capabilities=capabilities,
+    )
+    _record_samples(db, node_id, [request])
+    
+    storage.commit()
+    # Metric history stays in the database whatever the storage backend
     db.commit()
+    # Engines' loaded models steer batches to nodes that have them warm
+    if request.inference is not None:
+        inference_router.report(
+            node_id, request.inference.loaded, request.inference.workers, request.cpu_usage
+        )
+    NODE_HEARTBEATS.labels("ok").inc()
     
     return HeartbeatResponse(
         status="ok",
         timestamp=time.time(),
     )
+
+
+async def read_replayed_samples(request: Request) -> List[HeartbeatRequest]:
+    """Parse a replayed batch of heartbeat samples from the request body.
+    
+    The body is newline-delimited JSON, one heartbeat payload per line.
+    Compressed bodies (``Content-Encoding: gzip``) have already been decoded
+    by ``CompressionMiddleware``.
+    
+    Args:
+        request: Incoming request
+        
+    Returns:
+        Parsed samples in body order
+        
+    Raises:
+        HTTPException: 400 for malformed bodies, 413 for oversized batches
+    """
+    body = await request.body()
+    if len(body) > MAX_REPLAY_BYTES:
+        raise HTTPException(status_code=413, detail="Replay batch too large")
+    
+    lines = [line for line in body.splitlines() if line.strip()]
+    if len(lines) > MAX_REPLAY_SAMPLES:
+        raise HTTPException(status_code=413, detail="Replay batch too large")
+    try:
+        return [HeartbeatRequest.model_validate(json.loads(line)) for line in lines]
+    except (ValueError, ValidationError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid sample: {e}")
+
+
+def _record_samples(
+    db: Session, node_id: str, samples: List[HeartbeatRequest]
+) -> Tuple[int, int]:
+    """Add samples to a node's metric history.
+    
+    Samples whose timestamp is already recorded for the node are skipped, so
+    a batch that is replayed twice is only stored once. Samples older than
+    the retention window are skipped as well; those that expire once stored
+    are deleted by the leader's ``metrics-pruner`` loop.
+    
+    Args:
+        db: Database session, committed by the caller
+        node_id: Node the samples belong to
+        samples: Heartbeat samples
+        
+    Returns:
+        Tuple of (accepted, skipped)
+    """
+    now = time.time()
+    cutoff = now - METRICS_RETENTION_SECONDS
+    
+    rows = {}
+    for sample in samples:
+        timestamp = sample.timestamp if sample.timestamp is not None else now
+        if timestamp >= cutoff:
+            rows.setdefault(timestamp, sample)
+    
+    existing = set()
+    if rows:
+        existing = {
+            timestamp
+            for (timestamp,) in db.query(NodeMetricDB.timestamp).filter(
+                NodeMetricDB.node_id == node_id,
+                NodeMetricDB.timestamp >= min(rows),
+                NodeMetricDB.timestamp <= max(rows),
+            )
+        }
+    new_rows = [
+        NodeMetricDB(
+            node_id=node_id,
+            timestamp=timestamp,
+            cpu_usage=sample.cpu_usage,
+            mem_usage=sample.mem_usage,
+            disk_free_mb=sample.disk_free_mb,
+            running_containers=sample.running_containers,
+        )
+        for timestamp, sample in rows.items()
+        if timestamp not in existing
+    ]
+    db.add_all(new_rows)
+    
+    return len(new_rows), len(samples) - len(new_rows)
+
+
+@router.post("/{node_id}/metrics", response_model=MetricsReplayResponse)
+def replay_metrics(
+    node_id: str,
+    samples: List[HeartbeatRequest] = Depends(read_replayed_samples),
+    storage: Storage = Depends(get_storage),
+    db: Session = Depends(get_db),
+    authenticated_node_id: str = Depends(require_node_auth),
+) -> MetricsReplayResponse:
+    """Add a batch of spooled heartbeat samples to a node's metric history.
+    
+    Agents use this endpoint to replay samples they could not deliver while
+    the control plane was unreachable. Unlike a heartbeat, replayed samples
+    do not change the node's status or latest metrics.
+    
+    Args:
+        node_id: ID of the node the samples belong to
+        samples: Heartbeat samples parsed from the NDJSON body
+        storage: Node storage
+        db: Database session
+        
+    Returns:
+        MetricsReplayResponse with accepted and skipped counts
+        
+    Raises:
+        HTTPException: 403 for another node's samples, 404 if node not found
+        
+    Example:
+        POST /api/v1/nodes/{node_id}/metrics
+        Content-Type: application/x-ndjson
+        Content-Encoding: gzip
+        
+        {"timestamp": 1700000000.0, "cpu_usage": 12.5, "mem_usage": 40.1, ...}
+        {"timestamp": 1700000030.0, "cpu_usage": 13.0, "mem_usage": 40.3, ...}
+    """
+    if authenticated_node_id != node_id:
+        raise HTTPException(
+            status_code=403,
+            detail="Cannot replay metrics for a different node"
+        )
+    if not storage.nodes.get(node_id):
+        raise HTTPException(status_code=404, detail="Node not found")
+    
+    accepted, skipped = _record_samples(db, node_id, samples)
+    db.commit()
+    
+    return MetricsReplayResponse(accepted=accepted, skipped=skipped)
+
+
+@router.get("/{node_id}/metrics", response_model=List[MetricSampleResponse])
+def get_node_metrics(
+    node_id: str,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    storage: Storage = Depends(get_storage),
+    db: Session = Depends(get_db),
+) -> List[MetricSampleResponse]:
+    """Get a node's metric history, oldest first.
+    
+    Args:
+        node_id: ID of the node
+        since: Only return samples at or after this time
+        until: Only return samples before this time
+        limit: Maximum number of samples
+        storage: Node storage
+        db: Database session
+        
+    Returns:
+        List of MetricSampleResponse objects
+        
+    Raises:
+        HTTPException: 404 if node not found
+        
+    Example:
+        GET /api/v1/nodes/{node_id}/metrics?since=1700000000
+    """
+    if not storage.nodes.get(node_id):
+        raise HTTPException(status_code=404, detail="Node not found")
+    
+    query = db.query(NodeMetricDB).filter(NodeMetricDB.node_id == node_id)
+    if since is not None:
+        query = query.filter(NodeMetricDB.timestamp >= since)
+    if until is not None:
+        query = query.filter(NodeMetricDB.timestamp < until)
+    samples = query.order_by(NodeMetricDB.timestamp).limit(limit).all()
+    
+    return [
+        MetricSampleResponse(
+            timestamp=sample.timestamp,
+            cpu_usage=sample.cpu_usage,
+            mem_usage=sample.mem_usage,
+            disk_free_mb=sample.disk_free_mb,
+            running_containers=sample.running_containers or [],
+        )
+        for sample in samples
+    ]
+
+
+def _artifacts_response(db: Session, node_id: str) -> NodeArtifactsResponse:
+    """The artifacts a node last reported, most recently used first."""
+    rows = (
+        db.query(NodeArtifactDB)
+        .filter(NodeArtifactDB.node_id == node_id)
+        .order_by(NodeArtifactDB.last_used.desc())
+        .all()
+    )
+    return NodeArtifactsResponse(
+        node_id=node_id,
+        artifacts=[
+            CachedArtifact(
+                digest=row.digest,
+                size=row.size,
+                pinned=row.pinned,
+                last_used=row.last_used,
+            )
+            for row in rows
+        ],
+    )
+
+
+@router.put("/{node_id}/artifacts", response_model=NodeArtifactsResponse)
+def report_artifacts(
+    node_id: str,
+    request: NodeArtifactsRequest,
+    storage: Storage = Depends(get_storage),
+    db: Session = Depends(get_db),
+    authenticated_node_id: str = Depends(require_node_auth),
+) -> NodeArtifactsResponse:
+    """Replace the list of artifacts held in a node's cache.
+    
+    Agents report their cache after every change, so that placement and
+    request routing can prefer nodes already holding a model.
+    
+    Args:
+        node_id: ID of the reporting node
+        request: Every artifact the node holds
+        storage: Node storage
+        db: Database session
+        
+    Returns:
+        NodeArtifactsResponse with the stored artifacts
+        
+    Raises:
+        HTTPException: 403 for another node's cache, 404 if node not found
+        
+    Example:
+        PUT /api/v1/nodes/{node_id}/artifacts
+        {
+            "artifacts": [
+                {"digest": "sha256:4f3c...", "size": 524288000,
+                 "pinned": true, "last_used": 1700000000.0}
+            ]
+        }
+    """
+    if authenticated_node_id != node_id:
+        raise HTTPException(
+            status_code=403,
+            detail="Cannot report artifacts for a different node"
+        )
+    if not storage.nodes.get(node_id):
+        raise HTTPException(status_code=404, detail="Node not found")
+    
+    now = time.time()
+    db.query(NodeArtifactDB).filter(
+        NodeArtifactDB.node_id == node_id
+    ).delete(synchronize_session=False)
+    artifacts = {artifact.digest: artifact for artifact in request.artifacts}
+    db.add_all(
+        NodeArtifactDB(
+            node_id=node_id,
+            digest=artifact.digest,
+            size=artifact.size,
+            pinned=artifact.pinned,
+            last_used=artifact.last_used,
+            reported_at=now,
+        )
+        for artifact in artifacts.values()
+    )
+    db.commit()
+    
+    return _artifacts_response(db, node_id)
+
+
+@router.get("/{node_id}/artifacts", response_model=NodeArtifactsResponse)
+def get_node_artifacts(
+    node_id: str,
+    storage: Storage = Depends(get_storage),
+    db: Session = Depends(get_db),
+) -> NodeArtifactsResponse:
+    """Get the artifacts a node last reported holding in its cache.
+    
+    Args:
+        node_id: ID of the node
+        storage: Node storage
+        db: Database session
+        
+    Returns:
+        NodeArtifactsResponse with the artifacts, most recently used first
+        
+    Raises:
+        HTTPException: 404 if node not found
+        
+    Example:
+        GET /api/v1/nodes/{node_id}/artifacts
+    """
+    if not storage.nodes.get(node_id):
+        raise HTTPException(status_code=404, detail="Node not found")
+    
+    return _artifacts_response(db, node_id)
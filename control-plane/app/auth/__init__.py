@@ -3,11 +3,12 @@
 This module provides JWT token generation and validation for node authentication.
 """
 from .jwt_utils import create_node_token, verify_node_token, get_current_node
-from .dependencies import require_node_auth
+from .dependencies import require_node_auth, require_admin_auth
 
 __all__ = [
     "create_node_token",
     "verify_node_token",
     "get_current_node",
     "require_node_auth",
+    "require_admin_auth",
 ]
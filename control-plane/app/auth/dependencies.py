@@ -3,14 +3,21 @@
 This module provides dependency injection functions for protecting API endpoints
 that require node authentication.
 """
+import hmac
+import os
+
 from fastapi import HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional
 
+from app.metrics import timed_phase
 from .jwt_utils import verify_node_token
 
 security = HTTPBearer(auto_error=False)
 
+# Static bearer token for admin endpoints; admin endpoints are disabled if unset
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
 
 def require_node_auth(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
@@ -42,7 +49,8 @@ def require_node_auth(
         )
     
     token = credentials.credentials
-    payload = verify_node_token(token)
+    with timed_phase("auth"):
+        payload = verify_node_token(token)
     
     if not payload:
         raise HTTPException(
@@ -52,3 +60,35 @@ def require_node_auth(
         )
     
     return payload["node_id"]
+
+
+def require_admin_auth(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+) -> None:
+    """Require the admin token for an endpoint.
+    
+    Admin endpoints (profiling, diagnostics) are only available when the
+    ``ADMIN_TOKEN`` environment variable is set, and the request must present
+    it as a Bearer token.
+    
+    Args:
+        credentials: HTTP Bearer credentials from the Authorization header
+        
+    Raises:
+        HTTPException: 403 if admin endpoints are disabled, 401 if the token
+            is missing or wrong
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable",
+        )
+    
+    if not credentials or not hmac.compare_digest(
+        credentials.credentials.encode(), ADMIN_TOKEN.encode()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or missing admin token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
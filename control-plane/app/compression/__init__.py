@@ -0,0 +1,18 @@
+"""HTTP compression package: response negotiation and compressed request bodies."""
+from .codecs import (
+    SUPPORTED_ENCODINGS,
+    DecodeError,
+    compress,
+    decompress,
+    negotiate,
+)
+from .middleware import CompressionMiddleware
+
+__all__ = [
+    "SUPPORTED_ENCODINGS",
+    "DecodeError",
+    "compress",
+    "decompress",
+    "negotiate",
+    "CompressionMiddleware",
+]
@@ -0,0 +1,218 @@
+"""Compression middleware for responses and request bodies.
+
+``CompressionMiddleware`` is a plain ASGI middleware, like
+``MetricsMiddleware``:
+
+- Responses are compressed with the coding negotiated from the client's
+  ``Accept-Encoding`` once their body reaches ``COMPRESSION_MIN_SIZE``.
+  Only complete, single-message bodies are compressed; streaming responses
+  such as watches pass through untouched so events are not held back, and
+  Server-Sent Events and NDJSON streams have their headers sent at once.
+- Request bodies sent with ``Content-Encoding: gzip`` (or ``zstd``) are
+  decompressed before the endpoint sees them, up to
+  ``MAX_REQUEST_BODY_BYTES``. Unsupported codings are rejected with 415.
+- Every response advertises the accepted request codings in an
+  ``Accept-Encoding`` header (RFC 7694), which is how agents learn that they
+  may compress heartbeats and registrations.
+"""
+import json
+import os
+from typing import List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from .codecs import SUPPORTED_ENCODINGS, DecodeError, compress, decompress, negotiate
+from app.metrics.instruments import HTTP_COMPRESSION_BYTES
+
+# Smallest response body in bytes worth compressing
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", "1024"))
+
+# Largest decompressed request body in bytes
+MAX_REQUEST_BODY_BYTES = int(os.environ.get("MAX_REQUEST_BODY_BYTES", str(8 * 1024 * 1024)))
+
+# Bodies above this size are (de)compressed off the event loop
+_THREADPOOL_MIN_SIZE = 64 * 1024
+
+# Media types worth compressing
+_COMPRESSIBLE_MEDIA_TYPES = (b"application/json", b"text/")
+
+# Media types of event streams, whose headers are sent without waiting for a body
+_STREAMING_MEDIA_TYPES = (b"text/event-stream", b"application/x-ndjson")
+
+_ACCEPT_ENCODING = ", ".join(SUPPORTED_ENCODINGS).encode()
+
+Headers = List[Tuple[bytes, bytes]]
+
+
+def _header(headers: Headers, name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _without(headers: Headers, *names: bytes) -> Headers:
+    return [(k, v) for k, v in headers if k.lower() not in names]
+
+
+async def _run(func, encoding: str, data: bytes, *args):
+    """Run CPU-bound (de)compression, offloading large bodies to a thread."""
+    if len(data) >= _THREADPOOL_MIN_SIZE:
+        return await run_in_threadpool(func, encoding, data, *args)
+    return func(encoding, data, *args)
+
+
+class CompressionMiddleware:
+    """ASGI middleware negotiating response compression and decoding requests."""
+
+    def __init__(self, app, minimum_size: int = None, max_body_size: int = None):
+        """Wrap an ASGI application.
+
+        Args:
+            app: ASGI application
+            minimum_size: Smallest response body compressed, in bytes
+            max_body_size: Largest decompressed request body, in bytes
+        """
+        self.app = app
+        self.minimum_size = COMPRESSION_MIN_SIZE if minimum_size is None else minimum_size
+        self.max_body_size = (
+            MAX_REQUEST_BODY_BYTES if max_body_size is None else max_body_size
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = scope["headers"]
+        content_encoding = _header(headers, b"content-encoding")
+        if content_encoding and content_encoding.strip().lower() != b"identity":
+            encoding = content_encoding.strip().lower().decode("latin-1")
+            if encoding not in SUPPORTED_ENCODINGS:
+                await self._reject(send, 415, f"Unsupported Content-Encoding: {encoding}")
+                return
+            body = await self._read_body(receive)
+            if body is None:
+                await self._reject(send, 413, "Request body too large")
+                return
+            try:
+                decoded = await _run(decompress, encoding, body, self.max_body_size)
+            except DecodeError as e:
+                await self._reject(send, 400, str(e))
+                return
+            except OverflowError:
+                await self._reject(send, 413, "Request body too large")
+                return
+            HTTP_COMPRESSION_BYTES.labels("request", encoding, "encoded").inc(len(body))
+            HTTP_COMPRESSION_BYTES.labels("request", encoding, "raw").inc(len(decoded))
+
+            scope = dict(scope)
+            scope["headers"] = _without(
+                headers, b"content-encoding", b"content-length"
+            ) + [(b"content-length", str(len(decoded)).encode())]
+            receive = self._replay(decoded, receive)
+
+        coding = negotiate(
+            (_header(headers, b"accept-encoding") or b"").decode("latin-1")
+        )
+        await self.app(scope, receive, self._sender(send, coding))
+
+    async def _read_body(self, receive) -> Optional[bytes]:
+        """Read the whole compressed body, or None if it exceeds the limit."""
+        chunks, size = [], 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_body_size:
+                return None
+            chunks.append(chunk)
+            more_body = message.get("more_body", False)
+        return b"".join(chunks)
+
+    @staticmethod
+    def _replay(body: bytes, receive):
+        """Receive callable delivering the decoded body, then the client's messages."""
+        sent = False
+
+        async def replay():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        return replay
+
+    def _sender(self, send, coding: Optional[str]):
+        """Send callable compressing complete response bodies with ``coding``."""
+        start = None
+
+        async def send_wrapper(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = dict(message)
+                start["headers"] = list(message.get("headers", ())) + [
+                    (b"accept-encoding", _ACCEPT_ENCODING)
+                ]
+                # Event streams are never compressed, and their clients wait
+                # on the headers, which may come long before the first event
+                media_type = _header(start["headers"], b"content-type") or b""
+                if media_type.startswith(_STREAMING_MEDIA_TYPES):
+                    response_start, start = start, None
+                    await send(response_start)
+                return
+            if message["type"] != "http.response.body" or start is None:
+                # Other ways of sending the body, such as zero-copy file
+                # sends, are passed through after the held start
+                if start is not None:
+                    response_start, start = start, None
+                    await send(response_start)
+                await send(message)
+                return
+
+            response_start, start = start, None
+            headers = response_start["headers"]
+            body = message.get("body", b"")
+            media_type = _header(headers, b"content-type") or b""
+            if (
+                coding is not None
+                and not message.get("more_body", False)
+                and len(body) >= self.minimum_size
+                and _header(headers, b"content-encoding") is None
+                and media_type.startswith(_COMPRESSIBLE_MEDIA_TYPES)
+            ):
+                encoded = await _run(compress, coding, body)
+                HTTP_COMPRESSION_BYTES.labels("response", coding, "raw").inc(len(body))
+                HTTP_COMPRESSION_BYTES.labels("response", coding, "encoded").inc(len(encoded))
+                vary = _header(headers, b"vary")
+                response_start["headers"] = _without(
+                    headers, b"content-length", b"vary"
+                ) + [
+                    (b"content-encoding", coding.encode()),
+                    (b"content-length", str(len(encoded)).encode()),
+                    (b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"),
+                ]
+                message = dict(message, body=encoded)
+            await send(response_start)
+            await send(message)
+
+        return send_wrapper
+
+    @staticmethod
+    async def _reject(send, status: int, detail: str) -> None:
+        """Send an error response in FastAPI's ``{"detail": ...}`` shape."""
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"accept-encoding", _ACCEPT_ENCODING),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
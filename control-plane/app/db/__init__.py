@@ -1,5 +1,5 @@
 """Database package initialization."""
 from .database import Base, engine, get_db, init_db
-from .models import NodeDB, DeploymentDB
+from .models import NodeDB, DeploymentDB, NodeMetricDB, LeaseDB, ModelDB, NodeArtifactDB
 
-__all__ = ["Base", "engine", "get_db", "init_db", "NodeDB", "DeploymentDB"]
+__all__ = ["Base", "engine", "get_db", "init_db", "NodeDB", "DeploymentDB", "NodeMetricDB", "LeaseDB", "ModelDB", "NodeArtifactDB"]
@@ -1,13 +1,22 @@
 """Database configuration and session management."""
+import os
+import time
+
 from sqlalchemy import create_engine
+from sqlalchemy.exc import DatabaseError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 
 # SQLite database for MVP - can be swapped to Postgres later
-SQLALCHEMY_DATABASE_URL = "sqlite:///./control_plane.db"
+SQLALCHEMY_DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./control_plane.db")
 
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL,
+    connect_args=(
+        {"check_same_thread": False}
+        if SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+        else {}
+    ),
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -27,6 +36,21 @@ def get_db() -> Session:
         db.close()
 
 
-def init_db():
-    """Initialize database tables."""
-    Base.metadata.create_all(bind=engine)
+def init_db(attempts: int = 3):
+    """Initialize database tables.
+    
+    Several replicas may start against the same database at once. If another
+    replica creates a table between the existence check and ``CREATE
+    TABLE``, creation is retried, skipping the tables that now exist.
+    
+    Args:
+        attempts: Number of times to try creating the tables
+    """
+    for attempt in range(attempts):
+        try:
+            Base.metadata.create_all(bind=engine)
+            return
+        except DatabaseError:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.1 * (attempt + 1))
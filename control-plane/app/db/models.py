@@ -1,6 +1,6 @@
 """SQLAlchemy database models."""
 from datetime import datetime
-from sqlalchemy import Column, String, Integer, Float, Text, DateTime, JSON
+from sqlalchemy import Boolean, Column, String, Integer, Float, Text, DateTime, JSON, Index, UniqueConstraint
 from .database import Base
 
 
@@ -15,6 +15,7 @@ class NodeDB(Base):
     capabilities = Column(JSON, nullable=False)
     last_seen = Column(Float, nullable=False)
     status = Column(String, default="online")
+    resource_version = Column(Integer, default=0, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -31,5 +32,69 @@ class DeploymentDB(Base):
     env = Column(JSON, default={})
     status = Column(String, default="pending")
     action = Column(String, nullable=False)
+    resource_version = Column(Integer, default=0, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class NodeMetricDB(Base):
+    """Database model for the history of node heartbeat metrics."""
+    
+    __tablename__ = "node_metrics"
+    __table_args__ = (Index("ix_node_metrics_node_time", "node_id", "timestamp"),)
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    node_id = Column(String, nullable=False)
+    timestamp = Column(Float, nullable=False)
+    cpu_usage = Column(Float, default=0.0)
+    mem_usage = Column(Float, default=0.0)
+    disk_free_mb = Column(Integer, default=0)
+    running_containers = Column(JSON, default=[])
+
+
+class LeaseDB(Base):
+    """Database model for leader election leases."""
+    
+    __tablename__ = "leases"
+    
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)
+    epoch = Column(Integer, nullable=False, default=1)
+    expires_at = Column(Float, nullable=False)
+    renewed_at = Column(Float, nullable=False)
+
+
+class ModelDB(Base):
+    """Database model for registered ML models."""
+    
+    __tablename__ = "models"
+    __table_args__ = (UniqueConstraint("name", "version", name="uq_models_name_version"),)
+    
+    id = Column(String, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    version = Column(String, nullable=False)
+    framework = Column(String, nullable=False)
+    status = Column(String, default="active")
+    digest = Column(String, nullable=False, index=True)
+    size = Column(Integer, nullable=False)
+    input_schema = Column(JSON, default={})
+    output_schema = Column(JSON, default={})
+    max_batch_size = Column(Integer, nullable=True)
+    max_batch_wait_ms = Column(Float, nullable=True)
+    min_replicas = Column(Integer, nullable=True)
+    max_replicas = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class NodeArtifactDB(Base):
+    """Database model for the artifacts held in each node's cache."""
+    
+    __tablename__ = "node_artifacts"
+    
+    node_id = Column(String, primary_key=True)
+    digest = Column(String, primary_key=True, index=True)
+    size = Column(Integer, nullable=False)
+    pinned = Column(Boolean, default=False)
+    last_used = Column(Float, nullable=False)
+    reported_at = Column(Float, nullable=False)
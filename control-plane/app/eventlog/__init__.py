@@ -0,0 +1,12 @@
+"""Append-only event logs on local disk."""
+from .deployments import DELETE, PUT, UPDATE, DeploymentLog, deployment_log
+from .segments import SegmentLog
+
+__all__ = [
+    "DELETE",
+    "PUT",
+    "UPDATE",
+    "DeploymentLog",
+    "deployment_log",
+    "SegmentLog",
+]
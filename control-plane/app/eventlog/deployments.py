@@ -0,0 +1,192 @@
+"""Event log of deployment state transitions.
+
+Every change to a deployment (creation, status and action updates, removal)
+is appended to a ``SegmentLog`` before it is applied to the storage backend,
+and the log keeps the current state of every deployment in memory.
+
+With the ``memory`` and ``striped`` backends the log is the source of truth:
+on startup the store is rebuilt from the log's state, which makes
+deployments survive restarts, and a change that was logged but not applied
+is applied then.
+
+With the ``sql`` backend the deployments table wins, since other replicas
+change it without this replica's log seeing it. On startup the log adopts
+the table: rows it lacks or holds differently are recorded, and logged
+deployments without a row are recorded as deleted. The log then holds the
+history of the rows rather than overriding them, and a change that was
+logged but whose commit failed is undone in the log, not applied.
+
+When the log has more than ``DEPLOYMENT_LOG_MAX_SEGMENTS`` segments it is
+compacted into a snapshot of the current state, which drops the transition
+history before the snapshot.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from app.metrics.instruments import DEPLOYMENT_LOG_COMPACTION_DURATION, DEPLOYMENT_LOG_EVENTS
+
+from .segments import SegmentLog
+
+logger = logging.getLogger(__name__)
+
+# Directory of the deployment event log; empty disables the log
+DEPLOYMENT_LOG_DIR = os.environ.get("DEPLOYMENT_LOG_DIR", "")
+
+# Segment size at which a new segment file is started
+DEPLOYMENT_LOG_SEGMENT_BYTES = int(
+    os.environ.get("DEPLOYMENT_LOG_SEGMENT_BYTES", str(4 * 1024 * 1024))
+)
+
+# Segments kept before the log is compacted into a snapshot
+DEPLOYMENT_LOG_MAX_SEGMENTS = int(os.environ.get("DEPLOYMENT_LOG_MAX_SEGMENTS", "8"))
+
+# Sync every event to disk before acknowledging the change
+DEPLOYMENT_LOG_FSYNC = os.environ.get("DEPLOYMENT_LOG_FSYNC", "1") == "1"
+
+PUT = "put"
+UPDATE = "update"
+DELETE = "delete"
+
+
+class DeploymentLog:
+    """Append-only log of deployment state with its current projection.
+
+    Example:
+        >>> log = DeploymentLog("/var/lib/miaas/deployments")
+        >>> log.open()
+        >>> log.record(UPDATE, "deploy-123", {"status": "running"})
+        >>> log.history("deploy-123")
+    """
+
+    def __init__(
+        self,
+        directory: str = DEPLOYMENT_LOG_DIR,
+        segment_bytes: int = DEPLOYMENT_LOG_SEGMENT_BYTES,
+        max_segments: int = DEPLOYMENT_LOG_MAX_SEGMENTS,
+        fsync: bool = DEPLOYMENT_LOG_FSYNC,
+    ):
+        """Initialize the log; nothing is read until ``open``.
+
+        Args:
+            directory: Log directory; empty disables the log
+            segment_bytes: Size at which a new segment is started
+            max_segments: Segments kept before compacting
+            fsync: Sync every event to disk
+        """
+        self.directory = directory
+        self.max_segments = max_segments
+        self.state: Dict[str, Dict[str, Any]] = {}
+        self._segments = SegmentLog(directory, segment_bytes, fsync)
+        self._lock = threading.Lock()
+        self._open = False
+
+    @property
+    def is_open(self) -> bool:
+        """Whether the log is open and recording changes."""
+        return self._open
+
+    @property
+    def last_seq(self) -> int:
+        """Sequence number of the last recorded event."""
+        return self._segments.last_seq
+
+    def open(self) -> None:
+        """Open the log and rebuild the current state from disk."""
+        if not self.directory or self._open:
+            return
+        with self._lock:
+            snapshot_seq, snapshot = self._segments.open()
+            self.state = json.loads(snapshot) if snapshot else {}
+            replayed = 0
+            for _, payload in self._segments.read(after=snapshot_seq):
+                self._apply(json.loads(payload))
+                replayed += 1
+            self._open = True
+        logger.info(
+            f"Opened deployment event log {self.directory}: "
+            f"{len(self.state)} deployments, {replayed} events replayed"
+        )
+
+    def close(self) -> None:
+        """Stop recording and close the active segment."""
+        with self._lock:
+            self._open = False
+            self._segments.close()
+
+    def record(self, event_type: str, deployment_id: str, fields: Optional[Dict] = None) -> int:
+        """Append a state transition and apply it to the current state.
+
+        Args:
+            event_type: ``put`` (full record), ``update`` (changed fields) or
+                ``delete``
+            deployment_id: Deployment the event belongs to
+            fields: Record or changed fields
+
+        Returns:
+            The event's sequence number
+        """
+        event = {
+            "timestamp": time.time(),
+            "type": event_type,
+            "id": deployment_id,
+            "fields": fields or {},
+        }
+        payload = json.dumps(event, separators=(",", ":"), default=str).encode()
+        with self._lock:
+            seq = self._segments.append(payload)
+            self._apply(event)
+            if self._segments.segments > self.max_segments:
+                self._compact()
+        DEPLOYMENT_LOG_EVENTS.labels(event_type).inc()
+        return seq
+
+    def _apply(self, event: Dict) -> None:
+        deployment_id = event["id"]
+        if event["type"] == PUT:
+            self.state[deployment_id] = dict(event["fields"])
+        elif event["type"] == UPDATE and deployment_id in self.state:
+            self.state[deployment_id].update(event["fields"])
+        elif event["type"] == DELETE:
+            self.state.pop(deployment_id, None)
+
+    def compact(self) -> int:
+        """Snapshot the current state and drop the segments before it.
+
+        Returns:
+            Sequence number the snapshot is current to
+        """
+        with self._lock:
+            return self._compact()
+
+    def _compact(self) -> int:
+        start = time.perf_counter()
+        seq = self._segments.compact(
+            json.dumps(self.state, separators=(",", ":"), default=str).encode()
+        )
+        DEPLOYMENT_LOG_COMPACTION_DURATION.observe(time.perf_counter() - start)
+        return seq
+
+    def history(self, deployment_id: str) -> List[Dict[str, Any]]:
+        """Events of one deployment since the last compaction, oldest first.
+
+        Args:
+            deployment_id: Deployment ID
+
+        Returns:
+            Events with their sequence numbers
+        """
+        events = []
+        for seq, payload in self._segments.read():
+            event = json.loads(payload)
+            if event["id"] == deployment_id:
+                event["seq"] = seq
+                events.append(event)
+        return events
+
+
+# Global deployment log, opened on startup when DEPLOYMENT_LOG_DIR is set
+deployment_log = DeploymentLog()
@@ -0,0 +1,247 @@
+"""Append-only, segmented record log on local disk.
+
+Records are appended to the newest segment file and never rewritten. Once a
+segment reaches ``segment_bytes`` a new one is started, so every write is a
+sequential append and old data can be dropped a whole file at a time.
+Compaction writes a snapshot of the caller's state as of the last record and
+deletes every segment before it.
+
+Directory layout::
+
+    00000000000000000001.seg   records starting at sequence number 1
+    00000000000000000734.seg   records starting at sequence number 734
+    snapshot                   state as of the last compacted record
+
+Record layout (big-endian): payload length u32, sequence number u64, crc32
+u32 of the sequence number and payload, then the payload. Snapshot layout:
+magic "MSEG", version u8, sequence number u64, crc32 u32 of the body, then
+the body.
+
+On open, segments are scanned and the first torn or corrupt record ends the
+log: the segment is truncated there and any later segments are removed, so a
+crash mid-append loses at most the record being written.
+"""
+import logging
+import os
+import struct
+import threading
+import zlib
+from typing import Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_RECORD = struct.Struct(">IQI")
+_SEQ = struct.Struct(">Q")
+_SNAPSHOT = struct.Struct(">4sBQI")
+_MAGIC = b"MSEG"
+_VERSION = 1
+_SUFFIX = ".seg"
+_SNAPSHOT_NAME = "snapshot"
+
+
+def _checksum(seq: int, payload: bytes) -> int:
+    return zlib.crc32(payload, zlib.crc32(_SEQ.pack(seq)))
+
+
+def _read_records(path: str) -> Iterator[Tuple[int, int, bytes]]:
+    """Yield ``(offset, seq, payload)`` for each intact record of a segment.
+
+    Stops at the first torn or corrupt record; the caller can compare the
+    end of the last record with the file size to detect one.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = 0
+    while offset + _RECORD.size <= len(data):
+        length, seq, crc = _RECORD.unpack_from(data, offset)
+        start = offset + _RECORD.size
+        payload = data[start:start + length]
+        if len(payload) < length or _checksum(seq, payload) != crc:
+            return
+        yield offset, seq, payload
+        offset = start + length
+
+
+def _fsync_dir(directory: str) -> None:
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class SegmentLog:
+    """Segmented append-only log of sequence-numbered records.
+
+    Example:
+        >>> log = SegmentLog("/var/lib/miaas/events")
+        >>> seq, state = log.open()
+        >>> log.append(b"...")
+        >>> log.compact(encoded_state)
+    """
+
+    def __init__(self, directory: str, segment_bytes: int, fsync: bool = True):
+        """Initialize the log.
+
+        Args:
+            directory: Directory holding the segments and snapshot
+            segment_bytes: Size at which a new segment is started
+            fsync: Sync each append to disk before returning
+        """
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.last_seq = 0
+        self._segments: List[int] = []
+        self._file = None
+        self._lock = threading.Lock()
+
+    def _path(self, first_seq: int) -> str:
+        return os.path.join(self.directory, f"{first_seq:020d}{_SUFFIX}")
+
+    @property
+    def segments(self) -> int:
+        """Number of segment files."""
+        return len(self._segments)
+
+    def open(self) -> Tuple[int, Optional[bytes]]:
+        """Open the log, recovering from a torn tail.
+
+        Returns:
+            Tuple of (sequence number, body) of the snapshot, or (0, None)
+            if there is none; records after it are read with ``read``
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        snapshot_seq, snapshot = self._load_snapshot()
+        self._segments = sorted(
+            int(name[:-len(_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.endswith(_SUFFIX)
+        )
+        previous = 0
+        for i, first_seq in enumerate(self._segments):
+            path = self._path(first_seq)
+            end = 0
+            for offset, seq, payload in _read_records(path):
+                if seq <= previous:
+                    break  # out of order: treat as corrupt
+                previous = seq
+                end = offset + _RECORD.size + len(payload)
+            if end < os.path.getsize(path):
+                self._truncate(i, end)
+                break
+        # Segments older than the snapshot remain if compaction was
+        # interrupted before removing them
+        self.last_seq = max(snapshot_seq, previous)
+        if not self._segments:
+            self._segments.append(self.last_seq + 1)
+        self._file = open(self._path(self._segments[-1]), "ab")
+        return snapshot_seq, snapshot
+
+    def _truncate(self, index: int, end: int) -> None:
+        """Cut segment ``index`` at ``end`` and drop the segments after it."""
+        path = self._path(self._segments[index])
+        logger.warning(
+            f"Truncating event log segment {path} at byte {end} after a torn "
+            f"or corrupt record"
+        )
+        with open(path, "r+b") as f:
+            f.truncate(end)
+        for first_seq in self._segments[index + 1:]:
+            os.remove(self._path(first_seq))
+        del self._segments[index + 1:]
+
+    def append(self, payload: bytes) -> int:
+        """Append a record.
+
+        Args:
+            payload: Record body
+
+        Returns:
+            The record's sequence number
+        """
+        with self._lock:
+            seq = self.last_seq + 1
+            if self._file.tell() and self._file.tell() + len(payload) > self.segment_bytes:
+                self._roll(seq)
+            self._file.write(
+                _RECORD.pack(len(payload), seq, _checksum(seq, payload)) + payload
+            )
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self.last_seq = seq
+            return seq
+
+    def _roll(self, first_seq: int) -> None:
+        """Close the active segment and start one at ``first_seq``."""
+        self._file.close()
+        self._segments.append(first_seq)
+        self._file = open(self._path(first_seq), "ab")
+        if self.fsync:
+            _fsync_dir(self.directory)
+
+    def read(self, after: int = 0) -> Iterator[Tuple[int, bytes]]:
+        """Yield ``(seq, payload)`` of the records after sequence ``after``."""
+        with self._lock:
+            segments = list(self._segments)
+        for i, first_seq in enumerate(segments):
+            if i + 1 < len(segments) and segments[i + 1] <= after + 1:
+                continue  # every record in this segment is old
+            try:
+                for _, seq, payload in _read_records(self._path(first_seq)):
+                    if seq > after:
+                        yield seq, payload
+            except FileNotFoundError:
+                continue  # removed by a concurrent compaction
+
+    def compact(self, snapshot: bytes) -> int:
+        """Replace every record so far with a snapshot.
+
+        Args:
+            snapshot: Caller's state as of the last appended record
+
+        Returns:
+            Sequence number the snapshot is current to
+        """
+        with self._lock:
+            seq = self.last_seq
+            body = _SNAPSHOT.pack(_MAGIC, _VERSION, seq, zlib.crc32(snapshot))
+            path = os.path.join(self.directory, _SNAPSHOT_NAME)
+            with open(f"{path}.tmp", "wb") as f:
+                f.write(body + snapshot)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(f"{path}.tmp", path)
+
+            old = self._segments
+            self._file.close()
+            self._segments = [seq + 1]
+            self._file = open(self._path(seq + 1), "ab")
+            for first_seq in old:
+                if first_seq != seq + 1:
+                    os.remove(self._path(first_seq))
+            _fsync_dir(self.directory)
+            return seq
+
+    def _load_snapshot(self) -> Tuple[int, Optional[bytes]]:
+        path = os.path.join(self.directory, _SNAPSHOT_NAME)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return 0, None
+        if len(data) >= _SNAPSHOT.size:
+            magic, version, seq, crc = _SNAPSHOT.unpack_from(data)
+            body = data[_SNAPSHOT.size:]
+            if magic == _MAGIC and version == _VERSION and zlib.crc32(body) == crc:
+                return seq, body
+        # Snapshots are replaced atomically, so this is damage, not a crash
+        raise ValueError(f"Corrupt event log snapshot {path}")
+
+    def close(self) -> None:
+        """Close the active segment."""
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
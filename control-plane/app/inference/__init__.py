@@ -0,0 +1,40 @@
+"""Inference package: request queues with dynamic batching, routing, results and caching."""
+from .batcher import (
+    DEFAULT_POLICY,
+    DEFAULT_PRIORITY,
+    PRIORITY_CLASSES,
+    Batch,
+    BatchPolicy,
+    DeadlineInfeasible,
+    InferenceQueue,
+    InferenceRequest,
+    PriorityClass,
+    QueueFull,
+    inference_queue,
+)
+from .cache import InferenceCache, inference_cache
+from .results import COMPLETED, FAILED, InferenceResult, ResultStore, result_store
+from .routing import InferenceRouter, inference_router
+
+__all__ = [
+    "DEFAULT_POLICY",
+    "DEFAULT_PRIORITY",
+    "PRIORITY_CLASSES",
+    "Batch",
+    "BatchPolicy",
+    "DeadlineInfeasible",
+    "InferenceQueue",
+    "InferenceRequest",
+    "PriorityClass",
+    "QueueFull",
+    "inference_queue",
+    "COMPLETED",
+    "FAILED",
+    "InferenceResult",
+    "ResultStore",
+    "result_store",
+    "InferenceRouter",
+    "inference_router",
+    "InferenceCache",
+    "inference_cache",
+]
@@ -0,0 +1,674 @@
+"""Per-model inference request queues with dynamic batching.
+
+Inference requests (``POST /api/v1/inference``) are queued per model and
+handed to inference engines in batches. Engines pull work: they ask for the
+next batch of the models they serve and wait for one to be ready.
+
+A model's queue is ready once it holds ``max_batch_size`` requests, or once
+its oldest request has waited ``max_wait`` seconds, whichever comes first.
+Batch-friendly backends therefore get full batches under load, while a lone
+request waits no longer than ``max_wait``. Both limits are set per model
+(see ``BatchPolicy``).
+
+With a router (``routing.py``), a ready batch is held back briefly from
+engines that do not have its model loaded, so that engines that do can take
+it first.
+
+Every request belongs to a priority class (``PRIORITY_CLASSES``) and has a
+deadline, its class's default unless the client sets one. Requests are
+handed out earliest deadline first: a batch takes the queue's requests with
+the earliest deadlines, and of the ready queues, the one holding the
+earliest deadline goes first. Queued requests that can no longer finish by
+their deadline, given the model's recent time from lease to results, are
+not run; ``on_missed`` is told about them instead.
+
+Requests are admitted only while they can be served:
+
+* **Bounded queues**: a model queues at most ``INFERENCE_MAX_QUEUED``
+  requests. Each class may only fill its share of that bound, so a burst of
+  batch requests leaves room for interactive ones; requests beyond it are
+  refused with ``QueueFull``.
+* **Deadlines**: a request whose deadline falls before its results are
+  expected is refused with ``DeadlineInfeasible``, rather than queued only
+  to miss it. The estimate is its batch and those queued ahead of it,
+  spread over the engines recently serving the model, times the model's
+  recent time from lease to results.
+
+A batch is leased to the engine that took it. If its results do not arrive
+within the lease, its requests go back into their queue, keeping their
+deadlines, and are handed out again, so requests are delivered at least
+once even if an engine dies.
+
+Each model's batch latency, from its oldest request being queued to its
+results coming back, is tracked for the autoscaler
+(``app/orchestrator/autoscaler.py``).
+"""
+import asyncio
+import collections
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from app.inference.routing import InferenceRouter, inference_router
+from app.metrics.instruments import (
+    INFERENCE_BATCH_AFFINITY,
+    INFERENCE_BATCH_SIZE,
+    INFERENCE_QUEUE_DEPTH,
+    INFERENCE_QUEUE_WAIT,
+)
+
+# Largest batch formed for a model without its own policy
+INFERENCE_MAX_BATCH_SIZE = int(os.environ.get("INFERENCE_MAX_BATCH_SIZE", "8"))
+
+# Milliseconds a request waits for a batch to fill, for models without their own policy
+INFERENCE_MAX_BATCH_WAIT_MS = float(os.environ.get("INFERENCE_MAX_BATCH_WAIT_MS", "10"))
+
+# Seconds an engine has to return a batch's results before it is handed out again
+INFERENCE_LEASE_SECONDS = float(os.environ.get("INFERENCE_LEASE_SECONDS", "60"))
+
+# Requests queued per model; each priority class may fill its share of it
+INFERENCE_MAX_QUEUED = int(os.environ.get("INFERENCE_MAX_QUEUED", "1024"))
+
+# Default deadlines of each priority class, in milliseconds
+INFERENCE_INTERACTIVE_DEADLINE_MS = float(os.environ.get("INFERENCE_INTERACTIVE_DEADLINE_MS", "1000"))
+INFERENCE_STANDARD_DEADLINE_MS = float(os.environ.get("INFERENCE_STANDARD_DEADLINE_MS", "60000"))
+INFERENCE_BATCH_DEADLINE_MS = float(os.environ.get("INFERENCE_BATCH_DEADLINE_MS", "3600000"))
+
+# Weight of the latest batch in each model's moving average batch latency
+_LATENCY_WEIGHT = 0.3
+
+# Seconds after which a model's service time and engines no longer inform admission
+_ESTIMATE_WINDOW = 60.0
+
+# Orders requests queued with the same deadline and class
+_sequence = itertools.count()
+
+QUEUED = "queued"
+PROCESSING = "processing"
+
+
+class BatchPolicy(NamedTuple):
+    """When a model's queued requests are flushed as a batch."""
+
+    max_batch_size: int
+    max_wait: float  # seconds
+
+
+DEFAULT_POLICY = BatchPolicy(INFERENCE_MAX_BATCH_SIZE, INFERENCE_MAX_BATCH_WAIT_MS / 1000)
+
+
+class PriorityClass(NamedTuple):
+    """How urgent a class of requests is, and how much of a queue it may fill."""
+
+    rank: int  # breaks deadline ties, lowest first
+    deadline: float  # default seconds from submission
+    share: float  # fraction of the queue bound
+
+
+PRIORITY_CLASSES = {
+    "interactive": PriorityClass(0, INFERENCE_INTERACTIVE_DEADLINE_MS / 1000, 1.0),
+    "standard": PriorityClass(1, INFERENCE_STANDARD_DEADLINE_MS / 1000, 0.9),
+    "batch": PriorityClass(2, INFERENCE_BATCH_DEADLINE_MS / 1000, 0.5),
+}
+DEFAULT_PRIORITY = "standard"
+
+
+class QueueFull(Exception):
+    """A request's class has filled its share of the model's queue."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DeadlineInfeasible(Exception):
+    """A request's deadline falls before its results are expected."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class InferenceRequest:
+    """A queued inference request."""
+
+    __slots__ = ("request_id", "model_id", "input_data", "parameters", "received_at",
+                 "priority", "deadline", "batch_id", "_entry")
+
+    def __init__(self, request_id: str, model_id: str, input_data: Any,
+                 parameters: Dict, received_at: float,
+                 priority: str = DEFAULT_PRIORITY, deadline: float = math.inf):
+        self.request_id = request_id
+        self.model_id = model_id
+        self.input_data = input_data
+        self.parameters = parameters
+        self.received_at = received_at
+        self.priority = priority
+        self.deadline = deadline  # clock time
+        self.batch_id: Optional[str] = None
+        # Sequence number of its current queue entries; None when not queued
+        self._entry: Optional[int] = None
+
+
+class Batch:
+    """Requests for one model, leased to one engine."""
+
+    __slots__ = ("batch_id", "model_id", "requests", "holder", "leased_at", "expires")
+
+    def __init__(self, model_id: str, requests: List[InferenceRequest],
+                 holder: Optional[str], leased_at: float, expires: float):
+        self.batch_id = str(uuid.uuid4())
+        self.model_id = model_id
+        self.requests = requests
+        self.holder = holder
+        self.leased_at = leased_at
+        self.expires = expires
+
+
+class _ModelQueue:
+    """A model's queued requests, by deadline for dispatch and by arrival for flushing.
+
+    Entries are removed from one heap at a time; the other's copy is
+    skipped once it reaches the top, as its sequence number no longer
+    matches the request's.
+    """
+
+    __slots__ = ("by_deadline", "by_arrival", "size", "filled_at")
+
+    def __init__(self):
+        self.by_deadline: List[Tuple[float, int, int, InferenceRequest]] = []
+        self.by_arrival: List[Tuple[float, int, InferenceRequest]] = []
+        self.size = 0
+        # When the queue last reached a full batch; None while it holds less
+        self.filled_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return self.size
+
+    def push(self, request: InferenceRequest, now: float, max_batch_size: int) -> None:
+        if request._entry is None:
+            self.size += 1
+        request._entry = entry = next(_sequence)
+        rank = PRIORITY_CLASSES[request.priority].rank
+        heapq.heappush(self.by_deadline, (request.deadline, rank, entry, request))
+        heapq.heappush(self.by_arrival, (request.received_at, entry, request))
+        if self.filled_at is None and self.size >= max_batch_size:
+            self.filled_at = now
+
+    def pop(self, max_batch_size: int) -> InferenceRequest:
+        """Remove the request with the earliest deadline."""
+        self._top(self.by_deadline, 2)
+        request = heapq.heappop(self.by_deadline)[3]
+        request._entry = None
+        self.size -= 1
+        if self.size < max_batch_size:
+            self.filled_at = None
+        if not self.size:
+            self.by_deadline, self.by_arrival = [], []
+        return request
+
+    def earliest(self) -> InferenceRequest:
+        """The request with the earliest deadline."""
+        return self._top(self.by_deadline, 2)[3]
+
+    def oldest(self) -> InferenceRequest:
+        """The request queued longest."""
+        return self._top(self.by_arrival, 1)[2]
+
+    def ahead(self, deadline: float, rank: int) -> int:
+        """Requests handed out before one with this deadline and class would be."""
+        return sum(
+            1 for entry in self.by_deadline
+            if entry[3]._entry == entry[2] and (entry[0], entry[1]) <= (deadline, rank)
+        )
+
+    @staticmethod
+    def _top(heap, position):
+        while heap[0][-1]._entry != heap[0][position]:
+            heapq.heappop(heap)
+        return heap[0]
+
+
+class InferenceQueue:
+    """Queues of inference requests per model, handed out in batches.
+
+    Example:
+        >>> queue = InferenceQueue()
+        >>> request = queue.submit("model-1", {"x": [1, 2]}, policy=BatchPolicy(16, 0.02))
+        >>> batch = queue.next_batch(["model-1"], timeout=5)
+        >>> # ... run the batch, store its results ...
+        >>> queue.complete(batch.batch_id)
+    """
+
+    def __init__(self, lease: float = INFERENCE_LEASE_SECONDS,
+                 clock: Callable[[], float] = time.monotonic,
+                 router: Optional[InferenceRouter] = None,
+                 max_queued: int = INFERENCE_MAX_QUEUED,
+                 on_missed: Optional[Callable[[InferenceRequest], None]] = None):
+        """Initialize empty queues.
+
+        Args:
+            lease: Seconds an engine holds a batch before it is handed out again
+            clock: Monotonic clock, replaceable in tests
+            router: Decides which engines a ready batch waits for; None
+                hands batches to whichever engine asks first
+            max_queued: Requests queued per model
+            on_missed: Called, outside the queue's lock, with each request
+                taken out of its queue because it could no longer finish by
+                its deadline; the request stays outstanding until it returns
+        """
+        self.lease = lease
+        self.clock = clock
+        self.router = router
+        self.max_queued = max_queued
+        self.on_missed = on_missed
+        # Batches leased to each holder
+        self._held: Dict[str, int] = collections.Counter()
+        self._queues: Dict[str, _ModelQueue] = {}
+        self._policies: Dict[str, BatchPolicy] = {}
+        self._requests: Dict[str, InferenceRequest] = {}
+        self._leases: Dict[str, Batch] = {}
+        # Moving average batch latency per model, and when it last changed
+        self._latency: Dict[str, Tuple[float, float]] = {}
+        # Moving average time from lease to results per model, and when it last changed
+        self._service: Dict[str, Tuple[float, float]] = {}
+        # When each holder last took a batch of each model
+        self._holders: Dict[str, Dict[Optional[str], float]] = {}
+        # Requests past their deadline, not yet reported to on_missed
+        self._missed: List[InferenceRequest] = []
+        # Event loop futures of engines waiting for a batch
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self._cond = threading.Condition()
+
+    def submit(self, model_id: str, input_data: Any, parameters: Optional[Dict] = None,
+               policy: Optional[BatchPolicy] = None, priority: str = DEFAULT_PRIORITY,
+               deadline: Optional[float] = None) -> InferenceRequest:
+        """Queue a request for a model, if it can be served in time.
+
+        Args:
+            model_id: Model to run
+            input_data: Model input, passed to the engine as is
+            parameters: Inference parameters, passed to the engine as is
+            policy: The model's batching policy; replaces the one it had
+            priority: Name of the request's class in ``PRIORITY_CLASSES``
+            deadline: Seconds from now by which its results are due; None
+                for its class's default
+
+        Returns:
+            The queued request, with its new ``request_id``
+
+        Raises:
+            KeyError: If ``priority`` is not a known class
+            QueueFull: If the class has filled its share of the model's queue
+            DeadlineInfeasible: If its results are not expected before its
+                deadline
+        """
+        priority_class = PRIORITY_CLASSES[priority]
+        try:
+            with self._cond:
+                now = self.clock()
+                if policy is not None:
+                    self._policies[model_id] = policy
+                queue = self._queues.get(model_id) or _ModelQueue()
+                self._sweep(model_id, queue, now)
+                if len(queue) >= priority_class.share * self.max_queued:
+                    raise QueueFull(
+                        f"Inference queue of model {model_id} is full for {priority} requests",
+                        retry_after=self._estimate(model_id, len(queue), now),
+                    )
+                due = now + (priority_class.deadline if deadline is None else deadline)
+                expected = self._estimate(model_id, queue.ahead(due, priority_class.rank) + 1, now)
+                if now + expected > due:
+                    raise DeadlineInfeasible(
+                        f"Results from model {model_id} are expected in {expected:.3f}s, "
+                        f"after the request's deadline",
+                        retry_after=expected,
+                    )
+                request = InferenceRequest(
+                    str(uuid.uuid4()), model_id, input_data, parameters or {}, now, priority, due
+                )
+                max_batch_size = self._policy(model_id).max_batch_size
+                queue.push(request, now, max_batch_size)
+                self._queues[model_id] = queue
+                self._requests[request.request_id] = request
+                INFERENCE_QUEUE_DEPTH.inc()
+                # Waiting engines care when a queue starts (a new flush deadline)
+                # or fills up; other requests change nothing for them
+                if len(queue) == 1 or len(queue) == max_batch_size:
+                    self._notify()
+                return request
+        finally:
+            self._report_missed()
+
+    def expedite(self, request_id: str, priority: str, deadline: Optional[float] = None) -> None:
+        """Bring a queued request's deadline forward to that of a request sharing it.
+
+        Does nothing if the request is no longer queued or already due sooner.
+
+        Args:
+            request_id: The queued request
+            priority: Class of the request sharing it
+            deadline: Seconds from now it is due; None for the class default
+        """
+        priority_class = PRIORITY_CLASSES[priority]
+        with self._cond:
+            request = self._requests.get(request_id)
+            if request is None or request._entry is None:
+                return
+            now = self.clock()
+            due = now + (priority_class.deadline if deadline is None else deadline)
+            if due < request.deadline:
+                request.deadline = due
+                if priority_class.rank < PRIORITY_CLASSES[request.priority].rank:
+                    request.priority = priority
+                self._queues[request.model_id].push(
+                    request, now, self._policy(request.model_id).max_batch_size
+                )
+
+    def status(self, request_id: str) -> Optional[str]:
+        """``"queued"`` or ``"processing"`` for an outstanding request, else None.
+
+        A queued request that can no longer finish by its deadline is
+        reported to ``on_missed`` first, and is then no longer outstanding.
+        """
+        with self._cond:
+            request = self._requests.get(request_id)
+            if request is not None and not request.batch_id:
+                queue = self._queues.get(request.model_id)
+                if queue:
+                    self._sweep(request.model_id, queue, self.clock())
+        self._report_missed()
+        with self._cond:
+            request = self._requests.get(request_id)
+            if request is None:
+                return None
+            return PROCESSING if request.batch_id else QUEUED
+
+    def depth(self, model_id: Optional[str] = None) -> int:
+        """Requests waiting for a batch, for one model or all of them.
+
+        Requests that can no longer finish by their deadline are taken out
+        of the queues and reported to ``on_missed`` first.
+        """
+        with self._cond:
+            now = self.clock()
+            if model_id is not None:
+                queues = {model_id: self._queues[model_id]} if model_id in self._queues else {}
+            else:
+                queues = self._queues
+            for queued_model, queue in queues.items():
+                self._sweep(queued_model, queue, now)
+            depth = sum(len(queue) for queue in queues.values())
+        self._report_missed()
+        return depth
+
+    def latency(self, model_id: str, window: float = 60.0) -> float:
+        """Seconds a model's requests currently take from being queued to having results.
+
+        This is the moving average over the model's recent batches, or the
+        wait of its oldest queued request if that is longer, so a backlog
+        shows before its batches come back.
+
+        Args:
+            model_id: Model to report on
+            window: Seconds after which the average of a model without new
+                batches is no longer reported
+
+        Returns:
+            Seconds, 0 for a model without recent batches or queued requests
+        """
+        with self._cond:
+            now = self.clock()
+            average, updated = self._latency.get(model_id, (0.0, now - window))
+            latency = average if now - updated < window else 0.0
+            queue = self._queues.get(model_id)
+            if queue:
+                latency = max(latency, now - queue.oldest().received_at)
+            return latency
+
+    def next_batch(self, model_ids: Optional[Iterable[str]] = None, timeout: float = 0.0,
+                   holder: Optional[str] = None) -> Optional[Batch]:
+        """Take the next ready batch, waiting up to ``timeout`` seconds for one.
+
+        Args:
+            model_ids: Models the caller can run; None for any model
+            timeout: Seconds to wait for a batch to become ready
+            holder: Who takes the batch, checked when results come back
+
+        Returns:
+            The leased batch, or None if none was ready in time
+        """
+        wanted = set(model_ids) if model_ids is not None else None
+        deadline = self.clock() + timeout
+        try:
+            with self._cond:
+                while True:
+                    now = self.clock()
+                    batch, wait = self._poll(wanted, holder, now, deadline)
+                    if batch is not None or wait is None:
+                        return batch
+                    self._cond.wait(wait)
+        finally:
+            self._report_missed()
+
+    async def wait_batch(self, model_ids: Optional[Iterable[str]] = None, timeout: float = 0.0,
+                         holder: Optional[str] = None) -> Optional[Batch]:
+        """Take the next ready batch, waiting up to ``timeout`` seconds on the event loop.
+
+        Like :meth:`next_batch`, but waiting holds no thread: the caller is
+        woken through an asyncio future when a request is queued, and
+        otherwise when the next queue may be ready or lease may expire.
+
+        Args:
+            model_ids: Models the caller can run; None for any model
+            timeout: Seconds to wait for a batch to become ready
+            holder: Who takes the batch, checked when results come back
+
+        Returns:
+            The leased batch, or None if none was ready in time
+        """
+        wanted = set(model_ids) if model_ids is not None else None
+        loop = asyncio.get_running_loop()
+        deadline = self.clock() + timeout
+        try:
+            while True:
+                future = loop.create_future()
+                with self._cond:
+                    batch, wait = self._poll(wanted, holder, self.clock(), deadline)
+                    if batch is not None or wait is None:
+                        return batch
+                    self._waiters.append((loop, future))
+                try:
+                    await asyncio.wait_for(future, wait)
+                except asyncio.TimeoutError:
+                    pass
+                finally:
+                    with self._cond:
+                        if (loop, future) in self._waiters:
+                            self._waiters.remove((loop, future))
+        finally:
+            self._report_missed()
+
+    def complete(self, batch_id: str) -> Optional[Batch]:
+        """End a batch's lease once its results are stored.
+
+        Returns:
+            The batch, or None if its lease is unknown or has expired
+        """
+        with self._cond:
+            self._expire_leases(self.clock())
+            batch = self._leases.pop(batch_id, None)
+            if batch is None:
+                return None
+            self._release(batch)
+            for request in batch.requests:
+                self._requests.pop(request.request_id, None)
+            now = self.clock()
+            latency = now - min(request.received_at for request in batch.requests)
+            average, _ = self._latency.get(batch.model_id, (latency, now))
+            self._latency[batch.model_id] = (
+                average + _LATENCY_WEIGHT * (latency - average), now
+            )
+            served = now - batch.leased_at
+            average, _ = self._service.get(batch.model_id, (served, now))
+            self._service[batch.model_id] = (
+                average + _LATENCY_WEIGHT * (served - average), now
+            )
+            return batch
+
+    def leased(self, batch_id: str) -> Optional[Batch]:
+        """A batch whose lease is current, or None if it is unknown or expired."""
+        with self._cond:
+            self._expire_leases(self.clock())
+            return self._leases.get(batch_id)
+
+    def _policy(self, model_id: str) -> BatchPolicy:
+        return self._policies.get(model_id, DEFAULT_POLICY)
+
+    def _poll(self, wanted, holder, now, deadline) -> Tuple[Optional[Batch], Optional[float]]:
+        """Lease the next ready batch, or say how long to wait before looking again.
+
+        Returns:
+            ``(batch, None)`` if one was leased, ``(None, seconds)`` to wait
+            for, or ``(None, None)`` once ``deadline`` has passed
+        """
+        self._expire_leases(now)
+        model_id, wake_at = self._ready(wanted, now, holder)
+        if model_id is not None:
+            return self._lease(model_id, holder, now), None
+        if now >= deadline:
+            return None, None
+        wait = deadline - now
+        if wake_at is not None:
+            wait = min(wait, max(0.0, wake_at - now))
+        if self._leases:
+            wait = min(wait, max(0.0, min(b.expires for b in self._leases.values()) - now))
+        return None, wait
+
+    def _notify(self) -> None:
+        """Wake engines waiting for a batch, on threads and on event loops."""
+        self._cond.notify_all()
+        for loop, future in self._waiters:
+            loop.call_soon_threadsafe(_wake, future)
+        self._waiters = []
+
+    def _service_time(self, model_id: str, now: float) -> float:
+        """A model's recent seconds from lease to results, 0 without recent batches."""
+        service, updated = self._service.get(model_id, (0.0, now - _ESTIMATE_WINDOW))
+        return service if now - updated < _ESTIMATE_WINDOW else 0.0
+
+    def _estimate(self, model_id: str, position: int, now: float) -> float:
+        """Seconds until the results of a model's ``position``-th queued request are expected.
+
+        Nothing is expected of a model without recent batches, so its
+        requests are admitted.
+        """
+        engines = sum(
+            1 for taken in self._holders.get(model_id, {}).values()
+            if now - taken < _ESTIMATE_WINDOW
+        )
+        batches = math.ceil(position / self._policy(model_id).max_batch_size)
+        return math.ceil(batches / max(engines, 1)) * self._service_time(model_id, now)
+
+    def _sweep(self, model_id: str, queue: _ModelQueue, now: float) -> None:
+        """Take the requests that can no longer finish in time out of a model's queue, to be reported."""
+        finish = now + self._service_time(model_id, now)
+        while queue and queue.earliest().deadline < finish:
+            self._missed.append(queue.pop(self._policy(model_id).max_batch_size))
+            INFERENCE_QUEUE_DEPTH.dec()
+
+    def _report_missed(self) -> None:
+        """Tell ``on_missed`` about requests that missed their deadline, then forget them."""
+        with self._cond:
+            missed, self._missed = self._missed, []
+        if not missed:
+            return
+        for request in missed:
+            if self.on_missed is not None:
+                self.on_missed(request)
+        with self._cond:
+            for request in missed:
+                self._requests.pop(request.request_id, None)
+
+    def _ready(self, wanted, now, holder=None):
+        """The ready queue with the earliest deadline, and when the next one may be taken.
+
+        With a router, a queue is only ready for ``holder`` once it has been
+        ready for as long as the router holds it back from ``holder``.
+        """
+        ready, ready_due, wake_at = None, None, None
+        for model_id, queue in list(self._queues.items()):
+            if wanted is not None and model_id not in wanted:
+                continue
+            self._sweep(model_id, queue, now)
+            if not queue:
+                del self._queues[model_id]
+                continue
+            policy = self._policy(model_id)
+            flush_at = queue.oldest().received_at + policy.max_wait
+            if len(queue) >= policy.max_batch_size:
+                # Ready since the request that filled the batch arrived
+                flush_at = min(flush_at, queue.filled_at if queue.filled_at is not None else now)
+            if self.router is not None and holder is not None and flush_at <= now:
+                flush_at += self.router.delay(holder, model_id, self._held)
+            if flush_at <= now:
+                due = queue.earliest().deadline
+                if ready_due is None or due < ready_due:
+                    ready, ready_due = model_id, due
+            else:
+                wake_at = flush_at if wake_at is None else min(wake_at, flush_at)
+        return ready, wake_at
+
+    def _lease(self, model_id, holder, now) -> Batch:
+        queue = self._queues[model_id]
+        max_batch_size = self._policy(model_id).max_batch_size
+        size = min(len(queue), max_batch_size)
+        requests = [queue.pop(max_batch_size) for _ in range(size)]
+        if not queue:
+            del self._queues[model_id]
+        batch = Batch(model_id, requests, holder, now, now + self.lease)
+        for request in requests:
+            request.batch_id = batch.batch_id
+            INFERENCE_QUEUE_WAIT.observe(now - request.received_at)
+        self._leases[batch.batch_id] = batch
+        self._holders.setdefault(model_id, {})[holder] = now
+        if holder is not None:
+            self._held[holder] += 1
+            if self.router is not None:
+                warm = self.router.warm(holder, model_id)
+                INFERENCE_BATCH_AFFINITY.labels("warm" if warm else "cold").inc()
+        INFERENCE_QUEUE_DEPTH.dec(size)
+        INFERENCE_BATCH_SIZE.observe(size)
+        return batch
+
+    def _expire_leases(self, now):
+        """Put the requests of expired batches back into their queues."""
+        for batch in [b for b in self._leases.values() if b.expires <= now]:
+            del self._leases[batch.batch_id]
+            self._release(batch)
+            queue = self._queues.setdefault(batch.model_id, _ModelQueue())
+            max_batch_size = self._policy(batch.model_id).max_batch_size
+            for request in batch.requests:
+                request.batch_id = None
+                queue.push(request, now, max_batch_size)
+            INFERENCE_QUEUE_DEPTH.inc(len(batch.requests))
+
+    def _release(self, batch):
+        if batch.holder is not None:
+            self._held[batch.holder] -= 1
+            if not self._held[batch.holder]:
+                del self._held[batch.holder]
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+# Global inference queue
+inference_queue = InferenceQueue(router=inference_router)
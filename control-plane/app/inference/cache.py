@@ -0,0 +1,162 @@
+"""Deduplicating cache of inference results, keyed by input hash.
+
+Many clients send the same inputs — health probes, repeated prompts,
+retries — and each would otherwise run a full inference. Requests are keyed
+by their model, the model's artifact digest and a SHA-256 of their input
+data and parameters encoded as canonical JSON (sorted keys), so the same
+input to the same model version always has the same key.
+
+A submitted request is then, in order:
+
+* **a hit**, if a completed result for its key is cached: it is answered at
+  once with a copy of that result, without being queued;
+* **coalesced**, if an identical request is queued or running: it is given
+  that request's ID, so both share one execution and one result;
+* **a miss** otherwise: it is queued, and runs as usual.
+
+Completed results are kept, most recently used first, until the encoded
+results exceed ``INFERENCE_CACHE_MAX_BYTES``; failed requests are never
+cached. A model's entries are dropped when it is updated or archived, and
+when a request arrives for it with a different digest than the cached ones.
+
+Models whose outputs are not a function of their inputs (sampling,
+time-dependent features) should be called with ``"cache": false``.
+"""
+import collections
+import hashlib
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.metrics.instruments import INFERENCE_CACHE_BYTES, INFERENCE_CACHE_LOOKUPS
+from app.serialization import canonical_dumps
+
+# Bytes of encoded results cached; 0 disables the cache
+INFERENCE_CACHE_MAX_BYTES = int(os.environ.get("INFERENCE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# (model ID, model digest, input hash)
+CacheKey = Tuple[str, str, str]
+
+
+class InferenceCache:
+    """Completed results by input, and the requests running for inputs not yet cached.
+
+    Example:
+        >>> cache = InferenceCache()
+        >>> key = cache.key("model-1", "sha256:4f3c...", {"features": [1, 2]}, {})
+        >>> cache.resolve(key, lambda: "r1")
+        ('r1', None)
+        >>> cache.resolve(key, lambda: "r2")  # coalesced onto r1
+        ('r1', None)
+        >>> cache.finish("r1", b'{"label":"setosa"}')
+        >>> cache.resolve(key, lambda: "r3")
+        (None, b'{"label":"setosa"}')
+    """
+
+    def __init__(self, max_bytes: int = INFERENCE_CACHE_MAX_BYTES):
+        """Initialize an empty cache.
+
+        Args:
+            max_bytes: Bytes of encoded results kept; 0 disables the cache
+        """
+        self.max_bytes = max_bytes
+        self._results: "collections.OrderedDict[CacheKey, bytes]" = collections.OrderedDict()
+        self._bytes = 0
+        self._inflight: Dict[CacheKey, str] = {}
+        self._keys: Dict[str, CacheKey] = {}
+        self._digests: Dict[str, str] = {}
+        # Reentrant: starting a request can report queued requests that
+        # missed their deadline, which finishes them here
+        self._lock = threading.RLock()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether results are cached at all."""
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key(model_id: str, digest: Optional[str], input_data: Any, parameters: Any) -> CacheKey:
+        """The cache key of a request.
+
+        Raises:
+            TypeError: If the input is not JSON-serializable
+        """
+        encoded = canonical_dumps({"input": input_data, "parameters": parameters})
+        return model_id, digest or "", hashlib.sha256(encoded).hexdigest()
+
+    def resolve(self, key: CacheKey, start: Callable[[], str]) -> Tuple[Optional[str], Optional[bytes]]:
+        """Answer a request from the cache, join an identical running one, or start it.
+
+        ``start`` is called, under the cache's lock, only on a miss, so
+        concurrent identical requests start one execution between them.
+
+        Args:
+            key: The request's cache key
+            start: Queues the request and returns its request ID
+
+        Returns:
+            ``(None, result)`` on a hit, with the cached result as JSON
+            bytes; otherwise ``(request_id, None)`` for the request that
+            will produce the result
+        """
+        model_id, digest, _ = key
+        with self._lock:
+            if self._digests.get(model_id, digest) != digest:
+                self._drop(model_id)
+            self._digests[model_id] = digest
+            encoded = self._results.get(key)
+            if encoded is not None:
+                self._results.move_to_end(key)
+                INFERENCE_CACHE_LOOKUPS.labels("hit").inc()
+                return None, encoded
+            leader = self._inflight.get(key)
+            if leader is not None:
+                INFERENCE_CACHE_LOOKUPS.labels("coalesced").inc()
+                return leader, None
+            request_id = start()
+            self._inflight[key] = request_id
+            self._keys[request_id] = key
+            INFERENCE_CACHE_LOOKUPS.labels("miss").inc()
+            return request_id, None
+
+    def finish(self, request_id: str, encoded: Optional[bytes]) -> None:
+        """Record the outcome of a request started through :meth:`resolve`.
+
+        Args:
+            request_id: The request
+            encoded: Its result as JSON bytes, or None if it failed
+        """
+        with self._lock:
+            key = self._keys.pop(request_id, None)
+            if key is None or self._inflight.get(key) != request_id:
+                return
+            del self._inflight[key]
+            if encoded is None or len(encoded) > self.max_bytes:
+                return
+            self._results[key] = encoded
+            self._bytes += len(encoded)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._results.popitem(last=False)
+                self._bytes -= len(evicted)
+            INFERENCE_CACHE_BYTES.set(self._bytes)
+
+    def invalidate(self, model_id: str) -> None:
+        """Drop a model's cached results, and stop coalescing onto its running requests."""
+        with self._lock:
+            self._drop(model_id)
+            self._digests.pop(model_id, None)
+
+    def _drop(self, model_id: str) -> None:
+        for key in [key for key in self._results if key[0] == model_id]:
+            self._bytes -= len(self._results.pop(key))
+        for key in [key for key in self._inflight if key[0] == model_id]:
+            self._keys.pop(self._inflight.pop(key), None)
+        INFERENCE_CACHE_BYTES.set(self._bytes)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._results)
+
+
+# Global inference result cache
+inference_cache = InferenceCache()
@@ -0,0 +1,302 @@
+"""Bounded store for the results of finished inference requests.
+
+Engines return each batch's results to the control plane, where clients
+fetch them with ``GET /api/v1/inference/{request_id}``. Results are encoded
+to JSON once, when stored, and spliced into responses as they are.
+
+The store is bounded three ways:
+
+* **Age**: results are dropped ``INFERENCE_RESULT_TTL`` seconds after the
+  request finished; clients are expected to have fetched them by then.
+* **Memory**: once results held in memory exceed
+  ``INFERENCE_RESULT_MAX_BYTES``, the oldest go first.
+* **Disk**: with ``INFERENCE_RESULT_SPILL_DIR`` set, results of at least
+  ``INFERENCE_RESULT_SPILL_MIN_BYTES`` are written there instead of kept in
+  memory, and results pushed out of memory are moved there rather than
+  dropped, up to ``INFERENCE_RESULT_SPILL_MAX_BYTES`` of files.
+
+Clients waiting for a result (``?wait=10s``) are woken as soon as it is
+stored, instead of polling for it. Waiters are asyncio futures, so waiting
+clients hold no server threads.
+"""
+import asyncio
+import collections
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.metrics.instruments import INFERENCE_RESULT_BYTES, INFERENCE_RESULTS_EVICTED
+from app.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+# Seconds a finished result is kept
+INFERENCE_RESULT_TTL = float(os.environ.get("INFERENCE_RESULT_TTL", "300"))
+
+# Bytes of encoded results kept in memory
+INFERENCE_RESULT_MAX_BYTES = int(os.environ.get("INFERENCE_RESULT_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Directory results are spilled to; empty keeps results in memory only
+INFERENCE_RESULT_SPILL_DIR = os.environ.get("INFERENCE_RESULT_SPILL_DIR", "")
+
+# Encoded results at least this large go straight to the spill directory
+INFERENCE_RESULT_SPILL_MIN_BYTES = int(os.environ.get("INFERENCE_RESULT_SPILL_MIN_BYTES", str(64 * 1024)))
+
+# Bytes of spilled results kept on disk
+INFERENCE_RESULT_SPILL_MAX_BYTES = int(
+    os.environ.get("INFERENCE_RESULT_SPILL_MAX_BYTES", str(1024 * 1024 * 1024))
+)
+
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class InferenceResult:
+    """The outcome of one inference request, with its result encoded as JSON."""
+
+    __slots__ = ("request_id", "status", "error", "finished_at", "size", "_encoded", "_path")
+
+    def __init__(self, request_id: str, status: str, encoded: bytes,
+                 error: Optional[str], finished_at: float):
+        self.request_id = request_id
+        self.status = status
+        self.error = error
+        self.finished_at = finished_at
+        self.size = len(encoded)
+        self._encoded: Optional[bytes] = encoded
+        self._path: Optional[str] = None
+
+    @property
+    def spilled(self) -> bool:
+        """Whether the result is on disk rather than in memory."""
+        return self._path is not None
+
+    def encoded_result(self) -> bytes:
+        """The result as JSON bytes, read from disk if spilled.
+
+        Raises:
+            FileNotFoundError: If the spilled result has since been evicted
+        """
+        encoded = self._encoded
+        if encoded is not None:
+            return encoded
+        with open(self._path, "rb") as f:
+            return f.read()
+
+    def encode(self) -> bytes:
+        """The ``InferenceResultResponse`` body for this result.
+
+        Raises:
+            FileNotFoundError: If the spilled result has since been evicted
+        """
+        head = dumps({"request_id": self.request_id, "status": self.status})
+        tail = dumps({"error": self.error, "timestamp": self.finished_at})
+        return head[:-1] + b',"result":' + self.encoded_result() + b"," + tail[1:]
+
+
+class ResultStore:
+    """Finished inference results by request ID, bounded by age and size.
+
+    Example:
+        >>> results = ResultStore(ttl=60, max_bytes=16 * 1024 * 1024)
+        >>> results.put("req-1", COMPLETED, result={"label": "cat"})
+        >>> results.get("req-1").encode()
+        b'{"request_id":"req-1","status":"completed","result":{"label":"cat"},...}'
+        >>> await results.wait("req-2", timeout=10)  # None if not finished in time
+    """
+
+    def __init__(
+        self,
+        ttl: float = INFERENCE_RESULT_TTL,
+        max_bytes: int = INFERENCE_RESULT_MAX_BYTES,
+        spill_dir: str = INFERENCE_RESULT_SPILL_DIR,
+        spill_min_bytes: int = INFERENCE_RESULT_SPILL_MIN_BYTES,
+        spill_max_bytes: int = INFERENCE_RESULT_SPILL_MAX_BYTES,
+        clock: Callable[[], float] = time.time,
+    ):
+        """Initialize an empty store.
+
+        Args:
+            ttl: Seconds a result is kept
+            max_bytes: Bytes of encoded results kept in memory
+            spill_dir: Directory to spill results to; empty to keep them in
+                memory only
+            spill_min_bytes: Results at least this large are spilled at once
+            spill_max_bytes: Bytes of spilled results kept on disk
+            clock: Wall clock, replaceable in tests
+        """
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.spill_min_bytes = spill_min_bytes
+        self.spill_max_bytes = spill_max_bytes
+        self.clock = clock
+        # Oldest first; every result has the same TTL, so this is expiry order
+        self._results: "collections.OrderedDict[str, InferenceResult]" = collections.OrderedDict()
+        self._memory_bytes = 0
+        self._spilled_bytes = 0
+        self._waiters: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]]] = {}
+        self._lock = threading.Lock()
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    @property
+    def memory_bytes(self) -> int:
+        """Bytes of encoded results held in memory."""
+        with self._lock:
+            return self._memory_bytes
+
+    @property
+    def spilled_bytes(self) -> int:
+        """Bytes of results spilled to disk."""
+        with self._lock:
+            return self._spilled_bytes
+
+    def put(self, request_id: str, status: str, result: Any = None,
+            error: Optional[str] = None, encoded: Optional[bytes] = None) -> InferenceResult:
+        """Store the outcome of a request and wake clients waiting for it.
+
+        Args:
+            request_id: The request
+            status: ``"completed"`` or ``"failed"``
+            result: Model output, for completed requests
+            error: What went wrong, for failed requests
+            encoded: ``result`` already encoded as JSON, used instead of it
+
+        Returns:
+            The stored result
+        """
+        if encoded is None:
+            encoded = dumps(result)
+        stored = InferenceResult(request_id, status, encoded, error, self.clock())
+        # Written outside the lock; the file is only reachable once stored
+        spill = (
+            bool(self.spill_dir) and stored.size >= self.spill_min_bytes and self._spill(stored)
+        )
+        with self._lock:
+            self._discard(self._results.pop(request_id, None))
+            self._results[request_id] = stored
+            if spill:
+                self._spilled_bytes += stored.size
+            else:
+                self._memory_bytes += stored.size
+            self._evict(self.clock())
+            INFERENCE_RESULT_BYTES.labels("memory").set(self._memory_bytes)
+            INFERENCE_RESULT_BYTES.labels("disk").set(self._spilled_bytes)
+            waiters = self._waiters.pop(request_id, [])
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+        return stored
+
+    def get(self, request_id: str) -> Optional[InferenceResult]:
+        """The outcome of a request, or None if it has not finished or has expired."""
+        with self._lock:
+            self._expire(self.clock())
+            return self._results.get(request_id)
+
+    async def wait(self, request_id: str, timeout: float) -> Optional[InferenceResult]:
+        """Wait up to ``timeout`` seconds for a request's outcome.
+
+        Returns:
+            The result, or None if it was not stored in time
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            self._expire(self.clock())
+            found = self._results.get(request_id)
+            if found is not None or timeout <= 0:
+                return found
+            self._waiters.setdefault(request_id, []).append((loop, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(request_id, [])
+                if (loop, future) in waiters:
+                    waiters.remove((loop, future))
+                    if not waiters:
+                        del self._waiters[request_id]
+        return self.get(request_id)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._expire(self.clock())
+            return len(self._results)
+
+    def _spill(self, stored: InferenceResult) -> bool:
+        """Write a result to the spill directory; False if that failed."""
+        # Unique per put: a request run twice may have a result stored already
+        path = os.path.join(self.spill_dir, f"{stored.request_id}.{uuid.uuid4().hex}.json")
+        try:
+            with open(path, "wb") as f:
+                f.write(stored.encoded_result())
+        except OSError as e:
+            logger.warning(f"Failed to spill inference result {stored.request_id}: {e}")
+            return False
+        stored._path = path
+        stored._encoded = None
+        return True
+
+    def _discard(self, stored: Optional[InferenceResult]) -> None:
+        """Forget a result's bytes; called with the lock held after removing it."""
+        if stored is None:
+            return
+        if stored.spilled:
+            self._spilled_bytes -= stored.size
+            try:
+                os.remove(stored._path)
+            except FileNotFoundError:
+                pass
+        else:
+            self._memory_bytes -= stored.size
+
+    def _expire(self, now: float) -> None:
+        """Drop results past their TTL, oldest first."""
+        expired = now - self.ttl
+        while self._results:
+            request_id, oldest = next(iter(self._results.items()))
+            if oldest.finished_at > expired:
+                break
+            del self._results[request_id]
+            self._discard(oldest)
+            INFERENCE_RESULTS_EVICTED.labels("expired").inc()
+
+    def _evict(self, now: float) -> None:
+        """Expire old results, then push the oldest out of memory and disk until within bounds."""
+        self._expire(now)
+        if self._memory_bytes > self.max_bytes:
+            for request_id, stored in list(self._results.items()):
+                if self._memory_bytes <= self.max_bytes:
+                    break
+                if stored.spilled:
+                    continue
+                self._memory_bytes -= stored.size
+                if self.spill_dir and self._spill(stored):
+                    self._spilled_bytes += stored.size
+                    INFERENCE_RESULTS_EVICTED.labels("spilled").inc()
+                else:
+                    del self._results[request_id]
+                    INFERENCE_RESULTS_EVICTED.labels("memory").inc()
+        if self._spilled_bytes > self.spill_max_bytes:
+            for request_id, stored in list(self._results.items()):
+                if self._spilled_bytes <= self.spill_max_bytes:
+                    break
+                if stored.spilled:
+                    del self._results[request_id]
+                    self._discard(stored)
+                    INFERENCE_RESULTS_EVICTED.labels("disk").inc()
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+# Global result store
+result_store = ResultStore()
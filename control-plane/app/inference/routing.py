@@ -0,0 +1,155 @@
+"""Cache-affinity routing of inference batches to engines.
+
+Engines pull batches (see ``batcher.py``), so routing decides which polling
+engine may take a ready batch. Loading a model takes far longer than running
+a batch on it, so a batch should go to a node that already has its model
+loaded ("warm") whenever one can take it soon.
+
+Nodes running an inference engine report, with every heartbeat, the
+digests of the models loaded in their workers and how many workers they
+have (``InferenceLoadModel``). When an engine asks for a batch, each ready
+batch is held back from it for a number of affinity waits
+(``INFERENCE_AFFINITY_WAIT_MS``) that depends on how well it is placed:
+
+* **0** if the node has the model loaded;
+* otherwise, if a warm node with a free worker exists, **1** for the
+  least-loaded cold node and **2** for the other cold nodes;
+* otherwise, **0** for the least-loaded cold node and **1** for the others.
+
+Warm nodes with free workers therefore take batches of their models at
+once, and a batch only goes to a cold node when no warm node took it in
+time, least-loaded nodes first. A node's load score is the fraction of its
+workers running leased batches plus its CPU usage as a fraction, so the
+exact lease count dominates and the heartbeat CPU breaks ties.
+
+A node is counted as warm for a model as soon as it is leased a batch of
+that model, since its engine loads it to run the batch; its next heartbeat
+replaces that guess with what it has actually loaded. Nodes whose last
+report is older than ``NODE_OFFLINE_AFTER`` seconds are ignored.
+"""
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, Mapping, Optional, Set
+
+from app.orchestrator.reaper import NODE_OFFLINE_AFTER
+
+# Milliseconds a ready batch is left for better-placed engines, per tier
+INFERENCE_AFFINITY_WAIT_MS = float(os.environ.get("INFERENCE_AFFINITY_WAIT_MS", "50"))
+
+
+class _Engine:
+    __slots__ = ("loaded", "workers", "cpu_usage", "reported_at")
+
+    def __init__(self, loaded: Set[str], workers: int, cpu_usage: float, reported_at: float):
+        self.loaded = loaded
+        self.workers = workers
+        self.cpu_usage = cpu_usage
+        self.reported_at = reported_at
+
+
+class InferenceRouter:
+    """What each node's inference engine has loaded, and which engines a batch should wait for.
+
+    Example:
+        >>> router = InferenceRouter()
+        >>> router.track("model-1", "sha256:4f3c...")
+        >>> router.report("node-1", ["sha256:4f3c..."], workers=4, cpu_usage=30.0)
+        >>> router.delay("node-2", "model-1", held={})  # node-2 is cold
+        0.05
+    """
+
+    def __init__(self, affinity_wait: float = INFERENCE_AFFINITY_WAIT_MS / 1000,
+                 stale_after: float = NODE_OFFLINE_AFTER,
+                 clock: Callable[[], float] = time.monotonic):
+        """Initialize a router that knows no engines.
+
+        Args:
+            affinity_wait: Seconds a batch waits per tier of placement
+            stale_after: Seconds after which a node's report is ignored
+            clock: Monotonic clock, replaceable in tests
+        """
+        self.affinity_wait = affinity_wait
+        self.stale_after = stale_after
+        self.clock = clock
+        self._engines: Dict[str, _Engine] = {}
+        self._digests: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def track(self, model_id: str, digest: Optional[str]) -> None:
+        """Record the artifact digest of a model with queued requests."""
+        if digest:
+            with self._lock:
+                self._digests[model_id] = digest
+
+    def report(self, node_id: str, loaded: Iterable[str], workers: int,
+               cpu_usage: float = 0.0) -> None:
+        """Record a node's inference engine state from its heartbeat.
+
+        Args:
+            node_id: Reporting node
+            loaded: Digests of the models loaded in its workers
+            workers: Its worker processes
+            cpu_usage: Its CPU usage percentage
+        """
+        with self._lock:
+            self._engines[node_id] = _Engine(set(loaded), workers, cpu_usage, self.clock())
+
+    def warm(self, node_id: str, model_id: str) -> bool:
+        """Note that a node was leased a batch of a model.
+
+        Returns:
+            Whether the node already had the model loaded
+        """
+        with self._lock:
+            engine = self._engines.get(node_id)
+            digest = self._digests.get(model_id)
+            if engine is None or digest is None:
+                return False
+            if digest in engine.loaded:
+                return True
+            engine.loaded.add(digest)
+            return False
+
+    def delay(self, node_id: str, model_id: str, held: Mapping[str, int]) -> float:
+        """Seconds a ready batch of a model is left for engines better placed than ``node_id``.
+
+        Args:
+            node_id: Engine asking for a batch
+            model_id: Model of the ready batch
+            held: Batches currently leased to each node
+
+        Returns:
+            Seconds after the batch became ready that ``node_id`` may take it
+        """
+        now = self.clock()
+        with self._lock:
+            digest = self._digests.get(model_id)
+            engines = {
+                other: engine for other, engine in self._engines.items()
+                if now - engine.reported_at <= self.stale_after
+            }
+        if digest is None or not engines:
+            return 0.0
+        asking = engines.get(node_id)
+        if asking is not None and digest in asking.loaded:
+            return 0.0
+
+        def load(other):
+            engine = engines[other]
+            return held.get(other, 0) / max(engine.workers, 1) + engine.cpu_usage / 100
+
+        # The asking node has a free worker, or it would not be asking
+        available = [
+            other for other, engine in engines.items()
+            if other == node_id or held.get(other, 0) < engine.workers
+        ]
+        tiers = 1 if any(digest in engines[other].loaded for other in available) else 0
+        cold = [other for other in available if digest not in engines[other].loaded]
+        if asking is not None and load(node_id) <= min(load(other) for other in cold):
+            return tiers * self.affinity_wait
+        return (tiers + 1) * self.affinity_wait
+
+
+# Global inference router
+inference_router = InferenceRouter()
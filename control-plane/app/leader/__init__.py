@@ -0,0 +1,9 @@
+"""Leader election package for running singleton loops on one replica."""
+from .election import LeaderElector, SingletonLoop, default_identity, leader_elector
+
+__all__ = [
+    "LeaderElector",
+    "SingletonLoop",
+    "default_identity",
+    "leader_elector",
+]
@@ -0,0 +1,288 @@
+"""Database-backed leader election for control plane replicas.
+
+Every replica serves API requests, but background loops such as reapers and
+rollups must run exactly once across the deployment. Replicas compete for a
+named lease row in the ``leases`` table: the holder renews it well before it
+expires, and any other replica may take it over once it has expired.
+Acquisition and renewal are a single conditional ``UPDATE``, so the database
+decides the winner and no further coordination service is needed.
+
+Each takeover increments the lease's ``epoch``, which can be used as a
+fencing token by work that must not be done twice.
+
+A replica considers itself leader only until ``ttl`` seconds after it last
+started a successful renewal, measured on its own monotonic clock. Other
+replicas can only take over once the stored expiry has passed on their wall
+clocks, so leadership never overlaps as long as replica clocks agree to
+within the gap between renewals and expiry.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Callable, List, Optional
+
+from sqlalchemy import case, or_, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from app.db.database import SessionLocal
+from app.db.models import LeaseDB
+from app.metrics.instruments import LEADER, LEADER_TRANSITIONS, SINGLETON_RUNS
+
+logger = logging.getLogger(__name__)
+
+# Seconds a lease is valid without renewal
+LEADER_LEASE_TTL = float(os.environ.get("LEADER_LEASE_TTL", "15"))
+
+# Seconds between renewal attempts; several attempts fit in one TTL
+LEADER_RENEW_INTERVAL = float(
+    os.environ.get("LEADER_RENEW_INTERVAL", str(LEADER_LEASE_TTL / 3))
+)
+
+# Name of the lease guarding the control plane's singleton loops
+LEADER_LEASE_NAME = os.environ.get("LEADER_LEASE_NAME", "control-plane")
+
+
+def default_identity() -> str:
+    """Unique identity of this replica: host, process and a random suffix."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class SingletonLoop:
+    """A background loop that only does work while its elector leads."""
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], None],
+        interval: float,
+        elector: "LeaderElector",
+    ):
+        """Initialize the loop.
+
+        Args:
+            name: Loop name, used in logs and metrics
+            func: Work to run once per interval on the leader
+            interval: Seconds between runs
+            elector: Elector deciding whether this replica leads
+        """
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.elector = elector
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> bool:
+        """Run the work if this replica is the leader.
+
+        Returns:
+            True if the work ran
+        """
+        if not self.elector.is_leader:
+            return False
+        try:
+            self.func()
+        except Exception:
+            SINGLETON_RUNS.labels(self.name, "error").inc()
+            logger.exception(f"Singleton loop '{self.name}' failed")
+        else:
+            SINGLETON_RUNS.labels(self.name, "ok").inc()
+        return True
+
+    def start(self, stop: threading.Event) -> None:
+        """Start the loop thread, running until ``stop`` is set."""
+        def loop():
+            while not stop.wait(self.interval):
+                self.run_once()
+
+        self._thread = threading.Thread(
+            target=loop, name=f"singleton-{self.name}", daemon=True
+        )
+        self._thread.start()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        """Wait for the loop thread to exit."""
+        if self._thread:
+            self._thread.join(timeout)
+
+
+class LeaderElector:
+    """Acquires and renews a named lease and runs singleton loops on it.
+
+    Example:
+        >>> elector = LeaderElector("control-plane")
+        >>> elector.add_singleton("reaper", reap, interval=10)
+        >>> elector.start()
+        >>> ...
+        >>> elector.stop()
+    """
+
+    def __init__(
+        self,
+        name: str = LEADER_LEASE_NAME,
+        identity: Optional[str] = None,
+        ttl: float = LEADER_LEASE_TTL,
+        renew_interval: float = LEADER_RENEW_INTERVAL,
+        session_factory: Callable = SessionLocal,
+    ):
+        """Initialize the elector.
+
+        Args:
+            name: Lease name; replicas competing for the same name elect one leader
+            identity: Unique identity of this replica
+            ttl: Seconds a lease is valid without renewal
+            renew_interval: Seconds between renewal attempts, less than ``ttl``
+            session_factory: Callable returning a database session
+        """
+        self.name = name
+        self.identity = identity or default_identity()
+        self.ttl = ttl
+        self.renew_interval = renew_interval
+        self.session_factory = session_factory
+        self.epoch: Optional[int] = None
+        self._deadline = 0.0
+        self._was_leader = False
+        self._loops: List[SingletonLoop] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def is_leader(self) -> bool:
+        """Whether this replica currently holds an unexpired lease."""
+        return time.monotonic() < self._deadline
+
+    def add_singleton(
+        self, name: str, func: Callable[[], None], interval: float
+    ) -> SingletonLoop:
+        """Register a loop to run only on the leader.
+
+        Args:
+            name: Loop name
+            func: Work to run once per interval
+            interval: Seconds between runs
+
+        Returns:
+            The registered loop
+        """
+        loop = SingletonLoop(name, func, interval, self)
+        self._loops.append(loop)
+        return loop
+
+    def try_acquire(self) -> bool:
+        """Acquire the lease, or renew it if already held.
+
+        Returns:
+            True if this replica holds the lease afterwards
+        """
+        started = time.monotonic()
+        now = time.time()
+        db = self.session_factory()
+        try:
+            result = db.execute(
+                update(LeaseDB)
+                .where(
+                    LeaseDB.name == self.name,
+                    or_(LeaseDB.holder == self.identity, LeaseDB.expires_at < now),
+                )
+                .values(
+                    holder=self.identity,
+                    expires_at=now + self.ttl,
+                    renewed_at=now,
+                    epoch=case(
+                        (LeaseDB.holder == self.identity, LeaseDB.epoch),
+                        else_=LeaseDB.epoch + 1,
+                    ),
+                )
+                .execution_options(synchronize_session=False)
+            )
+            acquired = result.rowcount == 1
+            if not acquired and db.get(LeaseDB, self.name) is None:
+                db.add(LeaseDB(
+                    name=self.name,
+                    holder=self.identity,
+                    epoch=1,
+                    expires_at=now + self.ttl,
+                    renewed_at=now,
+                ))
+                acquired = True
+            db.commit()
+            if acquired:
+                self.epoch = db.get(LeaseDB, self.name).epoch
+        except IntegrityError:
+            # Another replica created the lease first
+            db.rollback()
+            acquired = False
+        except SQLAlchemyError as e:
+            db.rollback()
+            logger.warning(f"Leader lease '{self.name}' renewal failed: {e}")
+            acquired = False
+        finally:
+            db.close()
+
+        if acquired:
+            self._deadline = started + self.ttl
+        self._update_state()
+        return acquired
+
+    def release(self) -> None:
+        """Give up the lease so a standby can take over immediately."""
+        self._deadline = 0.0
+        db = self.session_factory()
+        try:
+            db.execute(
+                update(LeaseDB)
+                .where(LeaseDB.name == self.name, LeaseDB.holder == self.identity)
+                .values(expires_at=0.0)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            logger.warning(f"Leader lease '{self.name}' release failed: {e}")
+        finally:
+            db.close()
+        self._update_state()
+
+    def start(self) -> None:
+        """Start renewing the lease and running singleton loops."""
+        self._stop.clear()
+
+        def renew():
+            while True:
+                self.try_acquire()
+                if self._stop.wait(self.renew_interval):
+                    return
+
+        self._thread = threading.Thread(
+            target=renew, name=f"lease-{self.name}", daemon=True
+        )
+        self._thread.start()
+        for loop in self._loops:
+            loop.start(self._stop)
+
+    def stop(self) -> None:
+        """Stop all loops and release the lease."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        for loop in self._loops:
+            loop.join()
+        self.release()
+
+    def _update_state(self) -> None:
+        """Log and export leadership transitions."""
+        leader = self.is_leader
+        if leader != self._was_leader:
+            transition = "acquired" if leader else "lost"
+            LEADER_TRANSITIONS.labels(transition).inc()
+            logger.info(
+                f"Replica {self.identity} {transition} leader lease "
+                f"'{self.name}' (epoch {self.epoch})"
+            )
+            self._was_leader = leader
+        LEADER.set(1 if leader else 0)
+
+
+leader_elector = LeaderElector()
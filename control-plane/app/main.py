@@ -3,11 +3,27 @@
 This module initializes the FastAPI application, sets up middleware,
 includes API routers, and provides health check endpoints.
 """
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.api.v1 import nodes, deployments
+from app.api.v1 import nodes, deployments, admin, blobs, inference, models
+from app.compression import CompressionMiddleware
 from app.db import init_db
+from app.db.database import SessionLocal
+from app.eventlog import deployment_log
+from app.leader import leader_elector
+from app.metrics import CONTENT_TYPE_LATEST, REGISTRY, MetricsMiddleware
+from app.inference import inference_queue
+from app.orchestrator import Autoscaler, prune_metric_history, reap_offline_nodes
+from app.orchestrator.autoscaler import AUTOSCALE_INTERVAL
+from app.orchestrator.reaper import METRICS_PRUNE_INTERVAL, NODE_REAPER_INTERVAL
+from app.storage import project_deployments, storage_session
+from app.watch import (
+    SnapshotWriter,
+    change_log,
+    current_resource_version,
+    restore_snapshot,
+)
 
 app = FastAPI(
     title="MIaaS Control Plane",
@@ -24,15 +40,71 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Negotiate response compression and decode compressed request bodies
+app.add_middleware(CompressionMiddleware)
+
+# Record per-route latency, in-flight requests and DB usage
+app.add_middleware(MetricsMiddleware)
+
 # Include API routers
 app.include_router(nodes.router, prefix="/api/v1")
 app.include_router(deployments.router, prefix="/api/v1")
+app.include_router(admin.router, prefix="/api/v1")
+app.include_router(models.router, prefix="/api/v1")
+app.include_router(blobs.router, prefix="/api/v1")
+app.include_router(inference.router, prefix="/api/v1")
+
+
+# Periodic change log snapshots, enabled by SNAPSHOT_PATH
+snapshot_writer = SnapshotWriter(change_log)
+
+# Background work that must run once across all replicas
+leader_elector.add_singleton(
+    "node-reaper", reap_offline_nodes, interval=NODE_REAPER_INTERVAL
+)
+leader_elector.add_singleton(
+    "metrics-pruner", prune_metric_history, interval=METRICS_PRUNE_INTERVAL
+)
+
+# Fails queued inference requests that can no longer finish by their deadline
+inference_queue.on_missed = inference.fail_missed
+
+# Scales models' inference replicas with their load, enabled per model by max_replicas
+autoscaler = Autoscaler(inference_queue)
+leader_elector.add_singleton("autoscaler", autoscaler.run_once, interval=AUTOSCALE_INTERVAL)
 
 
 @app.on_event("startup")
 def startup_event():
-    """Initialize database on startup."""
+    """Initialize database, change log and leader election on startup.
+    
+    The change log is restored from the last snapshot when there is one, so
+    watches can resume across the restart; otherwise numbering continues
+    after the highest persisted resource version. With ``DEPLOYMENT_LOG_DIR``
+    set, stored deployments are then brought in line with the event log.
+    """
     init_db()
+    db = SessionLocal()
+    try:
+        path = snapshot_writer.path
+        if not (path and restore_snapshot(change_log, db, path)):
+            change_log.seed(current_resource_version(db))
+    finally:
+        db.close()
+    if deployment_log.directory:
+        deployment_log.open()
+        with storage_session() as storage:
+            project_deployments(deployment_log, storage)
+    snapshot_writer.start()
+    leader_elector.start()
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    """Hand over leadership and write a final snapshot on shutdown."""
+    leader_elector.stop()
+    snapshot_writer.stop()
+    deployment_log.close()
 
 
 @app.get("/")
@@ -57,3 +129,13 @@ def health_check():
         Health status of the control plane
     """
     return {"status": "healthy"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics() -> Response:
+    """Prometheus metrics endpoint.
+    
+    Returns:
+        All control plane metrics in the Prometheus text exposition format
+    """
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,26 @@
+"""Metrics package for Prometheus-format instrumentation."""
+from .registry import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    Counter,
+    Gauge,
+    Histogram,
+    Registry,
+)
+from .middleware import MetricsMiddleware, current_request_stats, timed_phase
+from .routing import TimedRoute
+from . import instruments
+
+__all__ = [
+    "CONTENT_TYPE_LATEST",
+    "REGISTRY",
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "Registry",
+    "MetricsMiddleware",
+    "current_request_stats",
+    "timed_phase",
+    "TimedRoute",
+    "instruments",
+]
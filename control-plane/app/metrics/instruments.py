@@ -0,0 +1,170 @@
+"""Metric definitions for the control plane.
+
+All metrics live in the global registry and are exposed at ``GET /metrics``.
+"""
+from .registry import Counter, Gauge, Histogram
+
+# Buckets for small integer counts such as queries per request
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+HTTP_REQUESTS = Counter(
+    "miaas_http_requests_total",
+    "HTTP requests handled, by method, route template and status code.",
+    ["method", "route", "status"],
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "miaas_http_request_duration_seconds",
+    "HTTP request latency, by method and route template.",
+    ["method", "route"],
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "miaas_http_requests_in_flight",
+    "HTTP requests currently being handled.",
+)
+HTTP_REQUEST_DB_QUERIES = Histogram(
+    "miaas_http_request_db_queries",
+    "Database queries executed per HTTP request, by route template.",
+    ["route"],
+    buckets=COUNT_BUCKETS,
+)
+HTTP_REQUEST_DB_DURATION = Histogram(
+    "miaas_http_request_db_duration_seconds",
+    "Time spent in database queries per HTTP request, by route template.",
+    ["route"],
+)
+HTTP_COMPRESSION_BYTES = Counter(
+    "miaas_http_compression_bytes_total",
+    "Compressed HTTP body bytes, by direction (request or response), "
+    "encoding and form (raw or encoded).",
+    ["direction", "encoding", "form"],
+)
+
+DB_QUERIES = Counter(
+    "miaas_db_queries_total",
+    "Database statements executed.",
+)
+DB_QUERY_DURATION = Histogram(
+    "miaas_db_query_duration_seconds",
+    "Latency of individual database statements.",
+)
+
+NODE_REGISTRATIONS = Counter(
+    "miaas_node_registrations_total",
+    "Node registrations, by result (created, updated or throttled).",
+    ["result"],
+)
+REGISTRATION_RETRY_AFTER = Histogram(
+    "miaas_registration_retry_after_seconds",
+    "Retry-After delays handed to throttled registrations.",
+    buckets=(0.5, 1, 2, 5, 10, 30, 60, 120, 300),
+)
+NODE_HEARTBEATS = Counter(
+    "miaas_node_heartbeats_total",
+    "Node heartbeats received, by result.",
+    ["result"],
+)
+
+PLACEMENT_DECISIONS = Counter(
+    "miaas_placement_decisions_total",
+    "Placement decisions, by result (placed or unplaced).",
+    ["result"],
+)
+PLACEMENT_DURATION = Histogram(
+    "miaas_placement_decision_duration_seconds",
+    "Latency of placement engine node selection.",
+)
+AUTOSCALER_REPLICAS = Counter(
+    "miaas_autoscaler_replicas_total",
+    "Inference replicas added or removed by the autoscaler, by change "
+    "(added, removed, or unplaced when no node could take one).",
+    ["change"],
+)
+
+LEADER = Gauge(
+    "miaas_leader",
+    "1 if this replica holds the leader lease, 0 otherwise.",
+)
+LEADER_TRANSITIONS = Counter(
+    "miaas_leader_transitions_total",
+    "Leadership changes of this replica, by transition (acquired or lost).",
+    ["transition"],
+)
+SINGLETON_RUNS = Counter(
+    "miaas_singleton_runs_total",
+    "Runs of leader-only background loops, by loop and result.",
+    ["loop", "result"],
+)
+
+WATCH_SNAPSHOT_DURATION = Histogram(
+    "miaas_watch_snapshot_duration_seconds",
+    "Time to write or restore the change log snapshot, by operation.",
+    ["operation"],
+)
+
+DEPLOYMENT_LOG_EVENTS = Counter(
+    "miaas_deployment_log_events_total",
+    "Deployment state events appended to the event log, by type.",
+    ["type"],
+)
+DEPLOYMENT_LOG_COMPACTION_DURATION = Histogram(
+    "miaas_deployment_log_compaction_duration_seconds",
+    "Time to compact the deployment event log into a snapshot.",
+)
+
+REGISTRY_BLOB_BYTES_SENT = Counter(
+    "miaas_registry_blob_bytes_sent_total",
+    "Artifact bytes served by the registry, excluding HEAD requests.",
+)
+SWARM_ANNOUNCEMENTS = Counter(
+    "miaas_swarm_announcements_total",
+    "Chunk availability announcements received from agents.",
+)
+
+INFERENCE_REQUESTS = Counter(
+    "miaas_inference_requests_total",
+    "Inference requests, by result (queued, cached, completed, failed or missed).",
+    ["result"],
+)
+INFERENCE_REJECTED = Counter(
+    "miaas_inference_rejected_total",
+    "Inference requests refused on admission, by reason (queue_full or deadline) and priority class.",
+    ["reason", "priority"],
+)
+INFERENCE_QUEUE_DEPTH = Gauge(
+    "miaas_inference_queue_depth",
+    "Inference requests waiting to be batched, across all models.",
+)
+INFERENCE_QUEUE_WAIT = Histogram(
+    "miaas_inference_queue_wait_seconds",
+    "Time inference requests wait in the queue before an engine takes their batch.",
+)
+INFERENCE_BATCH_SIZE = Histogram(
+    "miaas_inference_batch_size",
+    "Requests per batch handed to inference engines.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+INFERENCE_BATCH_AFFINITY = Counter(
+    "miaas_inference_batch_affinity_total",
+    "Batches leased to engines, by affinity: warm if the engine had the model loaded, else cold.",
+    ["affinity"],
+)
+INFERENCE_RESULT_BYTES = Gauge(
+    "miaas_inference_result_bytes",
+    "Encoded inference results held, by location (memory or disk).",
+    ["location"],
+)
+INFERENCE_CACHE_LOOKUPS = Counter(
+    "miaas_inference_cache_lookups_total",
+    "Inference requests looked up in the result cache, by result (hit, coalesced or miss).",
+    ["result"],
+)
+INFERENCE_CACHE_BYTES = Gauge(
+    "miaas_inference_cache_bytes",
+    "Encoded inference results held in the result cache.",
+)
+INFERENCE_RESULTS_EVICTED = Counter(
+    "miaas_inference_results_evicted_total",
+    "Inference results moved out of memory or dropped, by reason "
+    "(expired, spilled, memory or disk).",
+    ["reason"],
+)
@@ -0,0 +1,167 @@
+"""Request and database instrumentation.
+
+``MetricsMiddleware`` is a plain ASGI middleware, so it adds no extra task or
+body buffering per request and works with streaming (watch) responses. The
+SQLAlchemy engine listeners attribute statement counts and time to the
+request being served through a context variable, which propagates into the
+threadpool that runs sync endpoints. Requests over the slow request threshold
+are handed to the slow request log with their per-phase timings.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .instruments import (
+    DB_QUERIES,
+    DB_QUERY_DURATION,
+    HTTP_REQUESTS,
+    HTTP_REQUEST_DB_DURATION,
+    HTTP_REQUEST_DB_QUERIES,
+    HTTP_REQUEST_DURATION,
+    HTTP_REQUESTS_IN_FLIGHT,
+)
+from app.profiling.slowlog import slow_request_log
+
+# Route label used for requests that did not match any route
+UNMATCHED_ROUTE = "<unmatched>"
+
+# Long-lived streaming responses that are never reported as slow
+_STREAMING_MEDIA_TYPES = (b"application/x-ndjson", b"text/event-stream")
+
+
+class RequestStats:
+    """Per-request accumulator for database activity and phase timings."""
+
+    __slots__ = ("db_queries", "db_seconds", "phases", "handler_done")
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.phases: Dict[str, float] = {}
+        self.handler_done: Optional[float] = None
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar(
+    "miaas_request_stats", default=None
+)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    """Return database statistics for the request being served, if any."""
+    return _request_stats.get()
+
+
+@contextmanager
+def timed_phase(name: str) -> Iterator[None]:
+    """Attribute the time spent in the block to a phase of the request.
+
+    Does nothing outside of a request.
+
+    Args:
+        name: Phase name, e.g. "auth"
+    """
+    stats = _request_stats.get()
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.phases[name] = (
+            stats.phases.get(name, 0.0) + time.perf_counter() - start
+        )
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    """Remember when a statement started."""
+    conn.info.setdefault("miaas_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    """Record statement latency globally and against the current request."""
+    elapsed = time.perf_counter() - conn.info["miaas_query_start"].pop()
+    DB_QUERIES.inc()
+    DB_QUERY_DURATION.observe(elapsed)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.db_queries += 1
+        stats.db_seconds += elapsed
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency, status and DB usage."""
+
+    def __init__(self, app):
+        """Wrap an ASGI application.
+
+        Args:
+            app: ASGI application to instrument
+        """
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        response_started = None
+        streamed = False
+
+        async def send_wrapper(message):
+            nonlocal status_code, response_started, streamed
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                response_started = time.perf_counter()
+                for name, value in message.get("headers", ()):
+                    if name.lower() == b"content-type":
+                        streamed = value.startswith(_STREAMING_MEDIA_TYPES)
+            elif message["type"] == "http.response.body":
+                streamed = streamed or message.get("more_body", False)
+            await send(message)
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            _request_stats.reset(token)
+
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or UNMATCHED_ROUTE
+            method = scope["method"]
+            HTTP_REQUESTS.labels(method, route_path, status_code).inc()
+            HTTP_REQUEST_DURATION.labels(method, route_path).observe(elapsed)
+            HTTP_REQUEST_DB_QUERIES.labels(route_path).observe(stats.db_queries)
+            HTTP_REQUEST_DB_DURATION.labels(route_path).observe(stats.db_seconds)
+
+            # Streaming responses (watches) are long-lived by design
+            if not streamed and elapsed * 1000 >= slow_request_log.threshold_ms:
+                phases = dict(stats.phases)
+                phases["db"] = stats.db_seconds
+                if stats.handler_done is not None and response_started:
+                    phases["serialization"] = response_started - stats.handler_done
+                slow_request_log.record(
+                    method,
+                    route_path,
+                    scope["path"],
+                    status_code,
+                    elapsed,
+                    phases,
+                    stats.db_queries,
+                )
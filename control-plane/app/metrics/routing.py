@@ -0,0 +1,58 @@
+"""Route class that times endpoint execution.
+
+FastAPI resolves dependencies, calls the endpoint and then validates and
+serializes the return value inside a single route handler. Wrapping only the
+endpoint function lets the request's phase timings separate handler time
+from response serialization, which is measured up to the moment the response
+starts.
+"""
+import functools
+import inspect
+import time
+from typing import Callable
+
+from fastapi.routing import APIRoute
+
+from .middleware import current_request_stats
+
+
+def _timed(endpoint: Callable) -> Callable:
+    """Wrap an endpoint so its duration is recorded as the "handler" phase."""
+
+    def _record(start: float) -> None:
+        stats = current_request_stats()
+        if stats is not None:
+            stats.handler_done = time.perf_counter()
+            stats.phases["handler"] = stats.handler_done - start
+
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                _record(start)
+
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            _record(start)
+
+    return wrapper
+
+
+class TimedRoute(APIRoute):
+    """APIRoute that records endpoint time for slow request diagnostics.
+
+    Example:
+        router = APIRouter(prefix="/nodes", route_class=TimedRoute)
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, _timed(endpoint), **kwargs)
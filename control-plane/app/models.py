@@ -1,7 +1,7 @@
 """Pydantic models for API requests and responses."""
 from datetime import datetime
-from typing import Dict, List, Optional
-from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class CapabilitiesModel(BaseModel):
@@ -13,6 +13,8 @@ class CapabilitiesModel(BaseModel):
     gpus: List[Dict] = Field(default_factory=list, description="List of available GPUs")
     docker: Optional[Dict] = Field(None, description="Docker information")
     k8s: Optional[Dict] = Field(None, description="Kubernetes information")
+    disks: List[Dict] = Field(default_factory=list, description="Mounted disks")
+    fingerprint: Optional[str] = Field(None, description="Agent-computed content hash of the capabilities")
 
 
 class NodeRegisterRequest(BaseModel):
@@ -39,12 +41,56 @@ class NodeRegisterResponse(BaseModel):
     control_plane_url: str = Field(..., description="Control plane URL")
 
 
+class CachedArtifact(BaseModel):
+    """An artifact held in a node's cache."""
+    digest: str = Field(..., pattern=r"^sha256:[0-9a-f]{64}$", description="Artifact digest")
+    size: int = Field(..., ge=0, description="Artifact size in bytes")
+    pinned: bool = Field(False, description="Whether the artifact is in use and cannot be evicted")
+    last_used: float = Field(..., description="Time the artifact was last used on the node")
+
+
+class NodeArtifactsRequest(BaseModel):
+    """Request model for reporting the artifacts held in a node's cache."""
+    artifacts: List[CachedArtifact] = Field(default_factory=list, description="All artifacts held, replacing the previous report")
+
+
+class NodeArtifactsResponse(BaseModel):
+    """Response model for the artifacts held in a node's cache."""
+    node_id: str = Field(..., description="Node ID")
+    artifacts: List[CachedArtifact] = Field(default_factory=list, description="Artifacts held, most recently used first")
+
+
+class InferenceLoadModel(BaseModel):
+    """State of a node's inference engine, reported in heartbeats."""
+    loaded: List[str] = Field(default_factory=list, description="Digests of the models loaded in its workers")
+    workers: int = Field(0, ge=0, description="Worker processes")
+    busy: int = Field(0, ge=0, description="Workers running a batch")
+    queued: int = Field(0, ge=0, description="Requests taken from the control plane and not yet returned")
+
+
 class HeartbeatRequest(BaseModel):
     """Request model for node heartbeat."""
     cpu_usage: float = Field(0.0, description="CPU usage percentage")
     mem_usage: float = Field(0.0, description="Memory usage percentage")
     disk_free_mb: int = Field(0, description="Free disk space in MB")
     running_containers: List[str] = Field(default_factory=list, description="List of running containers")
+    timestamp: Optional[float] = Field(None, description="Sample time, defaults to the time it was received")
+    inference: Optional[InferenceLoadModel] = Field(None, description="Inference engine state, for nodes running one")
+
+
+class MetricSampleResponse(BaseModel):
+    """Response model for a stored node metric sample."""
+    timestamp: float = Field(..., description="Sample time")
+    cpu_usage: float = Field(..., description="CPU usage percentage")
+    mem_usage: float = Field(..., description="Memory usage percentage")
+    disk_free_mb: int = Field(..., description="Free disk space in MB")
+    running_containers: List[str] = Field(default_factory=list, description="List of running containers")
+
+
+class MetricsReplayResponse(BaseModel):
+    """Response model for a replayed batch of metric samples."""
+    accepted: int = Field(..., description="Samples added to the history")
+    skipped: int = Field(..., description="Samples already in the history or past retention")
 
 
 class HeartbeatResponse(BaseModel):
@@ -67,3 +113,167 @@ class DeploymentResponse(BaseModel):
     deployment_id: str = Field(..., description="Deployment ID")
     status: str = Field(..., description="Deployment status")
     message: str = Field(..., description="Status message")
+
+
+class DeploymentEventResponse(BaseModel):
+    """Response model for a recorded deployment state transition."""
+    seq: int = Field(..., description="Event sequence number")
+    timestamp: float = Field(..., description="Time the change was recorded")
+    type: str = Field(..., description="Event type: put, update or delete")
+    fields: Dict = Field(default_factory=dict, description="Full record for put, changed fields for update")
+
+
+class ModelRegisterRequest(BaseModel):
+    """Request model for registering an ML model."""
+    name: str = Field(..., description="Model name")
+    version: str = Field(..., description="Model version")
+    framework: str = Field(..., description="Framework, e.g. onnx or sklearn")
+    digest: str = Field(..., pattern=r"^sha256:[0-9a-f]{64}$", description="Digest of the uploaded artifact blob")
+    input_schema: Dict = Field(default_factory=dict, description="Input schema")
+    output_schema: Dict = Field(default_factory=dict, description="Output schema")
+    max_batch_size: Optional[int] = Field(None, ge=1, le=1024, description="Largest inference batch, defaults to INFERENCE_MAX_BATCH_SIZE")
+    max_batch_wait_ms: Optional[float] = Field(None, ge=0, le=60000, description="Longest wait for a batch to fill, defaults to INFERENCE_MAX_BATCH_WAIT_MS")
+    min_replicas: Optional[int] = Field(None, ge=0, le=1000, description="Fewest inference replicas the autoscaler keeps, default 0")
+    max_replicas: Optional[int] = Field(None, ge=0, le=1000, description="Most inference replicas the autoscaler adds; unset to not autoscale")
+
+
+class ModelUpdateRequest(BaseModel):
+    """Request model for updating model metadata."""
+    status: Optional[str] = Field(None, pattern="^(active|deprecated|archived)$", description="Lifecycle status")
+    input_schema: Optional[Dict] = Field(None, description="Input schema")
+    output_schema: Optional[Dict] = Field(None, description="Output schema")
+    max_batch_size: Optional[int] = Field(None, ge=1, le=1024, description="Largest inference batch")
+    max_batch_wait_ms: Optional[float] = Field(None, ge=0, le=60000, description="Longest wait for a batch to fill")
+    min_replicas: Optional[int] = Field(None, ge=0, le=1000, description="Fewest inference replicas the autoscaler keeps")
+    max_replicas: Optional[int] = Field(None, ge=0, le=1000, description="Most inference replicas the autoscaler adds")
+
+
+class ModelResponse(BaseModel):
+    """Response model for a registered ML model."""
+    id: str = Field(..., description="Model ID")
+    name: str = Field(..., description="Model name")
+    version: str = Field(..., description="Model version")
+    framework: str = Field(..., description="Framework")
+    status: str = Field(..., description="Lifecycle status: active, deprecated or archived")
+    digest: str = Field(..., description="Digest of the artifact blob")
+    size: int = Field(..., description="Artifact size in bytes")
+    input_schema: Dict = Field(default_factory=dict, description="Input schema")
+    output_schema: Dict = Field(default_factory=dict, description="Output schema")
+    max_batch_size: int = Field(..., description="Largest inference batch")
+    max_batch_wait_ms: float = Field(..., description="Longest wait for an inference batch to fill")
+    min_replicas: int = Field(0, description="Fewest inference replicas the autoscaler keeps")
+    max_replicas: Optional[int] = Field(None, description="Most inference replicas the autoscaler adds, null if not autoscaled")
+
+
+class ModelListResponse(BaseModel):
+    """Response model for the model list."""
+    models: List[ModelResponse] = Field(..., description="Registered models")
+
+
+class ModelLocationsResponse(BaseModel):
+    """Response model for the online nodes holding a model's artifact."""
+    model_config = ConfigDict(protected_namespaces=())
+    model_id: str = Field(..., description="Model ID")
+    digest: str = Field(..., description="Digest of the artifact blob")
+    nodes: List[NodeResponse] = Field(default_factory=list, description="Online nodes holding the artifact, pinned (in use) first")
+
+
+class BlobUploadResponse(BaseModel):
+    """Response model for an upload in progress."""
+    upload_id: str = Field(..., description="Upload ID")
+    offset: int = Field(..., description="Bytes received; the next chunk starts here")
+
+
+class PeerAnnounceRequest(BaseModel):
+    """Request model for announcing the chunks of an artifact a node holds."""
+    url: str = Field(..., description="Base URL the node serves chunks from")
+    have: str = Field(..., description="Base64 bitfield of the chunks held")
+    fetching: str = Field("", description="Base64 bitfield of the chunks being fetched from the registry")
+
+
+class SwarmPeer(BaseModel):
+    """A node holding or fetching chunks of an artifact."""
+    node_id: str = Field(..., description="Node ID")
+    url: str = Field(..., description="Base URL the node serves chunks from")
+    have: str = Field(..., description="Base64 bitfield of the chunks held")
+    fetching: str = Field("", description="Base64 bitfield of the chunks being fetched from the registry")
+
+
+class SwarmResponse(BaseModel):
+    """Response model for the peers holding or fetching an artifact."""
+    digest: str = Field(..., description="Artifact digest")
+    peers: List[SwarmPeer] = Field(default_factory=list, description="Peers holding or fetching chunks")
+
+
+class ChunkManifestResponse(BaseModel):
+    """Response model for the chunks an artifact is distributed in."""
+    digest: str = Field(..., description="Artifact digest")
+    size: int = Field(..., description="Artifact size in bytes")
+    chunk_size: int = Field(..., description="Chunk size in bytes")
+    chunks: List[str] = Field(..., description="SHA-256 of every chunk, hex")
+
+
+class InferenceSubmitRequest(BaseModel):
+    """Request model for submitting an inference request."""
+    model_config = ConfigDict(protected_namespaces=())
+    model_id: str = Field(..., description="Model to run")
+    input_data: Any = Field(..., description="Model input")
+    parameters: Dict = Field(default_factory=dict, description="Inference parameters")
+    cache: bool = Field(True, description="Answer from, and share, identical requests' results")
+    priority: str = Field(
+        "standard", pattern="^(interactive|standard|batch)$", description="Priority class"
+    )
+    deadline_ms: Optional[float] = Field(
+        None, gt=0, le=86400000, description="Milliseconds by which the result is due; class default if omitted"
+    )
+
+
+class InferenceSubmitResponse(BaseModel):
+    """Response model for an accepted inference request."""
+    request_id: str = Field(..., description="Request ID, for fetching the result")
+    status: str = Field(..., description="Request status: queued, processing, or completed if cached")
+
+
+class InferenceResultResponse(BaseModel):
+    """Response model for the status or result of an inference request."""
+    request_id: str = Field(..., description="Request ID")
+    status: str = Field(..., description="Request status: queued, processing, completed or failed")
+    result: Any = Field(None, description="Model output, once completed")
+    error: Optional[str] = Field(None, description="What went wrong, if failed")
+    timestamp: Optional[float] = Field(None, description="Time the request finished")
+
+
+class BatchLeaseRequest(BaseModel):
+    """Request model for an engine asking for the next batch."""
+    models: Optional[List[str]] = Field(None, description="Models the engine can run; any model if omitted")
+    wait: float = Field(0.0, ge=0, le=60, description="Seconds to wait for a batch to be ready")
+
+
+class BatchItem(BaseModel):
+    """One inference request of a batch."""
+    request_id: str = Field(..., description="Request ID")
+    input_data: Any = Field(..., description="Model input")
+    parameters: Dict = Field(default_factory=dict, description="Inference parameters")
+
+
+class BatchResponse(BaseModel):
+    """Response model for a batch leased to an engine."""
+    model_config = ConfigDict(protected_namespaces=())
+    batch_id: str = Field(..., description="Batch ID, for returning the results")
+    model_id: str = Field(..., description="Model to run")
+    digest: str = Field(..., description="Digest of the model's artifact")
+    framework: str = Field("", description="Framework of the model, choosing how engines load it")
+    lease_seconds: float = Field(..., description="Seconds to return the results in before the batch is handed out again")
+    requests: List[BatchItem] = Field(..., description="Requests in the batch, oldest first")
+
+
+class BatchItemResult(BaseModel):
+    """The outcome of one request of a batch."""
+    request_id: str = Field(..., description="Request ID")
+    result: Any = Field(None, description="Model output")
+    error: Optional[str] = Field(None, description="What went wrong, if the request failed")
+
+
+class BatchResultsRequest(BaseModel):
+    """Request model for returning a batch's results."""
+    results: List[BatchItemResult] = Field(..., description="Outcome of every request in the batch")
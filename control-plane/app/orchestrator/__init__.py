@@ -1,4 +1,23 @@
-"""Orchestrator package for placement and deployment logic."""
+"""Orchestrator package for placement, autoscaling and deployment logic."""
+from .autoscaler import (
+    DEFAULT_SCALING,
+    Autoscaler,
+    ModelLoad,
+    ScalingPolicy,
+    desired_replicas,
+    replicas_of,
+)
 from .placement import PlacementEngine
+from .reaper import prune_metric_history, reap_offline_nodes
 
-__all__ = ["PlacementEngine"]
+__all__ = [
+    "DEFAULT_SCALING",
+    "Autoscaler",
+    "ModelLoad",
+    "ScalingPolicy",
+    "desired_replicas",
+    "replicas_of",
+    "PlacementEngine",
+    "prune_metric_history",
+    "reap_offline_nodes",
+]
@@ -0,0 +1,340 @@
+"""Autoscaler adding and removing inference replicas as model load changes.
+
+An inference replica is a deployment (template ``inference-engine``) running
+an inference engine for one model on one node. Models opt in by setting
+``max_replicas``, and optionally ``min_replicas``. The autoscaler runs as a
+leader-only singleton loop every ``AUTOSCALE_INTERVAL`` seconds and compares
+each model's load with targets:
+
+* queued requests per replica, against ``AUTOSCALE_QUEUE_PER_REPLICA``;
+* batch latency (``InferenceQueue.latency``), against
+  ``AUTOSCALE_TARGET_LATENCY_MS``;
+* mean heartbeat CPU and memory usage of the replicas' nodes, against
+  ``AUTOSCALE_TARGET_CPU`` and ``AUTOSCALE_TARGET_MEM``.
+
+The desired replica count is the current count scaled by the highest ratio
+of load to target, so a model only scales down once every signal is low.
+Ratios within ``AUTOSCALE_TOLERANCE`` of 1 change nothing, and one run at
+most doubles a model's replicas.
+
+Changes are also damped in time. After scaling, a model does not scale up
+again for ``AUTOSCALE_UP_COOLDOWN`` seconds. It only scales down once it has
+wanted fewer replicas for ``AUTOSCALE_DOWN_COOLDOWN`` seconds in a row, and
+then only to the most it wanted during that time. Archived models lose
+their replicas at once.
+
+New replicas are placed by the placement engine on online nodes without a
+replica of the model, nodes holding its artifact first. Replicas on the
+busiest nodes are removed first.
+
+Inference queues are held in memory by each control plane replica, so with
+several replicas the leader scales on its own queues only.
+"""
+import logging
+import math
+import os
+import time
+import uuid
+from typing import AbstractSet, Callable, Dict, List, NamedTuple, Optional
+
+from app.db.database import SessionLocal
+from app.db.models import ModelDB, NodeArtifactDB
+from app.metrics.instruments import AUTOSCALER_REPLICAS
+from app.storage import Record, Storage, open_storage
+
+from .placement import PlacementEngine
+
+logger = logging.getLogger(__name__)
+
+# Seconds between autoscaler runs
+AUTOSCALE_INTERVAL = float(os.environ.get("AUTOSCALE_INTERVAL", "15"))
+
+# Queued requests one replica is expected to keep up with
+AUTOSCALE_QUEUE_PER_REPLICA = float(os.environ.get("AUTOSCALE_QUEUE_PER_REPLICA", "32"))
+
+# Target batch latency, from a request being queued to its results, in milliseconds
+AUTOSCALE_TARGET_LATENCY_MS = float(os.environ.get("AUTOSCALE_TARGET_LATENCY_MS", "500"))
+
+# Target mean CPU and memory usage of the nodes running a model's replicas, percent
+AUTOSCALE_TARGET_CPU = float(os.environ.get("AUTOSCALE_TARGET_CPU", "70"))
+AUTOSCALE_TARGET_MEM = float(os.environ.get("AUTOSCALE_TARGET_MEM", "80"))
+
+# Load-to-target ratios this close to 1 leave the replica count alone
+AUTOSCALE_TOLERANCE = float(os.environ.get("AUTOSCALE_TOLERANCE", "0.1"))
+
+# Seconds after scaling before scaling up again
+AUTOSCALE_UP_COOLDOWN = float(os.environ.get("AUTOSCALE_UP_COOLDOWN", "60"))
+
+# Seconds a model must want fewer replicas before they are removed
+AUTOSCALE_DOWN_COOLDOWN = float(os.environ.get("AUTOSCALE_DOWN_COOLDOWN", "300"))
+
+# Image the replicas' compose files run
+AUTOSCALE_REPLICA_IMAGE = os.environ.get("AUTOSCALE_REPLICA_IMAGE", "miaas-agent")
+
+REPLICA_TEMPLATE = "inference-engine"
+
+_REPLICA_COMPOSE = """services:
+  inference-engine:
+    image: {image}
+    environment:
+      ENGINE_WORKERS: "${{ENGINE_WORKERS:-1}}"
+      ENGINE_MODELS: "${{ENGINE_MODELS}}"
+"""
+
+
+class ScalingPolicy(NamedTuple):
+    """Targets and damping of the autoscaler."""
+
+    queue_per_replica: float
+    target_latency: float  # seconds
+    target_cpu: float
+    target_mem: float
+    tolerance: float
+    up_cooldown: float
+    down_cooldown: float
+
+
+DEFAULT_SCALING = ScalingPolicy(
+    AUTOSCALE_QUEUE_PER_REPLICA,
+    AUTOSCALE_TARGET_LATENCY_MS / 1000,
+    AUTOSCALE_TARGET_CPU,
+    AUTOSCALE_TARGET_MEM,
+    AUTOSCALE_TOLERANCE,
+    AUTOSCALE_UP_COOLDOWN,
+    AUTOSCALE_DOWN_COOLDOWN,
+)
+
+
+class ModelLoad(NamedTuple):
+    """A model's load, as seen by the autoscaler."""
+
+    queued: int
+    latency: float  # seconds
+    cpu_usage: Optional[float] = None  # mean over the replicas' nodes
+    mem_usage: Optional[float] = None
+
+
+def desired_replicas(current: int, load: ModelLoad, policy: ScalingPolicy = DEFAULT_SCALING,
+                     minimum: int = 0, maximum: int = 1) -> int:
+    """Replicas a model needs for its load, before cooldowns.
+
+    Args:
+        current: Replicas the model has
+        load: The model's load
+        policy: Targets and tolerance
+        minimum: Fewest replicas to keep
+        maximum: Most replicas to run
+
+    Returns:
+        Replica count between ``minimum`` and ``maximum``
+
+    Example:
+        >>> desired_replicas(2, ModelLoad(queued=128, latency=0.2), maximum=8)
+        4
+    """
+    if current == 0:
+        desired = math.ceil(load.queued / policy.queue_per_replica)
+    else:
+        ratios = [
+            load.queued / (current * policy.queue_per_replica),
+            load.latency / policy.target_latency,
+        ]
+        if load.cpu_usage is not None:
+            ratios.append(load.cpu_usage / policy.target_cpu)
+        if load.mem_usage is not None:
+            ratios.append(load.mem_usage / policy.target_mem)
+        ratio = max(ratios)
+        desired = current
+        if abs(ratio - 1) > policy.tolerance:
+            desired = min(math.ceil(current * ratio), 2 * current)
+    return max(minimum, min(maximum, desired))
+
+
+class _Scaling:
+    """Cooldown state of one model."""
+
+    __slots__ = ("scaled_at", "low_since", "low_peak")
+
+    def __init__(self):
+        self.scaled_at: Optional[float] = None
+        self.low_since: Optional[float] = None
+        self.low_peak = 0
+
+
+class Autoscaler:
+    """Scales models' inference replicas with their load.
+
+    Example:
+        >>> autoscaler = Autoscaler(inference_queue)
+        >>> leader_elector.add_singleton("autoscaler", autoscaler.run_once, interval=15)
+    """
+
+    def __init__(self, queue, placement: Optional[PlacementEngine] = None,
+                 policy: ScalingPolicy = DEFAULT_SCALING,
+                 session_factory: Callable = SessionLocal,
+                 backend: Optional[str] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        """Initialize an autoscaler.
+
+        Args:
+            queue: Inference request queues (``InferenceQueue``), read for
+                queue depth and batch latency
+            placement: Places new replicas; a default engine if None
+            policy: Targets and damping
+            session_factory: Callable returning a database session
+            backend: Storage backend name, ``STORAGE_BACKEND`` by default
+            clock: Monotonic clock, replaceable in tests
+        """
+        self.queue = queue
+        self.placement = placement or PlacementEngine()
+        self.policy = policy
+        self.session_factory = session_factory
+        self.backend = backend
+        self.clock = clock
+        self._scaling: Dict[str, _Scaling] = {}
+
+    def run_once(self) -> Dict[str, int]:
+        """Scale every autoscaled model once.
+
+        Returns:
+            Replica count of each model whose replicas changed
+        """
+        db = self.session_factory()
+        try:
+            storage = open_storage(db, self.backend)
+            models = db.query(ModelDB).filter(ModelDB.max_replicas.isnot(None)).all()
+            changed = {}
+            for model in models:
+                holding = {
+                    node_id for (node_id,) in db.query(NodeArtifactDB.node_id)
+                    .filter(NodeArtifactDB.digest == model.digest)
+                }
+                count = self.scale(storage, model, holding)
+                if count is not None:
+                    changed[model.id] = count
+            # Forget models that are no longer autoscaled
+            autoscaled = {model.id for model in models}
+            self._scaling = {
+                model_id: state for model_id, state in self._scaling.items()
+                if model_id in autoscaled
+            }
+            storage.commit()
+            db.commit()
+        finally:
+            db.close()
+        return changed
+
+    def scale(self, storage: Storage, model: ModelDB,
+              holding: AbstractSet[str] = frozenset()) -> Optional[int]:
+        """Scale one model's replicas; see the module docstring.
+
+        Args:
+            storage: Node and deployment storage
+            model: The model, with its replica bounds
+            holding: Nodes holding the model's artifact in their cache
+
+        Returns:
+            The model's new replica count, or None if it did not change
+        """
+        now = self.clock()
+        state = self._scaling.setdefault(model.id, _Scaling())
+        nodes = {node["id"]: node for node in storage.nodes.list(status="online")}
+        replicas = replicas_of(storage, model.id)
+        current = len(replicas)
+
+        if model.status == "archived":
+            wanted = 0
+        else:
+            wanted = desired_replicas(
+                current, self._load(model.id, replicas, nodes), self.policy,
+                model.min_replicas or 0, model.max_replicas,
+            )
+            if wanted < current:
+                if state.low_since is None:
+                    state.low_since, state.low_peak = now, wanted
+                state.low_peak = max(state.low_peak, wanted)
+                if now - state.low_since < self.policy.down_cooldown:
+                    return None
+                wanted = state.low_peak
+            else:
+                state.low_since = None
+            if wanted > current and state.scaled_at is not None \
+                    and now - state.scaled_at < self.policy.up_cooldown:
+                return None
+
+        if wanted > current:
+            count = current + self._add(storage, model, replicas, nodes, wanted - current, holding)
+        elif wanted < current:
+            count = current - self._remove(storage, replicas, nodes, current - wanted)
+        else:
+            return None
+        if count == current:
+            return None
+        state.scaled_at, state.low_since = now, None
+        logger.info(f"Scaled model {model.name} {model.version} from {current} to {count} replicas")
+        return count
+
+    def _load(self, model_id: str, replicas: List[Record], nodes: Dict[str, Record]) -> ModelLoad:
+        usage = [
+            nodes[replica["node_id"]]["capabilities"].get("metrics") or {}
+            for replica in replicas if replica["node_id"] in nodes
+        ]
+        cpu = [metrics["cpu_usage"] for metrics in usage if "cpu_usage" in metrics]
+        mem = [metrics["mem_usage"] for metrics in usage if "mem_usage" in metrics]
+        return ModelLoad(
+            queued=self.queue.depth(model_id),
+            latency=self.queue.latency(model_id),
+            cpu_usage=sum(cpu) / len(cpu) if cpu else None,
+            mem_usage=sum(mem) / len(mem) if mem else None,
+        )
+
+    def _add(self, storage, model, replicas, nodes, count, holding) -> int:
+        """Place up to ``count`` new replicas, at most one per node."""
+        taken = {replica["node_id"] for replica in replicas}
+        added = 0
+        for _ in range(count):
+            candidates = [
+                {**node, "artifacts": [model.digest] if node["id"] in holding else []}
+                for node_id, node in nodes.items() if node_id not in taken
+            ]
+            node_id = self.placement.select_node(candidates, {"artifacts": [model.digest]})
+            if node_id is None:
+                AUTOSCALER_REPLICAS.labels("unplaced").inc()
+                logger.warning(f"No node can take another replica of model {model.name} {model.version}")
+                break
+            storage.deployments.put({
+                "id": f"inference-{model.id[:8]}-{uuid.uuid4().hex[:8]}",
+                "node_id": node_id,
+                "template_id": REPLICA_TEMPLATE,
+                "rendered_compose": _REPLICA_COMPOSE.format(image=AUTOSCALE_REPLICA_IMAGE),
+                "env": {"ENGINE_MODELS": model.id},
+                "status": "pending",
+                "action": "apply",
+            })
+            taken.add(node_id)
+            added += 1
+            AUTOSCALER_REPLICAS.labels("added").inc()
+        return added
+
+    def _remove(self, storage, replicas, nodes, count) -> int:
+        """Mark ``count`` replicas for deletion, those on the busiest nodes first."""
+        def busy(replica):
+            node = nodes.get(replica["node_id"])
+            if node is None:
+                return float("inf")
+            return (node["capabilities"].get("metrics") or {}).get("cpu_usage", 0.0)
+
+        for replica in sorted(replicas, key=busy, reverse=True)[:count]:
+            storage.deployments.update(replica["id"], status="deleting", action="remove")
+            AUTOSCALER_REPLICAS.labels("removed").inc()
+        return min(count, len(replicas))
+
+
+def replicas_of(storage: Storage, model_id: str) -> List[Record]:
+    """A model's inference replicas, leaving out those being removed."""
+    return [
+        deployment for deployment in storage.deployments.list()
+        if deployment["template_id"] == REPLICA_TEMPLATE
+        and (deployment.get("env") or {}).get("ENGINE_MODELS") == model_id
+        and deployment["action"] != "remove"
+    ]
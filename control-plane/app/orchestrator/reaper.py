@@ -0,0 +1,93 @@
+"""Reapers marking nodes offline when their heartbeats stop, and pruning
+their expired metric history.
+
+Both run as leader-only singleton loops, so with several control plane
+replicas each stale node is only marked offline once, and heartbeats do not
+pay for pruning. Nodes are read and updated through the configured storage
+backend, so in-memory backends are reaped too.
+"""
+import logging
+import os
+import time
+from typing import Callable, ContextManager, Optional
+
+from app.db.database import SessionLocal
+from app.db.models import NodeMetricDB
+from app.storage import Storage, storage_session
+
+logger = logging.getLogger(__name__)
+
+# Seconds without a heartbeat after which a node is marked offline
+NODE_OFFLINE_AFTER = float(os.environ.get("NODE_OFFLINE_AFTER", "90"))
+
+# Seconds between reaper runs
+NODE_REAPER_INTERVAL = float(os.environ.get("NODE_REAPER_INTERVAL", "15"))
+
+# Seconds of metric history kept per node
+METRICS_RETENTION_SECONDS = float(os.environ.get("METRICS_RETENTION_SECONDS", "604800"))
+
+# Seconds between prunings of expired metric history
+METRICS_PRUNE_INTERVAL = float(os.environ.get("METRICS_PRUNE_INTERVAL", "300"))
+
+
+def reap_offline_nodes(
+    storage_factory: Callable[[], ContextManager[Storage]] = storage_session,
+    offline_after: float = NODE_OFFLINE_AFTER,
+    now: Optional[float] = None,
+) -> int:
+    """Mark online nodes without a recent heartbeat as offline.
+
+    With the SQL backend rows are updated through the ORM, so watch clients
+    see the status change.
+
+    Args:
+        storage_factory: Callable returning a context manager that opens
+            the storage backend for one unit of work
+        offline_after: Seconds without a heartbeat before a node is offline
+        now: Current time, defaults to ``time.time()``
+
+    Returns:
+        Number of nodes marked offline
+    """
+    cutoff = (now if now is not None else time.time()) - offline_after
+    with storage_factory() as storage:
+        stale = [
+            node for node in storage.nodes.list(status="online")
+            if node["last_seen"] is not None and node["last_seen"] < cutoff
+        ]
+        for node in stale:
+            storage.nodes.update(node["id"], status="offline")
+
+    if stale:
+        logger.info(f"Marked {len(stale)} nodes offline")
+    return len(stale)
+
+
+def prune_metric_history(
+    session_factory: Callable = SessionLocal,
+    retention: float = METRICS_RETENTION_SECONDS,
+    now: Optional[float] = None,
+) -> int:
+    """Delete node metric samples older than the retention window.
+
+    Args:
+        session_factory: Callable returning a database session
+        retention: Seconds of metric history kept per node
+        now: Current time, defaults to ``time.time()``
+
+    Returns:
+        Number of samples deleted
+    """
+    cutoff = (now if now is not None else time.time()) - retention
+    db = session_factory()
+    try:
+        deleted = db.query(NodeMetricDB).filter(
+            NodeMetricDB.timestamp < cutoff
+        ).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+    if deleted:
+        logger.info(f"Pruned {deleted} expired metric samples")
+    return deleted
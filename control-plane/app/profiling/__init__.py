@@ -0,0 +1,12 @@
+"""Profiling package for on-demand sampling and slow request capture."""
+from .sampler import Profile, ProfilerBusy, SamplingProfiler, profile_for
+from .slowlog import SlowRequestLog, slow_request_log
+
+__all__ = [
+    "Profile",
+    "ProfilerBusy",
+    "SamplingProfiler",
+    "profile_for",
+    "SlowRequestLog",
+    "slow_request_log",
+]
@@ -0,0 +1,224 @@
+"""Low-overhead sampling profiler.
+
+The sampling thread periodically snapshots the stack of every other thread
+with ``sys._current_frames()`` and counts identical stacks. Nothing is
+installed in the profiled threads, so the cost is proportional to the
+sampling rate rather than to the amount of code executed.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+
+# Leaf functions of threads that are parked waiting for work
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+}
+
+Frame = Tuple[str, str, int]
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is requested while another one is running."""
+
+
+class SamplingProfiler:
+    """Collects aggregated stack samples for all threads.
+
+    Example:
+        >>> profiler = SamplingProfiler(interval=0.01)
+        >>> profile = profiler.run(5.0)
+        >>> print(profile.to_collapsed())
+    """
+
+    def __init__(self, interval: float = 0.01, include_idle: bool = False):
+        """Initialize the profiler.
+
+        Args:
+            interval: Seconds between samples
+            include_idle: Keep samples of threads parked waiting for work
+        """
+        self.interval = interval
+        self.include_idle = include_idle
+
+    def run(self, duration: float) -> "Profile":
+        """Sample all other threads for ``duration`` seconds.
+
+        Args:
+            duration: Seconds to sample for
+
+        Returns:
+            Aggregated profile
+        """
+        own_ident = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        stacks: Counter = Counter()
+        samples = 0
+        start = time.perf_counter()
+        deadline = start + duration
+
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = _walk(frame)
+                if not stack:
+                    continue
+                if not self.include_idle and _is_idle(stack[-1]):
+                    continue
+                thread_name = names.get(ident)
+                if thread_name is None:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                    thread_name = names.get(ident, f"thread-{ident}")
+                stacks[(thread_name,) + stack] += 1
+            samples += 1
+            time.sleep(max(0.0, self.interval - (time.perf_counter() - now)))
+
+        return Profile(stacks, samples, self.interval, time.perf_counter() - start)
+
+
+def _walk(frame) -> Tuple[Frame, ...]:
+    """Return a stack as (file, function, first line) tuples, root first."""
+    stack: List[Frame] = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_filename, code.co_name, code.co_firstlineno))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+def _is_idle(leaf: Frame) -> bool:
+    """Whether a leaf frame belongs to a thread waiting for work."""
+    return (os.path.basename(leaf[0]), leaf[1]) in _IDLE_LEAVES
+
+
+def _frame_name(frame) -> str:
+    """Human-readable frame label used in the collapsed format."""
+    if isinstance(frame, str):
+        return frame
+    filename, function, line = frame
+    return f"{function} ({os.path.basename(filename)}:{line})"
+
+
+class Profile:
+    """Aggregated stack samples with exporters for common viewers."""
+
+    def __init__(
+        self,
+        stacks: Counter,
+        samples: int,
+        interval: float,
+        duration: float,
+    ):
+        """Initialize the profile.
+
+        Args:
+            stacks: Count of each (thread name, frame, ...) stack
+            samples: Number of sampling passes taken
+            interval: Requested seconds between samples
+            duration: Actual seconds spent sampling
+        """
+        self.stacks = stacks
+        self.samples = samples
+        self.interval = interval
+        self.duration = duration
+
+    def to_collapsed(self) -> str:
+        """Render in Brendan Gregg's collapsed-stack format.
+
+        Returns:
+            One ``frame;frame;frame count`` line per distinct stack, suitable
+            for flamegraph.pl, speedscope or inferno
+        """
+        lines = [
+            ";".join(_frame_name(f) for f in stack) + f" {count}"
+            for stack, count in self.stacks.most_common()
+        ]
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def to_speedscope(self, name: str = "miaas-control-plane") -> Dict:
+        """Render as a speedscope sampled profile.
+
+        Args:
+            name: Name shown in the speedscope UI
+
+        Returns:
+            Dictionary matching the speedscope file format schema
+        """
+        frame_index: Dict[object, int] = {}
+        frames: List[Dict] = []
+        samples: List[List[int]] = []
+        weights: List[float] = []
+
+        for stack, count in self.stacks.most_common():
+            indices = []
+            for frame in stack:
+                index = frame_index.get(frame)
+                if index is None:
+                    index = len(frames)
+                    frame_index[frame] = index
+                    if isinstance(frame, str):
+                        frames.append({"name": f"thread {frame}"})
+                    else:
+                        frames.append({
+                            "name": frame[1],
+                            "file": frame[0],
+                            "line": frame[2],
+                        })
+                indices.append(index)
+            samples.append(indices)
+            weights.append(count * self.interval)
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "miaas-control-plane",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }],
+        }
+
+
+_profile_lock = threading.Lock()
+
+
+def profile_for(
+    duration: float,
+    interval: float = 0.01,
+    include_idle: bool = False,
+) -> Profile:
+    """Run a single profile, refusing to overlap with another one.
+
+    Args:
+        duration: Seconds to sample for
+        interval: Seconds between samples
+        include_idle: Keep samples of threads parked waiting for work
+
+    Returns:
+        Aggregated profile
+
+    Raises:
+        ProfilerBusy: If a profile is already running
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running")
+    try:
+        return SamplingProfiler(interval, include_idle).run(duration)
+    finally:
+        _profile_lock.release()
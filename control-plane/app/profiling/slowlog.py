@@ -0,0 +1,112 @@
+"""Slow request log with per-phase timings.
+
+Requests slower than ``SLOW_REQUEST_THRESHOLD_MS`` are kept in a bounded
+in-memory log together with the time spent in each phase, so slow requests
+can be inspected after the fact without turning on a profiler.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Requests taking longer than this many milliseconds are recorded
+SLOW_REQUEST_THRESHOLD_MS = float(os.environ.get("SLOW_REQUEST_THRESHOLD_MS", "500"))
+
+# Number of slow requests kept in memory
+SLOW_REQUEST_LOG_SIZE = int(os.environ.get("SLOW_REQUEST_LOG_SIZE", "200"))
+
+
+class SlowRequestLog:
+    """Bounded log of the most recent slow requests."""
+
+    def __init__(
+        self,
+        threshold_ms: float = SLOW_REQUEST_THRESHOLD_MS,
+        max_entries: int = SLOW_REQUEST_LOG_SIZE,
+    ):
+        """Initialize the slow request log.
+
+        Args:
+            threshold_ms: Minimum duration of a request to be recorded
+            max_entries: Maximum number of entries retained
+        """
+        self.threshold_ms = threshold_ms
+        self._entries: deque = deque(maxlen=max_entries)
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        method: str,
+        route: str,
+        path: str,
+        status: int,
+        duration: float,
+        phases: Dict[str, float],
+        db_queries: int = 0,
+    ) -> Optional[Dict]:
+        """Record a request if it exceeded the threshold.
+
+        Args:
+            method: HTTP method
+            route: Route template
+            path: Request path
+            status: Response status code
+            duration: Total request time in seconds
+            phases: Seconds spent per phase (auth, handler, db, serialization)
+            db_queries: Number of database statements executed
+
+        Returns:
+            The recorded entry, or None if the request was fast enough
+        """
+        duration_ms = duration * 1000
+        if duration_ms < self.threshold_ms:
+            return None
+
+        entry = {
+            "timestamp": time.time(),
+            "method": method,
+            "route": route,
+            "path": path,
+            "status": status,
+            "duration_ms": round(duration_ms, 3),
+            "db_queries": db_queries,
+            "phases_ms": {
+                name: round(seconds * 1000, 3) for name, seconds in phases.items()
+            },
+        }
+        with self._lock:
+            self._entries.append(entry)
+        logger.warning(
+            "Slow request %s %s took %.1fms (%s)",
+            method,
+            path,
+            duration_ms,
+            ", ".join(f"{k}={v}ms" for k, v in entry["phases_ms"].items()),
+        )
+        return entry
+
+    def entries(self, limit: Optional[int] = None) -> List[Dict]:
+        """Return recorded slow requests, newest first.
+
+        Args:
+            limit: Maximum number of entries to return
+
+        Returns:
+            List of slow request entries
+        """
+        with self._lock:
+            entries = list(reversed(self._entries))
+        return entries[:limit] if limit is not None else entries
+
+    def clear(self) -> None:
+        """Drop all recorded entries."""
+        with self._lock:
+            self._entries.clear()
+
+
+# Global slow request log instance
+slow_request_log = SlowRequestLog()
@@ -0,0 +1,31 @@
+"""Model registry package: content-addressed artifact storage, serving and
+peer-assisted distribution."""
+from .blobs import (
+    BlobNotFound,
+    BlobStore,
+    DigestMismatch,
+    UploadOffsetMismatch,
+    blob_store,
+    sha256_digest,
+)
+from .chunks import ARTIFACT_CHUNK_BYTES, chunk_count, chunk_digests
+from .ranges import BlobResponse, RangeNotSatisfiable, parse_range
+from .tracker import ChunkTracker, chunk_tracker, decode_bitfield
+
+__all__ = [
+    "BlobNotFound",
+    "BlobStore",
+    "DigestMismatch",
+    "UploadOffsetMismatch",
+    "blob_store",
+    "sha256_digest",
+    "BlobResponse",
+    "RangeNotSatisfiable",
+    "parse_range",
+    "ARTIFACT_CHUNK_BYTES",
+    "chunk_count",
+    "chunk_digests",
+    "ChunkTracker",
+    "chunk_tracker",
+    "decode_bitfield",
+]
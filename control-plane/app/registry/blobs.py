@@ -0,0 +1,262 @@
+"""Content-addressed blob store for model artifacts.
+
+Blobs are stored under their SHA-256 digest, so identical artifacts are
+stored once and a digest always names the same bytes. Artifacts arrive
+through resumable uploads: the client appends chunks at the upload's current
+offset, and the digest is computed while the chunks are written. Finishing an
+upload checks the computed digest against the one the client claims and
+renames the upload into place, so a blob is never visible half-written or
+with the wrong content.
+
+Directory layout under ``REGISTRY_DIR``::
+
+    blobs/sha256/ab/abcdef...   complete blobs
+    uploads/<upload id>         uploads in progress
+
+Hash state of an upload is kept in memory. If the control plane restarts
+mid-upload, the partial file is hashed again when the next chunk arrives, so
+uploads resume across restarts.
+"""
+import hashlib
+import os
+import re
+import threading
+import uuid
+from typing import Dict, Iterable, Tuple
+
+# Root directory of the model registry's blobs and uploads
+REGISTRY_DIR = os.environ.get("REGISTRY_DIR", "./registry")
+
+DIGEST_PATTERN = re.compile(r"^sha256:[0-9a-f]{64}$")
+
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+_REHASH_CHUNK = 1024 * 1024
+
+
+class BlobNotFound(KeyError):
+    """The blob or upload does not exist."""
+
+
+class UploadOffsetMismatch(ValueError):
+    """A chunk does not start at the upload's current offset.
+
+    Attributes:
+        offset: Current size of the upload, where the next chunk must start
+    """
+
+    def __init__(self, offset: int):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+
+class DigestMismatch(ValueError):
+    """The uploaded content does not match the claimed digest."""
+
+
+class _Upload:
+    """Running hash of an upload, valid while ``offset`` matches the file."""
+
+    __slots__ = ("lock", "hasher", "offset")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hasher = hashlib.sha256()
+        self.offset = 0
+
+
+class BlobStore:
+    """Content-addressed blob storage on local disk.
+
+    Example:
+        >>> store = BlobStore("/var/lib/miaas/registry")
+        >>> upload_id = store.start_upload()
+        >>> store.append(upload_id, 0, [chunk])
+        >>> digest = store.finish(upload_id, "sha256:...")
+        >>> path, size = store.stat(digest)
+    """
+
+    def __init__(self, root: str = REGISTRY_DIR):
+        """Initialize the store.
+
+        Args:
+            root: Directory holding blobs and uploads
+        """
+        self.root = root
+        self._uploads: Dict[str, _Upload] = {}
+        self._lock = threading.Lock()
+
+    def blob_path(self, digest: str) -> str:
+        """Path of the blob with ``digest``."""
+        if not DIGEST_PATTERN.match(digest):
+            raise BlobNotFound(digest)
+        hex_digest = digest.split(":", 1)[1]
+        return os.path.join(self.root, "blobs", "sha256", hex_digest[:2], hex_digest)
+
+    def _upload_path(self, upload_id: str) -> str:
+        if not _UPLOAD_ID.match(upload_id):
+            raise BlobNotFound(upload_id)
+        return os.path.join(self.root, "uploads", upload_id)
+
+    def stat(self, digest: str) -> Tuple[str, int]:
+        """Locate a blob.
+
+        Args:
+            digest: Blob digest, ``sha256:<hex>``
+
+        Returns:
+            Tuple of (path, size in bytes)
+
+        Raises:
+            BlobNotFound: If there is no such blob
+        """
+        path = self.blob_path(digest)
+        try:
+            return path, os.path.getsize(path)
+        except FileNotFoundError:
+            raise BlobNotFound(digest)
+
+    def exists(self, digest: str) -> bool:
+        """Whether a blob is stored."""
+        try:
+            self.stat(digest)
+        except BlobNotFound:
+            return False
+        return True
+
+    def start_upload(self) -> str:
+        """Start an upload.
+
+        Returns:
+            Upload ID
+        """
+        upload_id = uuid.uuid4().hex
+        os.makedirs(os.path.join(self.root, "uploads"), exist_ok=True)
+        open(self._upload_path(upload_id), "wb").close()
+        with self._lock:
+            self._uploads[upload_id] = _Upload()
+        return upload_id
+
+    def _upload(self, upload_id: str) -> _Upload:
+        """Hash state of an upload; call ``_sync`` under its lock before using it."""
+        with self._lock:
+            return self._uploads.setdefault(upload_id, _Upload())
+
+    def _sync(self, upload_id: str, upload: _Upload) -> None:
+        """Rehash an upload's file if its hash state is stale; called with ``upload.lock`` held."""
+        path = self._upload_path(upload_id)
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._uploads.pop(upload_id, None)
+            raise BlobNotFound(upload_id)
+        if upload.offset != size:
+            # Restarted, or appended by another process sharing the directory
+            upload.hasher = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(_REHASH_CHUNK), b""):
+                    upload.hasher.update(chunk)
+            upload.offset = size
+
+    def offset(self, upload_id: str) -> int:
+        """Bytes received so far by an upload.
+
+        Raises:
+            BlobNotFound: If there is no such upload
+        """
+        try:
+            return os.path.getsize(self._upload_path(upload_id))
+        except FileNotFoundError:
+            raise BlobNotFound(upload_id)
+
+    def append(self, upload_id: str, offset: int, chunks: Iterable[bytes]) -> int:
+        """Append data to an upload.
+
+        Args:
+            upload_id: Upload ID
+            offset: Offset the data starts at; must be the upload's size
+            chunks: Data to append
+
+        Returns:
+            New size of the upload
+
+        Raises:
+            BlobNotFound: If there is no such upload
+            UploadOffsetMismatch: If ``offset`` is not the upload's size
+        """
+        upload = self._upload(upload_id)
+        with upload.lock:
+            self._sync(upload_id, upload)
+            if offset != upload.offset:
+                raise UploadOffsetMismatch(upload.offset)
+            with open(self._upload_path(upload_id), "ab") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    upload.hasher.update(chunk)
+                    upload.offset += len(chunk)
+            return upload.offset
+
+    def finish(self, upload_id: str, digest: str) -> str:
+        """Verify an upload and store it as a blob.
+
+        Args:
+            upload_id: Upload ID
+            digest: Expected digest, ``sha256:<hex>``
+
+        Returns:
+            The blob's digest
+
+        Raises:
+            BlobNotFound: If there is no such upload
+            DigestMismatch: If the content does not match ``digest``; the
+                upload is discarded
+        """
+        upload = self._upload(upload_id)
+        path = self._upload_path(upload_id)
+        with upload.lock:
+            self._sync(upload_id, upload)
+            actual = f"sha256:{upload.hasher.hexdigest()}"
+            if actual != digest:
+                self.cancel(upload_id)
+                raise DigestMismatch(f"Expected {digest}, received {actual}")
+            target = self.blob_path(digest)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if os.path.exists(target):
+                os.remove(path)  # already stored
+            else:
+                with open(path, "rb") as f:
+                    os.fsync(f.fileno())
+                os.replace(path, target)
+        with self._lock:
+            self._uploads.pop(upload_id, None)
+        return digest
+
+    def cancel(self, upload_id: str) -> None:
+        """Discard an upload."""
+        with self._lock:
+            self._uploads.pop(upload_id, None)
+        try:
+            os.remove(self._upload_path(upload_id))
+        except FileNotFoundError:
+            pass
+
+    def delete(self, digest: str) -> bool:
+        """Delete a blob.
+
+        Returns:
+            True if deleted, False if not found
+        """
+        try:
+            os.remove(self.blob_path(digest))
+        except (FileNotFoundError, BlobNotFound):
+            return False
+        return True
+
+
+def sha256_digest(data: bytes) -> str:
+    """Digest of ``data`` in blob store form."""
+    return f"sha256:{hashlib.sha256(data).hexdigest()}"
+
+
+# Global blob store
+blob_store = BlobStore()
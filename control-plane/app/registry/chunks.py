@@ -0,0 +1,72 @@
+"""Per-chunk digests of stored blobs.
+
+Agents fetching an artifact from each other split it into fixed-size chunks
+and must be able to check every chunk on its own, long before the whole
+artifact is there to compare with its digest. The registry therefore
+publishes the SHA-256 of every chunk. The digests are computed once per blob
+and chunk size and kept next to the blobs::
+
+    chunks/<chunk size>/ab/abcdef...   32-byte digests, one per chunk
+"""
+import hashlib
+import os
+import threading
+from typing import List
+
+from .blobs import BlobStore
+
+# Size of the chunks artifacts are distributed in between agents
+ARTIFACT_CHUNK_BYTES = int(os.environ.get("ARTIFACT_CHUNK_BYTES", str(4 * 1024 * 1024)))
+
+_DIGEST_SIZE = hashlib.sha256().digest_size
+_lock = threading.Lock()
+
+
+def chunk_count(size: int, chunk_size: int) -> int:
+    """Number of chunks a blob of ``size`` bytes is split into."""
+    return (size + chunk_size - 1) // chunk_size
+
+
+def chunk_digests(
+    store: BlobStore, digest: str, chunk_size: int = ARTIFACT_CHUNK_BYTES
+) -> List[str]:
+    """SHA-256 of every chunk of a blob, computed on first use.
+
+    Args:
+        store: Blob store holding the blob
+        digest: Blob digest, ``sha256:<hex>``
+        chunk_size: Chunk size in bytes
+
+    Returns:
+        Hex digests, in chunk order
+
+    Raises:
+        BlobNotFound: If there is no such blob
+    """
+    path, size = store.stat(digest)
+    hex_digest = digest.split(":", 1)[1]
+    manifest = os.path.join(
+        store.root, "chunks", str(chunk_size), hex_digest[:2], hex_digest
+    )
+    expected = chunk_count(size, chunk_size) * _DIGEST_SIZE
+    # Serialized so concurrent first requests hash a large blob only once
+    with _lock:
+        try:
+            with open(manifest, "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            raw = b""
+        if len(raw) != expected:
+            with open(path, "rb") as f:
+                raw = b"".join(
+                    hashlib.sha256(chunk).digest()
+                    for chunk in iter(lambda: f.read(chunk_size), b"")
+                )
+            os.makedirs(os.path.dirname(manifest), exist_ok=True)
+            tmp = f"{manifest}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(raw)
+            os.replace(tmp, manifest)
+    return [
+        raw[i:i + _DIGEST_SIZE].hex() for i in range(0, len(raw), _DIGEST_SIZE)
+    ]
@@ -0,0 +1,149 @@
+"""Serving blobs with HTTP Range support and without copying them.
+
+``BlobResponse`` answers ``GET`` and ``HEAD`` for a file, honouring a single
+``Range: bytes=...`` request with ``206 Partial Content``, so clients can
+resume a download or fetch parts of a large artifact in parallel. Requests
+for several ranges are answered with the whole file, as RFC 9110 allows.
+
+The body is sent without reading the file into Python: servers offering the
+ASGI ``http.response.zerocopysend`` extension are handed the open file and
+send it with ``sendfile``; otherwise the file is memory-mapped and sent as
+``memoryview`` slices, which the server writes to the socket straight from
+the page cache.
+"""
+import mmap
+import re
+from typing import Optional, Tuple
+
+from starlette.responses import Response
+
+# Bytes per body message when sending from a memory map
+BLOB_SEND_CHUNK = 1024 * 1024
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(ValueError):
+    """The requested range lies outside the file."""
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a ``Range`` header against a file size.
+
+    Args:
+        header: Range header value, or None
+        size: File size in bytes
+
+    Returns:
+        Inclusive ``(first, last)`` byte positions, or None to send the whole
+        file (no header, several ranges, or a syntax this server ignores)
+
+    Raises:
+        RangeNotSatisfiable: If the range starts beyond the end of the file
+    """
+    if not header:
+        return None
+    match = _RANGE.match(header.strip().replace(" ", ""))
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable(header)
+        return max(0, size - length), size - 1
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first >= size:
+        raise RangeNotSatisfiable(header)
+    if last < first:
+        return None
+    return first, last
+
+
+class BlobResponse(Response):
+    """Response sending a file, or a byte range of it."""
+
+    def __init__(
+        self,
+        path: str,
+        size: int,
+        etag: str,
+        range_header: Optional[str] = None,
+        media_type: str = "application/octet-stream",
+        headers: Optional[dict] = None,
+    ):
+        """Initialize the response.
+
+        Args:
+            path: File to send
+            size: File size in bytes
+            etag: Entity tag identifying the content
+            range_header: The request's ``Range`` header
+            media_type: Content type
+            headers: Additional response headers
+        """
+        self.path = path
+        self.size = size
+        self.background = None
+        response_headers = {
+            "accept-ranges": "bytes",
+            "etag": f'"{etag}"',
+            "content-type": media_type,
+            **(headers or {}),
+        }
+        try:
+            self.range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            self.status_code = 416
+            self.range = None
+            self.length = 0
+            response_headers["content-range"] = f"bytes */{size}"
+        else:
+            if self.range is None:
+                self.status_code = 200
+                self.range = (0, size - 1)
+            else:
+                self.status_code = 206
+                response_headers["content-range"] = (
+                    f"bytes {self.range[0]}-{self.range[1]}/{size}"
+                )
+            self.length = self.range[1] - self.range[0] + 1
+        response_headers["content-length"] = str(self.length)
+        self.init_headers(response_headers)
+
+    async def __call__(self, scope, receive, send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        length = self.length
+        if scope["method"] == "HEAD" or length == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        first = self.range[0]
+        with open(self.path, "rb") as f:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f.fileno(),
+                    "offset": first,
+                    "count": length,
+                })
+                return
+            # The map stays open until every slice handed to the server is
+            # released, then is closed when garbage collected
+            view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        end = first + length
+        for start in range(first, end, BLOB_SEND_CHUNK):
+            stop = min(start + BLOB_SEND_CHUNK, end)
+            await send({
+                "type": "http.response.body",
+                "body": view[start:stop],
+                "more_body": stop < end,
+            })
+
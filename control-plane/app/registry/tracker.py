@@ -0,0 +1,171 @@
+"""Chunk availability tracker for peer-assisted artifact distribution.
+
+Agents fetch artifacts from each other in chunks (see the agent's
+``peers.py``): each announces which chunks of an artifact it holds, as a
+bitfield, and asks the tracker which peers hold what.
+
+Agents also announce the chunks they are fetching from the registry at the
+moment. Other agents leave those chunks to them and fetch them from the peer
+once it holds them, instead of fetching them from the registry as well.
+
+The tracker only knows what agents announce. Announcements expire after
+``PEER_TTL`` seconds, so agents that stop or crash drop out of the swarm
+once the artifact is next announced or asked for; an agent seeding an
+artifact re-announces well within that time. State is kept
+in memory: after a restart, or on another control plane replica, the swarm
+is rebuilt from the agents' next announcements and downloads fall back to
+the registry meanwhile.
+
+Bitfields are sent base64-encoded; bit ``i`` (most significant bit of byte
+``i // 8`` first) is set if the peer holds (or fetches) chunk ``i``.
+"""
+import base64
+import binascii
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Seconds an announcement stays valid without being renewed
+PEER_TTL = float(os.environ.get("PEER_TTL", "120"))
+
+# Most peers returned to an agent asking for an artifact's swarm
+PEER_LIST_SIZE = int(os.environ.get("PEER_LIST_SIZE", "32"))
+
+
+def decode_bitfield(text: str, count: int) -> bytes:
+    """Decode a base64 bitfield, checking it covers ``count`` chunks.
+
+    Raises:
+        ValueError: If ``text`` is not base64 or has the wrong length
+    """
+    try:
+        bits = base64.b64decode(text, validate=True)
+    except binascii.Error as e:
+        raise ValueError(f"Invalid bitfield: {e}")
+    if len(bits) != (count + 7) // 8:
+        raise ValueError(f"Bitfield must cover {count} chunks")
+    return bits
+
+
+class _Peer:
+    __slots__ = ("url", "have", "fetching", "seen")
+
+    def __init__(self, url: str, have: bytes, fetching: bytes, seen: float):
+        self.url = url
+        self.have = have
+        self.fetching = fetching
+        self.seen = seen
+
+
+class ChunkTracker:
+    """Which agents hold or fetch which chunks of which artifacts.
+
+    Example:
+        >>> tracker = ChunkTracker()
+        >>> tracker.announce(digest, "node-1", "http://10.0.0.1:7070", have)
+        >>> tracker.peers(digest, exclude="node-2")
+        [('node-1', 'http://10.0.0.1:7070', b'\\xff...', b'')]
+    """
+
+    def __init__(
+        self,
+        ttl: float = PEER_TTL,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Initialize the tracker.
+
+        Args:
+            ttl: Seconds an announcement stays valid
+            clock: Monotonic clock, replaceable in tests
+        """
+        self.ttl = ttl
+        self.clock = clock
+        self._swarms: Dict[str, Dict[str, _Peer]] = {}
+        self._lock = threading.Lock()
+
+    def announce(
+        self,
+        digest: str,
+        node_id: str,
+        url: str,
+        have: bytes,
+        fetching: bytes = b"",
+    ) -> None:
+        """Record the chunks a node holds, replacing its previous announcement.
+
+        Expired announcements for the artifact are dropped as well.
+
+        Args:
+            digest: Artifact digest
+            node_id: Announcing node
+            url: Base URL the node serves chunks from
+            have: Bitfield of the chunks the node holds
+            fetching: Bitfield of the chunks the node is fetching from the
+                registry, empty if none
+        """
+        now = self.clock()
+        with self._lock:
+            swarm = self._swarms.setdefault(digest, {})
+            self._expire(swarm, now)
+            swarm[node_id] = _Peer(url, have, fetching, now)
+
+    def withdraw(self, digest: str, node_id: str) -> bool:
+        """Remove a node from an artifact's swarm.
+
+        Returns:
+            True if the node was in the swarm
+        """
+        with self._lock:
+            swarm = self._swarms.get(digest, {})
+            removed = swarm.pop(node_id, None) is not None
+            if not swarm:
+                self._swarms.pop(digest, None)
+            return removed
+
+    def peers(
+        self,
+        digest: str,
+        exclude: Optional[str] = None,
+        limit: int = PEER_LIST_SIZE,
+    ) -> List[Tuple[str, str, bytes, bytes]]:
+        """Nodes holding or fetching an artifact.
+
+        Nodes that have only just started fetching are listed with an empty
+        bitfield, so that agents can tell whether others are fetching the
+        same artifact. At most ``limit`` peers are returned, drawn at random
+        so that load spreads over the whole swarm.
+
+        Args:
+            digest: Artifact digest
+            exclude: Node to leave out, usually the one asking
+            limit: Most peers to return
+
+        Returns:
+            List of (node_id, url, have bitfield, fetching bitfield)
+        """
+        now = self.clock()
+        with self._lock:
+            swarm = self._swarms.get(digest, {})
+            self._expire(swarm, now)
+            if not swarm:
+                self._swarms.pop(digest, None)
+            found = [
+                (node_id, peer.url, peer.have, peer.fetching)
+                for node_id, peer in swarm.items()
+                if node_id != exclude
+            ]
+        if len(found) > limit:
+            found = random.sample(found, limit)
+        return found
+
+    def _expire(self, swarm: Dict[str, _Peer], now: float) -> None:
+        """Drop a swarm's peers whose announcements have expired; called with the lock held."""
+        expired = now - self.ttl
+        for node_id in [n for n, p in swarm.items() if p.seen < expired]:
+            del swarm[node_id]
+
+
+# Global chunk tracker
+chunk_tracker = ChunkTracker()
@@ -0,0 +1,112 @@
+"""Fast JSON serialization for large list responses.
+
+Endpoints normally build Pydantic response objects, which FastAPI then
+validates and serializes a second time through ``response_model``. For the
+node and deployment lists that is two passes over every row, plus a JSON
+decode of every node's ``capabilities`` column.
+
+With ``FAST_SERIALIZATION=1`` those endpoints instead select only the columns
+they need and encode rows straight to JSON bytes. Node capabilities are
+spliced in from the column's stored JSON text without being decoded at all.
+The bytes are identical in content to the validated response, but the data
+is trusted as stored: rows are not re-validated against the response model.
+
+orjson is used when installed, otherwise the standard library encoder.
+"""
+import json
+import os
+from typing import Any, Iterable
+
+from fastapi import Response
+from sqlalchemy import Text, type_coerce
+from sqlalchemy.orm import Session
+
+from app.db.models import DeploymentDB, NodeDB
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised when orjson is absent
+    orjson = None
+
+# Serve node and deployment lists through the fast path
+FAST_SERIALIZATION = os.environ.get("FAST_SERIALIZATION", "0") == "1"
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode an object as compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def canonical_dumps(obj: Any) -> bytes:
+    """Encode an object as JSON bytes with sorted keys, so equal objects encode alike."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, sort_keys=True).encode()
+
+
+class FastJSONResponse(Response):
+    """JSON response whose body is already encoded bytes."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+
+def _json_array(items: Iterable[bytes]) -> bytes:
+    return b"[" + b",".join(items) + b"]"
+
+
+def _encode_node(node_id, name, ip, capabilities_json, last_seen, status) -> bytes:
+    """Encode one node row in ``NodeResponse`` field order."""
+    head = dumps({"id": node_id, "name": name, "ip": ip})
+    tail = dumps({"last_seen": last_seen, "status": status})
+    return b"".join((
+        head[:-1],
+        b',"capabilities":',
+        capabilities_json.encode() if capabilities_json else b"null",
+        b",",
+        tail[1:],
+    ))
+
+
+def _node_columns():
+    return (
+        NodeDB.id,
+        NodeDB.name,
+        NodeDB.ip,
+        # Raw stored JSON text, spliced into the output undecoded
+        type_coerce(NodeDB.capabilities, Text),
+        NodeDB.last_seen,
+        NodeDB.status,
+    )
+
+
+def encode_node_list(db: Session) -> bytes:
+    """All nodes as a JSON array matching ``List[NodeResponse]``."""
+    return _json_array(
+        _encode_node(*row) for row in db.query(*_node_columns())
+    )
+
+
+def encode_node(db: Session, node_id: str) -> bytes:
+    """One node as a JSON object matching ``NodeResponse``, or b"" if absent."""
+    row = db.query(*_node_columns()).filter(NodeDB.id == node_id).first()
+    return _encode_node(*row) if row else b""
+
+
+def encode_deployment_list(db: Session) -> bytes:
+    """All deployments as a JSON array matching ``List[DeploymentResponse]``."""
+    rows = db.query(DeploymentDB.id, DeploymentDB.status, DeploymentDB.node_id)
+    return dumps([
+        {
+            "deployment_id": deployment_id,
+            "status": status,
+            "message": f"Deployment on node {node_id}",
+        }
+        for deployment_id, status, node_id in rows
+    ])
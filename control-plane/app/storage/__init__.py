@@ -0,0 +1,35 @@
+"""Storage package: node and deployment repositories with pluggable backends."""
+from .base import (
+    DeploymentRepository,
+    NodeRepository,
+    Record,
+    Storage,
+    capability_terms,
+    matches_capabilities,
+)
+from .dependencies import get_storage, open_storage, shared_storage, storage_session
+from .legacy import NodeStorage, storage
+from .logged import LoggedStorage, project_deployments
+from .memory import MemoryStorage
+from .sql import SQLStorage
+from .striped import StripedStorage
+
+__all__ = [
+    "DeploymentRepository",
+    "NodeRepository",
+    "Record",
+    "Storage",
+    "capability_terms",
+    "matches_capabilities",
+    "get_storage",
+    "open_storage",
+    "shared_storage",
+    "storage_session",
+    "NodeStorage",
+    "storage",
+    "LoggedStorage",
+    "project_deployments",
+    "MemoryStorage",
+    "SQLStorage",
+    "StripedStorage",
+]
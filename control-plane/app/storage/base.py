@@ -0,0 +1,131 @@
+"""Repository interfaces for nodes and deployments.
+
+Records are plain dictionaries, shaped like the watch snapshots:
+
+- nodes: ``id``, ``name``, ``ip``, ``capabilities``, ``last_seen``, ``status``
+- deployments: ``id``, ``node_id``, ``template_id``, ``rendered_compose``,
+  ``env``, ``status``, ``action``
+
+Backends may add fields (the SQL backend adds ``resource_version``).
+Returned records are copies; change stored records with ``put`` or
+``update``, never by mutating nested values in place.
+
+Capability queries match top-level capability keys. Scalar values match by
+equality, and ``True``/``False`` match non-empty/empty lists and objects, so
+``{"os": "linux", "gpus": True}`` selects Linux nodes with at least one GPU.
+"""
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+Record = Dict[str, Any]
+
+NODE_FIELDS = ("id", "name", "ip", "capabilities", "last_seen", "status")
+DEPLOYMENT_FIELDS = (
+    "id", "node_id", "template_id", "rendered_compose", "env", "status", "action",
+)
+
+
+def capability_terms(capabilities: Optional[Dict]) -> Iterator[Tuple[str, Any]]:
+    """Yield the indexable ``(key, value)`` terms of a capabilities object."""
+    for key, value in (capabilities or {}).items():
+        if isinstance(value, (list, dict)):
+            yield key, bool(value)
+        elif isinstance(value, (str, int, float, bool)) or value is None:
+            yield key, value
+
+
+def matches_capabilities(capabilities: Optional[Dict], query: Dict[str, Any]) -> bool:
+    """Whether a capabilities object satisfies a capability query."""
+    terms = dict(capability_terms(capabilities))
+    return all(key in terms and terms[key] == value for key, value in query.items())
+
+
+class NodeRepository(ABC):
+    """Storage of node records."""
+
+    @abstractmethod
+    def get(self, node_id: str) -> Optional[Record]:
+        """Return a node by ID, or None."""
+
+    @abstractmethod
+    def get_by_name(self, name: str) -> Optional[Record]:
+        """Return a node by its unique name, or None."""
+
+    @abstractmethod
+    def list(
+        self,
+        status: Optional[str] = None,
+        capabilities: Optional[Dict[str, Any]] = None,
+    ) -> List[Record]:
+        """Return nodes, optionally filtered by status and capability query."""
+
+    @abstractmethod
+    def put(self, node: Record) -> None:
+        """Insert a node, or replace the node with the same ID."""
+
+    @abstractmethod
+    def update(self, node_id: str, **fields) -> Optional[Record]:
+        """Change fields of a node.
+
+        Returns:
+            The updated node, or None if it does not exist
+        """
+
+    @abstractmethod
+    def delete(self, node_id: str) -> bool:
+        """Delete a node.
+
+        Returns:
+            True if deleted, False if not found
+        """
+
+
+class DeploymentRepository(ABC):
+    """Storage of deployment records."""
+
+    @abstractmethod
+    def get(self, deployment_id: str) -> Optional[Record]:
+        """Return a deployment by ID, or None."""
+
+    @abstractmethod
+    def list(
+        self, node_id: Optional[str] = None, status: Optional[str] = None
+    ) -> List[Record]:
+        """Return deployments, optionally filtered by node and status."""
+
+    @abstractmethod
+    def put(self, deployment: Record) -> None:
+        """Insert a deployment, or replace the deployment with the same ID."""
+
+    @abstractmethod
+    def update(self, deployment_id: str, **fields) -> Optional[Record]:
+        """Change fields of a deployment.
+
+        Returns:
+            The updated deployment, or None if it does not exist
+        """
+
+    @abstractmethod
+    def delete(self, deployment_id: str) -> bool:
+        """Delete a deployment.
+
+        Returns:
+            True if deleted, False if not found
+        """
+
+
+class Storage(ABC):
+    """A storage backend: node and deployment repositories.
+
+    Attributes:
+        name: Backend name, as selected by ``STORAGE_BACKEND``
+        nodes: Node repository
+        deployments: Deployment repository
+    """
+
+    name: str
+    nodes: NodeRepository
+    deployments: DeploymentRepository
+
+    def commit(self) -> None:
+        """Make changes durable; a no-op for backends that apply them at once."""
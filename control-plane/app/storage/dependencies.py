@@ -0,0 +1,111 @@
+"""Selecting and opening the configured storage backend."""
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from fastapi import Depends
+from sqlalchemy.orm import Session
+
+from app.db.database import SessionLocal, get_db
+from app.eventlog import deployment_log
+
+from .base import Storage
+from .logged import LoggedStorage
+from .memory import MemoryStorage
+from .sql import SQLStorage
+from .striped import StripedStorage
+
+# Node and deployment storage: "sql", "memory" or "striped"
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "sql")
+
+BACKENDS = {
+    "memory": MemoryStorage,
+    "striped": StripedStorage,
+}
+
+_shared: Optional[Storage] = None
+_shared_lock = threading.Lock()
+
+
+def shared_storage(backend: Optional[str] = None) -> Storage:
+    """The process-wide store of an in-memory backend.
+
+    Args:
+        backend: Backend name, ``STORAGE_BACKEND`` by default
+
+    Returns:
+        The store, created on first use
+
+    Raises:
+        ValueError: If the backend is not an in-memory backend
+    """
+    global _shared
+    backend = backend or STORAGE_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown in-memory storage backend: {backend}")
+    with _shared_lock:
+        if _shared is None or _shared.name != backend:
+            _shared = BACKENDS[backend]()
+        return _shared
+
+
+def open_storage(db: Optional[Session] = None, backend: Optional[str] = None) -> Storage:
+    """Open the configured backend.
+
+    When the deployment event log is open, deployment changes made through
+    the returned storage are recorded in it.
+
+    Args:
+        db: Session for the SQL backend; ignored by in-memory backends
+        backend: Backend name, ``STORAGE_BACKEND`` by default
+
+    Returns:
+        Storage for the backend
+
+    Raises:
+        ValueError: If the backend is unknown, or is SQL and no session is given
+    """
+    backend = backend or STORAGE_BACKEND
+    if backend == "sql":
+        if db is None:
+            raise ValueError("The sql storage backend needs a database session")
+        storage = SQLStorage(db)
+    else:
+        storage = shared_storage(backend)
+    if deployment_log.is_open:
+        storage = LoggedStorage(storage, deployment_log)
+    return storage
+
+
+@contextmanager
+def storage_session(backend: Optional[str] = None) -> Iterator[Storage]:
+    """Open the configured backend for a unit of work outside FastAPI.
+
+    With the SQL backend a session is opened for the block, committed when
+    the block succeeds and closed afterwards.
+
+    Example:
+        >>> with storage_session() as storage:
+        ...     storage.nodes.put(node)
+    """
+    db = SessionLocal() if (backend or STORAGE_BACKEND) == "sql" else None
+    try:
+        storage = open_storage(db, backend)
+        yield storage
+        storage.commit()
+    finally:
+        if db is not None:
+            db.close()
+
+
+def get_storage(db: Session = Depends(get_db)) -> Storage:
+    """FastAPI dependency returning the configured backend.
+
+    Args:
+        db: Database session, used by the SQL backend
+
+    Returns:
+        Storage for the request
+    """
+    return open_storage(db)
@@ -0,0 +1,68 @@
+"""Node storage for the legacy Flask API.
+
+``NodeStorage`` keeps its original add/get/list/delete interface but stores
+node records in a storage backend, so the Flask and FastAPI apps can share
+one store.
+"""
+from typing import List, Optional
+
+from .base import Record
+from .dependencies import storage_session
+
+
+class NodeStorage:
+    """Node storage with the legacy interface, over a storage backend."""
+
+    def __init__(self, backend: Optional[str] = None):
+        """Initialize the storage.
+
+        Args:
+            backend: Backend name, ``STORAGE_BACKEND`` by default
+        """
+        self.backend = backend
+
+    def add_node(self, node: Record) -> None:
+        """Add or update a node in storage.
+
+        Args:
+            node: Node record to add or update
+        """
+        with storage_session(self.backend) as storage:
+            storage.nodes.put(node)
+
+    def get_node(self, node_id: str) -> Optional[Record]:
+        """Get a node by ID.
+
+        Args:
+            node_id: ID of the node to retrieve
+
+        Returns:
+            Node record if found, None otherwise
+        """
+        with storage_session(self.backend) as storage:
+            return storage.nodes.get(node_id)
+
+    def get_all_nodes(self) -> List[Record]:
+        """Get all nodes.
+
+        Returns:
+            List of all node records
+        """
+        with storage_session(self.backend) as storage:
+            return storage.nodes.list()
+
+    def delete_node(self, node_id: str) -> bool:
+        """Delete a node by ID.
+
+        Args:
+            node_id: ID of the node to delete
+
+        Returns:
+            True if deleted, False if not found
+        """
+        with storage_session(self.backend) as storage:
+            return storage.nodes.delete(node_id)
+
+
+# Global storage instance
+storage = NodeStorage()
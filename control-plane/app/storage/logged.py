@@ -0,0 +1,127 @@
+"""Deployment storage that records every change in the event log.
+
+Changes are appended to the ``DeploymentLog`` before they are applied to the
+wrapped repository. For in-memory backends the repository is a projection of
+the log, rebuilt from it on startup by ``project_deployments``. The ``sql``
+backend is shared by every replica while each replica keeps its own log, so
+there the stored rows stay authoritative and the log adopts them instead.
+"""
+from typing import List, Optional
+
+from app.eventlog import DELETE, PUT, UPDATE, DeploymentLog
+
+from .base import DEPLOYMENT_FIELDS, DeploymentRepository, Record, Storage
+
+
+class LoggedDeploymentRepository(DeploymentRepository):
+    """Deployment repository writing ahead to an event log."""
+
+    def __init__(self, inner: DeploymentRepository, log: DeploymentLog):
+        """Initialize the repository.
+
+        Args:
+            inner: Repository holding the projected state
+            log: Event log recording every change
+        """
+        self.inner = inner
+        self.log = log
+
+    def get(self, deployment_id: str) -> Optional[Record]:
+        return self.inner.get(deployment_id)
+
+    def list(self, node_id=None, status=None) -> List[Record]:
+        return self.inner.list(node_id=node_id, status=status)
+
+    def put(self, deployment: Record) -> None:
+        record = {field: deployment.get(field) for field in DEPLOYMENT_FIELDS}
+        self.log.record(PUT, record["id"], record)
+        self.inner.put(deployment)
+
+    def update(self, deployment_id: str, **fields) -> Optional[Record]:
+        if self.inner.get(deployment_id) is None:
+            return None
+        self.log.record(UPDATE, deployment_id, fields)
+        return self.inner.update(deployment_id, **fields)
+
+    def delete(self, deployment_id: str) -> bool:
+        if self.inner.get(deployment_id) is None:
+            return False
+        self.log.record(DELETE, deployment_id)
+        return self.inner.delete(deployment_id)
+
+
+class LoggedStorage(Storage):
+    """A storage backend whose deployment changes go through the event log."""
+
+    def __init__(self, inner: Storage, log: DeploymentLog):
+        """Initialize the storage.
+
+        Args:
+            inner: Backend holding the nodes and projected deployments
+            log: Event log recording every deployment change
+        """
+        self.inner = inner
+        self.name = inner.name
+        self.nodes = inner.nodes
+        self.deployments = LoggedDeploymentRepository(inner.deployments, log)
+
+    def commit(self) -> None:
+        self.inner.commit()
+
+
+def project_deployments(log: DeploymentLog, storage: Storage) -> int:
+    """Bring a storage backend's deployments and the event log in line on startup.
+
+    In-memory backends are rebuilt from the log. A new, empty log adopts the
+    deployments already stored instead, so enabling the log on an existing
+    backend keeps them.
+
+    The ``sql`` backend may have been changed through other replicas, whose
+    changes this replica's log never saw, so its rows are never overwritten
+    or deleted: the log records rows it lacks or holds differently, and
+    deletes deployments no longer stored.
+
+    Args:
+        log: Open event log
+        storage: Storage to update; the caller commits
+
+    Returns:
+        Number of deployments written, adopted or deleted
+    """
+    if isinstance(storage, LoggedStorage):
+        storage = storage.inner
+    repository = storage.deployments
+    if storage.name == "sql" or log.last_seq == 0:
+        return _adopt(log, repository)
+
+    changed = 0
+    stored = {deployment["id"]: deployment for deployment in repository.list()}
+    for deployment_id, record in log.state.items():
+        current = stored.pop(deployment_id, None)
+        if current is None or _differs(current, record):
+            repository.put(record)
+            changed += 1
+    for deployment_id in stored:
+        repository.delete(deployment_id)
+        changed += 1
+    return changed
+
+
+def _adopt(log: DeploymentLog, repository: DeploymentRepository) -> int:
+    """Record the stored deployments into the log where it disagrees with them."""
+    changed = 0
+    known = dict(log.state)
+    for deployment in repository.list():
+        record = {field: deployment.get(field) for field in DEPLOYMENT_FIELDS}
+        logged = known.pop(record["id"], None)
+        if logged is None or _differs(record, logged):
+            log.record(PUT, record["id"], record)
+            changed += 1
+    for deployment_id in known:
+        log.record(DELETE, deployment_id)
+        changed += 1
+    return changed
+
+
+def _differs(current: Record, record: Record) -> bool:
+    return any(current.get(field) != record.get(field) for field in DEPLOYMENT_FIELDS)
@@ -0,0 +1,222 @@
+"""In-memory storage with secondary indexes.
+
+Nodes are indexed by name, status and capability terms; deployments by node
+and status. Filtered lists intersect index buckets, smallest first, instead of
+scanning every record. All operations of a ``MemoryStorage`` share one lock,
+so it is safe to use from the threadpool that runs sync endpoints; see
+``StripedStorage`` for a variant with finer-grained locking.
+
+Records only live as long as the process. Watches, resource versions and
+multiple replicas need the SQL backend.
+"""
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .base import (
+    DeploymentRepository,
+    NodeRepository,
+    Record,
+    Storage,
+    capability_terms,
+)
+
+Indexer = Callable[[Record], Iterable[Any]]
+
+
+class IndexedTable:
+    """Records by ID plus secondary indexes over them.
+
+    Index buckets are dicts used as insertion-ordered sets, so filtered lists
+    come back in insertion order like unfiltered ones. Not thread-safe on its
+    own; repositories guard it with a lock.
+    """
+
+    def __init__(self, indexes: Dict[str, Indexer]):
+        """Initialize an empty table.
+
+        Args:
+            indexes: Index name to function returning a record's index keys
+        """
+        self.rows: Dict[str, Record] = {}
+        self._indexers = indexes
+        self._buckets: Dict[str, Dict[Any, Dict[str, None]]] = {
+            name: {} for name in indexes
+        }
+
+    def insert(self, record: Record) -> None:
+        """Insert or replace a record, keeping the indexes current."""
+        record_id = record["id"]
+        self.remove(record_id)
+        self.rows[record_id] = record
+        for name, keys_of in self._indexers.items():
+            buckets = self._buckets[name]
+            for key in keys_of(record):
+                buckets.setdefault(key, {})[record_id] = None
+
+    def remove(self, record_id: str) -> Optional[Record]:
+        """Remove a record and its index entries."""
+        record = self.rows.pop(record_id, None)
+        if record is None:
+            return None
+        for name, keys_of in self._indexers.items():
+            buckets = self._buckets[name]
+            for key in keys_of(record):
+                bucket = buckets.get(key)
+                if bucket is not None:
+                    bucket.pop(record_id, None)
+                    if not bucket:
+                        del buckets[key]
+        return record
+
+    def lookup(self, index: str, key: Any) -> Dict[str, None]:
+        """IDs of records with ``key`` in ``index``."""
+        return self._buckets[index].get(key, {})
+
+    def select(self, criteria: List[tuple]) -> List[Record]:
+        """Records matching every ``(index, key)`` criterion."""
+        if not criteria:
+            return list(self.rows.values())
+        buckets = sorted(
+            (self.lookup(index, key) for index, key in criteria), key=len
+        )
+        smallest, others = buckets[0], buckets[1:]
+        return [
+            self.rows[record_id]
+            for record_id in smallest
+            if all(record_id in bucket for bucket in others)
+        ]
+
+
+def _node_table() -> IndexedTable:
+    return IndexedTable({
+        "name": lambda node: (node["name"],),
+        "status": lambda node: (node.get("status"),),
+        "capability": lambda node: capability_terms(node.get("capabilities")),
+    })
+
+
+def _deployment_table() -> IndexedTable:
+    return IndexedTable({
+        "node_id": lambda deployment: (deployment.get("node_id"),),
+        "status": lambda deployment: (deployment.get("status"),),
+    })
+
+
+def _node_criteria(status, capabilities) -> List[tuple]:
+    criteria = [("capability", term) for term in (capabilities or {}).items()]
+    if status is not None:
+        criteria.append(("status", status))
+    return criteria
+
+
+def _deployment_criteria(node_id, status) -> List[tuple]:
+    criteria = []
+    if node_id is not None:
+        criteria.append(("node_id", node_id))
+    if status is not None:
+        criteria.append(("status", status))
+    return criteria
+
+
+class MemoryNodeRepository(NodeRepository):
+    """Indexed in-memory node repository."""
+
+    def __init__(self, lock=None):
+        """Initialize the repository.
+
+        Args:
+            lock: Lock guarding the table; a private one by default
+        """
+        self._table = _node_table()
+        self._lock = lock or threading.RLock()
+
+    def get(self, node_id: str) -> Optional[Record]:
+        with self._lock:
+            node = self._table.rows.get(node_id)
+            return dict(node) if node else None
+
+    def get_by_name(self, name: str) -> Optional[Record]:
+        with self._lock:
+            for node_id in self._table.lookup("name", name):
+                return dict(self._table.rows[node_id])
+            return None
+
+    def list(self, status=None, capabilities=None) -> List[Record]:
+        with self._lock:
+            return [
+                dict(node)
+                for node in self._table.select(_node_criteria(status, capabilities))
+            ]
+
+    def put(self, node: Record) -> None:
+        with self._lock:
+            self._table.insert(dict(node))
+
+    def update(self, node_id: str, **fields) -> Optional[Record]:
+        with self._lock:
+            node = self._table.rows.get(node_id)
+            if node is None:
+                return None
+            node = {**node, **fields}
+            self._table.insert(node)
+            return dict(node)
+
+    def delete(self, node_id: str) -> bool:
+        with self._lock:
+            return self._table.remove(node_id) is not None
+
+
+class MemoryDeploymentRepository(DeploymentRepository):
+    """Indexed in-memory deployment repository."""
+
+    def __init__(self, lock=None):
+        """Initialize the repository.
+
+        Args:
+            lock: Lock guarding the table; a private one by default
+        """
+        self._table = _deployment_table()
+        self._lock = lock or threading.RLock()
+
+    def get(self, deployment_id: str) -> Optional[Record]:
+        with self._lock:
+            deployment = self._table.rows.get(deployment_id)
+            return dict(deployment) if deployment else None
+
+    def list(self, node_id=None, status=None) -> List[Record]:
+        with self._lock:
+            return [
+                dict(deployment)
+                for deployment in self._table.select(
+                    _deployment_criteria(node_id, status)
+                )
+            ]
+
+    def put(self, deployment: Record) -> None:
+        with self._lock:
+            self._table.insert(dict(deployment))
+
+    def update(self, deployment_id: str, **fields) -> Optional[Record]:
+        with self._lock:
+            deployment = self._table.rows.get(deployment_id)
+            if deployment is None:
+                return None
+            deployment = {**deployment, **fields}
+            self._table.insert(deployment)
+            return dict(deployment)
+
+    def delete(self, deployment_id: str) -> bool:
+        with self._lock:
+            return self._table.remove(deployment_id) is not None
+
+
+class MemoryStorage(Storage):
+    """In-memory storage; nodes and deployments share one lock."""
+
+    name = "memory"
+
+    def __init__(self):
+        """Initialize empty repositories."""
+        lock = threading.RLock()
+        self.nodes = MemoryNodeRepository(lock)
+        self.deployments = MemoryDeploymentRepository(lock)
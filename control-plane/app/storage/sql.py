@@ -0,0 +1,150 @@
+"""SQL storage on a SQLAlchemy session.
+
+Changes are flushed to the session but not committed: the caller commits
+through ``Storage.commit`` (or the session itself), so several changes made
+during one request land in one transaction. Flushing stamps rows with
+resource versions, and committing publishes them to watchers, exactly as
+for rows changed through the ORM directly.
+
+Status and node filters run in the database; capability queries are matched
+in Python, since the capabilities column is stored as JSON text.
+"""
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.db.models import DeploymentDB, NodeDB
+
+from .base import (
+    DEPLOYMENT_FIELDS,
+    NODE_FIELDS,
+    DeploymentRepository,
+    NodeRepository,
+    Record,
+    Storage,
+    matches_capabilities,
+)
+
+
+def _record(row, fields) -> Record:
+    record = {field: getattr(row, field) for field in fields}
+    record["resource_version"] = row.resource_version
+    return record
+
+
+class SQLNodeRepository(NodeRepository):
+    """Node repository backed by the ``nodes`` table."""
+
+    def __init__(self, db: Session):
+        """Initialize the repository.
+
+        Args:
+            db: Database session, committed by the caller
+        """
+        self.db = db
+
+    def get(self, node_id: str) -> Optional[Record]:
+        node = self.db.get(NodeDB, node_id)
+        return _record(node, NODE_FIELDS) if node else None
+
+    def get_by_name(self, name: str) -> Optional[Record]:
+        node = self.db.query(NodeDB).filter(NodeDB.name == name).first()
+        return _record(node, NODE_FIELDS) if node else None
+
+    def list(self, status=None, capabilities=None) -> List[Record]:
+        query = self.db.query(NodeDB)
+        if status is not None:
+            query = query.filter(NodeDB.status == status)
+        return [
+            _record(node, NODE_FIELDS)
+            for node in query
+            if not capabilities or matches_capabilities(node.capabilities, capabilities)
+        ]
+
+    def put(self, node: Record) -> None:
+        self.db.merge(NodeDB(**{field: node.get(field) for field in NODE_FIELDS}))
+        self.db.flush()
+
+    def update(self, node_id: str, **fields) -> Optional[Record]:
+        node = self.db.get(NodeDB, node_id)
+        if node is None:
+            return None
+        for field, value in fields.items():
+            setattr(node, field, value)
+        self.db.flush()
+        return _record(node, NODE_FIELDS)
+
+    def delete(self, node_id: str) -> bool:
+        node = self.db.get(NodeDB, node_id)
+        if node is None:
+            return False
+        self.db.delete(node)
+        self.db.flush()
+        return True
+
+
+class SQLDeploymentRepository(DeploymentRepository):
+    """Deployment repository backed by the ``deployments`` table."""
+
+    def __init__(self, db: Session):
+        """Initialize the repository.
+
+        Args:
+            db: Database session, committed by the caller
+        """
+        self.db = db
+
+    def get(self, deployment_id: str) -> Optional[Record]:
+        deployment = self.db.get(DeploymentDB, deployment_id)
+        return _record(deployment, DEPLOYMENT_FIELDS) if deployment else None
+
+    def list(self, node_id=None, status=None) -> List[Record]:
+        query = self.db.query(DeploymentDB)
+        if node_id is not None:
+            query = query.filter(DeploymentDB.node_id == node_id)
+        if status is not None:
+            query = query.filter(DeploymentDB.status == status)
+        return [_record(deployment, DEPLOYMENT_FIELDS) for deployment in query]
+
+    def put(self, deployment: Record) -> None:
+        self.db.merge(DeploymentDB(
+            **{field: deployment.get(field) for field in DEPLOYMENT_FIELDS}
+        ))
+        self.db.flush()
+
+    def update(self, deployment_id: str, **fields) -> Optional[Record]:
+        deployment = self.db.get(DeploymentDB, deployment_id)
+        if deployment is None:
+            return None
+        for field, value in fields.items():
+            setattr(deployment, field, value)
+        self.db.flush()
+        return _record(deployment, DEPLOYMENT_FIELDS)
+
+    def delete(self, deployment_id: str) -> bool:
+        deployment = self.db.get(DeploymentDB, deployment_id)
+        if deployment is None:
+            return False
+        self.db.delete(deployment)
+        self.db.flush()
+        return True
+
+
+class SQLStorage(Storage):
+    """Storage in the control plane database."""
+
+    name = "sql"
+
+    def __init__(self, db: Session):
+        """Initialize the repositories.
+
+        Args:
+            db: Database session shared by both repositories
+        """
+        self.db = db
+        self.nodes = SQLNodeRepository(db)
+        self.deployments = SQLDeploymentRepository(db)
+
+    def commit(self) -> None:
+        """Commit the session's transaction."""
+        self.db.commit()
@@ -0,0 +1,115 @@
+"""Lock-striped in-memory storage.
+
+``MemoryStorage`` serializes every operation on one lock. Here records are
+spread over independent stripes by ID, each an indexed in-memory repository
+with its own lock, so threads working on different records rarely contend.
+
+Lookups by ID touch one stripe. Lookups by name and filtered lists visit
+every stripe in turn; a list is not a point-in-time snapshot across stripes,
+and records come back grouped by stripe rather than in insertion order.
+"""
+import os
+import threading
+from typing import List, Optional
+
+from .base import DeploymentRepository, NodeRepository, Record, Storage
+from .memory import MemoryDeploymentRepository, MemoryNodeRepository
+
+# Number of independently locked stripes
+STORAGE_STRIPES = int(os.environ.get("STORAGE_STRIPES", "16"))
+
+
+class StripedNodeRepository(NodeRepository):
+    """Node repository split over independently locked stripes."""
+
+    def __init__(self, stripes: List[MemoryNodeRepository]):
+        """Initialize the repository.
+
+        Args:
+            stripes: Stripe repositories, each with its own lock
+        """
+        self._stripes = stripes
+
+    def _stripe(self, node_id: str) -> MemoryNodeRepository:
+        return self._stripes[hash(node_id) % len(self._stripes)]
+
+    def get(self, node_id: str) -> Optional[Record]:
+        return self._stripe(node_id).get(node_id)
+
+    def get_by_name(self, name: str) -> Optional[Record]:
+        for stripe in self._stripes:
+            node = stripe.get_by_name(name)
+            if node is not None:
+                return node
+        return None
+
+    def list(self, status=None, capabilities=None) -> List[Record]:
+        return [
+            node
+            for stripe in self._stripes
+            for node in stripe.list(status=status, capabilities=capabilities)
+        ]
+
+    def put(self, node: Record) -> None:
+        self._stripe(node["id"]).put(node)
+
+    def update(self, node_id: str, **fields) -> Optional[Record]:
+        return self._stripe(node_id).update(node_id, **fields)
+
+    def delete(self, node_id: str) -> bool:
+        return self._stripe(node_id).delete(node_id)
+
+
+class StripedDeploymentRepository(DeploymentRepository):
+    """Deployment repository split over independently locked stripes."""
+
+    def __init__(self, stripes: List[MemoryDeploymentRepository]):
+        """Initialize the repository.
+
+        Args:
+            stripes: Stripe repositories, each with its own lock
+        """
+        self._stripes = stripes
+
+    def _stripe(self, deployment_id: str) -> MemoryDeploymentRepository:
+        return self._stripes[hash(deployment_id) % len(self._stripes)]
+
+    def get(self, deployment_id: str) -> Optional[Record]:
+        return self._stripe(deployment_id).get(deployment_id)
+
+    def list(self, node_id=None, status=None) -> List[Record]:
+        return [
+            deployment
+            for stripe in self._stripes
+            for deployment in stripe.list(node_id=node_id, status=status)
+        ]
+
+    def put(self, deployment: Record) -> None:
+        self._stripe(deployment["id"]).put(deployment)
+
+    def update(self, deployment_id: str, **fields) -> Optional[Record]:
+        return self._stripe(deployment_id).update(deployment_id, **fields)
+
+    def delete(self, deployment_id: str) -> bool:
+        return self._stripe(deployment_id).delete(deployment_id)
+
+
+class StripedStorage(Storage):
+    """Lock-striped in-memory storage."""
+
+    name = "striped"
+
+    def __init__(self, stripes: int = STORAGE_STRIPES):
+        """Initialize empty repositories.
+
+        Args:
+            stripes: Number of stripes, each with one lock shared by its
+                node and deployment records
+        """
+        locks = [threading.RLock() for _ in range(max(1, stripes))]
+        self.nodes = StripedNodeRepository(
+            [MemoryNodeRepository(lock) for lock in locks]
+        )
+        self.deployments = StripedDeploymentRepository(
+            [MemoryDeploymentRepository(lock) for lock in locks]
+        )
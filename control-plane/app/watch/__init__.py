@@ -0,0 +1,26 @@
+"""Watch package for resource versions and change streaming."""
+from .changelog import (
+    ChangeLog,
+    ResourceVersionTooOld,
+    change_log,
+    current_resource_version,
+)
+from .snapshot import (
+    SnapshotWriter,
+    load_snapshot,
+    restore_snapshot,
+    write_snapshot,
+)
+from .stream import watch_response
+
+__all__ = [
+    "ChangeLog",
+    "ResourceVersionTooOld",
+    "change_log",
+    "current_resource_version",
+    "SnapshotWriter",
+    "load_snapshot",
+    "restore_snapshot",
+    "write_snapshot",
+    "watch_response",
+]
@@ -0,0 +1,428 @@
+"""Resource versions and the bounded in-memory change log.
+
+Every committed change to a ``NodeDB`` or ``DeploymentDB`` row is assigned a
+monotonically increasing resource version and appended to a bounded change
+log. Watch clients ask for all changes newer than a resource version they
+already hold; if the log has since been truncated past that point they are
+told to relist instead.
+
+Every heartbeat modifies its node's row, so a fleet would otherwise turn
+the log over every heartbeat interval and send watchers back to relisting.
+A node change touching only ``last_seen`` and the heartbeat metrics
+replaces the node's previous such change in the log instead of adding to
+it: events carry the whole object, so the newer one supersedes it.
+"""
+import asyncio
+import heapq
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+
+from app.db.models import NodeDB, DeploymentDB
+
+# Maximum number of change events kept in memory for watch clients
+WATCH_LOG_SIZE = int(os.environ.get("WATCH_LOG_SIZE", "10000"))
+
+ADDED = "ADDED"
+MODIFIED = "MODIFIED"
+DELETED = "DELETED"
+
+_PENDING_KEY = "watch_pending"
+_ENCODED_KEY = "watch_encoded"
+
+
+class ResourceVersionTooOld(Exception):
+    """Raised when a watch starts before the oldest retained change."""
+
+
+class ChangeEvent:
+    """A single committed change, serialized once for all watchers."""
+
+    __slots__ = ("resource_version", "kind", "type", "payload", "coalesce_key")
+
+    def __init__(
+        self, resource_version: int, kind: str, event_type: str, payload: bytes,
+        coalesce_key: Optional[str] = None,
+    ):
+        self.resource_version = resource_version
+        self.kind = kind
+        self.type = event_type
+        self.payload = payload
+        # Events with the same key supersede each other in the log
+        self.coalesce_key = coalesce_key
+
+
+class ChangeLog:
+    """Bounded, ordered log of committed resource changes.
+
+    Resource versions are handed out when rows are flushed, but events only
+    become visible to watchers once every lower resource version has either
+    been committed or rolled back. This keeps the visible log gap-free even
+    when concurrent transactions commit out of order.
+    """
+
+    def __init__(self, max_events: int = WATCH_LOG_SIZE):
+        """Initialize the change log.
+
+        Args:
+            max_events: Maximum number of events retained
+        """
+        self.max_events = max_events
+        # Retained events by resource version, oldest first
+        self._events: "OrderedDict[int, ChangeEvent]" = OrderedDict()
+        # Resource version of the retained event for each coalesce key
+        self._coalesced: Dict[str, int] = {}
+        # Event loop futures of watchers waiting for changes
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self._cond = threading.Condition()
+        self._last_allocated = 0
+        self._visible = 0
+        self._compacted = 0
+        self._inflight: set = set()
+        self._staged: List[Tuple[int, ChangeEvent]] = []
+
+    @property
+    def resource_version(self) -> int:
+        """Highest resource version visible to watchers."""
+        with self._cond:
+            return self._visible
+
+    def seed(self, resource_version: int) -> None:
+        """Continue numbering after a resource version persisted earlier.
+
+        Changes up to ``resource_version`` are not in memory, so watches
+        starting before it must relist.
+
+        Args:
+            resource_version: Highest resource version found in the database
+        """
+        with self._cond:
+            if resource_version > self._last_allocated:
+                self._last_allocated = resource_version
+                self._visible = resource_version
+                self._compacted = resource_version
+
+    def export(self) -> Tuple[int, int, List[ChangeEvent]]:
+        """Copy the visible log for a snapshot.
+
+        Returns:
+            Tuple of (highest visible resource version, compaction point,
+            retained events oldest first)
+        """
+        with self._cond:
+            return self._visible, self._compacted, list(self._events.values())
+
+    def restore(
+        self, events: List[ChangeEvent], resource_version: int, compacted: int
+    ) -> None:
+        """Replace the log with events restored from a snapshot.
+
+        Args:
+            events: Events in resource version order, none above
+                ``resource_version``
+            resource_version: Highest resource version found in the database
+            compacted: Watches starting before this version must relist
+        """
+        with self._cond:
+            self._events.clear()
+            self._coalesced.clear()
+            self._compacted = compacted
+            for change in events:
+                self._append(change)
+            self._last_allocated = resource_version
+            self._visible = resource_version
+            self._notify()
+
+    def allocate(self) -> int:
+        """Reserve the next resource version for a pending change.
+
+        Returns:
+            Newly allocated resource version
+        """
+        with self._cond:
+            self._last_allocated += 1
+            self._inflight.add(self._last_allocated)
+            return self._last_allocated
+
+    def publish(self, events: List[ChangeEvent]) -> None:
+        """Make committed events visible once all earlier versions settle.
+
+        Args:
+            events: Events whose resource versions came from ``allocate``
+        """
+        with self._cond:
+            for change in events:
+                self._inflight.discard(change.resource_version)
+                heapq.heappush(self._staged, (change.resource_version, change))
+            self._drain()
+
+    def abort(self, resource_versions: List[int]) -> None:
+        """Release resource versions whose transaction was rolled back.
+
+        Args:
+            resource_versions: Versions previously returned by ``allocate``
+        """
+        with self._cond:
+            for resource_version in resource_versions:
+                self._inflight.discard(resource_version)
+            self._drain()
+
+    def _drain(self) -> None:
+        """Move settled events into the log and wake up watchers."""
+        low = min(self._inflight) if self._inflight else self._last_allocated + 1
+        while self._staged and self._staged[0][0] < low:
+            _, change = heapq.heappop(self._staged)
+            self._append(change)
+        visible = low - 1
+        if self._staged:
+            visible = min(visible, self._staged[0][0] - 1)
+        if visible > self._visible:
+            self._visible = visible
+            self._notify()
+
+    def _append(self, change: ChangeEvent) -> None:
+        """Retain an event, dropping the one it supersedes or else the oldest past the bound."""
+        key = change.coalesce_key
+        if key is not None:
+            superseded = self._coalesced.pop(key, None)
+            if superseded is not None:
+                self._events.pop(superseded, None)
+            self._coalesced[key] = change.resource_version
+        if len(self._events) >= self.max_events:
+            oldest, dropped = self._events.popitem(last=False)
+            self._compacted = max(self._compacted, oldest)
+            if dropped.coalesce_key is not None and self._coalesced.get(dropped.coalesce_key) == oldest:
+                del self._coalesced[dropped.coalesce_key]
+        self._events[change.resource_version] = change
+
+    def _notify(self) -> None:
+        """Wake watchers waiting on threads and on event loops."""
+        self._cond.notify_all()
+        for loop, future in self._waiters:
+            loop.call_soon_threadsafe(_wake, future)
+        self._waiters = []
+
+    async def wait(self, resource_version: int, timeout: float) -> None:
+        """Wait up to ``timeout`` seconds for changes newer than ``resource_version``.
+
+        Waiting happens on the event loop, holding no thread.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._cond:
+            if self._visible > resource_version or timeout <= 0:
+                return
+            self._waiters.append((loop, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._cond:
+                if (loop, future) in self._waiters:
+                    self._waiters.remove((loop, future))
+
+    def since(
+        self,
+        kind: str,
+        resource_version: int,
+        timeout: float = 0.0,
+    ) -> Tuple[List[ChangeEvent], int]:
+        """Return events of ``kind`` newer than ``resource_version``.
+
+        Blocks for up to ``timeout`` seconds if nothing newer is visible yet.
+
+        Args:
+            kind: Resource kind to filter on ("nodes" or "deployments")
+            resource_version: Last resource version the caller has seen
+            timeout: Seconds to wait for new changes
+
+        Returns:
+            Tuple of (matching events, highest visible resource version)
+
+        Raises:
+            ResourceVersionTooOld: If changes after ``resource_version``
+                are no longer retained and the caller must relist
+        """
+        with self._cond:
+            if self._visible <= resource_version and timeout > 0:
+                self._cond.wait(timeout)
+            if resource_version < self._compacted:
+                raise ResourceVersionTooOld(
+                    f"resourceVersion {resource_version} is older than "
+                    f"the oldest retained change {self._compacted}"
+                )
+            matched = []
+            for change in reversed(self._events.values()):
+                if change.resource_version <= resource_version:
+                    break
+                if change.kind == kind:
+                    matched.append(change)
+            matched.reverse()
+            return matched, self._visible
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+# Global change log instance
+change_log = ChangeLog()
+
+
+def node_snapshot(node: NodeDB) -> Dict:
+    """Serializable view of a node row, matching ``NodeResponse``."""
+    return {
+        "id": node.id,
+        "name": node.name,
+        "ip": node.ip,
+        "capabilities": node.capabilities,
+        "last_seen": node.last_seen,
+        "status": node.status,
+        "resource_version": node.resource_version,
+    }
+
+
+def deployment_snapshot(deployment: DeploymentDB) -> Dict:
+    """Serializable view of a deployment row."""
+    return {
+        "deployment_id": deployment.id,
+        "node_id": deployment.node_id,
+        "template_id": deployment.template_id,
+        "status": deployment.status,
+        "action": deployment.action,
+        "resource_version": deployment.resource_version,
+    }
+
+
+# Marks a pending node change that only records a heartbeat
+HEARTBEAT = "HEARTBEAT"
+
+# Node columns a heartbeat changes; of its capabilities, only the metrics
+_HEARTBEAT_COLUMNS = {"last_seen", "capabilities", "resource_version"}
+
+
+def _heartbeat_only(obj) -> bool:
+    """Whether a modified row is a node whose change only records a heartbeat."""
+    if not isinstance(obj, NodeDB):
+        return False
+    state = inspect(obj)
+    for attr in state.attrs:
+        history = attr.history
+        if not history.has_changes():
+            continue
+        if attr.key not in _HEARTBEAT_COLUMNS:
+            return False
+        if attr.key == "capabilities":
+            if not history.deleted or not history.added:
+                return False
+            before, after = history.deleted[0], history.added[0]
+            if not isinstance(before, dict) or not isinstance(after, dict):
+                return False
+            if {k: v for k, v in before.items() if k != "metrics"} != {
+                k: v for k, v in after.items() if k != "metrics"
+            }:
+                return False
+    return True
+
+
+_WATCHED = {
+    NodeDB: ("nodes", node_snapshot),
+    DeploymentDB: ("deployments", deployment_snapshot),
+}
+
+
+def _encode(
+    resource_version: int, kind: str, event_type: str, obj: Dict
+) -> ChangeEvent:
+    """Serialize a change once so every watcher can reuse the bytes."""
+    payload = json.dumps(
+        {"type": event_type, "resourceVersion": resource_version, "object": obj},
+        separators=(",", ":"),
+        default=str,
+    ).encode()
+    return ChangeEvent(resource_version, kind, event_type, payload)
+
+
+def current_resource_version(db: Session) -> int:
+    """Highest resource version persisted in the database.
+
+    Args:
+        db: Database session
+
+    Returns:
+        Highest resource version across watched tables, or 0
+    """
+    return max(
+        db.query(func.max(NodeDB.resource_version)).scalar() or 0,
+        db.query(func.max(DeploymentDB.resource_version)).scalar() or 0,
+    )
+
+
+@event.listens_for(Session, "before_flush")
+def _assign_resource_versions(session, flush_context, instances):
+    """Stamp new and modified rows with a fresh resource version."""
+    pending = session.info.setdefault(_PENDING_KEY, [])
+    for obj in session.new:
+        if type(obj) in _WATCHED:
+            obj.resource_version = change_log.allocate()
+            pending.append((obj, ADDED, obj.resource_version))
+    for obj in session.dirty:
+        if type(obj) in _WATCHED and session.is_modified(obj):
+            obj.resource_version = change_log.allocate()
+            event_type = HEARTBEAT if _heartbeat_only(obj) else MODIFIED
+            pending.append((obj, event_type, obj.resource_version))
+    for obj in session.deleted:
+        if type(obj) in _WATCHED:
+            pending.append((obj, DELETED, change_log.allocate()))
+
+
+@event.listens_for(Session, "after_flush")
+def _snapshot_changes(session, flush_context):
+    """Serialize flushed rows while their state is still loaded."""
+    pending = session.info.get(_PENDING_KEY)
+    if not pending:
+        return
+    encoded = session.info.setdefault(_ENCODED_KEY, [])
+    for obj, event_type, resource_version in pending:
+        kind, snapshot = _WATCHED[type(obj)]
+        obj_dict = snapshot(obj)
+        obj_dict["resource_version"] = resource_version
+        if event_type == HEARTBEAT:
+            change = _encode(resource_version, kind, MODIFIED, obj_dict)
+            change.coalesce_key = f"{kind}/{obj.id}"
+        else:
+            change = _encode(resource_version, kind, event_type, obj_dict)
+        encoded.append(change)
+    pending.clear()
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_changes(session):
+    """Hand committed changes to the change log."""
+    encoded = session.info.pop(_ENCODED_KEY, None)
+    if encoded:
+        change_log.publish(encoded)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _release_changes(session, transaction):
+    """Release versions of changes that were never committed."""
+    if transaction.parent is not None:
+        return
+    leftovers = [
+        resource_version
+        for _, _, resource_version in session.info.pop(_PENDING_KEY, [])
+    ]
+    leftovers += [
+        change.resource_version
+        for change in session.info.pop(_ENCODED_KEY, [])
+    ]
+    if leftovers:
+        change_log.abort(leftovers)
@@ -0,0 +1,254 @@
+"""Warm-state snapshots of the change log.
+
+The change log only lives in memory, so a restarted control plane used to
+come back empty and every watch client had to relist. With ``SNAPSHOT_PATH``
+set, the retained change events are written to a compact binary file every
+``SNAPSHOT_INTERVAL`` seconds and on shutdown. On startup the snapshot is
+loaded and only the rows changed since it was taken are read back from the
+database, so watches can resume from the resource version they held.
+
+File layout (big-endian)::
+
+    header   magic "MSNP", version u8, created_at f64, resource_version u64,
+             compacted u64, event count u32, crc32 u32 of everything after
+             the header
+    index    one fixed-size entry per event: resource_version u64, kind u8,
+             type u8, payload offset u64, payload length u32
+    payloads the events' pre-serialized JSON, back to back
+
+The fixed-size index makes the file usable through ``mmap`` without parsing
+any JSON: restoring only copies payload bytes into the log. Snapshots are
+written to a temporary file and renamed into place, so a crash mid-write
+leaves the previous snapshot intact.
+
+The database stays the source of truth. Rows changed after the snapshot are
+replayed as ``MODIFIED`` events carrying their latest state; intermediate
+versions of a row changed several times are skipped, which is all a watcher
+needs to converge. The API never hard-deletes watched rows (deployments are
+marked ``deleting``), so every change is reflected in some row; rows deleted
+out of band after the snapshot are not seen by resumed watches. Delete the
+snapshot when the database is restored from a backup, or it will describe
+rows that no longer exist.
+"""
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy.orm import Session
+
+from .changelog import (
+    ADDED,
+    DELETED,
+    MODIFIED,
+    ChangeEvent,
+    ChangeLog,
+    _WATCHED,
+    _encode,
+    current_resource_version,
+)
+from app.metrics.instruments import WATCH_SNAPSHOT_DURATION
+
+logger = logging.getLogger(__name__)
+
+# Snapshot file; empty disables snapshots. Each replica needs its own file.
+SNAPSHOT_PATH = os.environ.get("SNAPSHOT_PATH", "")
+
+# Seconds between snapshots
+SNAPSHOT_INTERVAL = float(os.environ.get("SNAPSHOT_INTERVAL", "60"))
+
+_MAGIC = b"MSNP"
+_VERSION = 1
+_HEADER = struct.Struct(">4sB3xdQQII")
+_ENTRY = struct.Struct(">QBB2xQI")
+_KINDS = ("nodes", "deployments")
+_TYPES = (ADDED, MODIFIED, DELETED)
+
+
+class Snapshot(NamedTuple):
+    """Change log state read from a snapshot file."""
+
+    created_at: float
+    resource_version: int
+    compacted: int
+    events: List[ChangeEvent]
+
+
+def write_snapshot(log: ChangeLog, path: str) -> int:
+    """Atomically write the change log to ``path``.
+
+    Args:
+        log: Change log to snapshot
+        path: Snapshot file
+
+    Returns:
+        Resource version the snapshot is current to
+    """
+    start = time.perf_counter()
+    resource_version, compacted, events = log.export()
+    index, offset = [], 0
+    for change in events:
+        index.append(_ENTRY.pack(
+            change.resource_version,
+            _KINDS.index(change.kind),
+            _TYPES.index(change.type),
+            offset,
+            len(change.payload),
+        ))
+        offset += len(change.payload)
+    body = b"".join(index) + b"".join(change.payload for change in events)
+    header = _HEADER.pack(
+        _MAGIC, _VERSION, time.time(), resource_version, compacted,
+        len(events), zlib.crc32(body),
+    )
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    WATCH_SNAPSHOT_DURATION.labels("write").observe(time.perf_counter() - start)
+    return resource_version
+
+
+def load_snapshot(path: str) -> Optional[Snapshot]:
+    """Read a snapshot file.
+
+    Args:
+        path: Snapshot file
+
+    Returns:
+        The snapshot, or None if it is missing, corrupt or of another version
+    """
+    try:
+        with open(path, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ
+        ) as mm:
+            if len(mm) < _HEADER.size:
+                raise ValueError("truncated header")
+            magic, version, created_at, resource_version, compacted, count, crc = (
+                _HEADER.unpack_from(mm)
+            )
+            if magic != _MAGIC or version != _VERSION:
+                raise ValueError(f"unsupported format {magic!r} v{version}")
+            if zlib.crc32(mm[_HEADER.size:]) != crc:
+                raise ValueError("checksum mismatch")
+            payloads = _HEADER.size + count * _ENTRY.size
+            events = []
+            for i in range(count):
+                rv, kind, event_type, offset, length = _ENTRY.unpack_from(
+                    mm, _HEADER.size + i * _ENTRY.size
+                )
+                start = payloads + offset
+                events.append(ChangeEvent(
+                    rv, _KINDS[kind], _TYPES[event_type], mm[start:start + length]
+                ))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, IndexError, struct.error) as e:
+        logger.warning(f"Ignoring unreadable snapshot {path}: {e}")
+        return None
+    return Snapshot(created_at, resource_version, compacted, events)
+
+
+def restore_snapshot(log: ChangeLog, db: Session, path: str) -> bool:
+    """Restore the change log from a snapshot plus newer database changes.
+
+    Args:
+        log: Change log to restore into
+        db: Database session
+        path: Snapshot file
+
+    Returns:
+        True if the log was restored, False if there was no usable snapshot
+    """
+    start = time.perf_counter()
+    snapshot = load_snapshot(path)
+    if snapshot is None:
+        return False
+    # The snapshot is ahead of every stored row if the last changes it saw
+    # were deletions; numbering must continue after it either way
+    current = max(current_resource_version(db), snapshot.resource_version)
+
+    newer = []
+    for model, (kind, to_dict) in _WATCHED.items():
+        rows = db.query(model).filter(
+            model.resource_version > snapshot.resource_version
+        )
+        newer.extend(
+            _encode(row.resource_version, kind, MODIFIED, to_dict(row))
+            for row in rows
+        )
+    newer.sort(key=lambda change: change.resource_version)
+
+    log.restore(snapshot.events + newer, current, snapshot.compacted)
+    WATCH_SNAPSHOT_DURATION.labels("restore").observe(time.perf_counter() - start)
+    logger.info(
+        f"Restored {len(snapshot.events)} change events from snapshot at "
+        f"resource version {snapshot.resource_version}, replayed {len(newer)} "
+        f"newer changes"
+    )
+    return True
+
+
+class SnapshotWriter:
+    """Background thread writing periodic change log snapshots."""
+
+    def __init__(
+        self,
+        log: ChangeLog,
+        path: str = SNAPSHOT_PATH,
+        interval: float = SNAPSHOT_INTERVAL,
+    ):
+        """Initialize the writer.
+
+        Args:
+            log: Change log to snapshot
+            path: Snapshot file; empty disables the writer
+            interval: Seconds between snapshots
+        """
+        self.log = log
+        self.path = path
+        self.interval = interval
+        self._written: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def write(self) -> None:
+        """Write a snapshot unless nothing changed since the last one."""
+        if self._written == self.log.resource_version:
+            return
+        try:
+            self._written = write_snapshot(self.log, self.path)
+        except OSError as e:
+            logger.warning(f"Failed to write snapshot {self.path}: {e}")
+
+    def start(self) -> None:
+        """Start writing snapshots every interval."""
+        if not self.path:
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.wait(self.interval):
+                self.write()
+
+        self._thread = threading.Thread(
+            target=loop, name="watch-snapshot", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the thread and write a final snapshot."""
+        if not self.path:
+            return
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.write()
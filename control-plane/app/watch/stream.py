@@ -0,0 +1,137 @@
+"""Streaming responses for watch requests.
+
+Watch streams are newline-delimited JSON by default, or Server-Sent Events
+when the client sends ``Accept: text/event-stream``. Idle streams emit
+``BOOKMARK`` events so clients can advance their resource version without
+relisting, and a stream whose starting point has been dropped from the
+change log ends with an ``ERROR`` event carrying code 410.
+
+Streams wait for changes on the event loop, so open watches hold no server
+threads however long they last.
+"""
+import json
+import os
+import time
+from typing import AsyncIterator, Optional
+
+from fastapi.responses import StreamingResponse
+
+from .changelog import ChangeLog, ResourceVersionTooOld, change_log
+
+# Default and maximum lifetime of a single watch stream in seconds
+WATCH_TIMEOUT_SECONDS = int(os.environ.get("WATCH_TIMEOUT_SECONDS", "300"))
+WATCH_MAX_TIMEOUT_SECONDS = 3600
+
+# Seconds of inactivity before a BOOKMARK event is sent
+WATCH_BOOKMARK_INTERVAL = float(os.environ.get("WATCH_BOOKMARK_INTERVAL", "10"))
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SSE_MEDIA_TYPE = "text/event-stream"
+
+
+def _frame(
+    payload: bytes, event_type: str, resource_version: int, sse: bool
+) -> bytes:
+    """Wrap a serialized event for the negotiated stream format."""
+    if sse:
+        return (
+            f"event: {event_type}\nid: {resource_version}\n".encode()
+            + b"data: " + payload + b"\n\n"
+        )
+    return payload + b"\n"
+
+
+def _control_event(
+    event_type: str, resource_version: int, obj: dict, sse: bool
+) -> bytes:
+    """Build a BOOKMARK or ERROR event that is not backed by a row change."""
+    payload = json.dumps(
+        {"type": event_type, "resourceVersion": resource_version, "object": obj},
+        separators=(",", ":"),
+    ).encode()
+    return _frame(payload, event_type, resource_version, sse)
+
+
+async def iter_events(
+    kind: str,
+    resource_version: int,
+    timeout_seconds: float,
+    sse: bool = False,
+    log: Optional[ChangeLog] = None,
+) -> AsyncIterator[bytes]:
+    """Yield encoded change events for ``kind`` until the timeout expires.
+
+    Args:
+        kind: Resource kind to watch ("nodes" or "deployments")
+        resource_version: Resource version to start after
+        timeout_seconds: Lifetime of the stream
+        sse: Encode as Server-Sent Events instead of NDJSON
+        log: Change log to read from, defaults to the global one
+
+    Yields:
+        Encoded events, one per change
+    """
+    log = log or change_log
+    deadline = time.monotonic() + timeout_seconds
+    last_sent = time.monotonic()
+    while True:
+        remaining = deadline - time.monotonic()
+        await log.wait(resource_version, max(0.0, min(remaining, WATCH_BOOKMARK_INTERVAL)))
+        try:
+            events, visible = log.since(kind, resource_version)
+        except ResourceVersionTooOld as e:
+            yield _control_event(
+                "ERROR",
+                resource_version,
+                {"code": 410, "reason": "Expired", "message": str(e)},
+                sse,
+            )
+            return
+
+        for change in events:
+            yield _frame(change.payload, change.type, change.resource_version, sse)
+            last_sent = time.monotonic()
+        resource_version = max(resource_version, visible)
+
+        if time.monotonic() >= deadline:
+            return
+        if time.monotonic() - last_sent >= WATCH_BOOKMARK_INTERVAL:
+            yield _control_event(
+                "BOOKMARK",
+                resource_version,
+                {"resource_version": resource_version},
+                sse,
+            )
+            last_sent = time.monotonic()
+
+
+def watch_response(
+    kind: str,
+    resource_version: Optional[int],
+    timeout_seconds: Optional[int],
+    accept: Optional[str] = None,
+) -> StreamingResponse:
+    """Build a streaming watch response for a list endpoint.
+
+    Args:
+        kind: Resource kind to watch ("nodes" or "deployments")
+        resource_version: Resource version to start after; the current
+            version is used when omitted, so only future changes are sent
+        timeout_seconds: Lifetime of the stream, capped server-side
+        accept: Value of the request's Accept header
+
+    Returns:
+        StreamingResponse producing NDJSON or Server-Sent Events
+    """
+    sse = bool(accept) and SSE_MEDIA_TYPE in accept
+    if resource_version is None:
+        resource_version = change_log.resource_version
+    if timeout_seconds is None:
+        timeout_seconds = WATCH_TIMEOUT_SECONDS
+    timeout_seconds = max(0, min(timeout_seconds, WATCH_MAX_TIMEOUT_SECONDS))
+
+    return StreamingResponse(
+        iter_events(kind, resource_version, timeout_seconds, sse),
+        media_type=SSE_MEDIA_TYPE if sse else NDJSON_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
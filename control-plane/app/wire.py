@@ -0,0 +1,132 @@
+"""Compact binary heartbeat encoding.
+
+A JSON heartbeat is ~120 bytes that FastAPI must parse and Pydantic must
+validate, sent by every node every interval. Agents instead send heartbeats
+as a fixed struct layout under the ``application/vnd.miaas.heartbeat``
+media type, on the same route as JSON. All integers are big-endian::
+
+    version        u8    format version, 1 or 2
+    flags          u8    bit 0: timestamp present
+                         bit 1: inference section present (version 2)
+    timestamp      f64   sample time in Unix seconds (0 when absent)
+    cpu_usage      f32   percent
+    mem_usage      f32   percent
+    disk_free_mb   u64
+    names_length   u16   length in bytes of the container names that follow
+    names                running container names, UTF-8, NUL-separated
+
+Version 2 adds an optional inference section after the names, for nodes
+running an inference engine::
+
+    workers        u16   worker processes
+    busy           u16   workers running a batch
+    queued         u32   requests taken and not yet returned
+    loaded_count   u8    number of loaded model digests that follow
+    loaded               SHA-256 digests of the loaded models, 32 raw bytes each
+
+Heartbeats without an inference section are encoded as version 1, so
+control planes that only know version 1 keep accepting them. A heartbeat
+without containers is 28 bytes. Percentages travel as 32-bit floats and are
+rounded to two decimals when decoded.
+
+Decoded fields are validated from a dict, which in Pydantic 2 is cheaper than
+``model_construct``.
+"""
+import struct
+
+from app.models import HeartbeatRequest
+
+# Media type of binary heartbeat bodies
+HEARTBEAT_MEDIA_TYPE = "application/vnd.miaas.heartbeat"
+
+HEARTBEAT_VERSION = 2
+
+_HEADER = struct.Struct(">BBdffQH")
+_INFERENCE = struct.Struct(">HHIB")
+_HAS_TIMESTAMP = 0x01
+_HAS_INFERENCE = 0x02
+_DIGEST_PREFIX = "sha256:"
+_DIGEST_SIZE = 32
+_MAX_LOADED = 255
+
+
+class UnsupportedVersion(ValueError):
+    """A binary heartbeat uses a format version this server does not know."""
+
+
+def encode_heartbeat(heartbeat: HeartbeatRequest) -> bytes:
+    """Encode a heartbeat in the binary wire format.
+
+    Loaded models whose digests are not SHA-256 are left out of the
+    inference section, and only the first 255 are sent.
+    """
+    names = "\0".join(heartbeat.running_containers).encode()
+    flags = _HAS_TIMESTAMP if heartbeat.timestamp is not None else 0
+    inference = b""
+    if heartbeat.inference is not None:
+        flags |= _HAS_INFERENCE
+        digests = [
+            bytes.fromhex(digest[len(_DIGEST_PREFIX):])
+            for digest in heartbeat.inference.loaded
+            if digest.startswith(_DIGEST_PREFIX) and len(digest) == len(_DIGEST_PREFIX) + 2 * _DIGEST_SIZE
+        ][:_MAX_LOADED]
+        inference = _INFERENCE.pack(
+            heartbeat.inference.workers,
+            heartbeat.inference.busy,
+            heartbeat.inference.queued,
+            len(digests),
+        ) + b"".join(digests)
+    return _HEADER.pack(
+        2 if inference else 1,
+        flags,
+        heartbeat.timestamp or 0.0,
+        heartbeat.cpu_usage,
+        heartbeat.mem_usage,
+        heartbeat.disk_free_mb,
+        len(names),
+    ) + names + inference
+
+
+def decode_heartbeat(data: bytes) -> HeartbeatRequest:
+    """Decode a binary heartbeat.
+
+    Raises:
+        UnsupportedVersion: If the format version is unknown
+        ValueError: If the body is truncated, has trailing bytes or is not
+            valid UTF-8
+    """
+    try:
+        version, flags, timestamp, cpu, mem, disk, names_length = _HEADER.unpack_from(data)
+    except struct.error:
+        raise ValueError("Truncated heartbeat")
+    if not 1 <= version <= HEARTBEAT_VERSION:
+        raise UnsupportedVersion(f"Unsupported heartbeat version {version}")
+    end = _HEADER.size + names_length
+    inference = None
+    if version >= 2 and flags & _HAS_INFERENCE:
+        try:
+            workers, busy, queued, count = _INFERENCE.unpack_from(data, end)
+        except struct.error:
+            raise ValueError("Truncated heartbeat")
+        start = end + _INFERENCE.size
+        end = start + count * _DIGEST_SIZE
+        inference = {
+            "workers": workers,
+            "busy": busy,
+            "queued": queued,
+            "loaded": [
+                _DIGEST_PREFIX + data[offset:offset + _DIGEST_SIZE].hex()
+                for offset in range(start, end, _DIGEST_SIZE)
+            ],
+        }
+    if len(data) != end:
+        raise ValueError("Heartbeat length does not match its header")
+    names = data[_HEADER.size:_HEADER.size + names_length].decode()
+    return HeartbeatRequest.model_validate({
+        "cpu_usage": round(cpu, 2),
+        "mem_usage": round(mem, 2),
+        "disk_free_mb": disk,
+        "running_containers": names.split("\0") if names else [],
+        "timestamp": timestamp if flags & _HAS_TIMESTAMP else None,
+        "inference": inference,
+    })
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Benchmark distributing one artifact to many agents, with and without peers.
+
+Starts a control plane under uvicorn (see ``bench_registry.py``), uploads a
+random artifact, then has ``--agents`` agent processes on loopback fetch it
+at the same moment:
+
+* ``direct``: every agent downloads the whole artifact from the registry.
+* ``peers``: every agent runs ``agent/peers.py fetch``, taking chunks from
+  the other agents where it can and from the registry otherwise.
+
+Reports the wall time until every agent has the artifact and how many bytes
+the registry served, as copies of the artifact. On one host all agents share
+the same CPUs and loopback, so the wall time says little about a real
+network; the registry's share of the traffic is what peers reduce.
+
+Example:
+    cd control-plane
+    python benchmarks/bench_distribution.py --size-mb 64 --agents 8
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from bench_registry import CHUNK, start_server, upload
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AGENT_DIR = os.path.join(os.path.dirname(ROOT), "agent")
+
+DIRECT = (
+    "import sys, httpx\n"
+    "with httpx.stream('GET', sys.argv[1], timeout=600) as r:\n"
+    "    with open(sys.argv[2], 'wb') as f:\n"
+    "        for block in r.iter_bytes(1 << 20):\n"
+    "            f.write(block)\n"
+)
+
+
+def registry_bytes_sent(url: str) -> float:
+    """The control plane's count of artifact bytes served."""
+    for line in httpx.get(f"{url}/metrics").text.splitlines():
+        if line.startswith("miaas_registry_blob_bytes_sent_total "):
+            return float(line.split()[1])
+    return 0.0
+
+
+def fetch_all(mode: str, url: str, digest: str, agents: int, workdir: str) -> float:
+    """Start ``agents`` fetches at once and wait for all of them."""
+    env = dict(os.environ, CONTROL_PLANE_URL=url)
+    commands = []
+    for i in range(agents):
+        directory = os.path.join(workdir, mode, f"agent-{i}")
+        os.makedirs(directory)
+        if mode == "direct":
+            commands.append([
+                sys.executable, "-c", DIRECT,
+                f"{url}/api/v1/blobs/{digest}", os.path.join(directory, "artifact"),
+            ])
+        else:
+            # Seed a little longer than any fetch takes, so late agents find peers
+            commands.append([
+                sys.executable, "peers.py", "fetch", digest,
+                "--name", f"bench-agent-{i}", "--port", "0",
+                "--advertise-host", "127.0.0.1", "--dir", directory, "--seed", "5",
+            ])
+    start = time.perf_counter()
+    processes = [
+        subprocess.Popen(
+            command, cwd=AGENT_DIR, env=env,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+        )
+        for command in commands
+    ]
+    # Peer agents print their result once fetched, then keep seeding
+    for process in processes:
+        process.stdout.readline()
+    elapsed = time.perf_counter() - start
+    for process in processes:
+        process.wait(timeout=600)
+        if process.returncode:
+            raise RuntimeError(f"{mode} fetch failed")
+    return elapsed
+
+
+def run(size_mb: int, agents: int) -> dict:
+    """Distribute one artifact of ``size_mb`` MiB to ``agents`` agents."""
+    size = size_mb * 1024 * 1024
+    results = {"size_mb": size_mb, "agents": agents}
+    with tempfile.TemporaryDirectory() as workdir:
+        artifact = os.path.join(workdir, "artifact.bin")
+        with open(artifact, "wb") as f:
+            for _ in range(0, size, CHUNK):
+                f.write(os.urandom(min(CHUNK, size - f.tell())))
+
+        process, url = start_server(workdir)
+        try:
+            digest = upload(url, artifact)
+            for mode in ("direct", "peers"):
+                before = registry_bytes_sent(url)
+                elapsed = fetch_all(mode, url, digest, agents, workdir)
+                results[mode] = {
+                    "seconds": round(elapsed, 2),
+                    "registry_copies": round((registry_bytes_sent(url) - before) / size, 2),
+                }
+            return results
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--agents", type=int, default=8)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    results = run(args.size_mb, args.agents)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Benchmark JSON against binary heartbeats.
+
+Reports, for each encoding:
+
+- bytes per heartbeat body, with and without running containers
+- server CPU per heartbeat spent parsing the body (JSON parsing and
+  Pydantic validation, or ``app.wire.decode_heartbeat``)
+- server CPU per heartbeat end to end through the ASGI app, including
+  authentication and the database write, on in-memory SQLite
+
+CPU time is process time, so it excludes time spent waiting.
+
+Example:
+    cd control-plane
+    python benchmarks/bench_heartbeat.py --heartbeats 2000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep the slow request log from reporting every benchmark request
+os.environ.setdefault("SLOW_REQUEST_THRESHOLD_MS", "600000")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db.database import Base, get_db
+from app.main import app
+from app.models import HeartbeatRequest
+from app.wire import HEARTBEAT_MEDIA_TYPE, decode_heartbeat, encode_heartbeat
+
+SAMPLES = {
+    "empty": HeartbeatRequest(
+        cpu_usage=25.5, mem_usage=60.2, disk_free_mb=450000, timestamp=1700000000.0,
+    ),
+    "containers": HeartbeatRequest(
+        cpu_usage=25.5, mem_usage=60.2, disk_free_mb=450000, timestamp=1700000000.0,
+        running_containers=[f"deployment-{i:04d}-postgres" for i in range(8)],
+    ),
+}
+
+
+def bodies(sample: HeartbeatRequest) -> dict:
+    """The sample encoded as the agent would send it."""
+    return {
+        "json": json.dumps(sample.model_dump()).encode(),
+        "binary": encode_heartbeat(sample),
+    }
+
+
+def parse_cpu_us(body: bytes, encoding: str, repeat: int) -> float:
+    """Process time in microseconds per parse of ``body``."""
+    parse = (
+        HeartbeatRequest.model_validate_json if encoding == "json" else decode_heartbeat
+    )
+    start = time.process_time()
+    for _ in range(repeat):
+        parse(body)
+    return (time.process_time() - start) / repeat * 1e6
+
+
+def request_cpu_us(heartbeats: int) -> dict:
+    """Process time in microseconds per heartbeat request, by encoding."""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    client = TestClient(app)
+    reg = client.post("/api/v1/nodes/register", json={
+        "name": "bench-node", "ip": "10.0.0.1",
+        "capabilities": {"os": "linux", "cpu_count": 4, "mem_mb": 8000, "gpus": []},
+    }).json()
+    url = f"/api/v1/nodes/{reg['node_id']}/heartbeat"
+    auth = {"Authorization": f"Bearer {reg['node_token']}"}
+    content_types = {"json": "application/json", "binary": HEARTBEAT_MEDIA_TYPE}
+
+    # Alternate encodings in small rounds so the growing metric history
+    # weighs on both equally
+    cpu = {encoding: 0.0 for encoding in content_types}
+    sample = SAMPLES["containers"].model_copy()
+    rounds = max(1, heartbeats // 100)
+    for r in range(rounds):
+        for encoding, content_type in content_types.items():
+            headers = {**auth, "Content-Type": content_type}
+            start = time.process_time()
+            for i in range(heartbeats // rounds):
+                # Distinct timestamps so every heartbeat is recorded in history
+                sample.timestamp = time.time()
+                client.post(url, content=bodies(sample)[encoding], headers=headers)
+            cpu[encoding] += time.process_time() - start
+    results = {
+        encoding: round(seconds / (rounds * (heartbeats // rounds)) * 1e6, 1)
+        for encoding, seconds in cpu.items()
+    }
+    app.dependency_overrides.clear()
+    return results
+
+
+def run(heartbeats: int, repeat: int) -> dict:
+    """Run all measurements."""
+    results = {"heartbeats": heartbeats, "repeat": repeat, "bytes": {}, "parse_cpu_us": {}}
+    for name, sample in SAMPLES.items():
+        encoded = bodies(sample)
+        results["bytes"][name] = {k: len(v) for k, v in encoded.items()}
+        results["parse_cpu_us"][name] = {
+            k: round(parse_cpu_us(v, k, repeat), 2) for k, v in encoded.items()
+        }
+    results["request_cpu_us"] = request_cpu_us(heartbeats)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--heartbeats", type=int, default=2000,
+                        help="Heartbeat requests per encoding")
+    parser.add_argument("--repeat", type=int, default=100000,
+                        help="Parses per body in the parse benchmark")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    results = run(args.heartbeats, args.repeat)
+    for name in SAMPLES:
+        size, parse = results["bytes"][name], results["parse_cpu_us"][name]
+        print(
+            f"{name}: json {size['json']} B / {parse['json']} us parse, "
+            f"binary {size['binary']} B / {parse['binary']} us parse"
+        )
+    cpu = results["request_cpu_us"]
+    print(f"request CPU per heartbeat: json {cpu['json']} us, binary {cpu['binary']} us")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Benchmark model artifact uploads and downloads through the registry.
+
+Starts a control plane under uvicorn with a temporary ``REGISTRY_DIR``,
+uploads a random artifact in chunks, then downloads it as one stream and as
+several byte ranges fetched in parallel. Reports throughput and how much the
+server's resident memory grew, which stays small because blobs are sent from
+a memory map instead of being read into Python.
+
+Example:
+    cd control-plane
+    python benchmarks/bench_registry.py --size-mb 256 --parallel 4
+"""
+import argparse
+import hashlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import psutil
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHUNK = 8 * 1024 * 1024
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir: str):
+    """Start uvicorn and wait until it is healthy."""
+    port = _free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'cp.db')}",
+        REGISTRY_DIR=os.path.join(workdir, "registry"),
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{url}/health").status_code == 200:
+                return process, url
+        except httpx.TransportError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("control plane did not become healthy")
+
+
+def upload(url: str, path: str) -> str:
+    """Upload a file in chunks and return its digest."""
+    digest = hashlib.sha256()
+    with httpx.Client(base_url=url, timeout=120) as client:
+        location = client.post("/api/v1/blobs/uploads").headers["Location"]
+        with open(path, "rb") as f:
+            offset = 0
+            for chunk in iter(lambda: f.read(CHUNK), b""):
+                digest.update(chunk)
+                client.patch(
+                    location, content=chunk,
+                    headers={"Content-Range": f"{offset}-{offset + len(chunk) - 1}"},
+                ).raise_for_status()
+                offset += len(chunk)
+        name = f"sha256:{digest.hexdigest()}"
+        client.put(location, params={"digest": name}).raise_for_status()
+    return name
+
+
+def fetch_range(url: str, first: int, last: int) -> bytes:
+    with httpx.Client(timeout=120) as client:
+        response = client.get(url, headers={"Range": f"bytes={first}-{last}"})
+        response.raise_for_status()
+        return response.content
+
+
+def download(url: str, size: int, parallel: int) -> bytes:
+    """Download in ``parallel`` byte ranges, or in one request if 1."""
+    if parallel == 1:
+        return httpx.get(url, timeout=120).content
+    step = -(-size // parallel)
+    with ThreadPoolExecutor(parallel) as pool:
+        parts = pool.map(
+            lambda first: fetch_range(url, first, min(first + step, size) - 1),
+            range(0, size, step),
+        )
+        return b"".join(parts)
+
+
+def run(size_mb: int, parallel: int) -> dict:
+    """Upload and download one artifact of ``size_mb`` MiB."""
+    size = size_mb * 1024 * 1024
+    with tempfile.TemporaryDirectory() as workdir:
+        artifact = os.path.join(workdir, "artifact.bin")
+        with open(artifact, "wb") as f:
+            for _ in range(0, size, CHUNK):
+                f.write(os.urandom(min(CHUNK, size - f.tell())))
+
+        process, url = start_server(workdir)
+        try:
+            server = psutil.Process(process.pid)
+            start = time.perf_counter()
+            digest = upload(url, artifact)
+            upload_s = time.perf_counter() - start
+
+            results = {"size_mb": size_mb, "upload_mb_s": round(size_mb / upload_s)}
+            for streams in sorted({1, parallel}):
+                rss_before = server.memory_info().rss
+                start = time.perf_counter()
+                body = download(f"{url}/api/v1/blobs/{digest}", size, streams)
+                elapsed = time.perf_counter() - start
+                assert f"sha256:{hashlib.sha256(body).hexdigest()}" == digest
+                results[f"download_{streams}_streams"] = {
+                    "mb_s": round(size_mb / elapsed),
+                    "server_rss_growth_mb": round(
+                        (server.memory_info().rss - rss_before) / 2**20, 1
+                    ),
+                }
+            return results
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--parallel", type=int, default=4)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    results = run(args.size_mb, args.parallel)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Benchmark the node and deployment list endpoints with and without the
+fast serialization path.
+
+Seeds an in-memory SQLite database with N nodes and N deployments, then
+times ``GET /api/v1/nodes`` and ``GET /api/v1/deployments`` end to end
+through the ASGI app, first with response model validation and then with
+``FAST_SERIALIZATION`` enabled.
+
+Example:
+    cd control-plane
+    python benchmarks/bench_serialization.py --rows 10000 --repeat 20
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep the slow request log from reporting every benchmark request
+os.environ.setdefault("SLOW_REQUEST_THRESHOLD_MS", "600000")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import serialization
+from app.db.database import Base, get_db
+from app.db.models import DeploymentDB, NodeDB
+from app.main import app
+
+ENDPOINTS = ("/api/v1/nodes", "/api/v1/deployments")
+
+
+def seed(engine, rows: int) -> None:
+    """Insert ``rows`` nodes and deployments with realistic capabilities."""
+    now = time.time()
+    with engine.begin() as conn:
+        conn.execute(insert(NodeDB), [
+            {
+                "id": f"node-{i:06d}",
+                "name": f"worker-{i:06d}",
+                "ip": f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}",
+                "capabilities": {
+                    "os": "linux",
+                    "cpu_count": 16,
+                    "mem_mb": 65536,
+                    "disk_mb": 500000,
+                    "gpus": [{"id": 0, "vendor": "nvidia", "model": "NVIDIA A100", "mem_mb": 81920}],
+                    "docker": {"available": True, "version": "24.0.7"},
+                    "disks": [{"mountpoint": "/", "fstype": "ext4", "total_mb": 500000, "ssd": True}],
+                    "fingerprint": f"{i:016x}",
+                    "metrics": {"cpu_usage": 12.5, "mem_usage": 40.2, "disk_free_mb": 250000,
+                                "running_containers": ["postgres", "redis"]},
+                },
+                "last_seen": now,
+                "status": "online",
+                "resource_version": i + 1,
+            }
+            for i in range(rows)
+        ])
+        conn.execute(insert(DeploymentDB), [
+            {
+                "id": f"deploy-{i:06d}",
+                "node_id": f"node-{i:06d}",
+                "template_id": "postgres",
+                "rendered_compose": "services: {}",
+                "env": {},
+                "status": "running",
+                "action": "apply",
+                "resource_version": rows + i + 1,
+            }
+            for i in range(rows)
+        ])
+
+
+def time_endpoint(client: TestClient, url: str, repeat: int) -> dict:
+    """Time ``repeat`` requests after one warm-up request."""
+    response = client.get(url)
+    response.raise_for_status()
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        client.get(url)
+        durations.append(time.perf_counter() - start)
+    durations.sort()
+    return {
+        "median_ms": round(statistics.median(durations) * 1000, 2),
+        "p90_ms": round(durations[int(len(durations) * 0.9) - 1] * 1000, 2),
+        "bytes": len(response.content),
+    }
+
+
+def run(rows: int, repeat: int) -> dict:
+    """Seed a database and benchmark both serialization paths."""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    seed(engine, rows)
+    client = TestClient(app)
+
+    results = {"rows": rows, "repeat": repeat, "orjson": serialization.orjson is not None}
+    for url in ENDPOINTS:
+        serialization.FAST_SERIALIZATION = False
+        validated = time_endpoint(client, url, repeat)
+        serialization.FAST_SERIALIZATION = True
+        fast = time_endpoint(client, url, repeat)
+        results[url] = {
+            "validated": validated,
+            "fast": fast,
+            "speedup": round(validated["median_ms"] / fast["median_ms"], 2),
+        }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    results = run(args.rows, args.repeat)
+    for url in ENDPOINTS:
+        r = results[url]
+        print(
+            f"{url} ({args.rows} rows): validated {r['validated']['median_ms']}ms, "
+            f"fast {r['fast']['median_ms']}ms, speedup {r['speedup']}x"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""Benchmark control plane cold starts and warm restarts from a snapshot.
+
+Reports:
+
+- import time of ``app.main`` in a fresh interpreter, split into third-party
+  dependencies and the application's own modules
+- time from process start to the first healthy ``GET /health`` under
+  uvicorn, for a cold start and for a warm restart from a change log
+  snapshot (``SNAPSHOT_PATH``)
+- whether a watch started before the restart can resume afterwards, or must
+  relist (``ERROR`` event with code 410)
+
+Each run uses a fresh SQLite database in a temporary directory. Before the
+restarts, ``--nodes`` nodes are registered so the change log has events to
+snapshot.
+
+Example:
+    cd control-plane
+    python benchmarks/bench_startup.py --nodes 1000 --repeat 5
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_PROBE = """
+import time
+start = time.perf_counter()
+import fastapi, fastapi.responses, pydantic, sqlalchemy, sqlalchemy.orm, jwt
+deps = time.perf_counter()
+import app.main
+print(deps - start, time.perf_counter() - deps)
+"""
+
+
+def import_times(repeat: int) -> dict:
+    """Median import time of dependencies and application modules, in ms."""
+    deps, own = [], []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", IMPORT_PROBE],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.split()
+        deps.append(float(out[0]))
+        own.append(float(out[1]))
+    return {
+        "dependencies_ms": round(statistics.median(deps) * 1000, 1),
+        "app_ms": round(statistics.median(own) * 1000, 1),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _request(url: str, data=None, timeout: float = 5.0):
+    request = urllib.request.Request(
+        url, data=data, headers={"Content-Type": "application/json"}
+    )
+    return urllib.request.urlopen(request, timeout=timeout)
+
+
+class Server:
+    """A uvicorn control plane process."""
+
+    def __init__(self, workdir: str, snapshot: bool):
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'cp.db')}",
+            SNAPSHOT_PATH=os.path.join(workdir, "cp.snapshot") if snapshot else "",
+            REGISTRATION_RATE="0",
+        )
+        self.started = time.perf_counter()
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app",
+             "--port", str(self.port), "--log-level", "warning"],
+            cwd=ROOT, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+
+    def wait_healthy(self, timeout: float = 60.0) -> float:
+        """Poll ``/health`` and return seconds from process start until healthy."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                with _request(f"{self.url}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - self.started
+            except (urllib.error.URLError, ConnectionError, OSError):
+                time.sleep(0.005)
+        raise RuntimeError("control plane did not become healthy")
+
+    def stop(self) -> None:
+        """Stop gracefully, which writes the final snapshot."""
+        self.process.terminate()
+        self.process.wait(timeout=30)
+
+
+def watch_resumes(url: str, resource_version: int) -> bool:
+    """Whether a watch from ``resource_version`` streams events without a 410."""
+    with _request(
+        f"{url}/api/v1/nodes?watch=1&resourceVersion={resource_version}&timeoutSeconds=1"
+    ) as response:
+        first = json.loads(response.readline())
+    return first["type"] != "ERROR"
+
+
+def restart_times(nodes: int, repeat: int) -> dict:
+    """Time-to-healthy for cold starts and warm restarts, in ms."""
+    results = {}
+    for snapshot in (False, True):
+        label = "warm" if snapshot else "cold"
+        durations, resumed = [], []
+        for _ in range(repeat):
+            with tempfile.TemporaryDirectory() as workdir:
+                server = Server(workdir, snapshot)
+                server.wait_healthy()
+                for i in range(nodes):
+                    _request(f"{server.url}/api/v1/nodes/register", json.dumps({
+                        "name": f"bench-{i:05d}", "ip": "10.0.0.1",
+                        "capabilities": {"os": "linux", "cpu_count": 4,
+                                         "mem_mb": 8000, "gpus": []},
+                    }).encode()).close()
+                with _request(f"{server.url}/api/v1/nodes") as response:
+                    resource_version = int(response.headers["X-Resource-Version"])
+                server.stop()
+
+                restarted = Server(workdir, snapshot)
+                durations.append(restarted.wait_healthy())
+                resumed.append(watch_resumes(restarted.url, resource_version - nodes // 2))
+                restarted.stop()
+        results[label] = {
+            "time_to_healthy_ms": round(statistics.median(durations) * 1000, 1),
+            "watch_resumed": all(resumed),
+        }
+    return results
+
+
+def run(nodes: int, repeat: int) -> dict:
+    """Run all measurements."""
+    return {
+        "nodes": nodes,
+        "repeat": repeat,
+        "imports": import_times(repeat),
+        "restart": restart_times(nodes, repeat),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--nodes", type=int, default=1000,
+                        help="Nodes registered before each restart")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    results = run(args.nodes, args.repeat)
+    imports = results["imports"]
+    print(f"import app.main: dependencies {imports['dependencies_ms']}ms, "
+          f"application {imports['app_ms']}ms")
+    for label, r in results["restart"].items():
+        print(f"{label} start: healthy after {r['time_to_healthy_ms']}ms, "
+              f"watch resumed: {r['watch_resumed']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
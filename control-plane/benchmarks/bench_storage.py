@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Benchmark the node storage backends.
+
+Fills each backend with N nodes, then measures operations per second for
+lookups by name, lists filtered by status and by capability, and updates,
+first from one thread and then from several threads doing mixed reads and
+updates at once. The SQL backend runs against a SQLite file in a temporary
+directory, with one session per thread and a commit after every update.
+
+Example:
+    cd control-plane
+    python benchmarks/bench_storage.py --nodes 10000 --threads 8
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.database import Base
+from app.storage import MemoryStorage, SQLStorage, StripedStorage
+
+BACKENDS = ("sql", "memory", "striped")
+
+
+def make_node(i: int) -> dict:
+    """A node record; every tenth node has a GPU and every fifth is offline."""
+    return {
+        "id": f"node-{i:06d}",
+        "name": f"worker-{i:06d}",
+        "ip": f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}",
+        "capabilities": {
+            "os": "linux",
+            "cpu_count": 16,
+            "mem_mb": 65536,
+            "gpus": [{"id": 0, "model": "NVIDIA A100"}] if i % 10 == 0 else [],
+        },
+        "last_seen": time.time(),
+        "status": "offline" if i % 5 == 0 else "online",
+    }
+
+
+def opener(backend: str, tmpdir: str):
+    """Return a callable opening a storage handle for one thread."""
+    if backend == "sql":
+        engine = create_engine(
+            f"sqlite:///{os.path.join(tmpdir, 'bench.db')}",
+            connect_args={"check_same_thread": False, "timeout": 30},
+        )
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        return lambda: SQLStorage(session_factory())
+    shared = MemoryStorage() if backend == "memory" else StripedStorage()
+    return lambda: shared
+
+
+def operations(storage, nodes: int) -> dict:
+    """The measured operations, each taking a random generator."""
+    def update(rng):
+        storage.nodes.update(f"node-{rng.randrange(nodes):06d}", last_seen=time.time())
+        storage.commit()
+
+    return {
+        "get_by_name": lambda rng: storage.nodes.get_by_name(
+            f"worker-{rng.randrange(nodes):06d}"
+        ),
+        "list_by_status": lambda rng: storage.nodes.list(status="offline"),
+        "list_by_capability": lambda rng: storage.nodes.list(
+            status="online", capabilities={"gpus": True}
+        ),
+        "update": update,
+    }
+
+
+def ops_per_second(op, seconds: float, rng: random.Random) -> float:
+    """Run ``op`` repeatedly for about ``seconds`` and return its rate."""
+    count = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        op(rng)
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def run_backend(backend: str, nodes: int, threads: int, seconds: float) -> dict:
+    """Benchmark one backend single-threaded and under concurrent load."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        return _run_backend(opener(backend, tmpdir), nodes, threads, seconds)
+
+
+def _run_backend(open_storage, nodes: int, threads: int, seconds: float) -> dict:
+    storage = open_storage()
+    for i in range(nodes):
+        storage.nodes.put(make_node(i))
+    storage.commit()
+
+    results = {
+        name: round(ops_per_second(op, seconds, random.Random(1)))
+        for name, op in operations(storage, nodes).items()
+    }
+
+    # Mixed load: every thread looks nodes up by name and updates them
+    counts = [0] * threads
+
+    def worker(k):
+        rng = random.Random(k)
+        ops = operations(open_storage(), nodes)
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            ops["get_by_name"](rng)
+            ops["update"](rng)
+            counts[k] += 2
+
+    workers = [threading.Thread(target=worker, args=(k,)) for k in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    results[f"mixed_{threads}_threads"] = round(sum(counts) / (time.perf_counter() - start))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--nodes", type=int, default=10000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=1.0)
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    results = {"nodes": args.nodes, "threads": args.threads}
+    for backend in args.backends:
+        results[backend] = run_backend(backend, args.nodes, args.threads, args.seconds)
+        print(f"{backend}: " + ", ".join(
+            f"{name} {rate}/s" for name, rate in results[backend].items()
+        ))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
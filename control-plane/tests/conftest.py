@@ -5,9 +5,10 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
+from app.admission import registration_bucket
 from app.main import app
 from app.db.database import Base, get_db
-from app.db.models import NodeDB, DeploymentDB  # Import to register models
+from app.db.models import NodeDB, DeploymentDB, NodeMetricDB, ModelDB, NodeArtifactDB  # Import to register models
 
 
 # Use in-memory database with shared connection for tests
@@ -46,9 +47,13 @@ def setup_database():
         # Delete all records from tables
         db.query(DeploymentDB).delete()
         db.query(NodeDB).delete()
+        db.query(NodeMetricDB).delete()
+        db.query(ModelDB).delete()
+        db.query(NodeArtifactDB).delete()
         db.commit()
     finally:
         db.close()
+    registration_bucket.reset()
     yield
 
 
@@ -0,0 +1,83 @@
+"""Tests for registration admission control."""
+import pytest
+
+from app.admission import TokenBucket
+
+
+class FakeClock:
+    """Manually advanced monotonic clock."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _register(client, name):
+    return client.post('/api/v1/nodes/register', json={
+        "name": name,
+        "ip": "10.0.0.8",
+        "capabilities": {"os": "linux", "cpu_count": 1, "mem_mb": 512, "gpus": []},
+    })
+
+
+def test_bucket_admits_burst_then_refills():
+    """Test the burst is admitted at once and tokens refill at the rate."""
+    clock = FakeClock()
+    bucket = TokenBucket(rate=10, burst=3, clock=clock)
+
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve() > 0
+
+    clock.now = 1.0
+    assert bucket.reserve() == 0.0
+
+
+def test_rejected_requests_get_consecutive_slots():
+    """Test throttled clients are spread one token interval apart."""
+    clock = FakeClock()
+    bucket = TokenBucket(rate=10, burst=1, clock=clock)
+    bucket.reserve()
+
+    delays = [bucket.reserve() for _ in range(4)]
+
+    assert delays == pytest.approx([0.1, 0.2, 0.3, 0.4])
+
+
+def test_retry_after_is_capped():
+    """Test delays never exceed the configured maximum."""
+    bucket = TokenBucket(rate=1, burst=1, max_delay=2, clock=FakeClock())
+
+    delays = [bucket.reserve() for _ in range(10)]
+
+    assert max(delays) == 2
+
+
+def test_register_throttled_with_retry_after(client, monkeypatch):
+    """Test registrations over the limit get 429 and a Retry-After header."""
+    monkeypatch.setattr(
+        "app.admission.bucket.registration_bucket",
+        TokenBucket(rate=0.5, burst=2, clock=FakeClock()),
+    )
+
+    assert _register(client, "n1").status_code == 201
+    assert _register(client, "n2").status_code == 201
+    first = _register(client, "n3")
+    second = _register(client, "n4")
+
+    assert first.status_code == second.status_code == 429
+    assert first.headers["Retry-After"] == "2"
+    assert second.headers["Retry-After"] == "4"
+    metrics = client.get('/metrics').text
+    assert 'miaas_node_registrations_total{result="throttled"}' in metrics
+
+
+def test_zero_rate_disables_admission_control(client, monkeypatch):
+    """Test a rate of 0 admits every registration."""
+    monkeypatch.setattr(
+        "app.admission.bucket.registration_bucket",
+        TokenBucket(rate=0, burst=0, clock=FakeClock()),
+    )
+
+    assert all(_register(client, f"n{i}").status_code == 201 for i in range(5))
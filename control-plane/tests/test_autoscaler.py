@@ -0,0 +1,261 @@
+"""Unit tests for the inference replica autoscaler."""
+import time
+
+import pytest
+
+from app.db.models import ModelDB, NodeArtifactDB
+from app.inference import BatchPolicy, InferenceQueue
+from app.orchestrator import Autoscaler, ModelLoad, ScalingPolicy, desired_replicas, replicas_of
+from app.storage import open_storage
+from tests.conftest import TestingSessionLocal
+
+POLICY = ScalingPolicy(
+    queue_per_replica=32, target_latency=0.5, target_cpu=70, target_mem=80,
+    tolerance=0.1, up_cooldown=30, down_cooldown=90,
+)
+DIGEST = "sha256:" + "ab" * 32
+TICK = 15
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _add_model(min_replicas=1, max_replicas=4, model_id="model-1"):
+    db = TestingSessionLocal()
+    try:
+        db.add(ModelDB(
+            id=model_id, name="resnet", version=model_id, framework="onnx",
+            digest=DIGEST, size=1, min_replicas=min_replicas, max_replicas=max_replicas,
+        ))
+        db.commit()
+    finally:
+        db.close()
+    return model_id
+
+
+def _replicas(model_id="model-1"):
+    db = TestingSessionLocal()
+    try:
+        return replicas_of(open_storage(db, "sql"), model_id)
+    finally:
+        db.close()
+
+
+class FakeFleet:
+    """Online nodes that each run the batches of the replicas placed on them.
+
+    Every tick, a replica takes up to ``capacity`` requests from the queue
+    and its node reports CPU usage in proportion to the work done.
+    """
+
+    def __init__(self, queue, size, capacity, mem_mb=8000):
+        self.queue = queue
+        self.capacity = capacity
+        db = TestingSessionLocal()
+        try:
+            storage = open_storage(db, "sql")
+            for i in range(size):
+                storage.nodes.put({
+                    "id": f"node-{i}", "name": f"node-{i}", "ip": f"10.0.0.{i}",
+                    "capabilities": {"mem_mb": mem_mb - i, "metrics": {"cpu_usage": 5.0, "mem_usage": 40.0}},
+                    "last_seen": time.time(), "status": "online",
+                })
+            storage.commit()
+        finally:
+            db.close()
+
+    def tick(self, model_id):
+        db = TestingSessionLocal()
+        try:
+            storage = open_storage(db, "sql")
+            for replica in replicas_of(storage, model_id):
+                done = 0
+                while done < self.capacity:
+                    batch = self.queue.next_batch([model_id], holder=replica["node_id"])
+                    if batch is None:
+                        break
+                    self.queue.complete(batch.batch_id)
+                    done += len(batch.requests)
+                node = storage.nodes.get(replica["node_id"])
+                capabilities = dict(node["capabilities"])
+                capabilities["metrics"] = {"cpu_usage": 100.0 * done / self.capacity, "mem_usage": 40.0}
+                storage.nodes.update(replica["node_id"], capabilities=capabilities)
+            storage.commit()
+        finally:
+            db.close()
+
+
+def _drain(queue):
+    """Run every queued request at once."""
+    while True:
+        batch = queue.next_batch()
+        if batch is None:
+            return
+        queue.complete(batch.batch_id)
+
+
+def _report(node_id, cpu_usage):
+    db = TestingSessionLocal()
+    try:
+        storage = open_storage(db, "sql")
+        capabilities = dict(storage.nodes.get(node_id)["capabilities"])
+        capabilities["metrics"] = {"cpu_usage": cpu_usage, "mem_usage": 40.0}
+        storage.nodes.update(node_id, capabilities=capabilities)
+        storage.commit()
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def queue(clock):
+    return InferenceQueue(clock=clock)
+
+
+@pytest.fixture
+def autoscaler(queue, clock):
+    return Autoscaler(queue, policy=POLICY, session_factory=TestingSessionLocal,
+                      backend="sql", clock=clock)
+
+
+def test_desired_replicas_follow_busiest_signal():
+    """Test the replica count scales with the signal furthest above or below its target."""
+    assert desired_replicas(2, ModelLoad(64, 0.1), POLICY, maximum=8) == 2
+    assert desired_replicas(2, ModelLoad(96, 0.1), POLICY, maximum=8) == 3
+    assert desired_replicas(2, ModelLoad(0, 0.75), POLICY, maximum=8) == 3
+    assert desired_replicas(2, ModelLoad(0, 0.1, cpu_usage=105.0), POLICY, maximum=8) == 3
+    assert desired_replicas(2, ModelLoad(0, 0.1, mem_usage=120.0), POLICY, maximum=8) == 3
+    # Every signal must be low to scale down
+    assert desired_replicas(4, ModelLoad(0, 0.1, cpu_usage=35.0), POLICY, maximum=8) == 2
+    assert desired_replicas(4, ModelLoad(0, 0.1, cpu_usage=35.0, mem_usage=80.0), POLICY, maximum=8) == 4
+
+
+def test_desired_replicas_tolerance_and_bounds():
+    """Test small deviations change nothing, and counts stay within bounds and at most double."""
+    assert desired_replicas(4, ModelLoad(0, 0.1, cpu_usage=75.0), POLICY, maximum=8) == 4
+    assert desired_replicas(4, ModelLoad(0, 0.1, cpu_usage=66.0), POLICY, maximum=8) == 4
+    assert desired_replicas(2, ModelLoad(1000, 10.0), POLICY, maximum=8) == 4
+    assert desired_replicas(2, ModelLoad(1000, 10.0), POLICY, maximum=3) == 3
+    assert desired_replicas(2, ModelLoad(0, 0.0), POLICY, minimum=2, maximum=3) == 2
+    # Scaling from zero goes by queue depth alone
+    assert desired_replicas(0, ModelLoad(0, 0.0), POLICY, maximum=8) == 0
+    assert desired_replicas(0, ModelLoad(100, 3.0), POLICY, maximum=8) == 4
+
+
+def test_replicas_follow_load_curve(queue, clock, autoscaler):
+    """Test replicas rise with a load ramp, hold through the peak and fall back once it passes."""
+    model_id = _add_model(min_replicas=1, max_replicas=4)
+    fleet = FakeFleet(queue, size=6, capacity=40)
+    curve = [20] * 4 + [60] * 4 + [140] * 12 + [20] * 20
+    counts = []
+    for load in curve:
+        for i in range(load):
+            queue.submit(model_id, i, policy=BatchPolicy(8, 0.0))
+        fleet.tick(model_id)
+        autoscaler.run_once()
+        counts.append(len(_replicas(model_id)))
+        clock.now += TICK
+
+    assert counts[0] == 1
+    assert max(counts) == 4
+    peak = counts.index(4)
+    # Up during the ramp, never back down during the peak
+    assert peak < 12 and counts[:peak + 1] == sorted(counts[:peak + 1])
+    assert all(count == 4 for count in counts[peak:20])
+    # Down only after the load has stayed low for the down cooldown, and without flapping
+    assert counts[20 + POLICY.down_cooldown // TICK - 1] == 4
+    assert counts[20:] == sorted(counts[20:], reverse=True)
+    assert counts[-1] == 1
+    assert queue.depth(model_id) == 0
+
+
+def test_up_cooldown_limits_consecutive_scale_ups(queue, clock, autoscaler):
+    """Test a model does not scale up again within the up cooldown."""
+    model_id = _add_model(min_replicas=0, max_replicas=8)
+    FakeFleet(queue, size=8, capacity=40)
+    for i in range(64):
+        queue.submit(model_id, i)
+
+    assert autoscaler.run_once() == {model_id: 2}
+    clock.now += 10
+    assert autoscaler.run_once() == {}
+    clock.now += 20
+    assert autoscaler.run_once() == {model_id: 4}
+
+
+def test_scale_down_waits_for_sustained_low_load(queue, clock, autoscaler):
+    """Test brief dips keep replicas, and a sustained one removes the busiest first."""
+    model_id = _add_model(min_replicas=0, max_replicas=4)
+    FakeFleet(queue, size=3, capacity=40)
+    for i in range(96):
+        queue.submit(model_id, i)
+    assert autoscaler.run_once() == {model_id: 3}
+    _drain(queue)
+
+    clock.now += 60
+    assert autoscaler.run_once() == {}
+    # Load returns before the down cooldown passes
+    clock.now += 60
+    for i in range(96):
+        queue.submit(model_id, i)
+    assert autoscaler.run_once() == {}
+    _drain(queue)
+    _report("node-1", cpu_usage=60.0)
+
+    assert autoscaler.run_once() == {}
+    clock.now += 60
+    assert autoscaler.run_once() == {}
+    clock.now += 30
+    # Memory usage at half its target keeps two of three replicas
+    assert autoscaler.run_once() == {model_id: 2}
+    assert sorted(r["node_id"] for r in _replicas(model_id)) == ["node-0", "node-2"]
+
+
+def test_replicas_spread_over_nodes_holding_artifact_first(queue, autoscaler):
+    """Test replicas go one per node, nodes with the artifact cached first, until nodes run out."""
+    model_id = _add_model(min_replicas=0, max_replicas=8)
+    FakeFleet(queue, size=3, capacity=40)
+    db = TestingSessionLocal()
+    db.add(NodeArtifactDB(node_id="node-2", digest=DIGEST, size=1, last_used=0.0, reported_at=0.0))
+    db.commit()
+    db.close()
+    for i in range(64):
+        queue.submit(model_id, i)
+
+    assert autoscaler.run_once() == {model_id: 2}
+    replicas = _replicas(model_id)
+    assert [r["node_id"] for r in replicas].count("node-2") == 1
+    assert replicas[0]["env"] == {"ENGINE_MODELS": model_id}
+    assert replicas[0]["template_id"] == "inference-engine"
+
+    for i in range(200):
+        queue.submit(model_id, i)
+    autoscaler.clock = lambda: 2000.0
+    assert autoscaler.run_once() == {model_id: 3}
+    assert sorted(r["node_id"] for r in _replicas(model_id)) == ["node-0", "node-1", "node-2"]
+
+
+def test_archived_and_unscaled_models(queue, autoscaler):
+    """Test archived models lose their replicas, and models without max_replicas are left alone."""
+    model_id = _add_model(min_replicas=2, max_replicas=4)
+    _add_model(min_replicas=2, max_replicas=None, model_id="static")
+    FakeFleet(queue, size=3, capacity=40)
+    assert autoscaler.run_once() == {model_id: 2}
+
+    db = TestingSessionLocal()
+    db.query(ModelDB).filter(ModelDB.id == model_id).update({"status": "archived"})
+    db.commit()
+    db.close()
+
+    assert autoscaler.run_once() == {model_id: 0}
+    assert _replicas(model_id) == [] and _replicas("static") == []
+
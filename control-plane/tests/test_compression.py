@@ -0,0 +1,153 @@
+"""Tests for response compression and compressed request bodies."""
+import asyncio
+import gzip
+import json
+
+import pytest
+
+from app.compression import SUPPORTED_ENCODINGS, CompressionMiddleware, codecs, negotiate
+
+
+def _register_many(client, count):
+    for i in range(count):
+        client.post('/api/v1/nodes/register', json={
+            "name": f"gz-node-{i}",
+            "ip": f"10.0.2.{i}",
+            "capabilities": {"os": "linux", "cpu_count": 4, "mem_mb": 8000, "gpus": []},
+        })
+
+
+def test_negotiate_prefers_quality_then_server_order():
+    """Test Accept-Encoding negotiation."""
+    assert negotiate(None) is None
+    assert negotiate("br") is None
+    assert negotiate("gzip, deflate") == "gzip"
+    assert negotiate("gzip;q=0") is None
+    assert negotiate("*") == SUPPORTED_ENCODINGS[0]
+    assert negotiate("*, gzip;q=0") == ("zstd" if "zstd" in SUPPORTED_ENCODINGS else None)
+
+
+def test_large_responses_are_compressed_when_accepted(client):
+    """Test node lists above the threshold are gzip-compressed on request."""
+    _register_many(client, 20)
+
+    compressed = client.get('/api/v1/nodes', headers={"Accept-Encoding": "gzip"})
+    plain = client.get('/api/v1/nodes', headers={"Accept-Encoding": "identity"})
+
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in compressed.headers["vary"]
+    assert int(compressed.headers["content-length"]) < len(plain.content)
+    assert "content-encoding" not in plain.headers
+    assert compressed.json() == plain.json()
+
+
+def test_small_responses_are_not_compressed(client):
+    """Test bodies below the threshold are sent as-is."""
+    response = client.get('/health', headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in response.headers
+    assert response.headers["accept-encoding"] == ", ".join(SUPPORTED_ENCODINGS)
+
+
+def test_gzip_registration_and_heartbeat_bodies(client):
+    """Test agents may send gzip-compressed registrations and heartbeats."""
+    registration = client.post(
+        '/api/v1/nodes/register',
+        content=gzip.compress(json.dumps({
+            "name": "gz-agent", "ip": "10.0.2.1",
+            "capabilities": {"os": "linux", "cpu_count": 2, "mem_mb": 4000, "gpus": []},
+        }).encode()),
+        headers={"Content-Type": "application/json", "Content-Encoding": "gzip"},
+    )
+    assert registration.status_code == 201
+    node_id, token = registration.json()["node_id"], registration.json()["node_token"]
+
+    heartbeat = client.post(
+        f'/api/v1/nodes/{node_id}/heartbeat',
+        content=gzip.compress(json.dumps({"cpu_usage": 12.5, "mem_usage": 40.0}).encode()),
+        headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+            "Content-Encoding": "gzip",
+        },
+    )
+    assert heartbeat.status_code == 200
+    node = client.get(f'/api/v1/nodes/{node_id}').json()
+    assert node["capabilities"]["metrics"]["cpu_usage"] == 12.5
+
+
+def test_bad_request_bodies_are_rejected(client):
+    """Test unsupported codings, corrupt bodies and decompression bombs."""
+    url = '/api/v1/nodes/register'
+    headers = {"Content-Type": "application/json"}
+
+    unsupported = client.post(url, content=b"{}", headers={**headers, "Content-Encoding": "br"})
+    assert unsupported.status_code == 415
+    assert unsupported.headers["accept-encoding"] == ", ".join(SUPPORTED_ENCODINGS)
+    assert client.post(
+        url, content=b"garbage", headers={**headers, "Content-Encoding": "gzip"}
+    ).status_code == 400
+    assert client.post(
+        url, content=gzip.compress(b"{}")[:-4], headers={**headers, "Content-Encoding": "gzip"}
+    ).status_code == 400
+    bomb = gzip.compress(b" " * (9 * 1024 * 1024))
+    assert client.post(
+        url, content=bomb, headers={**headers, "Content-Encoding": "gzip"}
+    ).status_code == 413
+
+
+@pytest.mark.skipif("zstd" not in SUPPORTED_ENCODINGS, reason="zstandard not installed")
+def test_zstd_round_trip(client):
+    """Test zstd is preferred and decoded when zstandard is installed."""
+    _register_many(client, 20)
+
+    response = client.get('/api/v1/nodes', headers={"Accept-Encoding": "gzip, zstd"})
+
+    assert response.headers["content-encoding"] == "zstd"
+    body = codecs.compress("zstd", b'{"a": 1}')
+    assert codecs.decompress("zstd", body, 100) == b'{"a": 1}'
+
+
+def test_zero_copy_file_sends_pass_through():
+    """Test a response sent with the zerocopysend extension still gets its start message."""
+    file_send = {"type": "http.response.zerocopysend", "file": 3, "offset": 0, "count": 4096}
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/octet-stream")]})
+        await send(file_send)
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", b"gzip")],
+             "extensions": {"http.response.zerocopysend": {}}}
+    asyncio.run(CompressionMiddleware(app)(scope, None, send))
+
+    assert [m["type"] for m in sent] == ["http.response.start", "http.response.zerocopysend"]
+    assert sent[0]["status"] == 200 and sent[1] == file_send
+
+
+@pytest.mark.parametrize("media_type", [b"text/event-stream", b"application/x-ndjson"])
+def test_event_stream_headers_sent_before_first_event(media_type):
+    """Test event stream headers are not held back until the first event."""
+    sent = []
+    sent_before_body = []
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", media_type)]})
+        sent_before_body.extend(m["type"] for m in sent)
+        await send({"type": "http.response.body", "body": b"x" * 4096, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", b"gzip")]}
+    asyncio.run(CompressionMiddleware(app)(scope, None, send))
+
+    assert sent_before_body == ["http.response.start"]
+    assert len(sent) == 3 and sent[1]["body"] == b"x" * 4096
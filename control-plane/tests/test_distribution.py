@@ -0,0 +1,262 @@
+"""Tests for the chunk tracker and peer-assisted artifact distribution."""
+import base64
+import hashlib
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import pytest
+
+from app.registry import (
+    ChunkTracker,
+    blob_store,
+    chunk_digests,
+    decode_bitfield,
+    sha256_digest,
+)
+
+AGENT_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "agent"
+)
+ARTIFACT = os.urandom(10 * 1024 * 1024 + 5)
+DIGEST = sha256_digest(ARTIFACT)
+CHUNK = 4 * 1024 * 1024
+
+
+def encode_bitfield(chunks, count):
+    """Base64 bitfield of the chunks held, out of ``count`` chunks, as agents send it."""
+    bits = bytearray((count + 7) // 8)
+    for index in chunks:
+        bits[index // 8] |= 0x80 >> (index % 8)
+    return base64.b64encode(bytes(bits)).decode()
+
+
+@pytest.fixture(autouse=True)
+def registry_dir(tmp_path, monkeypatch):
+    """Keep blobs in a temporary directory and start with an empty swarm."""
+    monkeypatch.setattr(blob_store, "root", str(tmp_path))
+    monkeypatch.setattr("app.api.v1.blobs.ARTIFACT_CHUNK_BYTES", CHUNK)
+    monkeypatch.setattr("app.api.v1.blobs.chunk_tracker", ChunkTracker())
+    return tmp_path
+
+
+def _store(data):
+    upload_id = blob_store.start_upload()
+    blob_store.append(upload_id, 0, [data])
+    return blob_store.finish(upload_id, sha256_digest(data))
+
+
+def _register(client, name):
+    """Register a node and return its auth headers."""
+    reg = client.post('/api/v1/nodes/register', json={
+        "name": name,
+        "ip": "10.0.0.9",
+        "capabilities": {"os": "linux", "cpu_count": 2, "mem_mb": 4000, "gpus": []},
+    }).json()
+    return {"Authorization": f'Bearer {reg["node_token"]}'}
+
+
+def test_tracker_lists_peers_except_asking_node():
+    """Test announced peers are listed with their bitfields."""
+    tracker = ChunkTracker()
+    tracker.announce(DIGEST, "a", "http://a:7070", b"\xc0")
+    tracker.announce(DIGEST, "b", "http://b:7070", b"\x80")
+    tracker.announce(DIGEST, "c", "http://c:7070", b"\x00", b"\x20")  # just started
+
+    assert tracker.peers(DIGEST, exclude="b") == [
+        ("a", "http://a:7070", b"\xc0", b""),
+        ("c", "http://c:7070", b"\x00", b"\x20"),
+    ]
+    assert tracker.withdraw(DIGEST, "a")
+    assert [p[0] for p in tracker.peers(DIGEST)] == ["b", "c"]
+
+
+def test_tracker_expires_silent_peers():
+    """Test peers that stop announcing drop out of the swarm."""
+    now = [100.0]
+    tracker = ChunkTracker(ttl=60, clock=lambda: now[0])
+    tracker.announce(DIGEST, "a", "http://a:7070", b"\xff")
+
+    now[0] += 61
+
+    assert tracker.peers(DIGEST) == []
+
+
+def test_announce_drops_expired_peers():
+    """Test announcing prunes silent peers even if the swarm is never listed."""
+    now = [100.0]
+    tracker = ChunkTracker(ttl=60, clock=lambda: now[0])
+    tracker.announce(DIGEST, "a", "http://a:7070", b"\xff")
+    tracker.announce(DIGEST, "b", "http://b:7070", b"\xff")
+
+    now[0] += 61
+    tracker.announce(DIGEST, "b", "http://b:7070", b"\xff")
+
+    assert list(tracker._swarms[DIGEST]) == ["b"]
+
+
+def test_bitfield_validation():
+    """Test bitfields must be base64 and cover exactly the chunks."""
+    assert decode_bitfield(encode_bitfield([0, 9], 10), 10) == b"\x80\x40"
+    with pytest.raises(ValueError):
+        decode_bitfield("not base64!", 10)
+    with pytest.raises(ValueError):
+        decode_bitfield(encode_bitfield([0], 8), 10)
+
+
+def test_chunk_digests_are_cached(registry_dir):
+    """Test chunk digests are computed once and kept next to the blobs."""
+    digest = _store(ARTIFACT)
+
+    digests = chunk_digests(blob_store, digest, CHUNK)
+
+    assert digests == [
+        hashlib.sha256(ARTIFACT[i:i + CHUNK]).hexdigest()
+        for i in range(0, len(ARTIFACT), CHUNK)
+    ]
+    manifests = list((registry_dir / "chunks").rglob("*"))
+    assert any(p.is_file() for p in manifests)
+    assert chunk_digests(blob_store, digest, CHUNK) == digests
+
+
+def test_chunk_manifest(client):
+    """Test the chunk size and chunk digests are published for each blob."""
+    _store(ARTIFACT)
+
+    manifest = client.get(f'/api/v1/blobs/{DIGEST}/chunks').json()
+
+    assert manifest["size"] == len(ARTIFACT)
+    assert manifest["chunk_size"] == CHUNK
+    assert manifest["chunks"][0] == hashlib.sha256(ARTIFACT[:CHUNK]).hexdigest()
+    assert len(manifest["chunks"]) == 3
+
+
+def test_swarm_requires_node_token(client):
+    """Test the tracker is only available to registered nodes."""
+    _store(ARTIFACT)
+
+    assert client.get(f'/api/v1/blobs/{DIGEST}/swarm').status_code == 401
+
+
+def test_announced_chunks_are_offered_to_other_nodes(client):
+    """Test a node's announcement shows up in other nodes' swarms."""
+    _store(ARTIFACT)
+    seeder, fetcher = _register(client, "seeder"), _register(client, "fetcher")
+
+    response = client.put(
+        f'/api/v1/blobs/{DIGEST}/swarm', headers=seeder,
+        json={"url": "http://10.0.0.9:7070", "have": encode_bitfield([0, 2], 3),
+              "fetching": encode_bitfield([1], 3)},
+    )
+    assert response.status_code == 200
+    assert response.json()["peers"] == []
+
+    # Announcing returns the other peers
+    response = client.put(
+        f'/api/v1/blobs/{DIGEST}/swarm', headers=fetcher,
+        json={"url": "http://10.0.0.8:7070", "have": encode_bitfield([], 3)},
+    )
+    assert [(p["url"], p["have"], p["fetching"]) for p in response.json()["peers"]] == [
+        ("http://10.0.0.9:7070", encode_bitfield([0, 2], 3), encode_bitfield([1], 3))
+    ]
+    assert [p["url"] for p in client.get(
+        f'/api/v1/blobs/{DIGEST}/swarm', headers=seeder
+    ).json()["peers"]] == ["http://10.0.0.8:7070"]
+
+    client.delete(f'/api/v1/blobs/{DIGEST}/swarm', headers=seeder)
+    assert client.get(f'/api/v1/blobs/{DIGEST}/swarm', headers=fetcher).json()["peers"] == []
+
+
+def test_announcement_with_wrong_bitfield_rejected(client):
+    """Test a bitfield not covering the artifact's chunks is refused."""
+    _store(ARTIFACT)
+    headers = _register(client, "seeder")
+
+    response = client.put(
+        f'/api/v1/blobs/{DIGEST}/swarm', headers=headers,
+        json={"url": "http://10.0.0.9:7070", "have": encode_bitfield([0], 20)},
+    )
+
+    assert response.status_code == 400
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _registry_bytes_sent(url):
+    for line in httpx.get(f"{url}/metrics").text.splitlines():
+        if line.startswith("miaas_registry_blob_bytes_sent_total "):
+            return float(line.split()[1])
+    return 0.0
+
+
+@pytest.mark.skipif(not os.path.isdir(AGENT_DIR), reason="agent sources not available")
+def test_agent_processes_share_an_artifact(tmp_path):
+    """Test agents on loopback fetch an artifact mostly from each other."""
+    cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{tmp_path / 'cp.db'}",
+        REGISTRY_DIR=str(tmp_path / "registry"),
+        ARTIFACT_CHUNK_BYTES=str(64 * 1024),
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    agents = []
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                if httpx.get(f"{url}/health").status_code == 200:
+                    break
+            except httpx.TransportError:
+                assert time.monotonic() < deadline, "control plane did not start"
+                time.sleep(0.05)
+        artifact = os.urandom(4 * 1024 * 1024)
+        location = httpx.post(f"{url}/api/v1/blobs/uploads").headers["Location"]
+        httpx.put(
+            f"{url}{location}", content=artifact,
+            params={"digest": sha256_digest(artifact)},
+        ).raise_for_status()
+
+        agent_env = dict(
+            os.environ, CONTROL_PLANE_URL=url, PEER_REFRESH_INTERVAL="0.05",
+        )
+        agents = [
+            subprocess.Popen(
+                [sys.executable, "peers.py", "fetch", sha256_digest(artifact),
+                 "--name", f"agent-{i}", "--port", "0", "--advertise-host", "127.0.0.1",
+                 "--dir", str(tmp_path / f"agent-{i}"), "--seed", "2"],
+                cwd=AGENT_DIR, env=agent_env, stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL, text=True,
+            )
+            for i in range(4)
+        ]
+        outputs = [agent.communicate(timeout=60)[0] for agent in agents]
+
+        peer_bytes = 0
+        for agent, output in zip(agents, outputs):
+            assert agent.returncode == 0
+            path, from_peers, _, _ = output.split()
+            with open(path, "rb") as f:
+                assert f.read() == artifact
+            peer_bytes += int(from_peers)
+        assert peer_bytes > 0
+        # Without peers the registry would have sent four full copies
+        assert _registry_bytes_sent(url) < 3 * len(artifact)
+    finally:
+        for agent in agents:
+            agent.kill()
+        server.terminate()
+        server.wait()
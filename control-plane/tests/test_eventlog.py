@@ -0,0 +1,206 @@
+"""Tests for the append-only deployment event log."""
+import os
+
+import pytest
+
+from app.eventlog import DELETE, PUT, UPDATE, DeploymentLog, SegmentLog
+from app.eventlog import deployments as eventlog_deployments
+from app.storage import LoggedStorage, MemoryStorage, dependencies, open_storage, project_deployments
+from tests.conftest import TestingSessionLocal
+
+
+def _deployment(deployment_id, status="pending"):
+    return {
+        "id": deployment_id,
+        "node_id": "unassigned",
+        "template_id": "postgres",
+        "rendered_compose": "services: {}",
+        "env": {},
+        "status": status,
+        "action": "apply",
+    }
+
+
+def _segment_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".seg"))
+
+
+def test_records_survive_reopen_across_segments(tmp_path):
+    """Test records are read back in order after rolling and reopening."""
+    log = SegmentLog(str(tmp_path), segment_bytes=64, fsync=False)
+    log.open()
+    for i in range(10):
+        assert log.append(b"record-%d" % i) == i + 1
+    log.close()
+
+    reopened = SegmentLog(str(tmp_path), segment_bytes=64, fsync=False)
+    assert reopened.open() == (0, None)
+
+    assert reopened.last_seq == 10
+    assert reopened.segments > 1
+    assert [p for _, p in reopened.read(after=7)] == [b"record-7", b"record-8", b"record-9"]
+    assert reopened.append(b"next") == 11
+
+
+def test_torn_tail_is_truncated(tmp_path):
+    """Test a partially written record is dropped on open."""
+    log = SegmentLog(str(tmp_path), segment_bytes=1 << 20, fsync=False)
+    log.open()
+    log.append(b"first")
+    log.append(b"second")
+    log.close()
+    path = tmp_path / _segment_files(tmp_path)[0]
+    size = path.stat().st_size
+    with open(path, "r+b") as f:
+        f.truncate(size - 3)
+
+    reopened = SegmentLog(str(tmp_path), segment_bytes=1 << 20, fsync=False)
+    reopened.open()
+
+    assert [p for _, p in reopened.read()] == [b"first"]
+    assert reopened.append(b"again") == 2
+
+
+def test_compaction_replaces_segments_with_snapshot(tmp_path):
+    """Test compaction keeps a snapshot and drops older segments."""
+    log = SegmentLog(str(tmp_path), segment_bytes=32, fsync=False)
+    log.open()
+    for i in range(6):
+        log.append(b"record-%d" % i)
+
+    assert log.compact(b"state") == 6
+    log.append(b"after")
+    log.close()
+
+    assert len(_segment_files(tmp_path)) == 1
+    reopened = SegmentLog(str(tmp_path), segment_bytes=32, fsync=False)
+    assert reopened.open() == (6, b"state")
+    assert list(reopened.read(after=6)) == [(7, b"after")]
+
+
+def test_deployment_state_is_rebuilt_from_log(tmp_path):
+    """Test current state and history come back after a restart."""
+    log = DeploymentLog(str(tmp_path), segment_bytes=256, max_segments=3, fsync=False)
+    log.open()
+    log.record(PUT, "d1", _deployment("d1"))
+    log.record(PUT, "d2", _deployment("d2"))
+    log.record(UPDATE, "d1", {"status": "deleting", "action": "remove"})
+    log.record(DELETE, "d2")
+    log.close()
+
+    reopened = DeploymentLog(str(tmp_path), fsync=False)
+    reopened.open()
+
+    assert list(reopened.state) == ["d1"]
+    assert reopened.state["d1"]["status"] == "deleting"
+    assert [e["type"] for e in reopened.history("d1")] == [PUT, UPDATE]
+
+
+def test_log_compacts_after_max_segments(tmp_path):
+    """Test the log is compacted once it has too many segments."""
+    log = DeploymentLog(str(tmp_path), segment_bytes=200, max_segments=2, fsync=False)
+    log.open()
+    for i in range(20):
+        log.record(UPDATE if i else PUT, "d1", {"status": f"s{i}"} if i else _deployment("d1"))
+
+    assert len(_segment_files(tmp_path)) <= 2
+    assert log.state["d1"]["status"] == "s19"
+    log.close()
+    reopened = DeploymentLog(str(tmp_path), fsync=False)
+    reopened.open()
+    assert reopened.state == log.state
+
+
+def test_memory_storage_is_projected_from_log(tmp_path):
+    """Test deployments survive a restart of an in-memory backend."""
+    log = DeploymentLog(str(tmp_path), fsync=False)
+    log.open()
+    storage = LoggedStorage(MemoryStorage(), log)
+    storage.deployments.put(_deployment("d1"))
+    storage.deployments.put(_deployment("d2"))
+    storage.deployments.update("d2", status="running")
+    storage.deployments.delete("d1")
+    log.close()
+
+    restarted = DeploymentLog(str(tmp_path), fsync=False)
+    restarted.open()
+    fresh = MemoryStorage()
+
+    assert project_deployments(restarted, fresh) == 1
+    assert [(d["id"], d["status"]) for d in fresh.deployments.list()] == [("d2", "running")]
+
+
+def test_new_log_adopts_stored_deployments(tmp_path):
+    """Test enabling the log keeps deployments that already exist."""
+    storage = MemoryStorage()
+    storage.deployments.put(_deployment("d1"))
+    log = DeploymentLog(str(tmp_path), fsync=False)
+    log.open()
+
+    assert project_deployments(log, storage) == 1
+    assert log.state["d1"]["template_id"] == "postgres"
+    assert storage.deployments.get("d1") is not None
+
+
+def test_shared_sql_rows_are_adopted_not_overwritten(tmp_path):
+    """Test a restart keeps deployments changed through other replicas in a shared database."""
+    log = DeploymentLog(str(tmp_path), fsync=False)
+    log.open()
+    db = TestingSessionLocal()
+    try:
+        storage = LoggedStorage(open_storage(db, "sql"), log)
+        for deployment_id in ("d1", "d3"):
+            storage.deployments.put(_deployment(deployment_id))
+        storage.commit()
+        # Another replica, with its own log, changes the shared rows
+        other = open_storage(db, "sql")
+        other.deployments.update("d1", status="running")
+        other.deployments.put(_deployment("d2"))
+        other.deployments.delete("d3")
+        other.commit()
+
+        assert project_deployments(log, storage) == 3
+        storage.commit()
+        stored = {d["id"]: d["status"] for d in open_storage(db, "sql").deployments.list()}
+        assert stored == {"d1": "running", "d2": "pending"}
+        assert {i: d["status"] for i, d in log.state.items()} == stored
+    finally:
+        db.close()
+        log.close()
+
+
+@pytest.fixture
+def open_log(tmp_path, monkeypatch):
+    """Open the global deployment log in a temporary directory."""
+    log = DeploymentLog(str(tmp_path), fsync=False)
+    log.open()
+    monkeypatch.setattr(dependencies, "deployment_log", log)
+    monkeypatch.setattr("app.api.v1.deployments.deployment_log", log)
+    yield log
+    log.close()
+
+
+def test_api_records_deployment_history(client, open_log):
+    """Test API changes are logged and served as history."""
+    client.post('/api/v1/deployments', json={
+        "deployment_id": "deploy-1",
+        "template_id": "postgres",
+        "rendered_compose": "services: {}",
+        "action": "apply",
+    })
+    client.delete('/api/v1/deployments/deploy-1')
+
+    response = client.get('/api/v1/deployments/deploy-1/history')
+
+    assert response.status_code == 200
+    events = response.json()
+    assert [e["type"] for e in events] == ["put", "update"]
+    assert events[0]["fields"]["status"] == "pending"
+    assert events[1]["fields"] == {"status": "deleting", "action": "remove"}
+    assert client.get('/api/v1/deployments/missing/history').status_code == 404
+
+
+def test_history_requires_log(client):
+    """Test history is unavailable when the log is disabled."""
+    assert not eventlog_deployments.deployment_log.is_open
+    assert client.get('/api/v1/deployments/deploy-1/history').status_code == 404
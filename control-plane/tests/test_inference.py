@@ -0,0 +1,684 @@
+"""Tests for the inference request queue, dynamic batching and result store."""
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from app.inference import (
+    COMPLETED,
+    FAILED,
+    BatchPolicy,
+    DeadlineInfeasible,
+    InferenceCache,
+    InferenceQueue,
+    InferenceRouter,
+    QueueFull,
+    ResultStore,
+)
+from app.api.v1 import inference as inference_api
+from app.api.v1.inference import fail_missed
+from app.registry import blob_store, sha256_digest
+
+ARTIFACT = os.urandom(1024)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def fresh_inference(tmp_path, monkeypatch):
+    """Start every test with empty queues, results and cache, and a temporary registry."""
+    monkeypatch.setattr(blob_store, "root", str(tmp_path))
+    queue = InferenceQueue(lease=30, clock=FakeClock(), on_missed=fail_missed)
+    cache = InferenceCache()
+    monkeypatch.setattr("app.api.v1.inference.inference_queue", queue)
+    monkeypatch.setattr("app.api.v1.inference.result_store", ResultStore())
+    monkeypatch.setattr("app.api.v1.inference.inference_cache", cache)
+    monkeypatch.setattr("app.api.v1.models.inference_cache", cache)
+    return queue
+
+
+def _register_model(client, **policy):
+    upload_id = blob_store.start_upload()
+    blob_store.append(upload_id, 0, [ARTIFACT])
+    blob_store.finish(upload_id, sha256_digest(ARTIFACT))
+    response = client.post('/api/v1/models', json={
+        "name": "iris", "version": str(len(policy)), "framework": "sklearn",
+        "digest": sha256_digest(ARTIFACT), **policy,
+    })
+    assert response.status_code == 201
+    return response.json()
+
+
+def _register_node(client, name="engine-01", with_id=False):
+    reg = client.post('/api/v1/nodes/register', json={
+        "name": name,
+        "ip": "10.0.0.9",
+        "capabilities": {"os": "linux", "cpu_count": 2, "mem_mb": 4000, "gpus": []},
+    }).json()
+    headers = {"Authorization": f'Bearer {reg["node_token"]}'}
+    return (reg["node_id"], headers) if with_id else headers
+
+
+def test_batch_flushes_when_full():
+    """Test a full queue is handed out at once, up to the batch size."""
+    clock = FakeClock()
+    queue = InferenceQueue(clock=clock)
+    policy = BatchPolicy(max_batch_size=3, max_wait=10.0)
+    for i in range(4):
+        queue.submit("m", i, policy=policy)
+
+    batch = queue.next_batch()
+
+    assert [r.input_data for r in batch.requests] == [0, 1, 2]
+    assert queue.depth("m") == 1
+    # The remaining request waits for more or for its max wait
+    assert queue.next_batch() is None
+    clock.now += 10
+    assert [r.input_data for r in queue.next_batch().requests] == [3]
+
+
+def test_batch_flushes_after_max_wait():
+    """Test a partial batch is handed out once its oldest request waited long enough."""
+    clock = FakeClock()
+    queue = InferenceQueue(clock=clock)
+    queue.submit("m", "a", policy=BatchPolicy(8, 0.05))
+    clock.now += 0.01
+    queue.submit("m", "b")
+
+    assert queue.next_batch() is None
+    clock.now += 0.04
+    assert [r.input_data for r in queue.next_batch().requests] == ["a", "b"]
+
+
+def test_policies_are_per_model():
+    """Test each model batches by its own policy and engines get their models only."""
+    clock = FakeClock()
+    queue = InferenceQueue(clock=clock)
+    queue.submit("fast", 1, policy=BatchPolicy(1, 1.0))
+    queue.submit("slow", 2, policy=BatchPolicy(64, 1.0))
+
+    assert queue.next_batch(["slow"]) is None
+    assert queue.next_batch(["slow", "fast"]).model_id == "fast"
+
+
+def test_oldest_ready_queue_goes_first():
+    """Test the ready queue whose oldest request waited longest is served first."""
+    clock = FakeClock()
+    queue = InferenceQueue(clock=clock)
+    queue.submit("b", 1, policy=BatchPolicy(8, 0.0))
+    clock.now += 1
+    queue.submit("a", 2, policy=BatchPolicy(8, 0.0))
+
+    assert [queue.next_batch().model_id for _ in range(2)] == ["b", "a"]
+
+
+def test_waiting_engine_wakes_on_flush():
+    """Test an engine blocked on the queue gets the batch once its wait is over."""
+    queue = InferenceQueue()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(queue.next_batch(timeout=5)))
+    waiter.start()
+    time.sleep(0.05)
+    start = time.monotonic()
+    queue.submit("m", "x", policy=BatchPolicy(8, 0.1))
+    waiter.join(5)
+
+    assert got[0].requests[0].input_data == "x"
+    assert 0.09 <= time.monotonic() - start < 1
+
+
+def test_async_waiters_hold_no_threads():
+    """Test many engines wait on one event loop and each is woken with a batch."""
+    queue = InferenceQueue()
+
+    async def scenario():
+        waiters = [asyncio.ensure_future(queue.wait_batch(timeout=5, holder=f"node-{i}")) for i in range(50)]
+        await asyncio.sleep(0.05)
+        assert not any(waiter.done() for waiter in waiters)
+        threading.Thread(
+            target=lambda: [queue.submit("m", i, policy=BatchPolicy(1, 0.0)) for i in range(50)]
+        ).start()
+        return await asyncio.wait_for(asyncio.gather(*waiters), 5)
+
+    batches = asyncio.run(scenario())
+
+    assert sorted(batch.requests[0].input_data for batch in batches) == list(range(50))
+    assert asyncio.run(queue.wait_batch(timeout=0.05)) is None
+
+
+def test_expired_lease_requeues_requests():
+    """Test a batch whose results never arrive is handed out again."""
+    clock = FakeClock()
+    queue = InferenceQueue(lease=30, clock=clock)
+    request = queue.submit("m", "x", policy=BatchPolicy(1, 0.0))
+    first = queue.next_batch(holder="node-1")
+    assert queue.status(request.request_id) == "processing"
+
+    clock.now += 31
+    second = queue.next_batch(holder="node-2")
+
+    assert second.requests == first.requests
+    assert queue.complete(first.batch_id) is None
+    assert queue.complete(second.batch_id) is second
+    assert queue.status(request.request_id) is None
+
+
+def test_submit_lease_and_fetch_result(client):
+    """Test a request goes from queued through a batch to completed."""
+    model = _register_model(client, max_batch_size=2, max_batch_wait_ms=5000)
+    headers = _register_node(client)
+    ids = [
+        client.post('/api/v1/inference', json={
+            "model_id": model["id"], "input_data": {"x": i},
+        }).json()["request_id"]
+        for i in range(3)
+    ]
+    assert client.get(f'/api/v1/inference/{ids[0]}').json()["status"] == "queued"
+
+    batch = client.post('/api/v1/inference/batches', headers=headers, json={
+        "models": [model["id"]],
+    }).json()
+
+    assert [item["input_data"] for item in batch["requests"]] == [{"x": 0}, {"x": 1}]
+    assert batch["digest"] == model["digest"] and batch["framework"] == "sklearn"
+    assert client.get(f'/api/v1/inference/{ids[0]}').json()["status"] == "processing"
+
+    response = client.post(f'/api/v1/inference/batches/{batch["batch_id"]}/results', headers=headers, json={
+        "results": [
+            {"request_id": ids[0], "result": {"y": 0}},
+            {"request_id": ids[1], "error": "bad input"},
+        ],
+    })
+    assert response.status_code == 204
+
+    done = client.get(f'/api/v1/inference/{ids[0]}').json()
+    assert done["status"] == "completed" and done["result"] == {"y": 0}
+    assert client.get(f'/api/v1/inference/{ids[1]}').json()["status"] == "failed"
+    assert client.get(f'/api/v1/inference/{ids[2]}').json()["status"] == "queued"
+
+
+def test_model_batching_policy(client):
+    """Test models report their batching policy, defaults included, and can change it."""
+    model = _register_model(client)
+    assert model["max_batch_size"] == 8 and model["max_batch_wait_ms"] == 10
+
+    updated = client.put(f'/api/v1/models/{model["id"]}', json={"max_batch_size": 32}).json()
+
+    assert updated["max_batch_size"] == 32
+
+
+def test_no_batch_ready_returns_204(client):
+    """Test an engine asking with nothing queued gets no content."""
+    headers = _register_node(client)
+
+    assert client.post('/api/v1/inference/batches', headers=headers, json={}).status_code == 204
+    assert client.post('/api/v1/inference/batches', json={}).status_code == 401
+
+
+def test_results_only_from_lease_holder(client, fresh_inference):
+    """Test another node cannot return a batch's results, nor anyone after the lease."""
+    model = _register_model(client, max_batch_size=1)
+    holder, other = _register_node(client, "engine-01"), _register_node(client, "engine-02")
+    client.post('/api/v1/inference', json={"model_id": model["id"], "input_data": 1})
+    batch = client.post('/api/v1/inference/batches', headers=holder, json={}).json()
+    url = f'/api/v1/inference/batches/{batch["batch_id"]}/results'
+
+    assert client.post(url, headers=other, json={"results": []}).status_code == 403
+
+    fresh_inference.clock.now += 31
+    assert client.post(url, headers=holder, json={"results": []}).status_code == 409
+
+
+def test_unknown_and_archived_models_rejected(client):
+    """Test requests for missing or archived models are refused."""
+    model = _register_model(client)
+    client.delete(f'/api/v1/models/{model["id"]}')
+
+    assert client.post('/api/v1/inference', json={"model_id": "nope", "input_data": 1}).status_code == 404
+    assert client.post('/api/v1/inference', json={"model_id": model["id"], "input_data": 1}).status_code == 409
+    assert client.get('/api/v1/inference/unknown').status_code == 404
+
+
+def test_results_expire_after_ttl():
+    """Test results are dropped once older than the TTL, oldest first."""
+    clock = FakeClock()
+    results = ResultStore(ttl=60, clock=clock)
+    results.put("a", COMPLETED, result=1)
+    clock.now += 30
+    results.put("b", FAILED, error="boom")
+
+    clock.now += 31
+    assert results.get("a") is None
+    assert results.get("b").error == "boom"
+    clock.now += 30
+    assert len(results) == 0
+
+
+def test_memory_bound_drops_oldest_results():
+    """Test results over the memory bound are dropped oldest first without a spill directory."""
+    results = ResultStore(max_bytes=250)
+    for request_id in "abc":
+        results.put(request_id, COMPLETED, result="x" * 100)
+
+    assert results.get("a") is None
+    assert results.get("b") is not None and results.get("c") is not None
+    assert results.memory_bytes == 204
+
+
+def test_large_results_spill_to_disk(tmp_path):
+    """Test large results and results pushed out of memory go to disk, within its bound."""
+    results = ResultStore(max_bytes=250, spill_dir=str(tmp_path), spill_min_bytes=1000,
+                          spill_max_bytes=1200)
+    big = results.put("big", COMPLETED, result="y" * 1000)
+    for request_id in "abc":
+        results.put(request_id, COMPLETED, result=request_id * 100)
+
+    assert big.spilled and results.get("a").spilled
+    assert not results.get("c").spilled
+    assert results.memory_bytes == 204 and results.spilled_bytes == 1002 + 102
+    assert b'"result":"' + b"y" * 1000 in results.get("big").encode()
+
+    # Spilling another result overflows the disk bound: the oldest spilled goes
+    results.put("d", COMPLETED, result="d" * 100)
+    assert results.get("big") is None
+    assert len(os.listdir(tmp_path)) == 2
+
+    results.put("b", COMPLETED, result="again")
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_wait_wakes_when_result_stored():
+    """Test a waiter is woken by a result stored from another thread, and times out otherwise."""
+    results = ResultStore()
+
+    async def scenario():
+        threading.Timer(0.05, results.put, ("r", COMPLETED), {"result": 7}).start()
+        start = time.monotonic()
+        found = await results.wait("r", timeout=5)
+        elapsed = time.monotonic() - start
+        missing = await results.wait("other", timeout=0.05)
+        return found, elapsed, missing
+
+    found, elapsed, missing = asyncio.run(scenario())
+
+    assert found.status == COMPLETED and elapsed < 1
+    assert missing is None
+
+
+def test_get_waits_for_result(client):
+    """Test ?wait= returns as soon as results are posted, or the status once it runs out."""
+    model = _register_model(client, max_batch_size=1)
+    headers = _register_node(client)
+    request_id = client.post('/api/v1/inference', json={
+        "model_id": model["id"], "input_data": 1,
+    }).json()["request_id"]
+    batch = client.post('/api/v1/inference/batches', headers=headers, json={}).json()
+
+    assert client.get(f'/api/v1/inference/{request_id}?wait=50ms').json()["status"] == "processing"
+
+    url = f'/api/v1/inference/batches/{batch["batch_id"]}/results'
+    poster = threading.Timer(0.1, client.post, (url,), {
+        "headers": headers, "json": {"results": [{"request_id": request_id, "result": [2]}]},
+    })
+    poster.start()
+    start = time.monotonic()
+    done = client.get(f'/api/v1/inference/{request_id}?wait=10s').json()
+    poster.join()
+
+    assert done["status"] == "completed" and done["result"] == [2]
+    assert time.monotonic() - start < 5
+
+
+def test_invalid_wait_rejected(client):
+    """Test a wait that is not a duration is refused."""
+    assert client.get('/api/v1/inference/anything?wait=soon').status_code == 400
+    assert client.get('/api/v1/inference/anything?wait=-1s').status_code == 400
+
+
+WARM = "sha256:" + "aa" * 32
+
+
+def _router(clock):
+    router = InferenceRouter(affinity_wait=1.0, clock=clock)
+    router.track("m", WARM)
+    return router
+
+
+def test_router_tiers():
+    """Test warm nodes wait for nobody, and cold ones for warm nodes, then for less loaded nodes."""
+    router = _router(FakeClock())
+    router.report("warm", [WARM], workers=2, cpu_usage=90)
+    router.report("idle", [], workers=2, cpu_usage=10)
+    router.report("busy", [], workers=2, cpu_usage=80)
+
+    assert router.delay("warm", "m", {}) == 0
+    assert router.delay("idle", "m", {}) == 1
+    assert router.delay("busy", "m", {}) == 2
+    assert router.delay("unknown", "m", {}) == 2
+    # With the warm node's workers all leased, the least loaded cold node goes first
+    assert router.delay("idle", "m", {"warm": 2}) == 0
+    assert router.delay("busy", "m", {"warm": 2}) == 1
+    # Leases count towards the load score
+    assert router.delay("idle", "m", {"warm": 2, "idle": 2}) == 1
+    assert router.delay("busy", "m", {"warm": 2, "idle": 2}) == 0
+    # Models and nodes the router knows nothing about are not held back
+    assert router.delay("idle", "other-model", {}) == 0
+
+
+def test_router_forgets_stale_reports():
+    """Test reports older than the offline timeout no longer hold batches back."""
+    clock = FakeClock()
+    router = _router(clock)
+    router.stale_after = 60
+    router.report("warm", [WARM], workers=2)
+    router.report("cold", [], workers=2)
+    assert router.delay("cold", "m", {}) == 1
+
+    clock.now += 30
+    router.report("cold", [], workers=2)
+    clock.now += 31
+
+    assert router.delay("cold", "m", {}) == 0
+
+
+def test_ready_batch_waits_for_warm_engine():
+    """Test a cold engine only gets a ready batch once warm engines had their chance."""
+    clock = FakeClock()
+    router = _router(clock)
+    router.report("warm", [WARM], workers=1)
+    router.report("cold", [], workers=1)
+    queue = InferenceQueue(clock=clock, router=router)
+    queue.submit("m", 1, policy=BatchPolicy(1, 0.0))
+
+    assert queue.next_batch(holder="cold") is None
+    assert queue.next_batch(holder="warm").model_id == "m"
+
+    # The warm engine is busy now, so the next batch goes to the cold one at once
+    queue.submit("m", 2)
+    batch = queue.next_batch(holder="cold")
+    assert batch is not None
+    # ...which has the model loaded from then on
+    queue.complete(batch.batch_id)
+    queue.submit("m", 3)
+    assert queue.next_batch(holder="cold") is not None
+
+
+def test_cold_engine_takes_batch_after_affinity_wait():
+    """Test a batch no warm engine takes goes to a cold engine after the affinity wait."""
+    clock = FakeClock()
+    router = _router(clock)
+    router.report("warm", [WARM], workers=1)
+    router.report("cold", [], workers=1)
+    queue = InferenceQueue(clock=clock, router=router)
+    queue.submit("m", 1, policy=BatchPolicy(4, 0.5))
+
+    clock.now += 1.4
+    assert queue.next_batch(holder="cold") is None
+    clock.now += 0.1
+    assert queue.next_batch(holder="cold").requests[0].input_data == 1
+
+
+def test_heartbeat_reports_engine_state(client, monkeypatch):
+    """Test engines' heartbeats route batches of their loaded models to them."""
+    clock = FakeClock()
+    router = InferenceRouter(affinity_wait=1.0, clock=clock)
+    queue = InferenceQueue(clock=clock, router=router)
+    monkeypatch.setattr("app.api.v1.inference.inference_queue", queue)
+    monkeypatch.setattr("app.api.v1.inference.inference_router", router)
+    monkeypatch.setattr("app.api.v1.nodes.inference_router", router)
+    model = _register_model(client, max_batch_size=1)
+    warm_id, warm = _register_node(client, "engine-01", with_id=True)
+    cold_id, cold = _register_node(client, "engine-02", with_id=True)
+    for node_id, headers, loaded in ((warm_id, warm, [model["digest"]]), (cold_id, cold, [])):
+        response = client.post(f'/api/v1/nodes/{node_id}/heartbeat', headers=headers, json={
+            "cpu_usage": 10.0, "inference": {"loaded": loaded, "workers": 2, "busy": 0, "queued": 0},
+        })
+        assert response.status_code == 200
+
+    client.post('/api/v1/inference', json={"model_id": model["id"], "input_data": 1})
+
+    assert client.post('/api/v1/inference/batches', headers=cold, json={}).status_code == 204
+    assert client.post('/api/v1/inference/batches', headers=warm, json={}).status_code == 200
+    node = client.get(f'/api/v1/nodes/{warm_id}').json()
+    assert node["capabilities"]["metrics"]["inference"]["loaded"] == [model["digest"]]
+
+
+def test_batch_latency():
+    """Test batch latency averages returned batches, shows backlogs and goes stale."""
+    clock = FakeClock()
+    queue = InferenceQueue(clock=clock)
+    queue.submit("m", 1, policy=BatchPolicy(1, 0.0))
+    batch = queue.next_batch()
+    clock.now += 1.0
+    queue.complete(batch.batch_id)
+    assert queue.latency("m") == 1.0
+
+    queue.submit("m", 2)
+    clock.now += 3.0
+    assert queue.latency("m") == 3.0
+    queue.complete(queue.next_batch().batch_id)
+    assert queue.latency("m") == pytest.approx(1.6)
+
+    clock.now += 60
+    assert queue.latency("m") == 0.0
+
+
+def test_cache_hits_coalesces_and_evicts():
+    """Test identical inputs share one request, then one result, until evicted or the digest changes."""
+    cache = InferenceCache(max_bytes=10)
+    started = iter(["r1", "r2", "r3", "r4", "r5"])
+    a = cache.key("m", "sha256:aa", {"x": 1, "y": 2}, {})
+    b = cache.key("m", "sha256:aa", {"x": 2}, {})
+
+    assert cache.key("m", "sha256:aa", {"y": 2, "x": 1}, {}) == a
+    assert cache.key("m", "sha256:aa", {"x": 1, "y": 2}, {"top_k": 1}) != a
+    assert cache.key("m", "sha256:bb", {"x": 1, "y": 2}, {}) != a
+    assert cache.resolve(a, lambda: next(started)) == ("r1", None)
+    assert cache.resolve(a, lambda: next(started)) == ("r1", None)
+    assert cache.resolve(b, lambda: next(started)) == ("r2", None)
+
+    cache.finish("r1", b"12345")
+    cache.finish("r2", None)
+    assert cache.resolve(a, lambda: next(started)) == (None, b"12345")
+    assert cache.resolve(b, lambda: next(started)) == ("r3", None)
+
+    # b's result pushes out a, the least recently used
+    cache.finish("r3", b"123456")
+    assert cache.resolve(b, lambda: next(started)) == (None, b"123456")
+    assert cache.resolve(a, lambda: next(started)) == ("r4", None)
+
+    # A new digest drops the model's results and running requests
+    assert cache.resolve(cache.key("m", "sha256:bb", {"x": 2}, {}), lambda: next(started)) == ("r5", None)
+    cache.finish("r4", b"1")
+    assert len(cache) == 0
+
+
+def test_identical_requests_share_result(client):
+    """Test identical requests run once and are answered from the cache until the model changes."""
+    model = _register_model(client, max_batch_size=4, max_batch_wait_ms=0)
+    headers = _register_node(client)
+    body = {"model_id": model["id"], "input_data": {"x": 1}}
+    first = client.post('/api/v1/inference', json=body).json()
+    second = client.post('/api/v1/inference', json=body).json()
+    assert second == first == {"request_id": first["request_id"], "status": "queued"}
+
+    batch = client.post('/api/v1/inference/batches', headers=headers, json={}).json()
+    assert [item["request_id"] for item in batch["requests"]] == [first["request_id"]]
+    client.post(f'/api/v1/inference/batches/{batch["batch_id"]}/results', headers=headers, json={
+        "results": [{"request_id": first["request_id"], "result": {"y": 2}}],
+    })
+
+    cached = client.post('/api/v1/inference', json=body).json()
+    assert cached["status"] == "completed" and cached["request_id"] != first["request_id"]
+    assert client.get(f'/api/v1/inference/{cached["request_id"]}').json()["result"] == {"y": 2}
+    assert client.post('/api/v1/inference', json={**body, "cache": False}).json()["status"] == "queued"
+
+    client.put(f'/api/v1/models/{model["id"]}', json={"max_batch_size": 8})
+    assert client.post('/api/v1/inference', json=body).json()["status"] == "queued"
+
+
+def test_failed_requests_are_not_cached(client):
+    """Test a failed request's input runs again when resubmitted."""
+    model = _register_model(client, max_batch_size=1)
+    headers = _register_node(client)
+    body = {"model_id": model["id"], "input_data": -1}
+    request_id = client.post('/api/v1/inference', json=body).json()["request_id"]
+    batch = client.post('/api/v1/inference/batches', headers=headers, json={}).json()
+    client.post(f'/api/v1/inference/batches/{batch["batch_id"]}/results', headers=headers, json={
+        "results": [{"request_id": request_id, "error": "negative input"}],
+    })
+
+    retry = client.post('/api/v1/inference', json=body).json()
+
+    assert retry["status"] == "queued" and retry["request_id"] != request_id
+
+
+def test_earliest_deadline_goes_first():
+    """Test batches take the earliest deadlines, across classes and across ready models."""
+    clock = FakeClock()
+    queue = InferenceQueue(clock=clock)
+    policy = BatchPolicy(2, 0.0)
+    queue.submit("m", "batch", policy=policy, priority="batch")
+    queue.submit("m", "standard", policy=policy)
+    queue.submit("m", "soon", policy=policy, deadline=5.0)
+    queue.submit("m", "interactive", policy=policy, priority="interactive")
+    queue.submit("other", "sooner", policy=policy, deadline=2.0)
+
+    assert [r.input_data for r in queue.next_batch().requests] == ["interactive", "soon"]
+    assert [r.input_data for r in queue.next_batch().requests] == ["sooner"]
+    assert [r.input_data for r in queue.next_batch().requests] == ["standard", "batch"]
+
+
+def test_class_shares_bound_queue():
+    """Test each class fills only its share of a model's queue, leaving room for more urgent ones."""
+    queue = InferenceQueue(clock=FakeClock(), max_queued=10)
+    for i in range(5):
+        queue.submit("m", i, priority="batch")
+
+    with pytest.raises(QueueFull):
+        queue.submit("m", 5, priority="batch")
+    for i in range(4):
+        queue.submit("m", i)
+    with pytest.raises(QueueFull):
+        queue.submit("m", 9)
+    queue.submit("m", 9, priority="interactive")
+    with pytest.raises(QueueFull):
+        queue.submit("m", 10, priority="interactive")
+    assert queue.depth("m") == 10
+
+
+def test_infeasible_deadlines_rejected_and_missed_ones_failed():
+    """Test requests that would finish late are refused, and queued ones that would are failed."""
+    clock = FakeClock()
+    missed = []
+    queue = InferenceQueue(clock=clock, on_missed=missed.append)
+    policy = BatchPolicy(2, 0.0)
+    # Batches of the model take 2s from lease to results
+    queue.submit("m", 0, policy=policy)
+    batch = queue.next_batch(holder="node-1")
+    clock.now += 2.0
+    queue.complete(batch.batch_id)
+
+    for name in ("a", "b"):
+        queue.submit("m", name, deadline=3.0)
+    # A third would wait for the second batch, done in 4s
+    with pytest.raises(DeadlineInfeasible) as refused:
+        queue.submit("m", "c", deadline=3.0)
+    assert refused.value.retry_after == 4.0
+    # An interactive request with the same deadline goes ahead of them
+    queue.submit("m", "i", priority="interactive", deadline=3.0)
+    queue.submit("m", "d", deadline=4.0)
+    assert [r.input_data for r in queue.next_batch(holder="node-1").requests] == ["i", "a"]
+
+    # b could no longer finish by its deadline
+    clock.now += 1.5
+    assert [r.input_data for r in queue.next_batch(holder="node-2").requests] == ["d"]
+    assert [r.input_data for r in missed] == ["b"]
+    assert queue.status(missed[0].request_id) is None
+
+
+def test_admission_errors_through_api(client, fresh_inference):
+    """Test full queues answer 429 and infeasible deadlines 503, and missed requests fail."""
+    fresh_inference.max_queued = 2
+    model = _register_model(client, max_batch_size=1)
+    headers = _register_node(client)
+    body = {"model_id": model["id"], "priority": "batch"}
+    assert client.post('/api/v1/inference', json={**body, "input_data": 1}).status_code == 202
+    full = client.post('/api/v1/inference', json={**body, "input_data": 2})
+    assert full.status_code == 429 and full.headers["Retry-After"] == "1"
+    unknown = client.post('/api/v1/inference', json={**body, "priority": "fast", "input_data": 2})
+    assert unknown.status_code == 422
+
+    batch = client.post('/api/v1/inference/batches', headers=headers, json={}).json()
+    fresh_inference.clock.now += 3.0
+    client.post(f'/api/v1/inference/batches/{batch["batch_id"]}/results', headers=headers, json={
+        "results": [{"request_id": batch["requests"][0]["request_id"], "result": 1}],
+    })
+    late = client.post('/api/v1/inference', json={**body, "input_data": 3, "deadline_ms": 1000})
+    assert late.status_code == 503 and late.headers["Retry-After"] == "3"
+
+    queued = client.post('/api/v1/inference', json={**body, "input_data": 4, "deadline_ms": 4000})
+    request_id = queued.json()["request_id"]
+    fresh_inference.clock.now += 2.0
+    assert client.post('/api/v1/inference/batches', headers=headers, json={}).status_code == 204
+    failed = client.get(f'/api/v1/inference/{request_id}').json()
+    assert failed["status"] == "failed" and "Deadline" in failed["error"]
+
+
+def test_missed_requests_reported_without_a_lease():
+    """Test missed requests are reported on submit and on status and depth reads."""
+    clock = FakeClock()
+    missed = []
+    queue = InferenceQueue(clock=clock, on_missed=missed.append)
+    late = queue.submit("m", "late", deadline=1.0)
+    clock.now += 2.0
+
+    assert queue.status(late.request_id) is None
+    assert [r.input_data for r in missed] == ["late"]
+
+    queue.submit("n", "other", deadline=1.0)
+    clock.now += 2.0
+    assert queue.depth() == 0
+    assert [r.input_data for r in missed] == ["late", "other"]
+
+    queue.submit("m", "first", deadline=1.0)
+    clock.now += 2.0
+    queue.submit("m", "second", deadline=10.0)
+    assert [r.input_data for r in missed] == ["late", "other", "first"]
+
+
+def test_missed_request_failed_on_submit_through_api(client, fresh_inference):
+    """Test a request submitted through the cache fails the queued ones that missed their deadline."""
+    model = _register_model(client, max_batch_size=1)
+    body = {"model_id": model["id"], "deadline_ms": 1000}
+    late = client.post('/api/v1/inference', json={**body, "input_data": 1}).json()
+    fresh_inference.clock.now += 2.0
+
+    assert client.post('/api/v1/inference', json={**body, "input_data": 2}).status_code == 202
+
+    assert inference_api.result_store.get(late["request_id"]).status == "failed"
+    failed = client.get(f'/api/v1/inference/{late["request_id"]}').json()
+    assert failed["status"] == "failed" and "Deadline" in failed["error"]
+
+
+def test_coalesced_request_expedites_leader():
+    """Test a queued request shared by a more urgent one takes on its deadline and class."""
+    clock = FakeClock()
+    queue = InferenceQueue(clock=clock)
+    policy = BatchPolicy(1, 0.0)
+    queue.submit("m", "first", policy=policy, priority="batch")
+    shared = queue.submit("m", "shared", policy=policy, priority="batch")
+
+    queue.expedite(shared.request_id, "interactive")
+
+    assert shared.priority == "interactive" and shared.deadline == clock.now + 1.0
+    assert queue.next_batch().requests == [shared]
+    assert queue.depth("m") == 1
@@ -0,0 +1,207 @@
+"""Tests for DB-backed leader election and singleton loops."""
+import os
+import signal
+import subprocess
+import sys
+import textwrap
+import time
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from app.db import LeaseDB, NodeDB
+from app.leader import LeaderElector, SingletonLoop
+from app.orchestrator import reap_offline_nodes
+from app.storage import dependencies, open_storage
+from tests.conftest import TestingSessionLocal
+
+ADMIN_TOKEN = "test-admin-token"
+
+
+@pytest.fixture(autouse=True)
+def clear_leases():
+    """Remove leases left by other tests."""
+    db = TestingSessionLocal()
+    db.query(LeaseDB).delete()
+    db.commit()
+    db.close()
+
+
+def _elector(identity, ttl=0.3):
+    return LeaderElector(
+        "test-lease", identity=identity, ttl=ttl,
+        renew_interval=ttl / 3, session_factory=TestingSessionLocal,
+    )
+
+
+def test_only_one_replica_acquires_the_lease():
+    """Test a second replica cannot take an unexpired lease."""
+    a, b = _elector("a"), _elector("b")
+
+    assert a.try_acquire()
+    assert not b.try_acquire()
+    assert a.try_acquire()  # renewal keeps the epoch
+    assert a.is_leader and not b.is_leader
+    assert a.epoch == 1
+
+
+def test_expired_lease_is_taken_over_with_new_epoch():
+    """Test a standby takes over once the leader stops renewing."""
+    a, b = _elector("a", ttl=0.2), _elector("b", ttl=0.2)
+    a.try_acquire()
+
+    time.sleep(0.25)
+
+    assert not a.is_leader
+    assert b.try_acquire()
+    assert b.epoch == 2
+    assert not a.try_acquire()
+
+
+def test_release_hands_over_immediately():
+    """Test a released lease can be acquired without waiting for expiry."""
+    a, b = _elector("a", ttl=30), _elector("b", ttl=30)
+    a.try_acquire()
+
+    a.release()
+
+    assert not a.is_leader
+    assert b.try_acquire()
+
+
+def test_singleton_loop_runs_only_on_leader():
+    """Test singleton work is skipped on standby replicas."""
+    a, b = _elector("a"), _elector("b")
+    runs = []
+    loop_a = SingletonLoop("work", lambda: runs.append("a"), 1, a)
+    loop_b = SingletonLoop("work", lambda: runs.append("b"), 1, b)
+    a.try_acquire()
+    b.try_acquire()
+
+    assert loop_a.run_once()
+    assert not loop_b.run_once()
+    assert runs == ["a"]
+
+
+@contextmanager
+def _sql_storage():
+    """Open the SQL backend on the test database for one unit of work."""
+    db = TestingSessionLocal()
+    try:
+        storage = open_storage(db, "sql")
+        yield storage
+        storage.commit()
+    finally:
+        db.close()
+
+
+def test_reaper_marks_stale_nodes_offline():
+    """Test nodes without recent heartbeats are marked offline."""
+    db = TestingSessionLocal()
+    db.add_all([
+        NodeDB(id="fresh", name="fresh", ip="10.0.0.1", capabilities={},
+               last_seen=1000.0, status="online"),
+        NodeDB(id="stale", name="stale", ip="10.0.0.2", capabilities={},
+               last_seen=800.0, status="online"),
+    ])
+    db.commit()
+    db.close()
+
+    assert reap_offline_nodes(_sql_storage, offline_after=90, now=1000.0) == 1
+
+    db = TestingSessionLocal()
+    statuses = {n.id: n.status for n in db.query(NodeDB)}
+    db.close()
+    assert statuses == {"fresh": "online", "stale": "offline"}
+
+
+@pytest.mark.parametrize("backend", ["memory", "striped"])
+def test_reaper_marks_stale_nodes_offline_in_memory(backend, monkeypatch):
+    """Test the reaper also marks nodes offline in the in-memory backends."""
+    monkeypatch.setattr(dependencies, "STORAGE_BACKEND", backend)
+    monkeypatch.setattr(dependencies, "_shared", None)
+    nodes = dependencies.shared_storage().nodes
+    for node_id, last_seen in [("fresh", 1000.0), ("stale", 800.0)]:
+        nodes.put({"id": node_id, "name": node_id, "ip": "10.0.0.1",
+                   "capabilities": {}, "last_seen": last_seen, "status": "online"})
+
+    assert reap_offline_nodes(offline_after=90, now=1000.0) == 1
+
+    assert {n["id"]: n["status"] for n in nodes.list()} == {"fresh": "online", "stale": "offline"}
+
+
+def test_leader_endpoint(client, monkeypatch):
+    """Test the admin endpoint reports this replica's leadership."""
+    monkeypatch.setattr("app.auth.dependencies.ADMIN_TOKEN", ADMIN_TOKEN)
+    response = client.get(
+        '/api/v1/admin/leader', headers={"Authorization": f"Bearer {ADMIN_TOKEN}"}
+    )
+
+    assert response.status_code == 200
+    assert response.json()["is_leader"] is False
+
+
+REPLICA = textwrap.dedent("""
+    import sys, time
+    from app.db import init_db
+    from app.leader import LeaderElector
+
+    init_db()
+    elector = LeaderElector("replicas", identity=sys.argv[1], ttl=0.6, renew_interval=0.1)
+    elector.add_singleton(
+        "work", lambda: print(elector.epoch, time.time(), flush=True), 0.05
+    )
+    elector.start()
+    time.sleep(float(sys.argv[2]))
+    elector.stop()
+""")
+
+
+def test_replica_processes_elect_one_leader(tmp_path):
+    """Test several processes on one DB run singleton work one at a time."""
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'cp.db'}")
+    cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    replicas = {
+        name: subprocess.Popen(
+            [sys.executable, "-c", REPLICA, name, "3.5"],
+            cwd=cwd, env=env, stdout=subprocess.PIPE, text=True,
+        )
+        for name in ("r1", "r2", "r3")
+    }
+
+    # Once a leader has been working for a while, kill it without releasing
+    engine = create_engine(env["DATABASE_URL"])
+    first_leader = None
+    deadline = time.monotonic() + 10
+    while first_leader is None and time.monotonic() < deadline:
+        time.sleep(0.1)
+        with engine.connect() as conn:
+            try:
+                first_leader = conn.execute(
+                    text("SELECT holder FROM leases WHERE name = 'replicas'")
+                ).scalar()
+            except OperationalError:
+                pass  # replicas are still creating tables
+    assert first_leader is not None
+    time.sleep(0.5)
+    replicas[first_leader].send_signal(signal.SIGKILL)
+
+    runs = []
+    for name, process in replicas.items():
+        out, _ = process.communicate(timeout=30)
+        for line in out.splitlines():
+            epoch, at = line.split()
+            runs.append((float(at), int(epoch), name))
+    runs.sort()
+
+    # Each epoch belongs to one replica, and epochs never go backwards
+    holders = {}
+    for _, epoch, name in runs:
+        assert holders.setdefault(epoch, name) == name
+    assert [epoch for _, epoch, _ in runs] == sorted(epoch for _, epoch, _ in runs)
+    # A standby took over after the leader was killed
+    assert len(holders) >= 2
+    assert holders[min(holders)] == first_leader
+    assert any(name != first_leader for name in holders.values())
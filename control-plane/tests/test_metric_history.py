@@ -0,0 +1,137 @@
+"""Tests for node metric history and replay of spooled samples."""
+import gzip
+import json
+import time
+
+from app.db import NodeMetricDB
+from app.orchestrator import prune_metric_history
+from tests.conftest import TestingSessionLocal
+
+
+def _register(client, name="history-node"):
+    """Register a node and return (node_id, auth headers)."""
+    node_data = {
+        "name": name,
+        "ip": "10.0.0.7",
+        "capabilities": {"os": "linux", "cpu_count": 2, "mem_mb": 4000, "gpus": []},
+    }
+    reg = client.post('/api/v1/nodes/register', json=node_data).json()
+    return reg["node_id"], {"Authorization": f'Bearer {reg["node_token"]}'}
+
+
+def _ago(seconds):
+    """Timestamp ``seconds`` in the past, inside the retention window."""
+    return float(int(time.time()) - seconds)
+
+
+def _ndjson(samples):
+    return "\n".join(json.dumps(s) for s in samples).encode()
+
+
+def test_heartbeats_are_recorded_in_history(client):
+    """Test each heartbeat adds a sample to the node's history."""
+    node_id, headers = _register(client)
+    samples = ((_ago(60), 10.0), (_ago(30), 20.0))
+    for ts, cpu in samples:
+        client.post(
+            f'/api/v1/nodes/{node_id}/heartbeat',
+            json={"cpu_usage": cpu, "timestamp": ts},
+            headers=headers,
+        )
+
+    response = client.get(f'/api/v1/nodes/{node_id}/metrics')
+
+    assert response.status_code == 200
+    assert [(s["timestamp"], s["cpu_usage"]) for s in response.json()] == list(samples)
+
+
+def test_gzip_replay_fills_gap_without_changing_latest_metrics(client):
+    """Test replayed samples are stored but do not overwrite latest metrics."""
+    node_id, headers = _register(client)
+    client.post(
+        f'/api/v1/nodes/{node_id}/heartbeat',
+        json={"cpu_usage": 99.0, "timestamp": _ago(0)},
+        headers=headers,
+    )
+    start = _ago(100)
+    spooled = [{"timestamp": start + i, "cpu_usage": float(i)} for i in range(50)]
+
+    response = client.post(
+        f'/api/v1/nodes/{node_id}/metrics',
+        content=gzip.compress(_ndjson(spooled)),
+        headers={**headers, "Content-Type": "application/x-ndjson",
+                 "Content-Encoding": "gzip"},
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {"accepted": 50, "skipped": 0}
+    history = client.get(
+        f'/api/v1/nodes/{node_id}/metrics?since={start}&until={start + 50}'
+    ).json()
+    assert [s["cpu_usage"] for s in history] == [float(i) for i in range(50)]
+    node = client.get(f'/api/v1/nodes/{node_id}').json()
+    assert node["capabilities"]["metrics"]["cpu_usage"] == 99.0
+
+
+def test_replaying_a_batch_twice_is_idempotent(client):
+    """Test a batch resent after a lost response is not stored twice."""
+    node_id, headers = _register(client)
+    body = _ndjson([{"timestamp": _ago(20)}, {"timestamp": _ago(10)}])
+
+    client.post(f'/api/v1/nodes/{node_id}/metrics', content=body, headers=headers)
+    response = client.post(
+        f'/api/v1/nodes/{node_id}/metrics', content=body, headers=headers
+    )
+
+    assert response.json() == {"accepted": 0, "skipped": 2}
+    assert len(client.get(f'/api/v1/nodes/{node_id}/metrics').json()) == 2
+
+
+def test_replay_rejects_bad_requests(client):
+    """Test replay auth, malformed bodies and unsupported encodings."""
+    node_id, headers = _register(client)
+    other_id, other_headers = _register(client, name="other-node")
+    url = f'/api/v1/nodes/{node_id}/metrics'
+
+    assert client.post(url, content=b"{}").status_code == 401
+    assert client.post(url, content=b"{}", headers=other_headers).status_code == 403
+    assert client.post(url, content=b"not json", headers=headers).status_code == 400
+    assert client.post(
+        url, content=b"{}", headers={**headers, "Content-Encoding": "br"}
+    ).status_code == 415
+    assert client.post(
+        url, content=b"garbage", headers={**headers, "Content-Encoding": "gzip"}
+    ).status_code == 400
+
+
+def test_expired_samples_are_skipped(client, monkeypatch):
+    """Test samples older than the retention window are not recorded."""
+    monkeypatch.setattr("app.api.v1.nodes.METRICS_RETENTION_SECONDS", 60)
+    node_id, headers = _register(client)
+
+    client.post(
+        f'/api/v1/nodes/{node_id}/metrics',
+        content=_ndjson([{"timestamp": _ago(3600)}, {}]),
+        headers=headers,
+    )
+
+    history = client.get(f'/api/v1/nodes/{node_id}/metrics').json()
+    assert len(history) == 1
+    assert history[0]["timestamp"] > _ago(60)
+
+
+def test_pruner_deletes_expired_samples(client):
+    """Test the pruner loop removes samples that expired after being recorded."""
+    node_id, headers = _register(client)
+    client.post(
+        f'/api/v1/nodes/{node_id}/metrics',
+        content=_ndjson([{"timestamp": _ago(120)}, {"timestamp": _ago(30)}]),
+        headers=headers,
+    )
+
+    assert prune_metric_history(TestingSessionLocal, retention=60) >= 1
+
+    db = TestingSessionLocal()
+    remaining = [m.timestamp for m in db.query(NodeMetricDB).filter(NodeMetricDB.node_id == node_id)]
+    db.close()
+    assert remaining == [_ago(30)]
@@ -0,0 +1,155 @@
+"""Tests for the Prometheus metrics endpoint and metric types."""
+import re
+
+import pytest
+
+from app.metrics import Counter, Gauge, Histogram, Registry
+from app.orchestrator import PlacementEngine
+
+
+def _sample(text, name, **labels):
+    """Return the value of a sample line from exposition text, or None."""
+    for line in text.splitlines():
+        if line.startswith("#") or not line.startswith(name):
+            continue
+        series, value = line.rsplit(" ", 1)
+        if series.split("{")[0] != name:
+            continue
+        if all(f'{k}="{v}"' in series for k, v in labels.items()):
+            return float(value)
+    return None
+
+
+def _register(client, name="metrics-node"):
+    """Register a node and return the registration response body."""
+    node_data = {
+        "name": name,
+        "ip": "10.0.0.5",
+        "capabilities": {"os": "linux", "cpu_count": 2, "mem_mb": 4000, "gpus": []},
+    }
+    return client.post('/api/v1/nodes/register', json=node_data).json()
+
+
+def test_metrics_endpoint_content_type(client):
+    """Test /metrics serves Prometheus text format."""
+    response = client.get('/metrics')
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE miaas_http_request_duration_seconds histogram" in response.text
+
+
+def test_route_latency_uses_route_template(client):
+    """Test request metrics are labelled by route template, not raw path."""
+    node_id = _register(client)["node_id"]
+    client.get(f'/api/v1/nodes/{node_id}')
+
+    text = client.get('/metrics').text
+
+    assert _sample(
+        text,
+        "miaas_http_request_duration_seconds_count",
+        method="GET",
+        route="/api/v1/nodes/{node_id}",
+    ) >= 1
+    assert node_id not in text
+    assert _sample(
+        text,
+        "miaas_http_requests_total",
+        method="GET",
+        route="/api/v1/nodes/{node_id}",
+        status="200",
+    ) >= 1
+
+
+def test_db_queries_attributed_to_request(client):
+    """Test DB query counts are recorded per route."""
+    _register(client)
+
+    text = client.get('/metrics').text
+
+    assert _sample(
+        text, "miaas_http_request_db_queries_sum", route="/api/v1/nodes/register"
+    ) >= 2
+    assert _sample(text, "miaas_db_queries_total") >= 2
+
+
+def test_registration_and_heartbeat_counters(client):
+    """Test registration and heartbeat counters are incremented."""
+    before = client.get('/metrics').text
+    created_before = _sample(
+        before, "miaas_node_registrations_total", result="created"
+    ) or 0
+    ok_before = _sample(before, "miaas_node_heartbeats_total", result="ok") or 0
+
+    reg = _register(client, "counter-node")
+    _register(client, "counter-node")
+    client.post(
+        f'/api/v1/nodes/{reg["node_id"]}/heartbeat',
+        json={"cpu_usage": 1.0},
+        headers={"Authorization": f'Bearer {reg["node_token"]}'},
+    )
+
+    after = client.get('/metrics').text
+    assert _sample(after, "miaas_node_registrations_total", result="created") == (
+        created_before + 1
+    )
+    assert _sample(after, "miaas_node_registrations_total", result="updated") >= 1
+    assert _sample(after, "miaas_node_heartbeats_total", result="ok") == ok_before + 1
+
+
+def test_placement_decision_latency_recorded(client):
+    """Test placement decisions are timed and counted."""
+    engine = PlacementEngine()
+    engine.select_node([{"id": "n1", "capabilities": {}}], {})
+    engine.select_node([], {})
+
+    text = client.get('/metrics').text
+
+    assert _sample(text, "miaas_placement_decision_duration_seconds_count") >= 2
+    assert _sample(text, "miaas_placement_decisions_total", result="placed") >= 1
+    assert _sample(text, "miaas_placement_decisions_total", result="unplaced") >= 1
+
+
+def test_histogram_buckets_are_cumulative():
+    """Test histogram exposition has cumulative buckets, sum and count."""
+    registry = Registry()
+    histogram = Histogram("test_latency", "Test.", buckets=(0.1, 1.0), registry=registry)
+    for value in (0.05, 0.1, 0.5, 5.0):
+        histogram.observe(value)
+
+    text = registry.render()
+
+    assert 'test_latency_bucket{le="0.1"} 2' in text
+    assert 'test_latency_bucket{le="1"} 3' in text
+    assert 'test_latency_bucket{le="+Inf"} 4' in text
+    assert "test_latency_count 4" in text
+    assert re.search(r"test_latency_sum 5\.65", text)
+
+
+def test_labelled_metrics_and_escaping():
+    """Test labelled counters and gauges render with escaped label values."""
+    registry = Registry()
+    counter = Counter("test_total", "Test.", ["path"], registry=registry)
+    gauge = Gauge("test_gauge", "Test.", registry=registry)
+    counter.labels('/a"b').inc(2)
+    gauge.set(3)
+    gauge.dec()
+
+    text = registry.render()
+
+    assert 'test_total{path="/a\\"b"} 2' in text
+    assert "test_gauge 2" in text
+
+
+def test_registry_rejects_duplicates_and_bad_labels():
+    """Test duplicate names and mismatched labels are rejected."""
+    registry = Registry()
+    counter = Counter("dup_total", "Test.", ["a"], registry=registry)
+
+    with pytest.raises(ValueError):
+        Counter("dup_total", "Test.", registry=registry)
+    with pytest.raises(ValueError):
+        counter.labels("x", "y")
+    with pytest.raises(ValueError):
+        counter.inc()
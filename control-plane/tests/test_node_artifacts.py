@@ -0,0 +1,97 @@
+"""Tests for node artifact cache reports and model locations."""
+import os
+
+import pytest
+
+from app.db import NodeDB
+from app.registry import blob_store, sha256_digest
+from tests.conftest import TestingSessionLocal
+
+ARTIFACT = os.urandom(64 * 1024)
+DIGEST = sha256_digest(ARTIFACT)
+OTHER = "sha256:" + "0" * 64
+
+
+@pytest.fixture(autouse=True)
+def registry_dir(tmp_path, monkeypatch):
+    """Keep blobs in a temporary directory."""
+    monkeypatch.setattr(blob_store, "root", str(tmp_path))
+    return tmp_path
+
+
+def _register(client, name):
+    """Register a node and return its ID and auth headers."""
+    reg = client.post('/api/v1/nodes/register', json={
+        "name": name,
+        "ip": "10.0.0.9",
+        "capabilities": {"os": "linux", "cpu_count": 2, "mem_mb": 4000, "gpus": []},
+    }).json()
+    return reg["node_id"], {"Authorization": f'Bearer {reg["node_token"]}'}
+
+
+def _register_model(client):
+    upload_id = blob_store.start_upload()
+    blob_store.append(upload_id, 0, [ARTIFACT])
+    blob_store.finish(upload_id, DIGEST)
+    return client.post('/api/v1/models', json={
+        "name": "resnet", "version": "1", "framework": "onnx", "digest": DIGEST,
+    }).json()["id"]
+
+
+def _report(client, node_id, headers, *artifacts):
+    return client.put(
+        f'/api/v1/nodes/{node_id}/artifacts', headers=headers,
+        json={"artifacts": [
+            {"digest": digest, "size": 100, "pinned": pinned, "last_used": last_used}
+            for digest, pinned, last_used in artifacts
+        ]},
+    )
+
+
+def test_report_replaces_previous_contents(client):
+    """Test each report replaces what the node held before."""
+    node_id, headers = _register(client, "worker-01")
+
+    response = _report(client, node_id, headers, (DIGEST, True, 10.0), (OTHER, False, 20.0))
+    assert response.status_code == 200
+    assert [a["digest"] for a in response.json()["artifacts"]] == [OTHER, DIGEST]
+
+    _report(client, node_id, headers, (OTHER, False, 30.0))
+
+    artifacts = client.get(f'/api/v1/nodes/{node_id}/artifacts').json()["artifacts"]
+    assert artifacts == [{"digest": OTHER, "size": 100, "pinned": False, "last_used": 30.0}]
+
+
+def test_report_for_another_node_forbidden(client):
+    """Test a node cannot report another node's cache."""
+    node_id, _ = _register(client, "worker-01")
+    _, other_headers = _register(client, "worker-02")
+
+    assert _report(client, node_id, other_headers, (DIGEST, False, 1.0)).status_code == 403
+    assert client.put(f'/api/v1/nodes/{node_id}/artifacts', json={"artifacts": []}).status_code == 401
+
+
+def test_model_locations_prefer_pinned_online_nodes(client):
+    """Test the nodes holding a model are listed, in-use first, online only."""
+    model_id = _register_model(client)
+    idle, idle_headers = _register(client, "idle")
+    serving, serving_headers = _register(client, "serving")
+    gone, gone_headers = _register(client, "gone")
+    _register(client, "empty")
+    _report(client, idle, idle_headers, (DIGEST, False, 50.0))
+    _report(client, serving, serving_headers, (DIGEST, True, 10.0))
+    _report(client, gone, gone_headers, (DIGEST, True, 60.0))
+    db = TestingSessionLocal()
+    db.get(NodeDB, gone).status = "offline"
+    db.commit()
+    db.close()
+
+    locations = client.get(f'/api/v1/models/{model_id}/nodes').json()
+
+    assert locations["digest"] == DIGEST
+    assert [n["name"] for n in locations["nodes"]] == ["serving", "idle"]
+
+
+def test_model_locations_unknown_model(client):
+    """Test asking for an unregistered model's nodes returns 404."""
+    assert client.get('/api/v1/models/missing/nodes').status_code == 404
@@ -291,3 +291,25 @@ def test_select_node_gpu_bonus_affects_selection():
     # node-2: 16000 * 1.0 + 100000 * 0.5 + 1 * 2.0 = 66002
     # node-1 should be selected with higher score
     assert result == "node-1"
+
+
+def test_select_node_prefers_cached_artifacts():
+    """Test a node holding the required artifact wins over a larger node."""
+    engine = PlacementEngine()
+    nodes = [
+        {
+            "id": "node-1",
+            "capabilities": {"mem_mb": 64000, "disk_mb": 500000, "gpus": []},
+            "artifacts": [],
+        },
+        {
+            "id": "node-2",
+            "capabilities": {"mem_mb": 8000, "disk_mb": 50000, "gpus": []},
+            "artifacts": ["sha256:" + "a" * 64],
+        },
+    ]
+    
+    assert engine.select_node(nodes, {}) == "node-1"
+    assert engine.select_node(nodes, {"artifacts": ["sha256:" + "a" * 64]}) == "node-2"
+    # Without the artifact anywhere, resources decide
+    assert engine.select_node(nodes, {"artifacts": ["sha256:" + "b" * 64]}) == "node-1"
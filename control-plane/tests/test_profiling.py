@@ -0,0 +1,163 @@
+"""Tests for the sampling profiler and slow request log."""
+import threading
+
+import pytest
+
+from app.profiling import ProfilerBusy, SamplingProfiler, SlowRequestLog, profile_for
+from app.profiling import sampler
+
+ADMIN_TOKEN = "test-admin-token"
+
+
+@pytest.fixture
+def admin_headers(monkeypatch):
+    """Enable admin endpoints and return matching auth headers."""
+    monkeypatch.setattr("app.auth.dependencies.ADMIN_TOKEN", ADMIN_TOKEN)
+    return {"Authorization": f"Bearer {ADMIN_TOKEN}"}
+
+
+@pytest.fixture
+def slow_log(monkeypatch):
+    """Record every request in a fresh slow request log."""
+    log = SlowRequestLog(threshold_ms=0, max_entries=10)
+    monkeypatch.setattr("app.metrics.middleware.slow_request_log", log)
+    monkeypatch.setattr("app.api.v1.admin.slow_request_log", log)
+    return log
+
+
+def _busy_loop(stop):
+    """Spin until ``stop`` is set so the profiler has something to sample."""
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_profiler_samples_other_threads():
+    """Test the profiler captures stacks of busy threads."""
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_loop, args=(stop,), name="busy-worker")
+    worker.start()
+    try:
+        profile = SamplingProfiler(interval=0.001).run(0.1)
+    finally:
+        stop.set()
+        worker.join()
+
+    assert profile.samples > 0
+    collapsed = profile.to_collapsed()
+    assert any(
+        line.startswith("busy-worker;") and "_busy_loop (test_profiling.py:" in line
+        for line in collapsed.splitlines()
+    )
+
+
+def test_speedscope_format():
+    """Test the speedscope export references shared frames by index."""
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_loop, args=(stop,))
+    worker.start()
+    try:
+        profile = SamplingProfiler(interval=0.001).run(0.05)
+    finally:
+        stop.set()
+        worker.join()
+
+    document = profile.to_speedscope()
+
+    frames = document["shared"]["frames"]
+    sampled = document["profiles"][0]
+    assert sampled["type"] == "sampled"
+    assert len(sampled["samples"]) == len(sampled["weights"])
+    assert all(0 <= i < len(frames) for stack in sampled["samples"] for i in stack)
+
+
+def test_only_one_profile_at_a_time():
+    """Test overlapping profiles are rejected."""
+    sampler._profile_lock.acquire()
+    try:
+        with pytest.raises(ProfilerBusy):
+            profile_for(0.01)
+    finally:
+        sampler._profile_lock.release()
+
+
+def test_profile_endpoint_requires_admin_token(client, monkeypatch):
+    """Test the profile endpoint is disabled or rejected without the token."""
+    monkeypatch.setattr("app.auth.dependencies.ADMIN_TOKEN", "")
+    assert client.post('/api/v1/admin/profile?seconds=0.01').status_code == 403
+
+    monkeypatch.setattr("app.auth.dependencies.ADMIN_TOKEN", ADMIN_TOKEN)
+    assert client.post('/api/v1/admin/profile?seconds=0.01').status_code == 401
+    response = client.post(
+        '/api/v1/admin/profile?seconds=0.01',
+        headers={"Authorization": "Bearer wrong"},
+    )
+    assert response.status_code == 401
+
+
+def test_profile_endpoint_formats(client, admin_headers):
+    """Test the profile endpoint returns speedscope JSON or collapsed text."""
+    response = client.post(
+        '/api/v1/admin/profile?seconds=0.05&interval_ms=1', headers=admin_headers
+    )
+    assert response.status_code == 200
+    assert response.json()["profiles"][0]["type"] == "sampled"
+
+    response = client.post(
+        '/api/v1/admin/profile?seconds=0.05&format=collapsed&include_idle=true',
+        headers=admin_headers,
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert response.text.strip()
+
+
+def test_slow_request_log_threshold():
+    """Test only requests over the threshold are recorded, newest first."""
+    log = SlowRequestLog(threshold_ms=100, max_entries=2)
+
+    assert log.record("GET", "/a", "/a", 200, 0.05, {}) is None
+    for path in ("/b", "/c", "/d"):
+        log.record("GET", path, path, 200, 0.2, {"db": 0.1})
+
+    entries = log.entries()
+    assert [e["path"] for e in entries] == ["/d", "/c"]
+    assert entries[0]["duration_ms"] == 200.0
+    assert entries[0]["phases_ms"] == {"db": 100.0}
+
+
+def test_slow_requests_capture_phases(client, admin_headers, slow_log):
+    """Test slow requests record auth, handler, db and serialization phases."""
+    reg = client.post('/api/v1/nodes/register', json={
+        "name": "slow-node",
+        "ip": "10.0.0.9",
+        "capabilities": {"os": "linux", "cpu_count": 1, "mem_mb": 512, "gpus": []},
+    }).json()
+    client.post(
+        f'/api/v1/nodes/{reg["node_id"]}/heartbeat',
+        json={"cpu_usage": 3.0},
+        headers={"Authorization": f'Bearer {reg["node_token"]}'},
+    )
+
+    response = client.get('/api/v1/admin/slow-requests', headers=admin_headers)
+
+    assert response.status_code == 200
+    heartbeat = next(
+        e for e in response.json()
+        if e["route"] == "/api/v1/nodes/{node_id}/heartbeat"
+    )
+    assert heartbeat["status"] == 200
+    assert heartbeat["db_queries"] >= 2
+    assert {"auth", "handler", "db", "serialization"} <= set(heartbeat["phases_ms"])
+
+    assert client.delete(
+        '/api/v1/admin/slow-requests', headers=admin_headers
+    ).status_code == 204
+    # Only the DELETE itself, recorded after the log was cleared, remains
+    assert [e["method"] for e in slow_log.entries()] == ["DELETE"]
+
+
+def test_streaming_responses_not_logged_as_slow(client, slow_log):
+    """Test long-lived watch streams are not recorded as slow requests."""
+    client.get('/api/v1/nodes?watch=1&timeoutSeconds=0')
+
+    assert all(e["route"] != "/api/v1/nodes" for e in slow_log.entries())
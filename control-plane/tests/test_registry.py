@@ -0,0 +1,247 @@
+"""Tests for the model registry, blob uploads and ranged downloads."""
+import os
+import threading
+import time
+
+import pytest
+
+from app.registry import (
+    BlobStore,
+    DigestMismatch,
+    RangeNotSatisfiable,
+    UploadOffsetMismatch,
+    blob_store,
+    parse_range,
+    sha256_digest,
+)
+
+ARTIFACT = os.urandom(3 * 1024 * 1024 + 17)
+DIGEST = sha256_digest(ARTIFACT)
+
+
+@pytest.fixture(autouse=True)
+def registry_dir(tmp_path, monkeypatch):
+    """Keep blobs in a temporary directory."""
+    monkeypatch.setattr(blob_store, "root", str(tmp_path))
+    return tmp_path
+
+
+def _upload(client, data, chunk_size=1024 * 1024):
+    upload_id = client.post('/api/v1/blobs/uploads').json()["upload_id"]
+    for start in range(0, len(data), chunk_size):
+        chunk = data[start:start + chunk_size]
+        response = client.patch(
+            f'/api/v1/blobs/uploads/{upload_id}',
+            content=chunk,
+            headers={"Content-Range": f"{start}-{start + len(chunk) - 1}"},
+        )
+        assert response.status_code == 202
+    return client.put(f'/api/v1/blobs/uploads/{upload_id}?digest={sha256_digest(data)}')
+
+
+def test_chunked_upload_stores_blob(client):
+    """Test a blob uploaded in chunks is stored under its digest."""
+    response = _upload(client, ARTIFACT)
+
+    assert response.status_code == 201
+    assert response.json() == {"digest": DIGEST, "size": len(ARTIFACT)}
+    assert client.get(f'/api/v1/blobs/{DIGEST}').content == ARTIFACT
+
+
+def test_upload_resumes_at_reported_offset(client):
+    """Test a chunk at the wrong offset is refused with the received range."""
+    upload_id = client.post('/api/v1/blobs/uploads').json()["upload_id"]
+    client.patch(f'/api/v1/blobs/uploads/{upload_id}', content=ARTIFACT[:1000])
+
+    response = client.patch(
+        f'/api/v1/blobs/uploads/{upload_id}',
+        content=ARTIFACT[2000:3000],
+        headers={"Content-Range": "2000-2999"},
+    )
+
+    assert response.status_code == 416
+    assert response.headers["Range"] == "0-999"
+    assert client.get(f'/api/v1/blobs/uploads/{upload_id}').json()["offset"] == 1000
+    client.patch(f'/api/v1/blobs/uploads/{upload_id}', content=ARTIFACT[1000:])
+    assert client.put(
+        f'/api/v1/blobs/uploads/{upload_id}?digest={DIGEST}'
+    ).status_code == 201
+
+
+def test_digest_mismatch_discards_upload(client):
+    """Test content not matching the claimed digest is never stored."""
+    upload_id = client.post('/api/v1/blobs/uploads').json()["upload_id"]
+    client.patch(f'/api/v1/blobs/uploads/{upload_id}', content=b"tampered")
+
+    response = client.put(f'/api/v1/blobs/uploads/{upload_id}?digest={DIGEST}')
+
+    assert response.status_code == 400
+    assert client.get(f'/api/v1/blobs/{DIGEST}').status_code == 404
+    assert client.get(f'/api/v1/blobs/uploads/{upload_id}').status_code == 404
+
+
+def test_upload_hash_survives_restart(tmp_path):
+    """Test a new store instance rehashes a partial upload and finishes it."""
+    store = BlobStore(str(tmp_path))
+    upload_id = store.start_upload()
+    store.append(upload_id, 0, [ARTIFACT[:5000]])
+
+    restarted = BlobStore(str(tmp_path))
+    with pytest.raises(UploadOffsetMismatch):
+        restarted.append(upload_id, 0, [ARTIFACT[:10]])
+    restarted.append(upload_id, 5000, [ARTIFACT[5000:]])
+
+    assert restarted.finish(upload_id, DIGEST) == DIGEST
+    with pytest.raises(DigestMismatch):
+        other = restarted.start_upload()
+        restarted.finish(other, DIGEST)
+
+
+def test_concurrent_appends_to_one_upload(tmp_path):
+    """Test an append arriving while another is mid-write sees the upload's true offset."""
+    store = BlobStore(str(tmp_path))
+    upload_id = store.start_upload()
+    written, resume = threading.Event(), threading.Event()
+
+    class PausingHasher:
+        """Holds the first append between writing its data and hashing it."""
+
+        def __init__(self, hasher):
+            self.hasher = hasher
+
+        def update(self, data):
+            written.set()
+            assert resume.wait(5)
+            self.hasher.update(data)
+
+        def hexdigest(self):
+            return self.hasher.hexdigest()
+
+    store.append(upload_id, 0, [])
+    store._uploads[upload_id].hasher = PausingHasher(store._uploads[upload_id].hasher)
+    split = 1024 * 1024
+    first = threading.Thread(target=store.append, args=(upload_id, 0, [ARTIFACT[:split]]))
+    first.start()
+    assert written.wait(5)
+    sizes = []
+    second = threading.Thread(
+        target=lambda: sizes.append(store.append(upload_id, split, [ARTIFACT[split:]]))
+    )
+    second.start()
+    time.sleep(0.1)
+    resume.set()
+    first.join(5)
+    second.join(5)
+
+    assert sizes == [len(ARTIFACT)]
+    assert store.finish(upload_id, DIGEST) == DIGEST
+
+
+def test_ranged_downloads(client):
+    """Test byte ranges, suffix ranges and unsatisfiable ranges."""
+    _upload(client, ARTIFACT)
+    url = f'/api/v1/blobs/{DIGEST}'
+    size = len(ARTIFACT)
+
+    first = client.get(url, headers={"Range": "bytes=0-1023"})
+    tail = client.get(url, headers={"Range": "bytes=-100"})
+    rest = client.get(url, headers={"Range": f"bytes={size - 10}-"})
+    beyond = client.get(url, headers={"Range": f"bytes={size}-"})
+
+    assert first.status_code == 206
+    assert first.content == ARTIFACT[:1024]
+    assert first.headers["Content-Range"] == f"bytes 0-1023/{size}"
+    assert tail.content == ARTIFACT[-100:]
+    assert rest.content == ARTIFACT[-10:]
+    assert beyond.status_code == 416
+    assert beyond.headers["Content-Range"] == f"bytes */{size}"
+
+
+def test_parallel_ranges_reassemble_artifact(client):
+    """Test an artifact fetched in parts matches the original."""
+    _upload(client, ARTIFACT)
+    size, parts = len(ARTIFACT), 4
+    step = -(-size // parts)
+
+    body = b"".join(
+        client.get(
+            f'/api/v1/blobs/{DIGEST}',
+            headers={"Range": f"bytes={i}-{min(i + step, size) - 1}"},
+        ).content
+        for i in range(0, size, step)
+    )
+
+    assert sha256_digest(body) == DIGEST
+
+
+def test_head_reports_size(client):
+    """Test HEAD returns the size and digest without a body."""
+    _upload(client, ARTIFACT)
+
+    response = client.head(f'/api/v1/blobs/{DIGEST}')
+
+    assert response.status_code == 200
+    assert response.headers["Content-Length"] == str(len(ARTIFACT))
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert response.content == b""
+
+
+def test_parse_range():
+    """Test Range header parsing edge cases."""
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=10-", 100) == (10, 99)
+    assert parse_range("bytes=10-500", 100) == (10, 99)
+    assert parse_range("bytes=-500", 100) == (0, 99)
+    assert parse_range("bytes=0-1,5-6", 100) is None
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=100-", 100)
+
+
+def test_model_lifecycle(client):
+    """Test registering, listing, updating, archiving and downloading a model."""
+    _upload(client, ARTIFACT)
+    response = client.post('/api/v1/models', json={
+        "name": "resnet50", "version": "1.0", "framework": "onnx", "digest": DIGEST,
+    })
+    assert response.status_code == 201
+    model = response.json()
+    assert model["size"] == len(ARTIFACT)
+    assert model["status"] == "active"
+
+    duplicate = client.post('/api/v1/models', json={
+        "name": "resnet50", "version": "1.0", "framework": "onnx", "digest": DIGEST,
+    })
+    assert duplicate.status_code == 409
+
+    assert [m["id"] for m in client.get('/api/v1/models').json()["models"]] == [model["id"]]
+    updated = client.put(f'/api/v1/models/{model["id"]}', json={"status": "deprecated"})
+    assert updated.json()["status"] == "deprecated"
+    assert client.delete(f'/api/v1/models/{model["id"]}').json()["status"] == "archived"
+    assert client.get('/api/v1/models?status=active').json()["models"] == []
+
+    artifact = client.get(
+        f'/api/v1/models/{model["id"]}/artifact', headers={"Range": "bytes=0-9"}
+    )
+    assert artifact.content == ARTIFACT[:10]
+
+
+def test_model_requires_uploaded_artifact(client):
+    """Test a model cannot reference a blob that was never uploaded."""
+    response = client.post('/api/v1/models', json={
+        "name": "resnet50", "version": "1.0", "framework": "onnx", "digest": DIGEST,
+    })
+
+    assert response.status_code == 400
+
+
+def test_model_replica_bounds(client):
+    """Test autoscaling replica bounds are set and validated."""
+    _upload(client, ARTIFACT)
+    body = {"name": "resnet50", "version": "1.0", "framework": "onnx", "digest": DIGEST}
+
+    assert client.post('/api/v1/models', json={**body, "min_replicas": 3, "max_replicas": 2}).status_code == 400
+    model = client.post('/api/v1/models', json={**body, "max_replicas": 2}).json()
+    assert (model["min_replicas"], model["max_replicas"]) == (0, 2)
+    assert client.put(f'/api/v1/models/{model["id"]}', json={"min_replicas": 3}).status_code == 400
+    updated = client.put(f'/api/v1/models/{model["id"]}', json={"min_replicas": 1, "max_replicas": 5})
+    assert (updated.json()["min_replicas"], updated.json()["max_replicas"]) == (1, 5)
@@ -0,0 +1,67 @@
+"""Tests for the fast JSON serialization path."""
+import pytest
+
+from app import serialization
+
+
+@pytest.fixture
+def populated(client):
+    """Register nodes with nested capabilities and create deployments."""
+    node_ids = []
+    for i in range(3):
+        reg = client.post('/api/v1/nodes/register', json={
+            "name": f"fast-node-{i}",
+            "ip": f"10.0.1.{i}",
+            "capabilities": {
+                "os": "linux",
+                "cpu_count": 4,
+                "mem_mb": 8000,
+                "gpus": [{"id": 0, "model": "RTX ü"}],
+                "docker": {"available": True},
+            },
+        }).json()
+        node_ids.append(reg["node_id"])
+        client.post('/api/v1/deployments', json={
+            "deployment_id": f"fast-deploy-{i}",
+            "template_id": "postgres",
+            "rendered_compose": "services: {}",
+            "action": "apply",
+        })
+    return node_ids
+
+
+def _get_both(client, monkeypatch, url):
+    """Fetch a URL through the validated path and then the fast path."""
+    monkeypatch.setattr(serialization, "FAST_SERIALIZATION", False)
+    slow = client.get(url)
+    monkeypatch.setattr(serialization, "FAST_SERIALIZATION", True)
+    fast = client.get(url)
+    return slow, fast
+
+
+@pytest.mark.parametrize("url", ['/api/v1/nodes', '/api/v1/deployments'])
+def test_fast_lists_match_validated_lists(client, monkeypatch, populated, url):
+    """Test fast list bodies and headers match the validated responses."""
+    slow, fast = _get_both(client, monkeypatch, url)
+
+    assert fast.status_code == 200
+    assert fast.headers["content-type"] == "application/json"
+    assert fast.json() == slow.json()
+    assert len(fast.json()) == 3
+    assert fast.headers["X-Resource-Version"] == slow.headers["X-Resource-Version"]
+
+
+def test_fast_get_node_matches(client, monkeypatch, populated):
+    """Test a single node and a missing node through the fast path."""
+    slow, fast = _get_both(client, monkeypatch, f'/api/v1/nodes/{populated[0]}')
+    assert fast.json() == slow.json()
+
+    slow, fast = _get_both(client, monkeypatch, '/api/v1/nodes/missing')
+    assert fast.status_code == slow.status_code == 404
+
+
+def test_dumps_without_orjson(monkeypatch):
+    """Test the standard library fallback produces compact UTF-8 JSON."""
+    monkeypatch.setattr(serialization, "orjson", None)
+
+    assert serialization.dumps({"a": [1, "ü"]}) == '{"a":[1,"ü"]}'.encode()
@@ -0,0 +1,127 @@
+"""Tests for change log snapshots and warm restarts."""
+import json
+
+from app.db import NodeDB
+from app.watch import (
+    ChangeLog,
+    SnapshotWriter,
+    change_log,
+    load_snapshot,
+    restore_snapshot,
+    write_snapshot,
+)
+from app.watch.changelog import ChangeEvent
+from tests.conftest import TestingSessionLocal
+
+
+def _node(db, node_id):
+    db.add(NodeDB(id=node_id, name=node_id, ip="10.0.4.1", capabilities={},
+                  last_seen=0.0, status="online"))
+    db.commit()
+
+
+def test_snapshot_round_trip(tmp_path):
+    """Test events, resource version and compaction point survive a snapshot."""
+    log = ChangeLog(max_events=3)
+    for kind, event_type in [("nodes", "ADDED"), ("deployments", "MODIFIED"),
+                             ("nodes", "MODIFIED"), ("nodes", "DELETED")]:
+        rv = log.allocate()
+        log.publish([ChangeEvent(rv, kind, event_type, json.dumps({"rv": rv}).encode())])
+    path = str(tmp_path / "cp.snapshot")
+
+    assert write_snapshot(log, path) == 4
+    snapshot = load_snapshot(path)
+
+    assert (snapshot.resource_version, snapshot.compacted) == (4, 1)
+    assert [(e.resource_version, e.kind, e.type, e.payload) for e in snapshot.events] == [
+        (e.resource_version, e.kind, e.type, e.payload) for e in log.export()[2]
+    ]
+
+
+def test_corrupt_or_missing_snapshot_is_ignored(tmp_path):
+    """Test unreadable snapshots fall back to a cold start."""
+    path = tmp_path / "cp.snapshot"
+    assert load_snapshot(str(path)) is None
+
+    log = ChangeLog()
+    log.publish([ChangeEvent(log.allocate(), "nodes", "ADDED", b"{}")])
+    write_snapshot(log, str(path))
+    data = bytearray(path.read_bytes())
+    data[-1] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+    assert load_snapshot(str(path)) is None
+    path.write_bytes(b"")
+    assert load_snapshot(str(path)) is None
+
+
+def test_restore_replays_changes_after_snapshot(tmp_path):
+    """Test watches resume across a restart, including changes after the snapshot."""
+    path = str(tmp_path / "cp.snapshot")
+    db = TestingSessionLocal()
+    _node(db, "snap-a")
+    snapshot_rv = write_snapshot(change_log, path)
+    _node(db, "snap-b")
+    db.get(NodeDB, "snap-a").status = "offline"
+    db.commit()
+
+    restarted = ChangeLog()
+    assert restore_snapshot(restarted, db, path)
+    db.close()
+
+    events, visible = restarted.since("nodes", snapshot_rv - 1)
+    objects = [json.loads(e.payload)["object"] for e in events]
+    assert [(o["id"], o.get("status")) for o in objects] == [
+        ("snap-a", "online"), ("snap-b", "online"), ("snap-a", "offline"),
+    ]
+    assert visible == change_log.resource_version
+
+
+def test_superseded_changes_replay_latest_state(tmp_path):
+    """Test a row changed repeatedly after the snapshot replays once, at its latest version."""
+    path = str(tmp_path / "cp.snapshot")
+    db = TestingSessionLocal()
+    _node(db, "snap-a")
+    snapshot_rv = write_snapshot(change_log, path)
+    for status in ("offline", "online", "draining"):
+        db.get(NodeDB, "snap-a").status = status
+        db.commit()
+
+    restarted = ChangeLog()
+    assert restore_snapshot(restarted, db, path)
+    db.close()
+
+    events, visible = restarted.since("nodes", snapshot_rv)
+    assert [e.resource_version for e in events] == [visible]
+    assert json.loads(events[0].payload)["object"]["status"] == "draining"
+
+
+def test_numbering_continues_after_snapshot(tmp_path):
+    """Test versions seen only in the snapshot (e.g. deletions) are not reused."""
+    path = str(tmp_path / "cp.snapshot")
+    log = ChangeLog()
+    log.seed(10 ** 9)
+    write_snapshot(log, path)
+
+    restarted = ChangeLog()
+    db = TestingSessionLocal()
+    assert restore_snapshot(restarted, db, path)
+    db.close()
+
+    assert restarted.allocate() == 10 ** 9 + 1
+
+
+def test_writer_skips_unchanged_log(tmp_path):
+    """Test the periodic writer only rewrites the file after changes."""
+    path = tmp_path / "cp.snapshot"
+    log = ChangeLog()
+    writer = SnapshotWriter(log, str(path), interval=60)
+
+    writer.write()
+    path.write_bytes(b"sentinel")
+    writer.write()
+
+    assert path.read_bytes() == b"sentinel"
+    log.publish([ChangeEvent(log.allocate(), "nodes", "ADDED", b"{}")])
+    writer.write()
+    assert load_snapshot(str(path)).resource_version == 1
@@ -0,0 +1,205 @@
+"""Tests for the pluggable node and deployment storage backends."""
+import threading
+
+import pytest
+
+from app.storage import (
+    MemoryStorage,
+    NodeStorage,
+    SQLStorage,
+    StripedStorage,
+    matches_capabilities,
+)
+from app.storage import dependencies
+from app.watch import change_log
+from tests.conftest import TestingSessionLocal
+
+
+@pytest.fixture(params=["sql", "memory", "striped"])
+def storage(request):
+    """Each storage backend, empty."""
+    if request.param == "sql":
+        db = TestingSessionLocal()
+        yield SQLStorage(db)
+        db.close()
+    elif request.param == "memory":
+        yield MemoryStorage()
+    else:
+        yield StripedStorage(stripes=4)
+
+
+def _node(node_id, status="online", **capabilities):
+    return {
+        "id": node_id,
+        "name": f"node-{node_id}",
+        "ip": "10.0.0.1",
+        "capabilities": {"os": "linux", "gpus": [], **capabilities},
+        "last_seen": 1000.0,
+        "status": status,
+    }
+
+
+def _deployment(deployment_id, node_id="n1", status="pending"):
+    return {
+        "id": deployment_id,
+        "node_id": node_id,
+        "template_id": "postgres",
+        "rendered_compose": "services: {}",
+        "env": {},
+        "status": status,
+        "action": "apply",
+    }
+
+
+def test_node_crud(storage):
+    """Test nodes can be stored, found, updated and deleted."""
+    storage.nodes.put(_node("n1"))
+    storage.commit()
+
+    assert storage.nodes.get("n1")["name"] == "node-n1"
+    assert storage.nodes.get_by_name("node-n1")["id"] == "n1"
+    assert storage.nodes.update("n1", status="offline")["status"] == "offline"
+    assert storage.nodes.get("n1")["status"] == "offline"
+    assert storage.nodes.update("missing", status="offline") is None
+
+    assert storage.nodes.delete("n1")
+    assert not storage.nodes.delete("n1")
+    assert storage.nodes.get("n1") is None
+    assert storage.nodes.get_by_name("node-n1") is None
+
+
+def test_node_filters(storage):
+    """Test nodes are filtered by status and capability query."""
+    storage.nodes.put(_node("a", gpus=[{"model": "T4"}]))
+    storage.nodes.put(_node("b", status="offline", gpus=[{"model": "T4"}]))
+    storage.nodes.put(_node("c", os="windows"))
+    storage.commit()
+
+    def ids(**filters):
+        return sorted(node["id"] for node in storage.nodes.list(**filters))
+
+    assert ids() == ["a", "b", "c"]
+    assert ids(status="online") == ["a", "c"]
+    assert ids(capabilities={"gpus": True}) == ["a", "b"]
+    assert ids(status="online", capabilities={"os": "linux", "gpus": True}) == ["a"]
+    assert ids(capabilities={"os": "darwin"}) == []
+
+
+def test_update_reindexes_node(storage):
+    """Test changed fields move a node between index entries."""
+    storage.nodes.put(_node("a"))
+    storage.nodes.update("a", status="offline", capabilities={"os": "windows"})
+
+    assert storage.nodes.list(status="online") == []
+    assert [n["id"] for n in storage.nodes.list(capabilities={"os": "windows"})] == ["a"]
+    assert storage.nodes.list(capabilities={"os": "linux"}) == []
+
+
+def test_returned_records_are_copies(storage):
+    """Test changing a returned record does not change the stored one."""
+    storage.nodes.put(_node("a"))
+    node = storage.nodes.get("a")
+    node["status"] = "offline"
+
+    assert storage.nodes.get("a")["status"] == "online"
+
+
+def test_deployment_filters(storage):
+    """Test deployments are filtered by node and status."""
+    storage.deployments.put(_deployment("d1", node_id="n1"))
+    storage.deployments.put(_deployment("d2", node_id="n2"))
+    storage.deployments.put(_deployment("d3", node_id="n1", status="running"))
+    storage.commit()
+
+    def ids(**filters):
+        return sorted(d["id"] for d in storage.deployments.list(**filters))
+
+    assert ids() == ["d1", "d2", "d3"]
+    assert ids(node_id="n1") == ["d1", "d3"]
+    assert ids(node_id="n1", status="pending") == ["d1"]
+    storage.deployments.update("d1", status="deleting")
+    assert ids(status="deleting") == ["d1"]
+    assert storage.deployments.delete("d2")
+    assert ids() == ["d1", "d3"]
+
+
+def test_sql_changes_commit_with_the_session():
+    """Test SQL changes are stamped with resource versions and published on commit."""
+    db = TestingSessionLocal()
+    storage = SQLStorage(db)
+    before = change_log.resource_version
+
+    storage.nodes.put(_node("a"))
+    storage.commit()
+    db.close()
+
+    db = TestingSessionLocal()
+    node = SQLStorage(db).nodes.get("a")
+    db.close()
+    assert node["resource_version"] > before
+    assert change_log.resource_version >= node["resource_version"]
+
+
+def test_capability_matching():
+    """Test capability queries against scalar and collection values."""
+    capabilities = {"os": "linux", "cpu_count": 8, "gpus": [], "docker": {"v": 1}}
+
+    assert matches_capabilities(capabilities, {"os": "linux", "cpu_count": 8})
+    assert matches_capabilities(capabilities, {"gpus": False, "docker": True})
+    assert not matches_capabilities(capabilities, {"k8s": True})
+    assert not matches_capabilities(None, {"os": "linux"})
+
+
+@pytest.mark.parametrize("backend", [MemoryStorage, lambda: StripedStorage(8)])
+def test_concurrent_updates(backend):
+    """Test concurrent writers keep in-memory indexes consistent."""
+    storage = backend()
+    for i in range(50):
+        storage.nodes.put(_node(str(i)))
+
+    def flip(offset):
+        for round_ in range(20):
+            for i in range(offset, 50, 4):
+                status = "offline" if round_ % 2 else "online"
+                storage.nodes.update(str(i), status=status)
+
+    threads = [threading.Thread(target=flip, args=(k,)) for k in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Every writer finished on an odd round, leaving every node offline
+    assert len(storage.nodes.list(status="offline")) == 50
+    assert storage.nodes.list(status="online") == []
+
+
+def test_api_uses_configured_backend(client, monkeypatch):
+    """Test the API serves nodes from an in-memory backend."""
+    monkeypatch.setattr(dependencies, "STORAGE_BACKEND", "memory")
+    monkeypatch.setattr(dependencies, "_shared", None)
+
+    response = client.post('/api/v1/nodes/register', json={
+        "name": "mem-node", "ip": "10.0.0.9",
+        "capabilities": {"os": "linux", "cpu_count": 4, "mem_mb": 8000},
+    })
+    node_id = response.json()["node_id"]
+
+    assert client.get(f'/api/v1/nodes/{node_id}').json()["name"] == "mem-node"
+    assert dependencies.shared_storage().nodes.get(node_id)["ip"] == "10.0.0.9"
+    db = TestingSessionLocal()
+    assert SQLStorage(db).nodes.get(node_id) is None
+    db.close()
+
+
+def test_legacy_node_storage_shares_backend(monkeypatch):
+    """Test the legacy interface reads and writes the shared store."""
+    monkeypatch.setattr(dependencies, "_shared", None)
+    legacy = NodeStorage("striped")
+
+    legacy.add_node(_node("a"))
+
+    assert legacy.get_node("a")["name"] == "node-a"
+    assert [n["id"] for n in dependencies.shared_storage("striped").nodes.list()] == ["a"]
+    assert legacy.delete_node("a")
+    assert legacy.get_all_nodes() == []
@@ -0,0 +1,202 @@
+"""Tests for resource versions and the watch API."""
+import json
+
+import pytest
+
+from app.watch import ChangeLog, ResourceVersionTooOld
+from app.watch.changelog import ChangeEvent
+
+
+def _register(client, name="watch-node"):
+    """Register a node and return its ID."""
+    node_data = {
+        "name": name,
+        "ip": "10.0.0.1",
+        "capabilities": {"os": "linux", "cpu_count": 4, "mem_mb": 8000, "gpus": []},
+    }
+    response = client.post('/api/v1/nodes/register', json=node_data)
+    return response.json()["node_id"]
+
+
+def _events(response):
+    """Parse an NDJSON watch response into a list of events."""
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def _event(log, kind="nodes"):
+    """Allocate and publish a single event on a change log."""
+    resource_version = log.allocate()
+    log.publish([ChangeEvent(resource_version, kind, "ADDED", b"{}")])
+    return resource_version
+
+
+def test_list_returns_resource_version_header(client):
+    """Test list endpoints expose the current resource version."""
+    _register(client)
+
+    nodes = client.get('/api/v1/nodes')
+    deployments = client.get('/api/v1/deployments')
+
+    assert int(nodes.headers["X-Resource-Version"]) > 0
+    assert "X-Resource-Version" in deployments.headers
+
+
+def test_watch_nodes_streams_changes_since_version(client):
+    """Test watching nodes returns only changes after the given version."""
+    _register(client, "before-watch")
+    start = client.get('/api/v1/nodes').headers["X-Resource-Version"]
+
+    node_id = _register(client, "after-watch")
+    _register(client, "after-watch")
+
+    response = client.get(
+        f'/api/v1/nodes?watch=1&resourceVersion={start}&timeoutSeconds=0'
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    events = _events(response)
+    assert [e["type"] for e in events] == ["ADDED", "MODIFIED"]
+    assert all(e["object"]["id"] == node_id for e in events)
+    assert events[0]["resourceVersion"] < events[1]["resourceVersion"]
+
+
+def test_watch_deployments_filters_by_kind(client):
+    """Test a deployment watch does not include node changes."""
+    start = client.get('/api/v1/deployments').headers["X-Resource-Version"]
+    _register(client)
+    client.post('/api/v1/deployments', json={
+        "deployment_id": "watch-deploy",
+        "template_id": "redis",
+        "rendered_compose": "services: {}",
+        "action": "apply",
+    })
+    client.delete('/api/v1/deployments/watch-deploy')
+
+    response = client.get(
+        f'/api/v1/deployments?watch=1&resourceVersion={start}&timeoutSeconds=0'
+    )
+
+    events = _events(response)
+    assert [e["type"] for e in events] == ["ADDED", "MODIFIED"]
+    assert events[1]["object"]["status"] == "deleting"
+
+
+def test_watch_server_sent_events(client):
+    """Test watch responses can be negotiated as Server-Sent Events."""
+    start = client.get('/api/v1/nodes').headers["X-Resource-Version"]
+    _register(client)
+
+    response = client.get(
+        f'/api/v1/nodes?watch=1&resourceVersion={start}&timeoutSeconds=0',
+        headers={"Accept": "text/event-stream"},
+    )
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text.startswith("event: ADDED\nid: ")
+    assert "\ndata: {" in response.text
+
+
+def test_change_log_orders_out_of_order_commits():
+    """Test events become visible only once earlier versions settle."""
+    log = ChangeLog(max_events=10)
+    first = log.allocate()
+    second = log.allocate()
+
+    log.publish([ChangeEvent(second, "nodes", "ADDED", b"{}")])
+    events, visible = log.since("nodes", 0)
+    assert events == []
+    assert visible == 0
+
+    log.publish([ChangeEvent(first, "nodes", "ADDED", b"{}")])
+    events, visible = log.since("nodes", 0)
+    assert [e.resource_version for e in events] == [first, second]
+    assert visible == second
+
+
+def test_change_log_abort_releases_version():
+    """Test rolled-back versions do not block later events."""
+    log = ChangeLog(max_events=10)
+    aborted = log.allocate()
+    committed = _event(log)
+
+    log.abort([aborted])
+
+    events, visible = log.since("nodes", 0)
+    assert [e.resource_version for e in events] == [committed]
+    assert visible == committed
+
+
+def test_change_log_relist_when_too_old():
+    """Test watchers that fell behind the bounded log must relist."""
+    log = ChangeLog(max_events=2)
+    first = _event(log)
+    for _ in range(3):
+        _event(log)
+
+    with pytest.raises(ResourceVersionTooOld):
+        log.since("nodes", first)
+
+
+def test_watch_emits_relist_error_event(client, monkeypatch):
+    """Test the stream ends with a 410 error event when the log was truncated."""
+    log = ChangeLog(max_events=1)
+    for _ in range(3):
+        _event(log)
+    monkeypatch.setattr("app.watch.stream.change_log", log)
+
+    response = client.get('/api/v1/nodes?watch=1&resourceVersion=0&timeoutSeconds=0')
+
+    events = _events(response)
+    assert len(events) == 1
+    assert events[0]["type"] == "ERROR"
+    assert events[0]["object"]["code"] == 410
+
+
+def test_seed_forces_relist_for_versions_before_restart():
+    """Test seeding from the database continues numbering after it."""
+    log = ChangeLog(max_events=10)
+    log.seed(100)
+
+    assert log.resource_version == 100
+    assert log.allocate() == 101
+    with pytest.raises(ResourceVersionTooOld):
+        log.since("nodes", 50)
+
+
+def test_heartbeats_coalesce_in_change_log(client, monkeypatch):
+    """Test heartbeat-only node changes replace each other instead of filling the log."""
+    log = ChangeLog(max_events=10)
+    monkeypatch.setattr("app.watch.changelog.change_log", log)
+    monkeypatch.setattr("app.watch.stream.change_log", log)
+    reg = client.post('/api/v1/nodes/register', json={
+        "name": "beating", "ip": "10.0.0.1",
+        "capabilities": {"os": "linux", "cpu_count": 4, "mem_mb": 8000, "gpus": []},
+    }).json()
+    headers = {"Authorization": f'Bearer {reg["node_token"]}'}
+    for cpu in range(20):
+        response = client.post(f'/api/v1/nodes/{reg["node_id"]}/heartbeat', headers=headers,
+                               json={"cpu_usage": float(cpu)})
+        assert response.status_code == 200
+
+    events, visible = log.since("nodes", 0)
+    assert [e.type for e in events] == ["ADDED", "MODIFIED"]
+    assert events[-1].resource_version == visible
+    assert json.loads(events[-1].payload)["object"]["capabilities"]["metrics"]["cpu_usage"] == 19.0
+
+
+def test_watch_waits_on_event_loop(client):
+    """Test a waiting watch is woken by a change published from another thread."""
+    import asyncio
+    import threading
+
+    from app.watch.stream import iter_events
+
+    log = ChangeLog(max_events=10)
+
+    async def first_event():
+        stream = iter_events("nodes", 0, 5, log=log)
+        threading.Timer(0.05, _event, args=(log,)).start()
+        return await asyncio.wait_for(stream.__anext__(), 2)
+
+    assert json.loads(asyncio.run(first_event())) == {}
@@ -0,0 +1,90 @@
+"""Tests for the binary heartbeat wire format."""
+import struct
+
+import pytest
+
+from app.models import HeartbeatRequest, InferenceLoadModel
+from app.wire import HEARTBEAT_MEDIA_TYPE, decode_heartbeat, encode_heartbeat
+
+BINARY = {"Content-Type": HEARTBEAT_MEDIA_TYPE}
+
+
+def _register(client):
+    """Register a node and return (node_id, auth headers)."""
+    reg = client.post('/api/v1/nodes/register', json={
+        "name": "wire-node",
+        "ip": "10.0.3.1",
+        "capabilities": {"os": "linux", "cpu_count": 2, "mem_mb": 4000, "gpus": []},
+    }).json()
+    return reg["node_id"], {"Authorization": f'Bearer {reg["node_token"]}'}
+
+
+def test_round_trip():
+    """Test encoding and decoding preserve every field."""
+    heartbeat = HeartbeatRequest(
+        cpu_usage=12.3, mem_usage=45.6, disk_free_mb=250000,
+        running_containers=["postgres", "rédis"], timestamp=1700000000.25,
+    )
+
+    data = encode_heartbeat(heartbeat)
+
+    assert decode_heartbeat(data) == heartbeat
+    assert len(encode_heartbeat(HeartbeatRequest())) == 28
+    assert decode_heartbeat(encode_heartbeat(HeartbeatRequest())).timestamp is None
+
+
+def test_inference_section_round_trip():
+    """Test engine state travels in version 2, and heartbeats without it stay version 1."""
+    digests = ["sha256:" + "ab" * 32, "sha256:" + "01" * 32]
+    heartbeat = HeartbeatRequest(
+        cpu_usage=50.0, running_containers=["web"],
+        inference=InferenceLoadModel(loaded=digests, workers=8, busy=3, queued=40),
+    )
+
+    data = encode_heartbeat(heartbeat)
+
+    assert data[0] == 2 and len(data) == 28 + 3 + 9 + 64
+    assert decode_heartbeat(data) == heartbeat
+    assert encode_heartbeat(HeartbeatRequest())[0] == 1
+    for bad in (data[:-1], data + b"x", data[:32]):
+        with pytest.raises(ValueError):
+            decode_heartbeat(bad)
+
+
+def test_malformed_bodies_rejected():
+    """Test truncated bodies, trailing bytes and bad names are rejected."""
+    data = encode_heartbeat(HeartbeatRequest(running_containers=["web"]))
+
+    for bad in (data[:10], data[:-1], data + b"x", data[:-3] + b"\xff\xfe\xfd"):
+        with pytest.raises(ValueError):
+            decode_heartbeat(bad)
+
+
+def test_binary_heartbeat_on_json_route(client):
+    """Test the heartbeat route accepts binary and JSON bodies alike."""
+    node_id, headers = _register(client)
+    url = f'/api/v1/nodes/{node_id}/heartbeat'
+    heartbeat = HeartbeatRequest(cpu_usage=55.5, mem_usage=20.0, disk_free_mb=1234,
+                                 running_containers=["web"])
+
+    response = client.post(url, content=encode_heartbeat(heartbeat),
+                           headers={**headers, **BINARY})
+
+    assert response.status_code == 200
+    metrics = client.get(f'/api/v1/nodes/{node_id}').json()["capabilities"]["metrics"]
+    assert metrics["cpu_usage"] == 55.5
+    assert metrics["running_containers"] == ["web"]
+    assert client.post(url, json={"cpu_usage": 1.0}, headers=headers).status_code == 200
+    assert client.post(url, json={"cpu_usage": "x"}, headers=headers).status_code == 422
+
+
+def test_bad_binary_heartbeats_rejected(client):
+    """Test auth comes first, then malformed (400) and unknown versions (415)."""
+    node_id, headers = _register(client)
+    url = f'/api/v1/nodes/{node_id}/heartbeat'
+    data = encode_heartbeat(HeartbeatRequest())
+
+    assert client.post(url, content=b"", headers=BINARY).status_code == 401
+    assert client.post(url, content=data[:5], headers={**headers, **BINARY}).status_code == 400
+    future = struct.pack(">B", 3) + data[1:]
+    assert client.post(url, content=future, headers={**headers, **BINARY}).status_code == 415